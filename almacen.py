@@ -0,0 +1,230 @@
+# Almacén por contenido: cada canción se guarda una sola vez y las carpetas la enlazan
+
+import os
+import re
+import sys
+import shutil
+import hashlib
+import sqlite3
+import threading
+from collections import Counter
+
+from rutas import DIR_DATOS
+from historial import hash_archivo
+from conversion import BITRATE_MP3
+
+
+# Calidad con la que se genera cada formato: forma parte de la clave, así que si cambia
+# no se reutilizan archivos hechos con la anterior
+CALIDADES = {"MP3": BITRATE_MP3, "MP4": "best"}
+
+NOMBRE_INDICE = "indice.sqlite3"
+
+# ioctl de Linux que clona un archivo compartiendo sus bloques (btrfs, XFS...)
+FICLONE = 0x40049409
+
+# Métodos de enlace, del preferido al último recurso
+REFLINK = "reflink"
+HARDLINK = "hardlink"
+COPIA = "copy"
+
+_PATRON_ID = re.compile(r"[0-9A-Za-z_-]{1,32}")
+
+_sin_reflink = set()
+
+
+def clave_objeto(clave, formato, variante=""):
+    """Clave del almacén: (extractor, id) de historial.identificar_url, formato y calidad.
+
+    variante distingue salidas del mismo formato con otro contenido (OpcionesLote.variante:
+    "tags+cover", "loudnorm"...).
+    """
+    base = f"{clave[0]}:{clave[1]}:{formato}:{CALIDADES.get(formato, '')}"
+    return f"{base}:{variante}" if variante else base
+
+
+def _reflink(origen, destino):
+    if not sys.platform.startswith("linux"):
+        return False
+    dispositivo = os.stat(origen).st_dev
+    if dispositivo in _sin_reflink:
+        return False
+    import fcntl
+
+    try:
+        with open(origen, "rb") as fo, open(destino, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fo.fileno())
+        return True
+    except OSError:
+        # El sistema de archivos no sabe clonar: no se vuelve a intentar en este dispositivo
+        _sin_reflink.add(dispositivo)
+        try:
+            os.remove(destino)
+        except OSError:
+            pass
+        return False
+
+
+def enlazar(origen, destino):
+    """Crea destino con el contenido de origen sin duplicarlo en disco si se puede.
+
+    Prueba un reflink (copia independiente que comparte bloques), luego un enlace duro y, si
+    ninguno es posible (otro disco, FAT32...), copia. destino se sustituye de forma atómica.
+    Devuelve el método usado.
+    """
+    temporal = f"{destino}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        if _reflink(origen, temporal):
+            metodo = REFLINK
+        else:
+            try:
+                os.link(origen, temporal)
+                metodo = HARDLINK
+            except OSError:
+                shutil.copy2(origen, temporal)
+                metodo = COPIA
+        os.replace(temporal, destino)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    return metodo
+
+
+class AlmacenContenidos:
+    """Archivos finales guardados por su hash, con un índice por vídeo, formato y calidad.
+
+    Las descargas se hacen en carpeta_entrada (una subcarpeta por vídeo, así dos títulos
+    iguales no se pisan); guardar() mueve el resultado a objetos/ con el hash de su contenido
+    como nombre y lo enlaza en la carpeta de destino. Si el mismo vídeo se pide después para
+    otra carpeta, materializar() lo enlaza desde el almacén sin descargar nada.
+
+    El índice (SQLite) se carga entero en memoria al abrir: consultar una clave es una
+    búsqueda en un dict y un os.stat. Si en la carpeta de destino ya hay otro archivo con el
+    mismo título, el nuevo se guarda como "título [id].ext" en lugar de sobrescribirlo.
+    """
+
+    def __init__(self, carpeta=None):
+        self.carpeta = carpeta or os.path.join(DIR_DATOS, "almacen")
+        self.carpeta_objetos = os.path.join(self.carpeta, "objetos")
+        self.carpeta_entrada = os.path.join(self.carpeta, "entrada")
+        os.makedirs(self.carpeta_objetos, exist_ok=True)
+        os.makedirs(self.carpeta_entrada, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.carpeta, NOMBRE_INDICE), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS objetos ("
+            " clave TEXT PRIMARY KEY, hash TEXT NOT NULL, ext TEXT NOT NULL,"
+            " nombre TEXT NOT NULL, tamano INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        self._indice = {
+            clave: (digest, ext, nombre, tamano)
+            for clave, digest, ext, nombre, tamano in self._conn.execute(
+                "SELECT clave, hash, ext, nombre, tamano FROM objetos"
+            )
+        }
+        self._estadisticas = Counter()
+
+    def ruta_objeto(self, digest, ext):
+        return os.path.join(self.carpeta_objetos, digest[:2], digest + ext)
+
+    def buscar(self, clave, formato, variante=""):
+        """Devuelve (ruta del objeto, entrada del índice) si el vídeo ya está en el almacén."""
+        clave = clave_objeto(clave, formato, variante)
+        entrada = self._indice.get(clave)
+        if entrada is None:
+            return None
+        digest, ext, _, tamano = entrada
+        ruta = self.ruta_objeto(digest, ext)
+        try:
+            if os.stat(ruta).st_size == tamano:
+                return ruta, entrada
+        except OSError:
+            pass
+        with self._lock:
+            self._indice.pop(clave, None)
+            self._conn.execute("DELETE FROM objetos WHERE clave = ?", (clave,))
+            self._conn.commit()
+        return None
+
+    def materializar(self, clave, formato, carpeta, variante=""):
+        """Enlaza en carpeta el archivo guardado para el vídeo; None si no está en el almacén.
+
+        Devuelve (ruta en carpeta, hash del contenido).
+        """
+        encontrado = self.buscar(clave, formato, variante)
+        if encontrado is None:
+            return None
+        objeto, (digest, _, nombre, tamano) = encontrado
+        destino = self._colocar(objeto, carpeta, nombre, clave[1], tamano, digest)
+        with self._lock:
+            self._estadisticas["enlazados"] += 1
+            self._estadisticas["bytes_ahorrados"] += tamano
+        return destino, digest
+
+    def guardar(self, clave, formato, ruta, carpeta, variante=""):
+        """Mueve al almacén un archivo recién generado y lo enlaza en carpeta.
+
+        Si el almacén ya tenía ese mismo contenido (otro vídeo o formato idéntico) se descarta
+        el archivo nuevo. Devuelve (ruta en carpeta, hash del contenido).
+        """
+        digest = hash_archivo(ruta)
+        nombre = os.path.basename(ruta)
+        ext = os.path.splitext(nombre)[1]
+        tamano = os.path.getsize(ruta)
+        objeto = self.ruta_objeto(digest, ext)
+        with self._lock:
+            if os.path.exists(objeto):
+                os.remove(ruta)
+                self._estadisticas["deduplicados"] += 1
+                self._estadisticas["bytes_ahorrados"] += tamano
+            else:
+                os.makedirs(os.path.dirname(objeto), exist_ok=True)
+                shutil.move(ruta, objeto)
+                self._estadisticas["guardados"] += 1
+            self._indice[clave_objeto(clave, formato, variante)] = (digest, ext, nombre, tamano)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objetos VALUES (?, ?, ?, ?, ?)",
+                (clave_objeto(clave, formato, variante), digest, ext, nombre, tamano),
+            )
+            self._conn.commit()
+        # La subcarpeta del vídeo en carpeta_entrada queda vacía
+        if os.path.dirname(os.path.abspath(ruta)) != os.path.abspath(self.carpeta_entrada):
+            try:
+                os.rmdir(os.path.dirname(ruta))
+            except OSError:
+                pass
+        return self._colocar(objeto, carpeta, nombre, clave[1], tamano, digest), digest
+
+    def _colocar(self, objeto, carpeta, nombre, video_id, tamano, digest):
+        raiz, ext = os.path.splitext(nombre)
+        sufijo = str(video_id)
+        if not _PATRON_ID.fullmatch(sufijo):
+            # Claves ("url", url) de enlaces sin extractor propio
+            sufijo = hashlib.blake2b(sufijo.encode("utf-8"), digest_size=4).hexdigest()
+        candidatos = [os.path.join(carpeta, nombre), os.path.join(carpeta, f"{raiz} [{sufijo}]{ext}")]
+        for destino in candidatos:
+            try:
+                estado = os.stat(destino)
+            except FileNotFoundError:
+                break
+            if os.path.samestat(estado, os.stat(objeto)) or (
+                    estado.st_size == tamano and hash_archivo(destino) == digest):
+                return destino
+            # "título [id]" ocupado por otra versión del mismo vídeo: se sustituye
+        metodo = enlazar(objeto, destino)
+        with self._lock:
+            self._estadisticas[metodo] += 1
+        return destino
+
+    def estadisticas(self):
+        with self._lock:
+            return {clave: self._estadisticas[clave] for clave in
+                    ("enlazados", "guardados", "deduplicados", "bytes_ahorrados", REFLINK, HARDLINK, COPIA)}
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,463 @@
+# Banco de pruebas de rendimiento de la descarga contra un servidor local
+#
+#   python benchmark.py --salida bench.json
+#   python benchmark.py --tamanos 8 32 --workers 1 4 --formatos mp3 --comparar bench.json
+#   python benchmark.py --tamanos 32 --workers 4 --fallos 0.2 --max-rps 5
+#   python benchmark.py --formatos mp4 --tamanos 4 --workers 2 --segmentos 1 2 4 8 --kbps-conexion 2000
+#   python benchmark.py --soak 10000 --duracion 1 --tamanos 4 --workers 4 --postproceso 0 --prevalidacion 0
+#       (falla si la memoria no se mantiene plana, si algún elemento falla o queda abierto)
+#   python benchmark.py --latencia 5 --tamanos 1 --workers 1 --formatos mp3 --postproceso 0 --prevalidacion 0
+#       (un trabajo de un elemento: proceso nuevo de dwsongs frente a servidor de trabajos ya caliente)
+#
+# Genera con ffmpeg audio y vídeo sintéticos, los sirve en 127.0.0.1 y descarga lotes a través
+# de construir_opciones_ydl + YoutubeDL (extractor genérico). Cada escenario corre en un
+# proceso aparte para que la memoria pico y el tiempo de CPU sean solo suyos.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import string
+import argparse
+import itertools
+import platform
+import tempfile
+import subprocess
+import statistics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from descargas import ruta_ffmpeg
+from conversion import etiquetas_de
+
+
+ARCHIVOS = {"MP3": "pista.m4a", "MP4": "video.mp4"}
+
+
+def generar_medios(directorio, duracion):
+    """Crea con ffmpeg una pista AAC y un vídeo H.264 de la duración indicada (segundos)."""
+    ffmpeg = ruta_ffmpeg()
+    comandos = [
+        ["-f", "lavfi", "-i", f"sine=frequency=440:duration={duracion}",
+         "-c:a", "aac", "-b:a", "160k", os.path.join(directorio, ARCHIVOS["MP3"])],
+        ["-f", "lavfi", "-i", f"testsrc=size=640x360:rate=25:duration={duracion}",
+         "-f", "lavfi", "-i", f"sine=frequency=220:duration={duracion}",
+         "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "2M", "-c:a", "aac", "-shortest",
+         os.path.join(directorio, ARCHIVOS["MP4"])],
+    ]
+    for comando in comandos:
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", *comando], check=True)
+
+
+def medir_arranque(modulo, repeticiones=5):
+    """Mediana (ms) de lo que tarda un intérprete nuevo en importar el módulo."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        proceso = subprocess.run([sys.executable, "-c", f"import {modulo}"],
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True)
+        if proceso.returncode != 0:
+            return None
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tiempos), 1)
+
+
+def medir_arranque_gui(repeticiones=5, ejecutable=None):
+    """Mediana (ms) hasta que la ventana está lista, según main.py --medir-arranque.
+
+    Con ejecutable se mide un build de PyInstaller en lugar del código fuente. None si no
+    hay pantalla donde abrir la ventana.
+    """
+    comando = [ejecutable] if ejecutable else [sys.executable, "main.py"]
+    tiempos = []
+    for _ in range(repeticiones):
+        try:
+            proceso = subprocess.run(comando + ["--medir-arranque"], capture_output=True, text=True,
+                                     cwd=os.path.dirname(os.path.abspath(__file__)), timeout=60)
+            tiempos.append(json.loads(proceso.stdout.strip().splitlines()[-1])["startup_ms"])
+        except (OSError, subprocess.TimeoutExpired, IndexError, ValueError, KeyError):
+            return None
+    return round(statistics.median(tiempos), 1)
+
+
+def medir_postproceso(medios, items=8):
+    """Postproceso de items pistas (MP3 con etiquetas y portada) de dos maneras.
+
+    "encadenado" es lo que harían los postprocesadores de yt-dlp (FFmpegExtractAudio,
+    FFmpegMetadata y EmbedThumbnail, que además pasa la miniatura WebP a PNG): cuatro
+    ejecuciones de ffmpeg y tres reescrituras del archivo. "una_pasada" es transcodificar con
+    el plan de conversion.py: una ejecución que codifica, etiqueta e incrusta la portada
+    reducida. Devuelve los segundos, la CPU de ffmpeg y los bytes escritos de cada una.
+    """
+    from yt_dlp import YoutubeDL
+    from yt_dlp.postprocessor import FFmpegExtractAudioPP, FFmpegMetadataPP, EmbedThumbnailPP
+    from descargas import transcodificar
+    from rutas import FFMPEG_PATH
+
+    ydl = YoutubeDL({"ffmpeg_location": FFMPEG_PATH, "quiet": True, "noprogress": True})
+    cadena = [FFmpegExtractAudioPP(ydl, preferredcodec="mp3", preferredquality="192"),
+              FFmpegMetadataPP(ydl, add_chapters=False), EmbedThumbnailPP(ydl)]
+    resultados = {}
+    with tempfile.TemporaryDirectory(prefix="dwsongs-postproceso-") as carpeta:
+        miniatura = os.path.join(carpeta, "miniatura.webp")
+        subprocess.run([ruta_ffmpeg(), "-y", "-loglevel", "error", "-f", "lavfi", "-i",
+                        "testsrc=size=1280x720:rate=1", "-frames:v", "1", miniatura], check=True)
+        for modo in ("encadenado", "una_pasada"):
+            cpu_antes = cpu_hijos()
+            segundos = 0.0
+            escritos = 0
+            for i in range(items):
+                base = os.path.join(carpeta, f"{modo}-{i}")
+                shutil.copy(os.path.join(medios, ARCHIVOS["MP3"]), base + ".m4a")
+                shutil.copy(miniatura, base + ".webp")
+                info = {"id": str(i), "title": f"Pista {i}", "artist": "dwSongs", "album": "Benchmark",
+                        "webpage_url": f"https://example.com/{i}", "ext": "m4a", "filepath": base + ".m4a",
+                        "thumbnails": [{"url": "https://example.com/t.webp", "filepath": base + ".webp"}],
+                        "__files_to_move": {}}
+                inicio = time.perf_counter()
+                if modo == "encadenado":
+                    for pp in cadena:
+                        borrar, info = pp.run(info)
+                        # Cada paso escribe el archivo entero (los dos últimos en un temporal)
+                        escritos += os.path.getsize(info["filepath"])
+                        for ruta in borrar:
+                            os.remove(ruta)
+                else:
+                    transcodificar({"entradas": [base + ".m4a"], "streams": [{"ext": "m4a", "acodec": "aac"}],
+                                    "salida": base + ".mp3", "formato": "MP3", "etiquetas": etiquetas_de(info),
+                                    "portada": base + ".webp"})
+                    escritos += os.path.getsize(base + ".mp3")
+                segundos += time.perf_counter() - inicio
+            cpu_despues = cpu_hijos()
+            resultados[modo] = {
+                "segundos": round(segundos, 3),
+                "ms_por_pista": round(segundos / items * 1000, 1),
+                "cpu_s": round(cpu_despues - cpu_antes, 3) if cpu_antes is not None else None,
+                "mb_escritos": round(escritos / (1 << 20), 2),
+            }
+    resultados["items"] = items
+    return resultados
+
+
+def urls_sinteticas(n, semilla=0):
+    """Mezcla de enlaces como la de una lista real: sobre todo YouTube en sus distintas formas
+    (con repetidos), algunas listas y canales, otros sitios y filas inválidas."""
+    aleatorio = random.Random(semilla)
+    letras = string.ascii_letters + string.digits + "-_"
+
+    def ident(largo=11):
+        return "".join(aleatorio.choice(letras) for _ in range(largo))
+
+    ids = [ident() for _ in range(max(1, n // 2))]
+    formas = [
+        (40, lambda: f"https://www.youtube.com/watch?v={aleatorio.choice(ids)}"),
+        (15, lambda: f"https://youtu.be/{aleatorio.choice(ids)}?t=42"),
+        (8, lambda: f"https://m.youtube.com/shorts/{aleatorio.choice(ids)}"),
+        (7, lambda: f"https://www.youtube.com/watch?v={aleatorio.choice(ids)}&list=PL{ident(32)}"),
+        (5, lambda: f"https://www.youtube.com/playlist?list=PL{ident(32)}"),
+        (5, lambda: f"https://www.youtube.com/@{ident(8)}/videos"),
+        (5, lambda: f"https://soundcloud.com/{ident(8)}/{ident(12)}"),
+        (4, lambda: f"https://vimeo.com/{aleatorio.randrange(10 ** 8)}"),
+        (4, lambda: f"https://example.com/audio/{ident(8)}.mp3"),
+        (4, lambda: aleatorio.choice(["", "ftp://example.com/a.mp3", "no es un enlace", "http://", "https://[::1"])),
+        (3, lambda: f"youtube.com/watch?v={aleatorio.choice(ids)}"),
+    ]
+    generadores = [g for peso, g in formas for _ in range(peso)]
+    return [aleatorio.choice(generadores)() for _ in range(n)]
+
+
+def medir_prevalidacion(n=200000):
+    """URLs por segundo de la pasada previa (ingesta.prevalidar) sobre n enlaces sintéticos."""
+    from enlaces import indice_extractores
+    from ingesta import prevalidar
+
+    urls = urls_sinteticas(n)
+    inicio = time.perf_counter()
+    indice_extractores()
+    indice_s = time.perf_counter() - inicio
+    resumen = prevalidar(urls)
+    return {**resumen, "indice_s": round(indice_s, 3)}
+
+
+def cpu_hijos():
+    if resource is None:
+        return None
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def rss_pico_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def ejecutar_escenario(escenario):
+    """Descarga un lote y devuelve sus métricas (se ejecuta en el proceso hijo)."""
+    from descargas import descargar_lote, OpcionesLote
+    from progreso import EstadoProgreso
+
+    formato, n = escenario["formato"], escenario["items"]
+    urls = [f"{escenario['url_base']}/m/{i}-{ARCHIVOS[formato]}" for i in range(n)]
+    progreso = EstadoProgreso(n)
+    with tempfile.TemporaryDirectory(prefix="dwsongs-bench-") as carpeta:
+        cpu_py, cpu_ff = time.process_time(), cpu_hijos()
+        inicio = time.perf_counter()
+        opciones = OpcionesLote(pipeline=escenario["pipeline"], segmentos=escenario.get("segmentos", 1),
+                                usar_historial=False, usar_cache=False, expandir_listas=False,
+                                silencioso=True, progreso=progreso)
+        resultado = descargar_lote(urls, carpeta, formato, escenario["workers"], opciones)
+        duracion = time.perf_counter() - inicio
+    bytes_descargados = progreso.instantanea()["bytes"]
+    ff = cpu_hijos()
+    return {
+        **{k: escenario[k] for k in ("formato", "items", "workers", "pipeline", "segmentos")},
+        "ok": resultado["ok"],
+        "error": resultado["error"],
+        "retries": resultado["retries"],
+        "segundos": round(duracion, 3),
+        "items_s": round(n / duracion, 3),
+        "mb_s": round(bytes_descargados / duracion / 1e6, 3),
+        "cpu_python_s": round(time.process_time() - cpu_py, 3),
+        "cpu_ffmpeg_s": round(ff - cpu_ff, 3) if ff is not None else None,
+        "rss_pico_mb": rss_pico_mb(),
+        "conexiones": resultado["conexiones"],
+    }
+
+
+def memoria_referencia_y_final(serie, items, workers, reciclar_cada):
+    """(referencia, final) en bytes de las muestras de memoria residente de un soak."""
+    if len(serie) < 10:
+        raise RuntimeError("no se puede medir la memoria residente en este sistema")
+    # Las muestras se van aclarando (memoria.MAX_MUESTRAS): cada una cubre items / len(serie) elementos
+    calentamiento = (reciclar_cada or 0) * workers * len(serie) // items
+    desde = min(max(len(serie) // 10, calentamiento), len(serie) // 2)
+    referencia = statistics.median(serie[desde:desde + max(1, (len(serie) - desde) // 4)])
+    final = statistics.median(serie[len(serie) * 8 // 10:])
+    return referencia, final
+
+
+def ejecutar_soak(escenario):
+    """Lote largo de elementos distintos con reciclaje de YoutubeDL; mide si la memoria crece.
+
+    La memoria de referencia es la mediana del primer cuarto de las muestras tomadas después
+    del calentamiento (el primer reciclaje de todos los hilos, y como poco el 10 % del lote) y
+    la final la del último 20 %. El soak es correcto si todos los elementos acaban bien, la
+    memoria no crece más de tolerancia_mb y no queda estado por elemento abierto al acabar.
+    """
+    from descargas import descargar_lote, OpcionesLote
+    from memoria import ControlMemoria
+
+    n = escenario["items"]
+    urls = (f"{escenario['url_base']}/m/{i}-{ARCHIVOS['MP3']}" for i in range(n))
+    memoria = ControlMemoria(escenario["reciclar_cada"], (escenario["max_rss_mb"] or 0) << 20)
+    with tempfile.TemporaryDirectory(prefix="dwsongs-soak-") as carpeta:
+        inicio = time.perf_counter()
+        opciones = OpcionesLote(usar_historial=False, usar_cache=False, expandir_listas=False,
+                                silencioso=True, etiquetar=False, memoria=memoria)
+        resultado = descargar_lote(urls, carpeta, "MP3", escenario["workers"], opciones, total=n)
+        duracion = time.perf_counter() - inicio
+    serie = memoria.serie()
+    referencia, final = memoria_referencia_y_final(serie, n, escenario["workers"], escenario["reciclar_cada"])
+    crecimiento = (final - referencia) / (1 << 20)
+    plana = crecimiento <= escenario["tolerancia_mb"]
+    abiertos = resultado["memoria"]["elementos_abiertos"]
+    return {
+        **{k: escenario[k] for k in ("items", "workers", "reciclar_cada", "max_rss_mb", "tolerancia_mb")},
+        "ok": resultado["ok"],
+        "error": resultado["error"],
+        "segundos": round(duracion, 3),
+        "items_s": round(n / duracion, 3),
+        "memoria": resultado["memoria"],
+        "muestras": len(serie),
+        "rss_referencia_mb": round(referencia / (1 << 20), 1),
+        "rss_final_mb": round(final / (1 << 20), 1),
+        "crecimiento_mb": round(crecimiento, 1),
+        "plana": plana,
+        "correcto": plana and abiertos == 0 and resultado["ok"] == n,
+    }
+
+
+def fallos_soak(soak):
+    """Motivos por los que un soak no es correcto (lista vacía si lo es)."""
+    fallos = []
+    if soak["ok"] != soak["items"]:
+        fallos.append(f"solo {soak['ok']} de {soak['items']} elementos acabaron bien")
+    if not soak["plana"]:
+        fallos.append(f"la memoria creció {soak['crecimiento_mb']} MB "
+                      f"(tolerancia {soak['tolerancia_mb']} MB)")
+    if soak["memoria"]["elementos_abiertos"]:
+        fallos.append(f"{soak['memoria']['elementos_abiertos']} elementos siguen abiertos al acabar")
+    return fallos
+
+
+def medir_latencia_trabajo(url_base, repeticiones=5):
+    """Mediana (ms) de un trabajo de un elemento, desde que se pide hasta que termina.
+
+    "cli_ms" lanza cada vez un proceso nuevo de dwsongs (arranque, importar yt-dlp, primer
+    YoutubeDL...); "servidor_ms" envía el trabajo por HTTP a un ServidorTrabajos ya caliente
+    y espera su evento "summary". Cada repetición descarga una URL distinta.
+    """
+    from servidor_trabajos import ServidorTrabajos, ClienteTrabajos
+
+    directorio = os.path.dirname(os.path.abspath(__file__))
+    resultados = {"repeticiones": repeticiones}
+    with tempfile.TemporaryDirectory(prefix="dwsongs-latencia-") as carpeta:
+        tiempos = []
+        for i in range(repeticiones):
+            salida = os.path.join(carpeta, f"cli-{i}")
+            os.mkdir(salida)
+            inicio = time.perf_counter()
+            proceso = subprocess.run(
+                [sys.executable, "dwsongs.py", "--urls", f"{url_base}/m/cli{i}-{ARCHIVOS['MP3']}", "--out", salida,
+                 "--no-preflight", "--no-archive", "--no-tags"], cwd=directorio, capture_output=True)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            if proceso.returncode != 0:
+                raise RuntimeError(f"Falló dwsongs:\n{proceso.stderr.decode(errors='replace')}")
+        resultados["cli_ms"] = round(statistics.median(tiempos), 1)
+        with ServidorTrabajos(anunciar=False) as servidor:
+            cliente = ClienteTrabajos(servidor.url_base, servidor.token)
+            resultados["precalentado_ms"] = servidor.precalentado_ms
+            tiempos = []
+            for i in range(repeticiones):
+                salida = os.path.join(carpeta, f"servidor-{i}")
+                os.mkdir(salida)
+                inicio = time.perf_counter()
+                id = cliente.enviar(salida, "mp3", urls=[f"{url_base}/m/srv{i}-{ARCHIVOS['MP3']}"],
+                                    archive=False, tags=False)
+                resumen = [e for e in cliente.eventos(id) if e["event"] == "summary"][-1]
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                if resumen.get("ok") != 1:
+                    raise RuntimeError(f"Falló el trabajo enviado al servidor: {resumen}")
+            resultados["servidor_ms"] = round(statistics.median(tiempos), 1)
+    return resultados
+
+
+def lanzar_escenario(escenario):
+    proceso = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--escenario", json.dumps(escenario)],
+        capture_output=True, text=True,
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f"Falló el escenario {escenario}:\n{proceso.stderr}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def clave_escenario(e):
+    return (e["formato"], e["items"], e["workers"], e["pipeline"], e.get("segmentos", 1))
+
+
+def comparar(actual, ruta_anterior):
+    with open(ruta_anterior, "r", encoding="utf-8") as f:
+        anterior = {clave_escenario(e): e for e in json.load(f)["escenarios"]}
+    for e in actual["escenarios"]:
+        previo = anterior.get(clave_escenario(e))
+        if previo and previo["items_s"]:
+            cambio = (e["items_s"] / previo["items_s"] - 1) * 100
+            print(f"{clave_escenario(e)}: {previo['items_s']} -> {e['items_s']} items/s ({cambio:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de dwSongs contra un servidor local.")
+    parser.add_argument("--formatos", nargs="+", default=["MP3", "MP4"], type=str.upper)
+    parser.add_argument("--tamanos", nargs="+", type=int, default=[4, 16], help="elementos por lote")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--pipeline", action="store_true", help="medir también el modo pipeline")
+    parser.add_argument("--duracion", type=int, default=30, help="segundos de cada medio sintético")
+    parser.add_argument("--fallos", type=float, default=0.0,
+                        help="fracción de peticiones a las que el servidor responde 503")
+    parser.add_argument("--max-rps", type=float, help="peticiones/s por encima de las cuales responde 429")
+    parser.add_argument("--segmentos", nargs="+", type=int, default=[1],
+                        help="conexiones por archivo a probar (más de 1 implica pipeline)")
+    parser.add_argument("--kbps-conexion", type=int, help="velocidad máxima de cada conexión del servidor")
+    parser.add_argument("--ejecutable", help="build de PyInstaller cuyo arranque medir (en vez de main.py)")
+    parser.add_argument("--postproceso", type=int, default=8, metavar="N",
+                        help="pistas con las que comparar el postproceso en una pasada con el de "
+                             "yt-dlp encadenado (0 para no medirlo)")
+    parser.add_argument("--prevalidacion", type=int, default=200000, metavar="N",
+                        help="enlaces sintéticos con los que medir la pasada previa (0 para no medirla)")
+    parser.add_argument("--soak", type=int, default=0, metavar="N",
+                        help="lote largo de N elementos distintos que falla si la memoria crece")
+    parser.add_argument("--reciclar-cada", type=int, default=200, metavar="N",
+                        help="elementos tras los que cada hilo recrea su YoutubeDL en --soak")
+    parser.add_argument("--max-rss", type=int, metavar="MB", help="límite de memoria residente en --soak")
+    parser.add_argument("--tolerancia-mb", type=float, default=32.0,
+                        help="crecimiento de memoria admitido en --soak")
+    parser.add_argument("--latencia", type=int, default=0, metavar="N",
+                        help="repeticiones con las que medir la latencia de un trabajo de un elemento "
+                             "en un proceso nuevo y en el servidor de trabajos (0 para no medirla)")
+    parser.add_argument("--salida", default="bench.json")
+    parser.add_argument("--comparar", metavar="JSON", help="resultados anteriores con los que comparar")
+    parser.add_argument("--escenario", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.escenario:
+        escenario = json.loads(args.escenario)
+        print(json.dumps(ejecutar_soak(escenario) if escenario.get("soak") else ejecutar_escenario(escenario)))
+        return 0
+
+    from servidor_medios import ServidorMedios
+
+    resultados = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "arranque_cli_ms": medir_arranque("dwsongs"),
+        "importar_gui_ms": medir_arranque("main"),
+        "arranque_gui_ms": medir_arranque_gui(ejecutable=args.ejecutable),
+        "prevalidacion": medir_prevalidacion(args.prevalidacion) if args.prevalidacion else None,
+        "escenarios": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="dwsongs-medios-") as medios:
+        generar_medios(medios, args.duracion)
+        if args.postproceso:
+            resultados["postproceso"] = medir_postproceso(medios, args.postproceso)
+            print(json.dumps(resultados["postproceso"]), flush=True)
+        with ServidorMedios(medios, tasa_fallos=args.fallos, max_rps=args.max_rps,
+                            kbps_conexion=args.kbps_conexion) as servidor:
+            for formato, pipeline, segmentos, items, workers in itertools.product(
+                    args.formatos, [False, True] if args.pipeline else [False], args.segmentos,
+                    args.tamanos, args.workers):
+                # La descarga por segmentos solo existe en modo pipeline
+                if segmentos > 1:
+                    if not pipeline and args.pipeline:
+                        continue
+                    pipeline = True
+                escenario = {"formato": formato, "items": items, "workers": workers,
+                             "pipeline": pipeline, "segmentos": segmentos, "url_base": servidor.url_base}
+                antes = servidor.inyectados
+                medida = lanzar_escenario(escenario)
+                medida["inyectados"] = {str(c): n - antes[c] for c, n in servidor.inyectados.items()}
+                print(json.dumps(medida), flush=True)
+                resultados["escenarios"].append(medida)
+            if args.latencia:
+                resultados["latencia_trabajo"] = medir_latencia_trabajo(servidor.url_base, args.latencia)
+                print(json.dumps(resultados["latencia_trabajo"]), flush=True)
+            if args.soak:
+                resultados["soak"] = lanzar_escenario({
+                    "soak": True, "items": args.soak, "workers": max(args.workers),
+                    "reciclar_cada": args.reciclar_cada, "max_rss_mb": args.max_rss,
+                    "tolerancia_mb": args.tolerancia_mb, "url_base": servidor.url_base,
+                })
+                print(json.dumps(resultados["soak"]), flush=True)
+
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, indent=2)
+    if args.comparar:
+        comparar(resultados, args.comparar)
+    if args.soak and not resultados["soak"]["correcto"]:
+        for fallo in fallos_soak(resultados["soak"]):
+            print(f"Soak: {fallo}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
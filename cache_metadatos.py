@@ -0,0 +1,97 @@
+# Caché de metadatos (info-dicts de yt-dlp) por ID de vídeo
+
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from rutas import ruta_datos
+
+
+# Caducidad cuando las URLs de los formatos no llevan firma con fecha de expiración
+TTL_SIN_FIRMA = 3600
+# Margen antes de que caduquen las URLs firmadas, para que no expiren a mitad de descarga
+MARGEN_CADUCIDAD = 300
+MAX_EN_MEMORIA = 256
+
+_PATRON_EXPIRA = re.compile(r"[?&/]expire[=/](\d+)")
+
+
+def caducidad_info(info, ahora=None):
+    """Momento (epoch) en que dejan de valer las URLs firmadas de los formatos de info."""
+    ahora = ahora or time.time()
+    expiraciones = []
+    for fmt in info.get("formats") or [info]:
+        m = _PATRON_EXPIRA.search(fmt.get("url") or "")
+        if m:
+            expiraciones.append(int(m.group(1)))
+    if not expiraciones:
+        return ahora + TTL_SIN_FIRMA
+    return min(expiraciones) - MARGEN_CADUCIDAD
+
+
+class CacheMetadatos:
+    """LRU en memoria respaldada por SQLite con los info-dicts ya extraídos.
+
+    Las entradas caducan cuando lo hacen las URLs firmadas de sus formatos. Cuenta aciertos y
+    fallos en los atributos hits y misses.
+    """
+
+    def __init__(self, ruta=None, max_en_memoria=MAX_EN_MEMORIA):
+        self.hits = 0
+        self.misses = 0
+        self._max = max_en_memoria
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta or ruta_datos("metadatos.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadatos ("
+            " clave TEXT PRIMARY KEY, expira REAL NOT NULL, info TEXT NOT NULL)"
+        )
+        self._conn.execute("DELETE FROM metadatos WHERE expira < ?", (time.time(),))
+        self._conn.commit()
+
+    @staticmethod
+    def _clave(clave):
+        return f"{clave[0]}:{clave[1]}"
+
+    def obtener(self, clave):
+        """Devuelve una copia del info-dict guardado para la clave (extractor, id), o None."""
+        clave = self._clave(clave)
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None:
+                self._memoria.move_to_end(clave)
+            else:
+                entrada = self._conn.execute(
+                    "SELECT expira, info FROM metadatos WHERE clave = ?", (clave,)
+                ).fetchone()
+            if entrada is None or entrada[0] < ahora:
+                self._memoria.pop(clave, None)
+                self.misses += 1
+                return None
+            self._recordar(clave, entrada)
+            self.hits += 1
+        return json.loads(entrada[1])
+
+    def guardar(self, clave, info):
+        """Guarda un info-dict ya saneado (YoutubeDL.sanitize_info)."""
+        entrada = (caducidad_info(info), json.dumps(info))
+        clave = self._clave(clave)
+        with self._lock:
+            self._recordar(clave, entrada)
+            self._conn.execute("INSERT OR REPLACE INTO metadatos VALUES (?, ?, ?)", (clave, *entrada))
+            self._conn.commit()
+
+    def _recordar(self, clave, entrada):
+        self._memoria[clave] = entrada
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self._max:
+            self._memoria.popitem(last=False)
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,373 @@
+# Cola de trabajos compartida: varios procesos o máquinas se reparten un mismo lote
+
+import os
+import sys
+import time
+import socket
+import sqlite3
+import threading
+from itertools import islice
+from contextlib import contextmanager
+
+from enlaces import canonizar, clave_canonica, prioridad, LISTA, CANAL, INVALIDO
+
+
+# Estados de cada elemento de la cola; los finales son los de descargar_lote más "expanded"
+PENDIENTE = "pending"
+RESERVADO = "leased"
+EXPANDIDO = "expanded"
+FINALES = ("ok", "error", "invalid", "skipped", "duplicates", "cancelled", EXPANDIDO)
+
+# Segundos que dura una reserva sin latidos; cada nodo late cada DURACION_RESERVA / 3
+DURACION_RESERVA = 120.0
+# Reservas caducadas tras las que un elemento se da por fallido (el nodo que lo tenía murió)
+MAX_INTENTOS = 3
+# Espera de un nodo sin trabajo mientras otros aún tienen elementos reservados
+ESPERA_SIN_TRABAJO = 5.0
+# Filas por transacción al encolar (para no bloquear a los demás nodos)
+BLOQUE_ENCOLAR = 1000
+# Claves por sentencia (SQLite limita los parámetros)
+BLOQUE_CLAVES = 500
+
+
+class ColaTrabajos:
+    """Interfaz de una cola de trabajos compartida entre nodos.
+
+    Los elementos se identifican por su clave canónica (extractor:id), así que un vídeo entra
+    una sola vez aunque llegue con otra URL o desde otra lista. Un nodo reserva elementos con
+    reclamar() durante duracion segundos y los renueva con latido(); si deja de latir, la
+    reserva caduca y el elemento vuelve a pendiente para otro nodo (hasta MAX_INTENTOS veces).
+
+    ColaSQLite es la implementación incluida; otra (p. ej. sobre un broker de red) solo tiene
+    que implementar estos métodos y registrarse con registrar_backend().
+    """
+
+    def encolar(self, urls):
+        """Añade URLs; devuelve {"added", "duplicates", "invalid"}."""
+        raise NotImplementedError
+
+    def reclamar(self, trabajador, n=1, duracion=DURACION_RESERVA):
+        """Reserva hasta n elementos pendientes para trabajador; lista de (clave, url)."""
+        raise NotImplementedError
+
+    def latido(self, trabajador, claves, duracion=DURACION_RESERVA):
+        """Renueva las reservas de trabajador; devuelve las claves que ya no son suyas."""
+        raise NotImplementedError
+
+    def completar(self, trabajador, clave, estado):
+        """Deja un elemento reservado por trabajador en un estado final; False si ya no era suyo."""
+        raise NotImplementedError
+
+    def liberar(self, trabajador, claves):
+        """Devuelve a pendiente elementos reservados por trabajador (sin contar el intento)."""
+        raise NotImplementedError
+
+    def progreso(self):
+        """Progreso agregado del lote: elementos por estado y nodos que trabajan en él."""
+        raise NotImplementedError
+
+    def terminada(self):
+        """True si no queda ningún elemento pendiente ni reservado."""
+        progreso = self.progreso()
+        return not progreso[PENDIENTE] and not progreso[RESERVADO]
+
+    def parametros(self):
+        """Parámetros del lote (p. ej. "format") comunes a todos los nodos."""
+        raise NotImplementedError
+
+    def fijar_parametros(self, **parametros):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class ColaSQLite(ColaTrabajos):
+    """ColaTrabajos en un archivo SQLite.
+
+    Sirve para varios procesos de una máquina y para varias máquinas que abren el mismo
+    archivo en una carpeta compartida cuyo sistema de archivos respete los bloqueos (SMB;
+    NFS sin bloqueos no). Cada reserva se hace en una transacción BEGIN IMMEDIATE, así que
+    dos nodos nunca reciben el mismo elemento. Las caducidades usan la hora de cada nodo: los
+    relojes deben estar sincronizados con un margen muy inferior a la duración de la reserva.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, timeout=60, isolation_level=None, check_same_thread=False)
+        with self._transaccion() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS trabajos ("
+                " clave TEXT PRIMARY KEY, url TEXT NOT NULL, prioridad INTEGER NOT NULL,"
+                " estado TEXT NOT NULL, trabajador TEXT, expira REAL,"
+                " intentos INTEGER NOT NULL DEFAULT 0, caducadas INTEGER NOT NULL DEFAULT 0,"
+                " actualizado REAL NOT NULL)"
+            )
+            c.execute("CREATE INDEX IF NOT EXISTS trabajos_estado ON trabajos (estado, prioridad)")
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS trabajadores ("
+                " id TEXT PRIMARY KEY, host TEXT NOT NULL, latido REAL NOT NULL)"
+            )
+            c.execute("CREATE TABLE IF NOT EXISTS parametros (nombre TEXT PRIMARY KEY, valor TEXT)")
+
+    @contextmanager
+    def _transaccion(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def encolar(self, urls):
+        resumen = {"added": 0, "duplicates": 0, "invalid": 0}
+        urls = (url.strip() for url in urls if url and url.strip())
+        while True:
+            bloque = list(islice(urls, BLOQUE_ENCOLAR))
+            if not bloque:
+                return resumen
+            filas = []
+            for url in bloque:
+                enlace = canonizar(url)
+                estado = INVALIDO if enlace.tipo == INVALIDO else PENDIENTE
+                filas.append((clave_canonica(url, enlace), url, prioridad(enlace), estado))
+            ahora = time.time()
+            with self._transaccion() as c:
+                for clave, url, prioridad_url, estado in filas:
+                    cursor = c.execute(
+                        "INSERT OR IGNORE INTO trabajos (clave, url, prioridad, estado, actualizado)"
+                        " VALUES (?, ?, ?, ?, ?)", (clave, url, prioridad_url, estado, ahora))
+                    if not cursor.rowcount:
+                        resumen["duplicates"] += 1
+                    elif estado == INVALIDO:
+                        resumen["invalid"] += 1
+                    else:
+                        resumen["added"] += 1
+
+    def _caducar(self, c, ahora):
+        c.execute(
+            "UPDATE trabajos SET estado = CASE WHEN intentos >= ? THEN ? ELSE ? END,"
+            " trabajador = NULL, expira = NULL, caducadas = caducadas + 1, actualizado = ?"
+            " WHERE estado = ? AND expira < ?",
+            (MAX_INTENTOS, "error", PENDIENTE, ahora, RESERVADO, ahora))
+
+    def _latir(self, c, trabajador, ahora):
+        c.execute("INSERT OR REPLACE INTO trabajadores VALUES (?, ?, ?)",
+                  (trabajador, socket.gethostname(), ahora))
+
+    def reclamar(self, trabajador, n=1, duracion=DURACION_RESERVA):
+        ahora = time.time()
+        with self._transaccion() as c:
+            self._caducar(c, ahora)
+            filas = c.execute(
+                "SELECT clave, url FROM trabajos WHERE estado = ? ORDER BY prioridad, rowid LIMIT ?",
+                (PENDIENTE, n)).fetchall()
+            c.executemany(
+                "UPDATE trabajos SET estado = ?, trabajador = ?, expira = ?, intentos = intentos + 1,"
+                " actualizado = ? WHERE clave = ?",
+                [(RESERVADO, trabajador, ahora + duracion, ahora, clave) for clave, _ in filas])
+            self._latir(c, trabajador, ahora)
+        return filas
+
+    def latido(self, trabajador, claves, duracion=DURACION_RESERVA):
+        ahora = time.time()
+        with self._transaccion() as c:
+            c.execute("UPDATE trabajos SET expira = ? WHERE trabajador = ? AND estado = ?",
+                      (ahora + duracion, trabajador, RESERVADO))
+            suyas = {clave for clave, in c.execute(
+                "SELECT clave FROM trabajos WHERE trabajador = ? AND estado = ?", (trabajador, RESERVADO))}
+            self._latir(c, trabajador, ahora)
+        return set(claves) - suyas
+
+    def completar(self, trabajador, clave, estado):
+        # Si la reserva caducó pero nadie ha vuelto a reclamar el elemento, el trabajo hecho vale
+        with self._transaccion() as c:
+            cursor = c.execute(
+                "UPDATE trabajos SET estado = ?, trabajador = ?, expira = NULL, actualizado = ?"
+                " WHERE clave = ? AND (estado = ? OR (estado = ? AND trabajador = ?))",
+                (estado, trabajador, time.time(), clave, PENDIENTE, RESERVADO, trabajador))
+        return bool(cursor.rowcount)
+
+    def liberar(self, trabajador, claves):
+        claves = list(claves)
+        with self._transaccion() as c:
+            for i in range(0, len(claves), BLOQUE_CLAVES):
+                bloque = claves[i:i + BLOQUE_CLAVES]
+                c.execute(
+                    "UPDATE trabajos SET estado = ?, trabajador = NULL, expira = NULL,"
+                    " intentos = MAX(intentos - 1, 0), actualizado = ?"
+                    f" WHERE trabajador = ? AND estado = ? AND clave IN ({', '.join('?' * len(bloque))})",
+                    (PENDIENTE, time.time(), trabajador, RESERVADO, *bloque))
+
+    def progreso(self):
+        ahora = time.time()
+        with self._lock:
+            estados = dict(self._conn.execute("SELECT estado, COUNT(*) FROM trabajos GROUP BY estado"))
+            caducadas = self._conn.execute("SELECT COALESCE(SUM(caducadas), 0) FROM trabajos").fetchone()[0]
+            por_trabajador = self._conn.execute(
+                "SELECT trabajador, estado, COUNT(*) FROM trabajos WHERE trabajador IS NOT NULL"
+                " GROUP BY trabajador, estado").fetchall()
+            latidos = self._conn.execute("SELECT id, host, latido FROM trabajadores").fetchall()
+        progreso = {estado: estados.get(estado, 0) for estado in (PENDIENTE, RESERVADO) + FINALES}
+        # Las listas expandidas se sustituyen por sus vídeos
+        progreso["total"] = sum(estados.values()) - progreso[EXPANDIDO]
+        progreso["done"] = sum(progreso[estado] for estado in FINALES if estado != EXPANDIDO)
+        progreso["requeued"] = caducadas
+        trabajadores = {identificador: {"host": host, "last_seen_s": round(ahora - latido, 1)}
+                        for identificador, host, latido in latidos}
+        for identificador, estado, n in por_trabajador:
+            trabajadores.setdefault(identificador, {"host": None, "last_seen_s": None})[estado] = n
+        progreso["workers"] = trabajadores
+        return progreso
+
+    def terminada(self):
+        with self._lock:
+            fila = self._conn.execute("SELECT 1 FROM trabajos WHERE estado IN (?, ?) LIMIT 1",
+                                      (PENDIENTE, RESERVADO)).fetchone()
+        return fila is None
+
+    def parametros(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT nombre, valor FROM parametros"))
+
+    def fijar_parametros(self, **parametros):
+        """Guarda los parámetros que aún no tengan valor (el primero que encola decide)."""
+        with self._transaccion() as c:
+            c.executemany("INSERT OR IGNORE INTO parametros VALUES (?, ?)", parametros.items())
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+BACKENDS = {"sqlite": ColaSQLite}
+
+
+def registrar_backend(esquema, clase):
+    """Permite abrir con abrir_cola("esquema://...") otra implementación de ColaTrabajos."""
+    BACKENDS[esquema] = clase
+
+
+def abrir_cola(destino):
+    """Abre la cola de destino: una ruta (o sqlite:///ruta) o una URL de un backend registrado."""
+    esquema, separador, resto = destino.partition("://")
+    if not separador:
+        return ColaSQLite(destino)
+    if esquema == "sqlite":
+        return ColaSQLite(resto)
+    if esquema not in BACKENDS:
+        raise ValueError(f"Cola de trabajos desconocida: {destino}")
+    return BACKENDS[esquema](destino)
+
+
+def id_trabajador():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class TrabajadorCola:
+    """Un nodo que saca de una ColaTrabajos las URLs de descargar_lote.
+
+    urls() es el iterable para descargar_lote: reserva los elementos de bloque en bloque
+    (descargar_lote solo lee por adelantado dos por hilo, así que un nodo no acapara la cola)
+    y, cuando no queda nada pendiente pero otros nodos siguen trabajando, espera por si sus
+    reservas caducan o sus listas añaden vídeos. terminada() va en on_terminada de
+    descargar_lote y anota el estado final de cada URL; las canceladas vuelven a pendiente.
+
+    Las listas y canales se expanden aquí (con la caché de expansiones) y sus vídeos se
+    encolan en la cola compartida, así se reparten entre todos los nodos y un vídeo que esté
+    en dos listas se descarga una vez. Un hilo renueva las reservas cada duracion / 3 s;
+    cerrar() lo detiene y libera las que queden (p. ej. al cancelar).
+    """
+
+    def __init__(self, cola, identificador=None, bloque=4, duracion=DURACION_RESERVA, cancelado=None):
+        self.cola = cola
+        self.id = identificador or id_trabajador()
+        self.bloque = max(1, bloque)
+        self.duracion = duracion
+        self.cancelado = cancelado or threading.Event()
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._latir, name="dwsongs-latido", daemon=True)
+        self._hilo.start()
+        self._ydl_listas = None
+        self._cache_listas = None
+
+    def urls(self):
+        while not self.cancelado.is_set():
+            filas = self.cola.reclamar(self.id, self.bloque, self.duracion)
+            if not filas:
+                if self.cola.terminada():
+                    return
+                self.cancelado.wait(ESPERA_SIN_TRABAJO)
+                continue
+            videos = []
+            for clave, url in filas:
+                if canonizar(url).tipo in (LISTA, CANAL):
+                    self._expandir(clave, url)
+                else:
+                    videos.append((clave, url))
+            # Se apuntan todas antes de entregar la primera: si se cancela, cerrar() las libera
+            with self._lock:
+                self._en_curso.update((url, clave) for clave, url in videos)
+            for _, url in videos:
+                yield url
+
+    def _expandir(self, clave, url):
+        from yt_dlp import YoutubeDL
+        from expansion import expandir_lista, CacheExpansiones
+
+        if self._ydl_listas is None:
+            self._ydl_listas = YoutubeDL({"extract_flat": "in_playlist", "quiet": True, "noprogress": True})
+            self._cache_listas = CacheExpansiones()
+        try:
+            entradas = self._cache_listas.obtener(url)
+            if entradas is None:
+                entradas = expandir_lista(self._ydl_listas, url)
+                self._cache_listas.guardar(url, entradas)
+        except Exception as e:
+            print(f"Error al expandir la lista {url}: {e}", file=sys.stderr)
+            self.cola.completar(self.id, clave, "error")
+            return
+        self.cola.encolar(entradas)
+        self.cola.completar(self.id, clave, EXPANDIDO)
+
+    def terminada(self, url, resultado):
+        with self._lock:
+            clave = self._en_curso.pop(url, None)
+        if clave is None:
+            return
+        if resultado == "cancelled":
+            self.cola.liberar(self.id, [clave])
+        else:
+            self.cola.completar(self.id, clave, resultado)
+
+    def _latir(self):
+        while not self._parar.wait(self.duracion / 3):
+            with self._lock:
+                claves = set(self._en_curso.values())
+            try:
+                perdidas = self.cola.latido(self.id, claves, self.duracion)
+            except (sqlite3.Error, OSError) as e:
+                print(f"No se pudieron renovar las reservas: {e}", file=sys.stderr)
+                continue
+            if perdidas:
+                # Otro nodo las reclamó tras caducar: su resultado es el que contará
+                with self._lock:
+                    self._en_curso = {url: clave for url, clave in self._en_curso.items()
+                                      if clave not in perdidas}
+
+    def cerrar(self):
+        self._parar.set()
+        self._hilo.join()
+        with self._lock:
+            claves = list(self._en_curso.values())
+            self._en_curso.clear()
+        if claves:
+            self.cola.liberar(self.id, claves)
+        if self._ydl_listas is not None:
+            self._ydl_listas.close()
+            self._cache_listas.cerrar()
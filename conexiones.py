@@ -0,0 +1,253 @@
+# Capa de red compartida por todos los hilos: caché DNS, cookies y conexiones keep-alive
+
+import ssl
+import time
+import socket
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin
+
+
+TTL_DNS = 300
+# Conexiones ociosas que se guardan por host
+MAX_OCIOSAS_POR_HOST = 8
+TIMEOUT = 30
+MAX_REDIRECCIONES = 5
+# Credenciales del host original que no deben viajar a otro origen tras una redirección
+CABECERAS_DE_ORIGEN = ("cookie", "authorization")
+
+_getaddrinfo_original = socket.getaddrinfo
+_dns = {}
+_lock_dns = threading.Lock()
+_estadisticas = {"dns_consultas": 0, "dns_aciertos": 0, "conexiones_ytdlp": 0}
+
+
+def _getaddrinfo_con_cache(host, port, family=0, type=0, proto=0, flags=0):
+    clave = (host, port, family, type, proto, flags)
+    ahora = time.monotonic()
+    with _lock_dns:
+        entrada = _dns.get(clave)
+        if entrada is not None and entrada[0] > ahora:
+            _estadisticas["dns_aciertos"] += 1
+            return list(entrada[1])
+        _estadisticas["dns_consultas"] += 1
+    resultado = _getaddrinfo_original(host, port, family, type, proto, flags)
+    with _lock_dns:
+        _dns[clave] = (ahora + TTL_DNS, tuple(resultado))
+    return resultado
+
+
+def instalar_cache_dns():
+    """Sustituye socket.getaddrinfo por una versión con caché (TTL_DNS segundos) para todo el
+    proceso, de modo que yt-dlp y nuestras propias conexiones resuelven cada host una vez."""
+    socket.getaddrinfo = _getaddrinfo_con_cache
+    _contar_conexiones_ytdlp()
+
+
+def _contar_conexiones_ytdlp():
+    # El handler urllib de yt-dlp no mantiene conexiones abiertas entre peticiones: cada una
+    # pasa por _urllib.create_connection, así que contarlas ahí da sus handshakes por lote
+    from yt_dlp.networking import _urllib
+
+    original = _urllib.create_connection
+    if getattr(original, "_contada", False):
+        return
+
+    def create_connection(*args, **kwargs):
+        with _lock_dns:
+            _estadisticas["conexiones_ytdlp"] += 1
+        return original(*args, **kwargs)
+
+    create_connection._contada = True
+    _urllib.create_connection = create_connection
+
+
+def cargar_cookies(ruta):
+    """Carga una vez un cookies.txt (formato Netscape) en un cookie jar que pueden compartir
+    todas las instancias de YoutubeDL (CookieJar ya protege su estado con un lock)."""
+    from yt_dlp.cookies import YoutubeDLCookieJar
+
+    jar = YoutubeDLCookieJar(ruta)
+    jar.load()
+    return jar
+
+
+class ErrorHTTP(OSError):
+    """Respuesta de error de un servidor (status y headers como en los HTTPError de yt-dlp)."""
+
+    def __init__(self, status, reason, headers):
+        super().__init__(f"HTTP Error {status}: {reason}")
+        self.status = status
+        self.headers = headers
+
+
+class ErrorRedireccion(OSError):
+    """Redirección que no se sigue: demasiadas seguidas o a un esquema menos seguro."""
+
+
+def _clave(partes):
+    esquema = partes.scheme.lower()
+    return esquema, partes.hostname, partes.port or (443 if esquema == "https" else 80)
+
+
+class _Respuesta:
+    """Envuelve una HTTPResponse y devuelve su conexión al pool al cerrarla si se leyó entera.
+
+    url y cabeceras son las de la última petición, tras seguir las redirecciones.
+    """
+
+    def __init__(self, pool, clave, conexion, respuesta, url, cabeceras):
+        self._pool = pool
+        self._clave = clave
+        self._conexion = conexion
+        self._respuesta = respuesta
+        self.url = url
+        self.cabeceras = cabeceras
+        self.status = respuesta.status
+        self.reason = respuesta.reason
+        self.headers = respuesta.headers
+
+    def read(self, n=None):
+        return self._respuesta.read(n)
+
+    def read1(self, n=-1):
+        return self._respuesta.read1(n)
+
+    def close(self):
+        if self._conexion is None:
+            return
+        # read1 no marca la respuesta como cerrada al llegar justo al final: basta con length 0
+        leida = self._respuesta.isclosed() or self._respuesta.length == 0
+        reutilizable = leida and not self._respuesta.will_close
+        self._respuesta.close()
+        if reutilizable:
+            self._pool._devolver(self._clave, self._conexion)
+        else:
+            self._conexion.close()
+        self._conexion = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PoolConexiones:
+    """Conexiones HTTP(S) keep-alive por host, compartidas entre hilos.
+
+    abrir() toma una conexión ociosa del host (o abre una nueva, lo que cuenta como
+    handshake) y, cuando se cierra la respuesta tras leerla entera, la deja lista para la
+    siguiente petición. estadisticas() da las conexiones nuevas, las reutilizadas y la tasa de
+    reutilización.
+    """
+
+    def __init__(self, max_ociosas=MAX_OCIOSAS_POR_HOST, timeout=TIMEOUT):
+        self._max_ociosas = max_ociosas
+        self._timeout = timeout
+        self._ociosas = {}
+        self._lock = threading.Lock()
+        self._contexto_ssl = None
+        self.nuevas = 0
+        self.reutilizadas = 0
+
+    def _conectar(self, clave):
+        esquema, host, puerto = clave
+        if esquema == "https":
+            if self._contexto_ssl is None:
+                self._contexto_ssl = ssl.create_default_context()
+            return http.client.HTTPSConnection(host, puerto, timeout=self._timeout,
+                                               context=self._contexto_ssl)
+        return http.client.HTTPConnection(host, puerto, timeout=self._timeout)
+
+    def _tomar(self, clave):
+        with self._lock:
+            ociosas = self._ociosas.get(clave)
+            if ociosas:
+                self.reutilizadas += 1
+                return ociosas.pop(), True
+            self.nuevas += 1
+        return self._conectar(clave), False
+
+    def _devolver(self, clave, conexion):
+        with self._lock:
+            ociosas = self._ociosas.setdefault(clave, [])
+            if len(ociosas) < self._max_ociosas:
+                ociosas.append(conexion)
+                return
+        conexion.close()
+
+    def abrir(self, url, cabeceras=None):
+        """GET de url siguiendo redirecciones; la respuesta se usa como context manager.
+
+        Lanza ErrorHTTP si el servidor responde 4xx/5xx (salvo 416, que se devuelve tal cual) y
+        ErrorRedireccion si hay más de MAX_REDIRECCIONES o una pasa de https a otro esquema. Si
+        una redirección cambia de origen, Cookie y Authorization no se envían al nuevo.
+        """
+        cabeceras = dict(cabeceras or {})
+        for _ in range(MAX_REDIRECCIONES + 1):
+            partes = urlsplit(url)
+            clave = _clave(partes)
+            ruta = partes.path or "/"
+            if partes.query:
+                ruta += "?" + partes.query
+            respuesta = self._enviar(clave, ruta, cabeceras, url)
+            if respuesta.status in (301, 302, 303, 307, 308) and respuesta.headers.get("Location"):
+                respuesta.read()
+                respuesta.close()
+                url = urljoin(url, respuesta.headers["Location"])
+                destino = _clave(urlsplit(url))
+                if destino[0] not in ("http", "https") or (clave[0] == "https" and destino[0] != "https"):
+                    raise ErrorRedireccion(f"redirección de {clave[0]} a {destino[0]} rechazada: {url}")
+                if destino != clave:
+                    cabeceras = {k: v for k, v in cabeceras.items()
+                                 if k.lower() not in CABECERAS_DE_ORIGEN}
+                continue
+            if respuesta.status >= 400 and respuesta.status != 416:
+                respuesta.read()
+                respuesta.close()
+                raise ErrorHTTP(respuesta.status, respuesta.reason, respuesta.headers)
+            return respuesta
+        raise ErrorRedireccion(f"más de {MAX_REDIRECCIONES} redirecciones: {url}")
+
+    def _enviar(self, clave, ruta, cabeceras, url):
+        conexion, reutilizada = self._tomar(clave)
+        try:
+            conexion.request("GET", ruta, headers=cabeceras)
+            respuesta = conexion.getresponse()
+        except (http.client.HTTPException, OSError):
+            conexion.close()
+            if not reutilizada:
+                raise
+            # El servidor pudo cerrar la conexión ociosa: se repite una vez con una nueva
+            with self._lock:
+                self.nuevas += 1
+            conexion = self._conectar(clave)
+            try:
+                conexion.request("GET", ruta, headers=cabeceras)
+                respuesta = conexion.getresponse()
+            except (http.client.HTTPException, OSError):
+                conexion.close()
+                raise
+        return _Respuesta(self, clave, conexion, respuesta, url, cabeceras)
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.nuevas + self.reutilizadas
+            return {
+                "conexiones_nuevas": self.nuevas,
+                "conexiones_reutilizadas": self.reutilizadas,
+                "tasa_reutilizacion": round(self.reutilizadas / total, 3) if total else None,
+            }
+
+    def cerrar(self):
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, {}
+        for conexiones in ociosas.values():
+            for conexion in conexiones:
+                conexion.close()
+
+
+def estadisticas_dns():
+    with _lock_dns:
+        return dict(_estadisticas)
@@ -0,0 +1,192 @@
+# Plan de conversión con ffmpeg: el camino más barato que deja el archivo en el formato pedido
+
+import os
+
+
+# Códecs que el contenedor MP4 admite tal cual (prefijos de los nombres que da yt-dlp)
+VIDEO_MP4 = ("avc1", "avc3", "h264", "hev1", "hvc1", "hevc", "h265", "av01", "av1", "vp09", "vp9", "mp4v")
+AUDIO_MP4 = ("mp4a", "aac", "mp3", "opus", "ac-3", "ac3", "ec-3", "eac3", "flac", "alac")
+# Extensiones que, sin conocer el códec, se suponen ya compatibles con MP4
+EXT_MP4 = ("mp4", "m4a", "m4v", "mov")
+# Extensiones que, sin conocer el códec, se suponen solo de audio
+EXT_AUDIO = ("m4a", "mp3", "aac", "opus", "ogg", "oga", "flac", "wav", "weba")
+
+BITRATE_MP3 = "192k"
+
+# Normalización de sonoridad (EBU R128 en una pasada) y frecuencia a la que se vuelve, porque
+# loudnorm entrega 192 kHz
+NORMALIZACION = "loudnorm=I=-14:TP=-1.5:LRA=11"
+FRECUENCIA = {"MP3": 44100, "MP4": 48000}
+# La portada se reduce a este lado como máximo (las de YouTube llegan a 1280x720)
+LADO_PORTADA = 600
+
+# Etiquetas de ffmpeg y campos del info-dict de yt-dlp de los que salen, por preferencia
+CAMPOS_ETIQUETAS = {
+    "title": ("track", "title"),
+    "artist": ("artist", "creator", "uploader", "channel"),
+    "album": ("album",),
+    "album_artist": ("album_artist",),
+    "genre": ("genre",),
+    "track": ("track_number",),
+    "date": ("release_year", "release_date", "upload_date"),
+    "comment": ("webpage_url",),
+}
+
+# Acciones, de más barata a más cara
+MOVER = "move"
+REMUX = "remux"
+RECODIFICAR_AUDIO = "encode_audio"
+RECODIFICAR_VIDEO = "encode_video"
+RECODIFICAR = "encode"
+
+
+def _codec(stream, clave):
+    codec = (stream.get(clave) or "").lower()
+    return None if codec in ("", "none", "unknown") else codec
+
+
+def _tiene(stream, clave):
+    return (stream.get(clave) or "").lower() != "none"
+
+
+def _tiene_video(stream):
+    """Si la entrada lleva vídeo: yt-dlp marca "none" los formatos sin él y, si no dice el
+    códec (p. ej. un enlace directo), se mira la extensión."""
+    codec = (stream.get("vcodec") or "").lower()
+    if codec == "none":
+        return False
+    if codec in ("", "unknown"):
+        return (stream.get("ext") or "").lower() not in EXT_AUDIO
+    return True
+
+
+def _compatible(codec, ext, codecs):
+    if codec is None:
+        return ext in EXT_MP4
+    return codec.startswith(codecs)
+
+
+def etiquetas_de(info):
+    """Etiquetas (título, artista, álbum...) para ffmpeg a partir de un info-dict de yt-dlp."""
+    etiquetas = {}
+    for etiqueta, campos in CAMPOS_ETIQUETAS.items():
+        for campo in campos:
+            valor = info.get(campo)
+            if valor in (None, ""):
+                continue
+            if campo.endswith("_date"):
+                valor = str(valor)[:4]
+            etiquetas[etiqueta] = str(valor).replace("\n", " ").strip()
+            break
+    if "artist" not in etiquetas and info.get("artists"):
+        etiquetas["artist"] = ", ".join(info["artists"])
+    return etiquetas
+
+
+def _argumentos_etiquetas(formato, etiquetas, portada, con_video=False):
+    """Argumentos de salida que escriben las etiquetas y la portada (la última entrada).
+
+    con_video indica si la salida lleva además el vídeo de la fuente, que va antes que la portada.
+    """
+    argumentos = []
+    for etiqueta, valor in etiquetas.items():
+        argumentos += ["-metadata", f"{etiqueta}={valor}"]
+    if portada:
+        indice = "v:1" if con_video else "v:0"
+        argumentos += [f"-c:{indice}", "mjpeg", f"-filter:{indice}",
+                       f"scale=w='min(iw,{LADO_PORTADA})':h='min(ih,{LADO_PORTADA})'"
+                       ":force_original_aspect_ratio=decrease",
+                       f"-disposition:{indice}", "attached_pic"]
+    if formato == "MP3" and (etiquetas or portada):
+        # ID3v2.3: la versión que leen el Explorador de Windows y la mayoría de reproductores
+        argumentos += ["-id3v2_version", "3"]
+        if portada:
+            argumentos += ["-metadata:s:v", "title=Album cover", "-metadata:s:v", "comment=Cover (front)"]
+    return argumentos
+
+
+def planificar(trabajo, hilos=1):
+    """Decide cómo convertir un trabajo según los streams descargados.
+
+    trabajo["streams"] describe cada entrada (ext, vcodec, acodec). Devuelve un dict con la
+    acción (MOVER, REMUX o alguna de las RECODIFICAR*), los argumentos de salida de ffmpeg y
+    el motivo de la decisión. Solo se recodifica lo que el contenedor de destino no admite, y
+    los codificadores multihilo reciben hilos hilos.
+
+    En la misma ejecución de ffmpeg se escriben trabajo["etiquetas"] (de etiquetas_de), la
+    portada de trabajo["portada"] (una imagen que ffmpeg recibe como última entrada, reducida
+    a LADO_PORTADA) y, con trabajo["normalizar"], se normaliza la sonoridad del audio (lo que
+    obliga a recodificarlo). Un archivo que ya está en el formato pedido (MP3, o un solo MP4
+    con códecs que el contenedor admite) se mueve sin reescribirlo; con etiquetas o portada se
+    copian sus streams.
+    """
+    streams = trabajo.get("streams") or [{} for _ in trabajo["entradas"]]
+    etiquetas = trabajo.get("etiquetas") or {}
+    portada = trabajo.get("portada")
+    normalizar = trabajo.get("normalizar")
+    filtro_audio = ["-af", f"{NORMALIZACION},aresample={FRECUENCIA[trabajo['formato']]}"] if normalizar else []
+
+    if trabajo["formato"] == "MP3":
+        stream = streams[0]
+        codec = _codec(stream, "acodec")
+        ext = (stream.get("ext") or os.path.splitext(trabajo["entradas"][0])[1][1:]).lower()
+        # Con portada el vídeo de la entrada se descarta con -map en lugar de -vn
+        seleccion = ["-map", "0:a:0", "-map", f"{len(trabajo['entradas'])}:v:0"] if portada else ["-vn"]
+        extra = _argumentos_etiquetas("MP3", etiquetas, portada)
+        if (codec == "mp3" or codec is None) and ext == "mp3" and not normalizar:
+            if not extra:
+                return {"accion": MOVER, "argumentos": [], "motivo": "la fuente ya es MP3"}
+            return {"accion": REMUX, "argumentos": seleccion + ["-c:a", "copy"] + extra,
+                    "motivo": "la fuente ya es MP3: solo etiquetas"}
+        if codec == "mp3" and not normalizar:
+            return {"accion": REMUX, "argumentos": seleccion + ["-c:a", "copy"] + extra,
+                    "motivo": f"audio MP3 en contenedor {ext}"}
+        # libmp3lame es de un solo hilo: más hilos solo compiten con los otros trabajos del pool
+        return {"accion": RECODIFICAR_AUDIO,
+                "argumentos": seleccion + filtro_audio + ["-c:a", "libmp3lame", "-b:a", BITRATE_MP3,
+                                                          "-threads", "1"] + extra,
+                "motivo": f"audio {codec or ext} a MP3" + (" normalizado" if normalizar else "")}
+
+    # MP4: una entrada con vídeo y audio, vídeo y audio por separado o solo audio
+    argumentos = []
+    con_video = len(streams) > 1 or _tiene_video(streams[0])
+    if len(streams) > 1:
+        argumentos += ["-map", "0:v:0", "-map", "1:a:0"]
+    elif portada and con_video:
+        argumentos += ["-map", "0:v:0", "-map", "0:a:0?"]
+    elif portada:
+        argumentos += ["-map", "0:a:0"]
+    if portada:
+        argumentos += ["-map", f"{len(trabajo['entradas'])}:v:0"]
+    extra = _argumentos_etiquetas("MP4", etiquetas, portada, con_video)
+    video = next((s for s in streams if _tiene(s, "vcodec")), streams[0])
+    audio = next((s for s in reversed(streams) if _tiene(s, "acodec")), streams[-1])
+    vcodec, acodec = _codec(video, "vcodec"), _codec(audio, "acodec")
+    # Sin vídeo no hay nada que recodificar más que el audio
+    copia_video = not con_video or _compatible(vcodec, (video.get("ext") or "").lower(), VIDEO_MP4)
+    copia_audio = _compatible(acodec, (audio.get("ext") or "").lower(), AUDIO_MP4) and not normalizar
+    ext = (video.get("ext") or os.path.splitext(trabajo["entradas"][0])[1][1:]).lower()
+    if len(streams) == 1 and ext == "mp4" and copia_video and copia_audio and not extra:
+        return {"accion": MOVER, "argumentos": [], "motivo": "la fuente ya es MP4 con códecs compatibles"}
+    if con_video and copia_video:
+        argumentos += ["-c:v", "copy"]
+    elif con_video:
+        argumentos += ["-c:v", "libx264", "-preset", "veryfast", "-crf", "20", "-threads", str(hilos)]
+    if copia_audio:
+        argumentos += ["-c:a", "copy"]
+    else:
+        argumentos += filtro_audio + ["-c:a", "aac", "-b:a", "192k"]
+    argumentos += extra + ["-movflags", "+faststart"]
+    if copia_video and copia_audio:
+        accion = REMUX
+    elif copia_video:
+        accion = RECODIFICAR_AUDIO
+    elif copia_audio:
+        accion = RECODIFICAR_VIDEO
+    else:
+        accion = RECODIFICAR
+    motivo = f"vídeo {vcodec or video.get('ext')}" if con_video else "sin vídeo"
+    motivo += f", audio {acodec or audio.get('ext')}"
+    if normalizar:
+        motivo += ", audio normalizado"
+    return {"accion": accion, "argumentos": argumentos, "motivo": motivo}
@@ -0,0 +1,1088 @@
+# Lógica de descarga sin dependencias de la interfaz gráfica
+# (yt_dlp se importa al empezar la primera descarga para que arrancar sea rápido)
+
+import os
+import sys
+import gc
+import copy
+import shutil
+import time
+import tempfile
+import sqlite3
+import subprocess
+import queue
+import threading
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from rutas import FFMPEG_PATH
+from historial import HistorialDescargas
+from enlaces import canonizar, clave_de, UNICO, INVALIDO
+from ingesta import sin_duplicados, clave_canonica, ConjuntoHashes
+from expansion import expandir_lista, CacheExpansiones
+from cache_metadatos import CacheMetadatos
+from escritor import estimar_bytes
+from conversion import planificar, etiquetas_de, MOVER
+from memoria import ControlMemoria
+from segmentado import DescargaSegmentada
+from conexiones import PoolConexiones, instalar_cache_dns, cargar_cookies, estadisticas_dns
+from metricas import MetricasLote, EXTRACCION, DESCARGA, COLA_FFMPEG, POSTPROCESO, ESCRITURA
+from planificador import (
+    LimitadorHosts, ColaReintentos, clasificar_error, calcular_espera, host_de,
+    LIMITADO, REINTENTABLES, MAX_REINTENTOS,
+)
+
+# Número de descargas simultáneas
+DESCARGAS_PARALELAS_POR_DEFECTO = 3
+MAX_DESCARGAS_PARALELAS = 8
+
+# Trabajos de ffmpeg en cola por cada núcleo en modo pipeline
+TRABAJOS_EN_COLA_POR_NUCLEO = 2
+
+# Evento del diario de trabajos para cada resultado
+EVENTOS_DIARIO = {"ok": "done", "error": "failed", "invalid": "invalid", "skipped": "skipped"}
+
+# Extractores que carga YoutubeDL, por valor de allowed_extractors: (clase, va instanciado).
+# Calcular la lista cuesta unos 90 ms en cada instancia y no cambia en todo el proceso
+_extractores = {}
+_lock_extractores = threading.Lock()
+
+
+def construir_opciones_ydl(formato: str, carpeta_salida: str, postprocesar: bool = True,
+                           por_video: bool = False):
+    """Opciones de YoutubeDL para el formato pedido.
+
+    Con postprocesar=False no se añade ningún postprocesador: el modo pipeline descarga los
+    streams en bruto y hace la extracción/unión con ffmpeg en un pool de procesos aparte.
+    Con por_video=True cada vídeo va a su propia subcarpeta (extractor-id), de modo que dos
+    títulos iguales no se pisan (la carpeta de entrada del almacén de almacen.py).
+    """
+    outtmpl = os.path.join(carpeta_salida, "%(title)s")
+    if por_video:
+        outtmpl = os.path.join(carpeta_salida, "%(extractor_key)s-%(id)s", "%(title)s")
+    if formato == "MP3":
+        opciones = {
+            "format": "bestaudio/best",
+            "ffmpeg_location": FFMPEG_PATH,
+            "outtmpl": outtmpl,
+            "windowsfilenames": True,
+            "restrictfilenames": True,
+            # watch?v=X&list=Y es el vídeo X, como lo cuenta enlaces.canonizar
+            "noplaylist": True,
+        }
+        if postprocesar:
+            opciones["postprocessors"] = [
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                    "preferredquality": "192",
+                }
+            ]
+        return opciones
+    else:  # MP4
+        return {
+            "format": "bestvideo*+bestaudio/best",
+            "ffmpeg_location": FFMPEG_PATH,
+            "merge_output_format": "mp4",
+            "outtmpl": outtmpl,
+            "windowsfilenames": True,
+            "restrictfilenames": True,
+            # watch?v=X&list=Y es el vídeo X, como lo cuenta enlaces.canonizar
+            "noplaylist": True,
+        }
+
+
+def crear_ydl(opciones):
+    """YoutubeDL(opciones) sin recalcular en cada instancia la lista de extractores.
+
+    La primera instancia del proceso (para cada allowed_extractors) se crea normalmente y se
+    guarda su lista; las siguientes se crean con auto_init=False y reciben esa lista en el
+    mismo orden. Con verbose se crean siempre normalmente (escriben la cabecera de depuración).
+    """
+    from yt_dlp import YoutubeDL
+
+    clave = repr(opciones.get("allowed_extractors"))
+    extractores = _extractores.get(clave)
+    if extractores is None or opciones.get("verbose"):
+        ydl = YoutubeDL(opciones)
+        with _lock_extractores:
+            _extractores.setdefault(clave, [(ie, False) if isinstance(ie, type) else (type(ie), True)
+                                            for ie in ydl._ies.values()])
+        return ydl
+    ydl = YoutubeDL(opciones, auto_init=False)
+    for ie, instanciado in extractores:
+        ydl.add_info_extractor(ie() if instanciado else ie)
+    return ydl
+
+
+def precalentar():
+    """Deja cargado lo que la primera descarga del proceso tendría que cargar: yt-dlp, su lista
+    de extractores con sus expresiones ya compiladas, el índice de enlaces.py y la caché DNS.
+    Devuelve los ms que tarda."""
+    inicio = time.perf_counter()
+    canonizar("https://example.com/audio.mp3")
+    opciones = construir_opciones_ydl("MP3", tempfile.gettempdir())
+    opciones.update({"quiet": True, "noprogress": True})
+    ydl = crear_ydl(opciones)
+    try:
+        ydl.get_info_extractor("Generic")
+    finally:
+        ydl.close()
+    from yt_dlp.extractor import gen_extractor_classes
+
+    # Cada extractor compila su _VALID_URL la primera vez que se le pregunta: una URL que no
+    # reconoce ninguno los recorre todos, como hará la primera extract_info con un enlace directo
+    for ie in gen_extractor_classes():
+        ie.suitable("https://example.com/audio.mp3")
+    instalar_cache_dns()
+    return round((time.perf_counter() - inicio) * 1000, 1)
+
+
+def ruta_ffmpeg():
+    ejecutable = "ffmpeg.exe" if sys.platform.startswith("win") else "ffmpeg"
+    ruta = os.path.join(FFMPEG_PATH, ejecutable)
+    return ruta if os.path.isfile(ruta) else "ffmpeg"
+
+
+def clave_entrada(info, entrada, clave_url):
+    """Clave de historial de un vídeo: la de la URL salvo que venga de una lista."""
+    if "entries" in info:
+        return (entrada.get("extractor_key"), entrada.get("id"))
+    return clave_url
+
+
+def salidas_descargadas(info):
+    """Recorre (entrada, ruta final) de cada vídeo descargado por extract_info(download=True)."""
+    for entrada in info.get("entries") or [info]:
+        descargas = (entrada or {}).get("requested_downloads")
+        if descargas:
+            yield entrada, descargas[-1]["filepath"]
+
+
+def descargar_portada(ydl, info, base):
+    """Descarga la miniatura de info junto a base para incrustarla; None si no hay o falla."""
+    miniaturas = [t for t in info.get("thumbnails") or [] if t.get("url")]
+    url = miniaturas[-1]["url"] if miniaturas else info.get("thumbnail")
+    if not url:
+        return None
+    ext = os.path.splitext(urlsplit(url).path)[1].lower()
+    if ext not in (".jpg", ".jpeg", ".png", ".webp"):
+        ext = ".jpg"
+    ruta = f"{base}.portada{ext}"
+    try:
+        with ydl.urlopen(url) as respuesta, open(ruta, "wb") as f:
+            shutil.copyfileobj(respuesta, f)
+    except Exception as e:
+        print(f"No se pudo descargar la portada de {info.get('webpage_url') or url}: {e}", file=sys.stderr)
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+        return None
+    return ruta
+
+
+def preparar_postproceso(trabajo, ydl, info, base, etiquetar=False, normalizar=False):
+    """Añade a un trabajo de ffmpeg las etiquetas y la portada de info y la normalización."""
+    if etiquetar:
+        trabajo["etiquetas"] = etiquetas_de(info)
+        trabajo["portada"] = descargar_portada(ydl, info, base)
+    trabajo["normalizar"] = normalizar
+    return trabajo
+
+
+def extraer_info(ydl, url, clave, cache=None):
+    """Info-dict de la URL con los formatos ya elegidos según las opciones de ydl.
+
+    Si la caché tiene el vídeo se reutiliza su info-dict (solo se repite la selección de
+    formatos, sin peticiones de red); si no, se extrae y se guarda.
+    """
+    if cache is not None:
+        info = cache.obtener(clave)
+        if info is not None:
+            return ydl.process_ie_result(info, download=False)
+    info = ydl.extract_info(url, download=False)
+    if cache is not None and "entries" not in info:
+        cache.guardar(clave, ydl.sanitize_info(info))
+    return info
+
+
+def reservar_espacio(escritor, info, carpeta):
+    """Espera a que el escritor admita el trabajo de info y devuelve la reserva.
+
+    Los intermedios son los streams descargados más la salida de ffmpeg, que se estima del
+    mismo tamaño (en MP3 suele ser menor).
+    """
+    estimados = estimar_bytes(info)
+    return escritor.admitir(2 * estimados, estimados, carpeta)
+
+
+def descargar_crudo(ydl, url, formato, clave_url, cache=None, segmentos=0, hook=None, pool=None,
+                    metricas=None, escritor=None, carpeta=None, etiquetar=False, normalizar=False):
+    """Descarga los streams sin postprocesar y devuelve los trabajos de ffmpeg pendientes.
+
+    Cada trabajo es un dict con las rutas de entrada y la descripción de sus streams (ext y
+    códecs), la ruta final, el formato y la clave con la que se registrará en el historial.
+
+    Con segmentos > 1 los formatos HTTP directos se descargan con segmentado.py (varias
+    conexiones Range a la vez) y en segundo plano, de modo que el vídeo y el audio de un
+    mismo elemento se bajan a la vez; el resto sigue pasando por ydl.dl. hook recibe el
+    progreso de las descargas por segmentos con el formato de los progress_hooks de yt-dlp, y
+    pool (un PoolConexiones) les da conexiones keep-alive compartidas con los demás hilos.
+    Si se pasa un MetricasLote, el tiempo de extracción y el de descarga se suman a url.
+
+    Con un EscritorSalidas (escritor.py) la descarga espera a que se admita su espacio en
+    disco; la reserva va en trabajo["reserva"] y se libera al llevar la salida a carpeta.
+
+    Con etiquetar=True se descarga también la miniatura y el trabajo lleva las etiquetas y la
+    portada que ffmpeg escribirá en la misma conversión; normalizar se pasa al plan.
+    """
+    inicio = time.perf_counter()
+    info = extraer_info(ydl, url, clave_url, cache)
+    if metricas is not None:
+        metricas.sumar(url, EXTRACCION, time.perf_counter() - inicio)
+    reserva = reservar_espacio(escritor, info, carpeta) if escritor is not None else None
+    inicio = time.perf_counter()
+    try:
+        trabajos = _descargar_entradas(ydl, info, formato, clave_url, segmentos, hook, pool,
+                                       etiquetar, normalizar)
+    except BaseException:
+        if reserva is not None:
+            escritor.liberar(reserva)
+        raise
+    finally:
+        if metricas is not None:
+            metricas.sumar(url, DESCARGA, time.perf_counter() - inicio)
+    if reserva is not None:
+        if not trabajos:
+            escritor.liberar(reserva)
+        for trabajo in trabajos:
+            trabajo["reserva"] = reserva
+    return trabajos
+
+
+def _descargar_entradas(ydl, info, formato, clave_url, segmentos, hook, pool, etiquetar, normalizar):
+    trabajos = []
+    for entrada in info.get("entries") or [info]:
+        if not entrada:
+            continue
+        base = ydl.prepare_filename(entrada)
+        # ydl.dl no crea las carpetas de la plantilla (p. ej. la subcarpeta de cada vídeo)
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        entradas = []
+        streams = []
+        normales = []
+        segmentadas = []
+        for fmt in entrada.get("requested_formats") or [entrada]:
+            info_fmt = dict(entrada)
+            info_fmt.pop("requested_formats", None)
+            info_fmt.update(fmt)
+            ruta = f"{base}.f{info_fmt['format_id']}.{info_fmt['ext']}"
+            entradas.append(ruta)
+            streams.append({k: info_fmt.get(k) for k in ("ext", "vcodec", "acodec", "abr")})
+            if segmentos > 1 and info_fmt.get("protocol") in ("http", "https"):
+                cabeceras = dict(info_fmt.get("http_headers") or {})
+                cookies = ydl.cookiejar.get_cookie_header(info_fmt["url"])
+                if cookies:
+                    cabeceras["Cookie"] = cookies
+                descarga = DescargaSegmentada(info_fmt["url"], ruta, segmentos, cabeceras, pool)
+                if descarga.preparar():
+                    descarga.iniciar()
+                    segmentadas.append(descarga)
+                    continue
+            normales.append((ruta, info_fmt))
+        try:
+            for ruta, info_fmt in normales:
+                exito, _ = ydl.dl(ruta, info_fmt)
+                if not exito:
+                    raise RuntimeError(f"descarga incompleta: {ruta}")
+        except BaseException:
+            # Los segmentos en segundo plano no pueden seguir escribiendo en la carpeta de un
+            # elemento que ya se da por fallido o cancelado: cancelar() espera a sus hilos
+            for descarga in segmentadas:
+                descarga.cancelar()
+            raise
+        if segmentadas:
+            esperar_segmentadas(segmentadas, base, entrada, hook)
+        trabajos.append(preparar_postproceso({
+            "entradas": entradas,
+            "streams": streams,
+            "salida": f"{base}.{formato.lower()}",
+            "formato": formato,
+            "clave": clave_entrada(info, entrada, clave_url),
+        }, ydl, entrada, base, etiquetar, normalizar))
+    return trabajos
+
+
+def esperar_segmentadas(descargas, nombre, info, hook=None):
+    """Espera a varias DescargaSegmentada informando a hook de los bytes que llevan entre todas."""
+    total = sum(d.tamano for d in descargas)
+    pendientes = list(descargas)
+    while pendientes:
+        try:
+            if pendientes[0].esperar(timeout=0.2):
+                pendientes.pop(0)
+            # El hook puede cortar la descarga (p. ej. al cancelar el lote)
+            if hook is not None:
+                hook({"status": "downloading" if pendientes else "finished", "filename": nombre,
+                      "downloaded_bytes": sum(d.descargados for d in descargas),
+                      "total_bytes": total, "info_dict": info})
+        except BaseException:
+            for descarga in pendientes:
+                descarga.cancelar()
+            raise
+
+
+def _cpu_hijos():
+    if resource is None:
+        return None
+    uso = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return uso.ru_utime + uso.ru_stime
+
+
+def transcodificar(trabajo):
+    """Convierte un trabajo según su plan en una sola ejecución de ffmpeg.
+
+    En modo pipeline se llama en un proceso del pool; sin él, en el hilo de la descarga. La
+    portada (si la hay) se borra al terminar.
+
+    Devuelve el plan con la ruta de salida, el tiempo de CPU que ha gastado ffmpeg ("cpu_s",
+    None si el sistema no lo permite medir) y los segundos de conversión ("segundos") y de
+    escritura del archivo final y limpieza de las entradas ("escritura_s").
+    """
+    plan = planificar(trabajo, trabajo.get("hilos", 1))
+    cpu_antes = _cpu_hijos()
+    inicio = time.perf_counter()
+    escritura = 0.0
+    portada = trabajo.get("portada")
+    if plan["accion"] == MOVER:
+        if trabajo["entradas"][0] != trabajo["salida"]:
+            shutil.move(trabajo["entradas"][0], trabajo["salida"])
+        escritura = time.perf_counter() - inicio
+    else:
+        comando = [ruta_ffmpeg(), "-y", "-loglevel", "error"]
+        for entrada in trabajo["entradas"] + ([portada] if portada else []):
+            comando += ["-i", entrada]
+        comando += plan["argumentos"]
+        # Un MP4 que solo recibe etiquetas es a la vez entrada y salida
+        raiz, ext = os.path.splitext(trabajo["salida"])
+        salida = f"{raiz}.tmp{ext}" if trabajo["salida"] in trabajo["entradas"] else trabajo["salida"]
+        comando.append(salida)
+        subprocess.run(comando, check=True, capture_output=True,
+                       creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        inicio_escritura = time.perf_counter()
+        if salida != trabajo["salida"]:
+            os.replace(salida, trabajo["salida"])
+        for entrada in trabajo["entradas"]:
+            if entrada != trabajo["salida"]:
+                try:
+                    os.remove(entrada)
+                except OSError:
+                    pass
+        escritura = time.perf_counter() - inicio_escritura
+    if portada:
+        try:
+            os.remove(portada)
+        except OSError:
+            pass
+    cpu_despues = _cpu_hijos()
+    plan["segundos"] = time.perf_counter() - inicio - escritura
+    plan["escritura_s"] = escritura
+    plan["salida"] = trabajo["salida"]
+    plan["cpu_s"] = round(cpu_despues - cpu_antes, 3) if cpu_antes is not None else None
+    return plan
+
+
+class OpcionesLote:
+    """Opciones de un descargar_lote. La CLI, la interfaz y el servidor de trabajos crean una y
+    la pasan entera; los recursos (diario, metricas, almacen...) los crea y cierra el llamante.
+
+    pipeline         los hilos solo descargan y un pool de procesos hace el trabajo de ffmpeg
+    segmentos        con más de 1, conexiones Range por archivo HTTP directo (segmentado.py)
+    expandir_listas  resolver listas y canales en sus vídeos antes de descargar (expansion.py)
+    usar_historial   saltarse lo que el historial de la carpeta ya tiene en ese formato
+    usar_cache       reutilizar los info-dicts de cache_metadatos.py
+    etiquetar        escribir etiquetas y portada en la misma ejecución de ffmpeg que convierte
+                     (sin pipeline sustituye a FFmpegExtractAudio y a la unión de yt-dlp)
+    normalizar       normalizar el audio a -14 LUFS en esa misma ejecución
+    max_reintentos   veces que se reprograma una URL con un error transitorio (planificador.py)
+    cookies          cookies.txt que comparten todos los hilos (se guarda al acabar)
+    silencioso       yt-dlp solo escribe los errores
+    diario           DiarioTrabajo donde se anota el estado de cada URL
+    terminadas       claves canónicas ya terminadas en otra ejecución: se cuentan como skipped
+    progreso         EstadoProgreso que recibe los hooks de descarga y postproceso
+    limitador        LimitadorHosts compartido con otros lotes (si no, uno propio)
+    metricas         MetricasLote donde se instrumenta cada URL (si no, uno en memoria)
+    almacen          AlmacenContenidos donde se guarda cada salida y de donde se enlaza
+    escritor         EscritorSalidas: trabajo en un disco local con admisión por espacio libre
+    memoria          ControlMemoria que decide cuándo recicla cada hilo su YoutubeDL
+    """
+
+    def __init__(self, pipeline=False, segmentos=0, expandir_listas=True, usar_historial=True,
+                 usar_cache=True, etiquetar=False, normalizar=False, max_reintentos=MAX_REINTENTOS,
+                 cookies=None, silencioso=False, diario=None, terminadas=None, progreso=None,
+                 limitador=None, metricas=None, almacen=None, escritor=None, memoria=None):
+        self.pipeline = pipeline
+        self.segmentos = segmentos
+        self.expandir_listas = expandir_listas
+        self.usar_historial = usar_historial
+        self.usar_cache = usar_cache
+        self.etiquetar = etiquetar
+        self.normalizar = normalizar
+        self.max_reintentos = max_reintentos
+        self.cookies = cookies
+        self.silencioso = silencioso
+        self.diario = diario
+        self.terminadas = terminadas
+        self.progreso = progreso
+        self.limitador = limitador
+        self.metricas = metricas
+        self.almacen = almacen
+        self.escritor = escritor
+        self.memoria = memoria
+
+    def copiar(self, **cambios):
+        """Copia con algunas opciones cambiadas."""
+        opciones = copy.copy(self)
+        for nombre, valor in cambios.items():
+            if nombre not in opciones.__dict__:
+                raise TypeError(f"opción de lote desconocida: {nombre}")
+            setattr(opciones, nombre, valor)
+        return opciones
+
+    @property
+    def variante(self):
+        """Variante de las salidas en el almacén: las que llevan etiquetas y portada o audio
+        normalizado tienen otro contenido y se guardan aparte ("tags+cover+loudnorm")."""
+        partes = []
+        if self.etiquetar:
+            # La portada solo se incrusta junto con las etiquetas
+            partes += ["tags", "cover"]
+        if self.normalizar:
+            partes.append("loudnorm")
+        return "+".join(partes)
+
+
+class Lote:
+    """Estado que comparten los hilos de un descargar_lote y el camino de cada URL por él.
+
+    procesar() lleva una URL de principio a fin (lista, historial, almacén, descarga y
+    conversión); reintentar() y terminar() deciden qué pasa con ella al fallar o acabar, y
+    ejecutar() reparte entre los hilos las URLs de la fuente, las de las listas expandidas y
+    los reintentos.
+    """
+
+    def __init__(self, carpeta, formato, workers, opciones, total=None, on_progreso=None,
+                 on_terminada=None, cancelado=None, activo=None):
+        self.carpeta = carpeta
+        self.formato = formato
+        self.workers = max(1, min(int(workers), MAX_DESCARGAS_PARALELAS))
+        self.opciones = opciones
+        self.total = total
+        self.on_progreso = on_progreso
+        self.on_terminada = on_terminada
+        self.cancelado = cancelado
+        self.activo = activo
+        self.diario = opciones.diario
+        self.almacen = opciones.almacen
+        self.escritor = opciones.escritor
+        self.progreso = opciones.progreso
+        self.metricas = opciones.metricas or MetricasLote()
+        self.memoria = opciones.memoria or ControlMemoria()
+        self.limitador = opciones.limitador or LimitadorHosts()
+
+        # Sin pipeline, las etiquetas y la normalización van en la ejecución de ffmpeg que haría
+        # falta de todos modos: en MP3 sustituye a FFmpegExtractAudio y en MP4 a la unión de
+        # yt-dlp (los streams se descargan sin unir, como en el pipeline)
+        self.postproceso_propio = not opciones.pipeline and (opciones.etiquetar or opciones.normalizar)
+        self.crudo_en_hilo = self.postproceso_propio and formato == "MP4"
+        self.ydl_opts = self._opciones_ydl()
+        self.ydl_opts_listas = dict(self.ydl_opts, extract_flat="in_playlist")
+
+        self.contadores = {"ok": 0, "error": 0, "invalid": 0, "skipped": 0, "duplicates": 0, "cancelled": 0}
+        self.etapas = {"descargas": 0, "codificaciones": 0, "reintentos": 0}
+        self.conversiones = {}
+        self.historial = HistorialDescargas(carpeta) if opciones.usar_historial else None
+        self.cache_listas = CacheExpansiones() if opciones.expandir_listas else None
+        self.cache_info = CacheMetadatos() if opciones.usar_cache else None
+        self.cola_reintentos = ColaReintentos()
+        # Vídeos salidos de expandir listas, pendientes de entrar en el pool
+        self.expandidas = queue.Queue()
+        self.intentos = {}
+        self.inicios = {}
+        self.lock = threading.Lock()
+
+        instalar_cache_dns()
+        self.dns_inicial = estadisticas_dns()
+        self.conexiones = PoolConexiones()
+        self.jar = cargar_cookies(opciones.cookies) if opciones.cookies else None
+        # Una instancia de YoutubeDL por hilo: no es seguro compartirla entre hilos
+        self._local = threading.local()
+        self._instancias = []
+
+        if opciones.pipeline:
+            nucleos = os.cpu_count() or 1
+            self.codificadores = ProcessPoolExecutor(max_workers=nucleos)
+            self.huecos_cola = threading.BoundedSemaphore(nucleos * TRABAJOS_EN_COLA_POR_NUCLEO)
+            # Hilos para los codificadores multihilo (vídeo): los núcleos que tocan a cada descarga
+            self.hilos_ffmpeg = max(1, nucleos // self.workers)
+        # Como mucho dos URLs en espera por hilo: el iterable no se materializa entero
+        self._huecos = threading.BoundedSemaphore(self.workers * 2)
+        self._en_vuelo = 0
+
+    def _opciones_ydl(self):
+        from yt_dlp.utils import DownloadCancelled
+
+        postprocesar = not self.opciones.pipeline and not self.postproceso_propio
+        if self.escritor is not None:
+            ydl_opts = construir_opciones_ydl(self.formato, self.escritor.carpeta_temporal,
+                                              postprocesar=postprocesar, por_video=True)
+        elif self.almacen is not None:
+            ydl_opts = construir_opciones_ydl(self.formato, self.almacen.carpeta_entrada,
+                                              postprocesar=postprocesar, por_video=True)
+        else:
+            ydl_opts = construir_opciones_ydl(self.formato, self.carpeta, postprocesar=postprocesar)
+        if self.opciones.silencioso:
+            ydl_opts.update({"quiet": True, "noprogress": True})
+
+        def comprobar_cancelacion(d):
+            if self.cancelado is not None and self.cancelado.is_set():
+                raise DownloadCancelled("descarga cancelada")
+
+        ydl_opts["progress_hooks"] = [comprobar_cancelacion, self.metricas.hook_descarga]
+        ydl_opts["postprocessor_hooks"] = [self.metricas.hook_postproceso]
+        if self.progreso is not None:
+            ydl_opts["progress_hooks"].append(self.progreso.hook_descarga)
+            ydl_opts["postprocessor_hooks"].append(self.progreso.hook_postproceso)
+        return ydl_opts
+
+    def cancelado_ya(self):
+        return self.cancelado is not None and self.cancelado.is_set()
+
+    # YoutubeDL de cada hilo
+
+    def obtener_ydl(self, listas=False):
+        nombre = "ydl_listas" if listas else "ydl"
+        ydl = getattr(self._local, nombre, None)
+        if ydl is None:
+            ydl = crear_ydl(self.ydl_opts_listas if listas else self.ydl_opts)
+            if self.jar is not None:
+                # YoutubeDL.cookiejar es una cached_property: así no carga el archivo cada instancia
+                ydl.__dict__["cookiejar"] = self.jar
+            setattr(self._local, nombre, ydl)
+            with self.lock:
+                self._instancias.append(ydl)
+        return ydl
+
+    def reciclar_ydl(self):
+        """Cierra los YoutubeDL del hilo actual; el siguiente elemento crea otros."""
+        for nombre in ("ydl", "ydl_listas"):
+            ydl = getattr(self._local, nombre, None)
+            if ydl is None:
+                continue
+            setattr(self._local, nombre, None)
+            with self.lock:
+                self._instancias.remove(ydl)
+            try:
+                ydl.close()
+            except Exception:
+                pass
+        # Los extractores y las respuestas del YoutubeDL cerrado forman ciclos
+        gc.collect()
+
+    # Estado final de cada URL
+
+    def reintentar(self, url, error):
+        """Reprograma la URL si el error es transitorio; devuelve False si debe fallar ya."""
+        clase, retry_after = clasificar_error(error)
+        if clase == LIMITADO:
+            self.limitador.frenar(host_de(url), retry_after)
+        with self.lock:
+            intento = self.intentos.get(url, 0) + 1
+            if clase not in REINTENTABLES or intento > self.opciones.max_reintentos:
+                self.intentos.pop(url, None)
+                return False
+            self.intentos[url] = intento
+            self.etapas["reintentos"] += 1
+        self.metricas.reintento(url, clase, error)
+        espera = calcular_espera(intento, retry_after=retry_after)
+        if not self.opciones.silencioso:
+            print(f"Reintento {intento} de {url} en {espera:.1f} s ({clase}): {error}", file=sys.stderr)
+        if self.diario:
+            self.diario.registrar("retry", url, attempt=intento, reason=clase, wait=round(espera, 2))
+        self.cola_reintentos.programar(url, espera)
+        return True
+
+    def terminar(self, resultado, url=None, error=None, empezada=True):
+        """Cuenta la URL con su estado final y avisa a on_terminada y on_progreso.
+
+        Las repetidas y las ya terminadas en otra ejecución se cierran con empezada=False: no
+        tienen métricas ni inicio propios, y la misma URL puede seguir en curso en otro hilo.
+        """
+        if url and empezada:
+            self.metricas.terminar(url, resultado, error)
+        with self.lock:
+            self.contadores[resultado] += 1
+            completadas = sum(self.contadores.values())
+            inicio_url = None
+            if empezada:
+                inicio_url = self.inicios.pop(url, None)
+                self.intentos.pop(url, None)
+        if self.diario and url and empezada and resultado in EVENTOS_DIARIO:
+            duracion = round(time.monotonic() - inicio_url, 3) if inicio_url else None
+            self.diario.registrar(EVENTOS_DIARIO[resultado], url, duration=duracion)
+        if self.on_terminada and url:
+            self.on_terminada(url, resultado)
+        if self.on_progreso:
+            self.on_progreso(completadas, self.total)
+
+    def fallar(self, url, error, mensaje="Error al descargar"):
+        """Cierra la URL como cancelada o error, salvo que se pueda reintentar."""
+        if self.cancelado_ya():
+            self.terminar("cancelled", url, error)
+        elif not self.reintentar(url, error):
+            print(f"{mensaje} {url}: {error}", file=sys.stderr)
+            self.terminar("error", url, error)
+
+    def descartar_pendientes(self):
+        """Al cancelar, cierra como "cancelled" los reintentos programados y los vídeos de listas
+        que no llegaron a entrar en el pool, para que el lote llegue a su total."""
+        for url in self.cola_reintentos.vaciar():
+            self.terminar("cancelled", url)
+        while True:
+            try:
+                url = self.expandidas.get_nowait()
+            except queue.Empty:
+                return
+            self.terminar("cancelled", url, empezada=False)
+
+    # Camino de una URL
+
+    def procesar(self, raw):
+        try:
+            self._procesar_url(raw)
+        finally:
+            if self.progreso is not None:
+                self.progreso.libre()
+            if self.memoria.terminado():
+                self.reciclar_ydl()
+
+    def _procesar_url(self, raw):
+        if self.activo is not None:
+            self.activo.wait()
+        url = (raw or "").strip()
+        if url:
+            self.metricas.empezar(url)
+        if self.cancelado_ya():
+            self.terminar("cancelled", url)
+            return
+        if self.diario and url:
+            with self.lock:
+                self.inicios[url] = time.monotonic()
+            self.diario.registrar("started", url)
+        enlace = canonizar(url)
+        if enlace.tipo == INVALIDO:
+            self.terminar("invalid", url)
+            return
+        host = host_de(url)
+        if self.cache_listas and enlace.tipo != UNICO:
+            self.limitador.esperar(host)
+            try:
+                self.expandir(url)
+            except Exception as e:
+                self.fallar(url, e, "Error al expandir la lista")
+                return
+            self.limitador.exito(host)
+            return
+        clave = clave_de(enlace, url)
+        if self.historial and self.historial.contiene(self.formato, clave):
+            self.terminar("skipped", url)
+            return
+        if self.almacen is not None and self.enlazar_del_almacen(url, clave):
+            self.terminar("ok", url)
+            return
+        self.limitador.esperar(host)
+        try:
+            if self.opciones.pipeline:
+                trabajos = self.descargar_crudo(url, clave)
+            elif self.crudo_en_hilo:
+                self.descargar_y_convertir(url, clave)
+            else:
+                self.descargar_con_ytdlp(url, clave)
+        except Exception as e:
+            self.fallar(url, e)
+            return
+        self.limitador.exito(host)
+        with self.lock:
+            self.intentos.pop(url, None)
+            self.etapas["descargas"] += len(trabajos) if self.opciones.pipeline else 1
+        if self.opciones.pipeline:
+            self.encolar_codificacion(url, trabajos)
+        else:
+            self.terminar("ok", url)
+
+    def expandir(self, url):
+        """Mete en la cola los vídeos de una lista o canal (con la caché de expansiones)."""
+        entradas = self.cache_listas.obtener(url)
+        if entradas is None:
+            entradas = expandir_lista(self.obtener_ydl(listas=True), url)
+            self.cache_listas.guardar(url, entradas)
+        with self.lock:
+            # La fila de la lista se sustituye por sus vídeos en el total
+            if self.total is not None:
+                self.total += len(entradas) - 1
+        for entrada in entradas:
+            self.expandidas.put(entrada)
+        if self.diario:
+            self.diario.registrar("expanded", url, entries=len(entradas))
+
+    def enlazar_del_almacen(self, url, clave):
+        """Enlaza en la carpeta la salida que ya tenga el almacén; False si no la tiene."""
+        try:
+            with self.metricas.medir(url, ESCRITURA):
+                enlazado = self.almacen.materializar(clave, self.formato, self.carpeta,
+                                                     self.opciones.variante)
+                if enlazado is not None and self.historial:
+                    self.registrar(clave, *enlazado)
+        except OSError as e:
+            print(f"No se pudo enlazar {url} desde el almacén: {e}", file=sys.stderr)
+            return False
+        if enlazado is None:
+            return False
+        if self.diario:
+            self.diario.registrar("linked", url, path=enlazado[0])
+        return True
+
+    def descargar_crudo(self, url, clave):
+        """Streams sin postprocesar: los trabajos de ffmpeg para el pool o para este hilo."""
+        return descargar_crudo(self.obtener_ydl(), url, self.formato, clave, self.cache_info,
+                               self.opciones.segmentos, self.avisar_descarga, self.conexiones,
+                               self.metricas, self.escritor, self.carpeta, self.opciones.etiquetar,
+                               self.opciones.normalizar)
+
+    def descargar_y_convertir(self, url, clave):
+        """MP4 sin pipeline: streams sin unir y una sola ejecución de ffmpeg en este hilo."""
+        trabajos = self.descargar_crudo(url, clave)
+        try:
+            for trabajo in trabajos:
+                ruta = self.convertir_en_hilo(url, trabajo, {"webpage_url": url})
+                with self.metricas.medir(url, ESCRITURA):
+                    self.finalizar_salida(trabajo["clave"], ruta)
+        finally:
+            if trabajos and trabajos[0].get("reserva") is not None:
+                self.escritor.liberar(trabajos[0]["reserva"])
+
+    def descargar_con_ytdlp(self, url, clave):
+        """Descarga y postproceso de yt-dlp, o el propio en este hilo si hay etiquetas."""
+        ydl = self.obtener_ydl()
+        with self.metricas.medir(url, EXTRACCION):
+            info = extraer_info(ydl, url, clave, self.cache_info)
+        reserva = reservar_espacio(self.escritor, info, self.carpeta) if self.escritor is not None else None
+        try:
+            # process_ie_result descarga y postprocesa: el postproceso lo miden los hooks
+            postproceso = self.metricas.segundos(url, POSTPROCESO)
+            inicio_descarga = time.perf_counter()
+            try:
+                info = ydl.process_ie_result(info, download=True)
+            finally:
+                self.metricas.sumar(url, DESCARGA, time.perf_counter() - inicio_descarga
+                                    - (self.metricas.segundos(url, POSTPROCESO) - postproceso))
+            for entrada, ruta in salidas_descargadas(info):
+                if self.postproceso_propio:
+                    ruta = self.postprocesar_salida(ydl, url, entrada, ruta)
+                with self.metricas.medir(url, ESCRITURA):
+                    self.finalizar_salida(clave_entrada(info, entrada, clave), ruta)
+        finally:
+            if reserva is not None:
+                self.escritor.liberar(reserva)
+
+    def avisar_descarga(self, d):
+        for hook in self.ydl_opts["progress_hooks"]:
+            hook(d)
+
+    # Conversión y salida
+
+    def postprocesar_salida(self, ydl, url, entrada, ruta):
+        """Conversión, etiquetas, portada y normalización de un archivo descargado sin pipeline."""
+        base = os.path.splitext(ruta)[0]
+        ext = os.path.splitext(ruta)[1][1:]
+        trabajo = preparar_postproceso({
+            "entradas": [ruta],
+            "streams": [{"ext": ext, "vcodec": entrada.get("vcodec"), "acodec": entrada.get("acodec")}],
+            "salida": f"{base}.{self.formato.lower()}",
+            "formato": self.formato,
+        }, ydl, entrada, base, self.opciones.etiquetar, self.opciones.normalizar)
+        return self.convertir_en_hilo(url, trabajo, entrada)
+
+    def convertir_en_hilo(self, url, trabajo, entrada):
+        """transcodificar en el hilo de la descarga, avisando a los hooks de postproceso."""
+        for hook in self.ydl_opts["postprocessor_hooks"]:
+            hook({"status": "started", "postprocessor": "dwsongs", "info_dict": entrada})
+        try:
+            plan = transcodificar(trabajo)
+        finally:
+            for hook in self.ydl_opts["postprocessor_hooks"]:
+                hook({"status": "finished", "postprocessor": "dwsongs", "info_dict": entrada})
+        if self.diario:
+            self.diario.registrar("converted", url, action=plan["accion"], reason=plan["motivo"],
+                                  cpu_s=plan["cpu_s"])
+        return plan["salida"]
+
+    def encolar_codificacion(self, url, trabajos):
+        """Manda los trabajos de ffmpeg al pool; la URL termina cuando acaba el último."""
+        if not trabajos:
+            self.terminar("ok", url)
+            return
+        pendientes = {"n": len(trabajos), "fallo": None}
+        for trabajo in trabajos:
+            trabajo["hilos"] = self.hilos_ffmpeg
+            # Bloquea la descarga mientras la cola de ffmpeg esté llena
+            self.huecos_cola.acquire()
+            if self.progreso is not None:
+                self.progreso.codificacion(+1)
+            enviado = time.perf_counter()
+            self.codificadores.submit(transcodificar, trabajo).add_done_callback(
+                lambda futuro, trabajo=trabajo, enviado=enviado:
+                    self._on_codificado(futuro, url, trabajo, enviado, pendientes))
+
+    def _on_codificado(self, futuro, url, trabajo, enviado, pendientes):
+        self.huecos_cola.release()
+        if self.progreso is not None:
+            self.progreso.codificacion(-1)
+        error = None
+        try:
+            plan = futuro.result()
+        except Exception as e:
+            print(f"Error al convertir {url}: {e}", file=sys.stderr)
+            error = e
+        else:
+            # Cualquier fallo al anotar o guardar la salida cierra la URL como error: si no,
+            # no se contaría y el lote no llegaría nunca al total
+            try:
+                if not self.opciones.silencioso:
+                    print(f"Conversión de {os.path.basename(plan['salida'])}: {plan['accion']} "
+                          f"({plan['motivo']}, CPU {plan['cpu_s']} s)", file=sys.stderr)
+                if self.diario:
+                    self.diario.registrar("converted", url, action=plan["accion"], reason=plan["motivo"],
+                                          cpu_s=plan["cpu_s"])
+                self.metricas.sumar(url, POSTPROCESO, plan["segundos"])
+                self.metricas.sumar(url, COLA_FFMPEG, max(0.0, time.perf_counter() - enviado
+                                                          - plan["segundos"] - plan["escritura_s"]))
+                self.metricas.sumar(url, ESCRITURA, plan["escritura_s"])
+                with self.metricas.medir(url, ESCRITURA):
+                    self.finalizar_salida(trabajo["clave"], trabajo["salida"])
+            except Exception as e:
+                print(f"Error al guardar {trabajo['salida']} de {url}: {e}", file=sys.stderr)
+                error = e
+        with self.lock:
+            if error is None:
+                suma = self.conversiones.setdefault(plan["accion"], {"n": 0, "cpu_s": 0.0})
+                suma["n"] += 1
+                suma["cpu_s"] = round(suma["cpu_s"] + (plan["cpu_s"] or 0.0), 3)
+            self.etapas["codificaciones"] += error is None
+            pendientes["n"] -= 1
+            pendientes["fallo"] = pendientes["fallo"] or error
+            fin = pendientes["n"] == 0
+        if fin:
+            if trabajo.get("reserva") is not None:
+                self.escritor.liberar(trabajo["reserva"])
+            if pendientes["fallo"]:
+                self.terminar("error", url, pendientes["fallo"])
+            else:
+                self.terminar("ok", url)
+
+    def finalizar_salida(self, clave, ruta):
+        """Lleva la salida al almacén o a carpeta (si se preparó aparte) y la apunta en el historial."""
+        digest = None
+        if self.almacen is not None:
+            temporal = ruta
+            ruta, digest = self.almacen.guardar(clave, self.formato, ruta, self.carpeta,
+                                                self.opciones.variante)
+            if self.escritor is not None:
+                self.escritor.limpiar(temporal)
+        elif self.escritor is not None:
+            ruta = self.escritor.mover(ruta, self.carpeta)
+        if self.historial:
+            self.registrar(clave, ruta, digest)
+
+    def registrar(self, clave, ruta, digest=None):
+        try:
+            self.historial.registrar(self.formato, clave, ruta, digest)
+        except (OSError, sqlite3.Error) as e:
+            print(f"No se pudo registrar {ruta} en el historial: {e}", file=sys.stderr)
+
+    # Reparto de las URLs entre los hilos
+
+    def siguientes(self, urls):
+        """Alterna los reintentos ya listos y los vídeos expandidos (primero) con las filas de urls.
+
+        Genera pares (url, origen), con origen "fuente", "lista" o "reintento".
+        """
+        vistas = ConjuntoHashes()
+        fuente = sin_duplicados(urls, vistas=vistas,
+                                on_duplicado=lambda url: self.terminar("duplicates", url, empezada=False))
+        fuente_agotada = False
+        while True:
+            if self.cancelado_ya():
+                return
+            url = self.cola_reintentos.siguiente()
+            if url is not None:
+                yield url, "reintento"
+                continue
+            try:
+                url = self.expandidas.get_nowait()
+            except queue.Empty:
+                if not fuente_agotada:
+                    url = next(fuente, None)
+                    if url is None:
+                        fuente_agotada = True
+                    else:
+                        yield url, "fuente"
+                    continue
+                with self.lock:
+                    activos = self._en_vuelo
+                # Un procesar en vuelo puede estar expandiendo una lista o reprogramando su URL
+                if not activos and self.expandidas.empty() and not len(self.cola_reintentos):
+                    return
+                try:
+                    url = self.expandidas.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+            if vistas.agregar(clave_canonica(url)):
+                yield url, "lista"
+            else:
+                self.terminar("duplicates", url, empezada=False)
+
+    def pendientes(self, urls):
+        """URLs que quedan por procesar: quita las terminadas en una ejecución anterior."""
+        terminadas = self.opciones.terminadas
+        for url, origen in self.siguientes(urls):
+            if origen == "reintento":
+                yield url
+                continue
+            if terminadas is not None and url and url.strip() and clave_canonica(url) in terminadas:
+                self.terminar("skipped", url, empezada=False)
+                continue
+            if self.diario and url and url.strip():
+                if origen == "lista":
+                    self.diario.registrar("queued", url.strip(), expanded=True)
+                else:
+                    self.diario.registrar("queued", url.strip())
+            yield url
+
+    def _on_procesada(self, futuro, raw):
+        if futuro.exception() is not None:
+            print(f"Error inesperado: {futuro.exception()}", file=sys.stderr)
+            self.terminar("error", (raw or "").strip(), futuro.exception())
+        with self.lock:
+            self._en_vuelo -= 1
+        self._huecos.release()
+
+    def ejecutar(self, urls):
+        """Procesa todas las URLs y devuelve el resumen del lote."""
+        inicio = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="dwsongs") as pool:
+                for raw in self.pendientes(urls):
+                    self._huecos.acquire()
+                    with self.lock:
+                        self._en_vuelo += 1
+                    pool.submit(self.procesar, raw).add_done_callback(
+                        lambda futuro, raw=raw: self._on_procesada(futuro, raw))
+            # Con el pool ya parado ningún hilo puede reprogramar una URL ni expandir una lista
+            if self.cancelado_ya():
+                self.descartar_pendientes()
+            fin_descargas = time.perf_counter()
+        finally:
+            self.cerrar()
+        return self.resumen(inicio, fin_descargas, time.perf_counter())
+
+    def cerrar(self):
+        if self.opciones.pipeline:
+            self.codificadores.shutdown(wait=True)
+        for ydl in self._instancias:
+            try:
+                ydl.close()
+            except Exception:
+                pass
+        self.conexiones.cerrar()
+        if self.jar is not None:
+            try:
+                self.jar.save()
+            except OSError as e:
+                print(f"No se pudieron guardar las cookies en {self.opciones.cookies}: {e}", file=sys.stderr)
+        if self.historial:
+            self.historial.cerrar()
+        if self.cache_listas:
+            self.cache_listas.cerrar()
+        if self.cache_info:
+            self.cache_info.cerrar()
+
+    def resumen(self, inicio, fin_descargas, fin):
+        resultado = dict(self.contadores)
+        resultado["retries"] = self.etapas["reintentos"]
+        resultado["cache_hits"] = self.cache_info.hits if self.cache_info else 0
+        resultado["cache_misses"] = self.cache_info.misses if self.cache_info else 0
+        resultado["descargas_s"] = self.etapas["descargas"] / max(fin_descargas - inicio, 1e-6)
+        resultado["codificaciones_s"] = (
+            self.etapas["codificaciones"] / max(fin - inicio, 1e-6) if self.opciones.pipeline else None
+        )
+        resultado["conversiones"] = self.conversiones if self.opciones.pipeline else None
+        resultado["almacen"] = self.almacen.estadisticas() if self.almacen is not None else None
+        resultado["staging"] = self.escritor.estadisticas() if self.escritor is not None else None
+        resultado["latencias"] = self.metricas.resumen()["stages"]
+        resultado["memoria"] = self.memoria.estadisticas()
+        # Estado por URL que debería haberse vaciado al terminar cada una: si crece con el lote,
+        # la memoria de un trabajo largo no se mantiene plana
+        resultado["memoria"]["elementos_abiertos"] = (self.metricas.abiertos() + len(self.inicios)
+                                                      + len(self.intentos))
+        dns = estadisticas_dns()
+        resultado["conexiones"] = {
+            **self.conexiones.estadisticas(),
+            # Cada conexión nueva, de yt-dlp o nuestra, empieza resolviendo su host
+            "dns_consultas": dns["dns_consultas"] - self.dns_inicial["dns_consultas"],
+            "dns_aciertos": dns["dns_aciertos"] - self.dns_inicial["dns_aciertos"],
+            # yt-dlp abre una conexión por petición: no pasa por el pool, pero se cuenta aparte
+            "conexiones_ytdlp": dns["conexiones_ytdlp"] - self.dns_inicial["conexiones_ytdlp"],
+        }
+        return resultado
+
+
+def descargar_lote(urls, carpeta, formato, workers=1, opciones=None, total=None, on_progreso=None,
+                   on_terminada=None, cancelado=None, activo=None):
+    """Descarga las URLs con un pool de hilos, cada uno con su propio YoutubeDL.
+
+    urls puede ser cualquier iterable (p. ej. un generador de ingesta.py): se consume a medida
+    que quedan hilos libres. Las URLs repetidas (misma clave canónica) se cuentan en
+    "duplicates" y no se descargan. Si urls no tiene longitud, total puede indicar el número
+    estimado de filas. opciones es un OpcionesLote (si no se pasa, el de por defecto).
+
+    Los errores de red, 5xx y 429 reprograman la URL con espera exponencial mientras los
+    hilos siguen con otras; los vídeos privados o borrados fallan en el acto.
+
+    cancelado (un threading.Event o equivalente) detiene el lote cuando se activa: no se leen
+    más URLs y las que esperaban turno, las descargas en curso, los reintentos programados y
+    los vídeos de listas aún sin empezar terminan como "cancelled" (sin anotarse como
+    terminadas en el diario, para que se repitan al reanudar), así que los contadores siguen
+    sumando el total. Las conversiones ya encoladas en ffmpeg sí terminan. Mientras
+    activo (otro Event) está desactivado, las URLs que aún no han empezado esperan (pausa).
+
+    on_progreso(completadas, total) se llama tras cada URL terminada, desde cualquiera de los
+    hilos; total es None si no se conoce. on_terminada(url, resultado) recibe el estado final
+    de cada URL (ok, error, invalid, skipped, duplicates o cancelled).
+
+    Devuelve un dict con esos contadores, "retries", "cache_hits" y "cache_misses", el
+    rendimiento de cada etapa ("descargas_s", "codificaciones_s") y los resúmenes de
+    "conversiones" (pipeline), "almacen", "staging", "latencias" (p50/p95 por etapa),
+    "memoria" (con los "elementos_abiertos" al acabar, que deberían ser 0) y "conexiones".
+    """
+    if total is None and hasattr(urls, "__len__"):
+        total = len(urls)
+    lote = Lote(carpeta, formato, workers, opciones or OpcionesLote(), total, on_progreso,
+                on_terminada, cancelado, activo)
+    return lote.ejecutar(urls)
@@ -0,0 +1,168 @@
+# Diario de trabajos: registro en disco del estado de cada URL para poder reanudar
+
+import os
+import json
+import time
+import glob
+import queue
+import threading
+from itertools import chain
+
+from rutas import DIR_DATOS
+from ingesta import iterar_urls_de_csv, contar_filas_csv, clave_canonica, ConjuntoHashes
+
+
+# El hilo escritor agrupa los eventos y hace fsync como mucho cada INTERVALO_FSYNC segundos
+INTERVALO_FSYNC = 1.0
+MAX_EVENTOS_LOTE = 500
+
+# Eventos que dejan una URL terminada (las fallidas se reintentan al reanudar)
+EVENTOS_TERMINADOS = {"done", "skipped", "invalid"}
+
+
+def carpeta_diarios():
+    ruta = os.path.join(DIR_DATOS, "trabajos")
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+class DiarioTrabajo:
+    """Diario JSONL de solo añadido de un trabajo de descarga.
+
+    La primera línea es la cabecera con los parámetros del trabajo y cada línea siguiente un
+    evento (queued, started, done, failed...) de una URL. registrar() solo encola: un hilo
+    aparte escribe los eventos por lotes y hace un fsync por lote, no uno por evento.
+
+    Cada lote se añade con una sola escritura, así que varios procesos del mismo trabajo
+    pueden compartir el archivo; reanudado=False evita el evento "resumed" al abrirlo.
+    """
+
+    def __init__(self, ruta, cabecera=None, reanudado=True):
+        self.ruta = ruta
+        self._cola = queue.Queue()
+        self._archivo = open(ruta, "ab", buffering=0)
+        if cabecera is not None:
+            self._cola.put(json.dumps({"event": "job", "t": time.time(), **cabecera}, ensure_ascii=False))
+        elif reanudado:
+            self._cola.put(json.dumps({"event": "resumed", "t": time.time()}))
+        self._hilo = threading.Thread(target=self._escribir, name="dwsongs-diario", daemon=True)
+        self._hilo.start()
+
+    @classmethod
+    def nuevo(cls, carpeta, formato, workers, pipeline=False, csv=None, urls=None,
+              store=None, staging=None, tags=True, normalize=False):
+        """Crea el diario de un trabajo nuevo; csv o urls indican de dónde salen los enlaces.
+
+        store y staging son la carpeta del almacén y la temporal ("" la de por defecto, None
+        sin ellas); con tags y normalize quedan en la cabecera para reanudar igual.
+        """
+        nombre = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}.jsonl"
+        cabecera = {"folder": carpeta, "format": formato, "workers": workers, "pipeline": pipeline,
+                    "store": os.path.abspath(store) if store else store,
+                    "staging": os.path.abspath(staging) if staging else staging,
+                    "tags": tags, "normalize": normalize}
+        if csv is not None:
+            cabecera["csv"] = os.path.abspath(csv)
+        else:
+            cabecera["urls"] = list(urls or [])
+        return cls(os.path.join(carpeta_diarios(), nombre), cabecera)
+
+    def registrar(self, evento, url, **datos):
+        self._cola.put(json.dumps({"event": evento, "url": url, "t": time.time(), **datos},
+                                  ensure_ascii=False))
+
+    def _escribir(self):
+        cerrar = False
+        while not cerrar:
+            lote = [self._cola.get()]
+            limite = time.monotonic() + INTERVALO_FSYNC
+            while len(lote) < MAX_EVENTOS_LOTE:
+                espera = limite - time.monotonic()
+                if espera <= 0:
+                    break
+                try:
+                    lote.append(self._cola.get(timeout=espera))
+                except queue.Empty:
+                    break
+            if None in lote:
+                cerrar = True
+                lote = [linea for linea in lote if linea is not None]
+            if lote:
+                self._archivo.write(("\n".join(lote) + "\n").encode("utf-8"))
+                os.fsync(self._archivo.fileno())
+        self._archivo.close()
+
+    def cerrar(self):
+        self._cola.put(None)
+        self._hilo.join()
+
+
+def ultimo_diario():
+    diarios = glob.glob(os.path.join(carpeta_diarios(), "*.jsonl"))
+    return max(diarios, key=os.path.getmtime) if diarios else None
+
+
+def leer_diario(ruta):
+    """Devuelve (cabecera, terminadas, encoladas) de un diario.
+
+    terminadas es un ConjuntoHashes con las claves canónicas de las URLs ya terminadas y
+    encoladas la lista de URLs salidas de expandir listas que no llegaron a terminar (las de la
+    fuente original se vuelven a leer de ella). Una última línea cortada por un cierre brusco
+    se ignora.
+    """
+    cabecera = None
+    estados = {}
+    expandidas = set()
+    with open(ruta, "r", encoding="utf-8") as f:
+        for linea in f:
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                continue
+            if evento.get("event") == "job":
+                cabecera = evento
+            elif "url" in evento:
+                estados[evento["url"]] = evento["event"]
+                if evento.get("expanded"):
+                    expandidas.add(evento["url"])
+    terminadas = ConjuntoHashes()
+    encoladas = []
+    for url, estado in estados.items():
+        if estado in EVENTOS_TERMINADOS:
+            terminadas.agregar(clave_canonica(url))
+        elif url in expandidas:
+            encoladas.append(url)
+    return cabecera, terminadas, encoladas
+
+
+def preparar_reanudacion(ruta):
+    """Parámetros para reanudar el trabajo de un diario.
+
+    Devuelve un dict con folder, format, workers, pipeline, store, staging, tags, normalize,
+    las URLs a volver a recorrer (las de la fuente original más las encoladas, p. ej. vídeos
+    de listas), su total aproximado y el conjunto de terminadas que descargar_lote debe
+    saltarse. Los diarios de antes de guardar store, staging, tags y normalize se reanudan
+    con los valores por defecto.
+    """
+    cabecera, terminadas, encoladas = leer_diario(ruta)
+    if cabecera is None:
+        raise ValueError(f"El diario no tiene cabecera: {ruta}")
+    if "csv" in cabecera:
+        fuente = iterar_urls_de_csv(cabecera["csv"])
+        total = contar_filas_csv(cabecera["csv"])
+    else:
+        fuente = iter(cabecera.get("urls", []))
+        total = len(cabecera.get("urls", []))
+    return {
+        "folder": cabecera["folder"],
+        "format": cabecera["format"],
+        "workers": cabecera.get("workers", 1),
+        "pipeline": cabecera.get("pipeline", False),
+        "store": cabecera.get("store"),
+        "staging": cabecera.get("staging"),
+        "tags": cabecera.get("tags", True),
+        "normalize": cabecera.get("normalize", False),
+        "urls": chain(fuente, encoladas),
+        "total": total + len(encoladas),
+        "terminadas": terminadas,
+    }
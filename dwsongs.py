@@ -0,0 +1,482 @@
+# Punto de entrada por línea de comandos (sin interfaz gráfica)
+#
+#   python -m dwsongs --csv lista.csv --format mp3 --out CARPETA --jobs 4
+#
+#   python -m dwsongs --queue lote.sqlite3 --csv lista.csv            (solo encola)
+#   python -m dwsongs --queue lote.sqlite3 --out CARPETA --jobs 4     (un nodo más del lote)
+#   python -m dwsongs --watch --csv lista.csv --out CARPETA           (sincroniza las filas nuevas)
+#   python -m dwsongs --serve                                         (servidor local de trabajos)
+#   python -m dwsongs --submit --urls URL --out CARPETA               (envía el trabajo a --serve)
+#
+# Escribe en stdout una línea JSON por evento ("preflight", "start", "progress", "summary").
+# No importa tkinter ni customtkinter, y cada modo importa solo lo suyo al empezar: yt_dlp
+# solo se carga al descargar y --submit solo carga el cliente HTTP de servidor_trabajos.
+
+import time
+
+_INICIO = time.perf_counter()
+
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+
+
+_lock_salida = threading.Lock()
+
+
+def emitir(evento, **datos):
+    linea = json.dumps({"event": evento, **datos}, ensure_ascii=False)
+    with _lock_salida:
+        print(linea, flush=True)
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(prog="dwsongs", description="Descarga por lotes sin interfaz gráfica.")
+    fuente = parser.add_mutually_exclusive_group()
+    fuente.add_argument("--csv", help="CSV con una URL en la primera columna")
+    fuente.add_argument("--urls", nargs="+", metavar="URL", help="URLs a descargar")
+    fuente.add_argument("--resume", nargs="?", const="last", metavar="DIARIO",
+                        help="reanudar el último trabajo (o el del diario indicado)")
+    parser.add_argument("--format", choices=["mp3", "mp4"], default="mp3", type=str.lower)
+    parser.add_argument("--out", help="carpeta de descarga (obligatoria salvo con --resume o si --queue "
+                                      "solo encola)")
+    parser.add_argument("--jobs", type=int, help="descargas en paralelo (por defecto las de descargas.py; "
+                                                "con --submit, las del servidor)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="separar la descarga de la conversión con ffmpeg")
+    parser.add_argument("--segments", type=int, default=0, metavar="N",
+                        help="descargar cada archivo HTTP con N conexiones a la vez (implica --pipeline)")
+    parser.add_argument("--cookies", metavar="COOKIES_TXT",
+                        help="cookies.txt (formato Netscape) compartido por todas las descargas")
+    parser.add_argument("--metrics", metavar="JSONL",
+                        help="escribir las métricas de cada elemento (tiempos por etapa, bytes...)")
+    parser.add_argument("--prometheus", metavar="ARCHIVO",
+                        help="escribir al acabar el resumen de métricas en formato Prometheus")
+    parser.add_argument("--store", nargs="?", const="", metavar="CARPETA",
+                        help="guardar cada canción una vez en un almacén compartido y enlazarla "
+                             "en las carpetas (por defecto en la carpeta de datos)")
+    parser.add_argument("--staging", nargs="?", const="", metavar="CARPETA",
+                        help="descargar y convertir en un disco local (por defecto la carpeta temporal) "
+                             "y llevar a --out solo los archivos terminados")
+    parser.add_argument("--staging-budget", type=int, metavar="MB",
+                        help="máximo de MB intermedios en vuelo con --staging")
+    # Los valores de orquestador.EJECUTOR_HILOS y EJECUTOR_PROCESOS (no se importa para crear el parser)
+    parser.add_argument("--executor", choices=["threads", "processes"], default="threads",
+                        help="dónde corren las descargas: hilos de este proceso o varios procesos")
+    parser.add_argument("--processes", type=int, default=None, metavar="N",
+                        help="procesos con --executor processes (por defecto el número de CPU, "
+                             "sin pasar de --jobs)")
+    parser.add_argument("--count-rows", action="store_true",
+                        help="contar antes las filas del CSV para conocer el total")
+    parser.add_argument("--no-tags", action="store_true",
+                        help="no escribir etiquetas ni portada en los archivos")
+    parser.add_argument("--normalize", action="store_true",
+                        help="normalizar la sonoridad del audio (EBU R128, -14 LUFS)")
+    parser.add_argument("--recycle-after", type=int, metavar="N",
+                        help="cada hilo recrea su YoutubeDL tras N elementos (trabajos largos)")
+    parser.add_argument("--max-rss", type=int, metavar="MB",
+                        help="recrear los YoutubeDL de todos los hilos si la memoria del proceso pasa de MB")
+    parser.add_argument("--check", action="store_true",
+                        help="solo comprobar los enlaces, sin red ni descargas: lista los inválidos "
+                             "y termina con código 1 si hay alguno")
+    parser.add_argument("--no-preflight", action="store_true",
+                        help="no comprobar todos los enlaces antes de empezar a descargar")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="no consultar ni actualizar el historial de la carpeta")
+    parser.add_argument("--queue", metavar="COLA",
+                        help="cola compartida (archivo SQLite o URL de otro backend): --csv/--urls "
+                             "encolan en ella y con --out este proceso descarga lo que reserve")
+    parser.add_argument("--status", action="store_true", help="con --queue, mostrar el progreso del lote y salir")
+    parser.add_argument("--lease", type=float, metavar="SEGUNDOS",
+                        help="duración de las reservas de --queue sin latidos (por defecto "
+                             "cola_trabajos.DURACION_RESERVA)")
+    parser.add_argument("--watch", action="store_true",
+                        help="quedarse vigilando --csv y --watch-playlist y procesar solo lo nuevo")
+    parser.add_argument("--watch-playlist", action="append", default=[], metavar="URL",
+                        help="lista o canal cuyos vídeos nuevos descarga --watch (se puede repetir)")
+    parser.add_argument("--watch-interval", type=float, metavar="SEGUNDOS",
+                        help="cada cuánto comprueba --watch si el CSV ha crecido")
+    parser.add_argument("--playlist-interval", type=float, metavar="SEGUNDOS",
+                        help="cada cuánto revisa --watch cada lista")
+    parser.add_argument("--serve", action="store_true",
+                        help="quedarse en marcha, con yt-dlp ya cargado, descargando los trabajos que "
+                             "envíen --submit u otros programas por HTTP en 127.0.0.1")
+    parser.add_argument("--port", type=int, default=0,
+                        help="puerto de --serve (por defecto uno libre, anunciado en la carpeta de datos)")
+    parser.add_argument("--submit", action="store_true",
+                        help="enviar --csv/--urls al servidor de --serve en vez de descargar en este proceso")
+    return parser
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    if args.serve:
+        if args.csv or args.urls or args.resume or args.queue or args.watch or args.submit:
+            parser.error("--serve no admite fuentes: los trabajos se envían con --submit")
+        return servir(args)
+    if not (args.csv or args.urls or args.resume or args.queue or args.watch):
+        parser.error("hace falta --csv, --urls, --resume o --queue")
+    if args.segments > 1:
+        args.pipeline = True
+    if args.cookies and not os.path.isfile(args.cookies):
+        print(f"No existe el archivo de cookies: {args.cookies}", file=sys.stderr)
+        return 2
+    if args.submit:
+        if args.resume or args.queue or args.watch or args.check:
+            parser.error("--submit solo admite --csv o --urls")
+        if not args.out:
+            parser.error("falta --out")
+        return enviar_a_servidor(args)
+    if args.jobs is None and not args.check:
+        from descargas import DESCARGAS_PARALELAS_POR_DEFECTO
+        args.jobs = DESCARGAS_PARALELAS_POR_DEFECTO
+    if args.watch:
+        if args.urls or args.resume or args.check or args.status:
+            parser.error("--watch solo admite --csv y --watch-playlist como fuentes")
+        if not (args.csv or args.watch_playlist):
+            parser.error("--watch necesita --csv o --watch-playlist")
+        if not (args.out or args.queue):
+            parser.error("--watch necesita --out o --queue")
+        return sincronizar(args)
+    if args.queue:
+        if args.resume or args.check:
+            parser.error("--queue no admite --resume ni --check")
+        return usar_cola(args)
+    if args.resume:
+        if args.check:
+            parser.error("--check necesita --csv o --urls")
+        return reanudar(args)
+    if args.csv and not os.path.isfile(args.csv):
+        print(f"No existe el CSV: {args.csv}", file=sys.stderr)
+        return 2
+    if args.check:
+        from enlaces import INVALIDO
+        return 1 if comprobar(args)[INVALIDO] else 0
+    if not args.out:
+        parser.error("falta --out")
+    from ingesta import iterar_urls_de_csv, contar_filas_csv
+    from diario import DiarioTrabajo
+
+    if not os.path.isdir(args.out):
+        print(f"La carpeta no existe: {args.out}", file=sys.stderr)
+        return 2
+    total = None
+    if args.csv:
+        if args.count_rows:
+            total = contar_filas_csv(args.csv)
+        urls = iterar_urls_de_csv(args.csv)
+    else:
+        urls = args.urls
+        total = len(urls)
+    if not args.no_preflight:
+        resumen = comprobar(args)
+        if total is None:
+            total = resumen["rows"]
+
+    diario = DiarioTrabajo.nuevo(args.out, args.format.upper(), args.jobs, args.pipeline,
+                                 csv=args.csv, urls=args.urls, store=args.store, staging=args.staging,
+                                 tags=not args.no_tags, normalize=args.normalize)
+    return ejecutar(args, urls, total, args.out, args.format.upper(), args.jobs, args.pipeline, diario)
+
+
+def comprobar(args):
+    """Pasada previa sin red sobre los enlaces de --csv o --urls.
+
+    Emite un evento "invalid" por cada enlace no válido y el resumen "preflight".
+    """
+    from ingesta import iterar_urls_de_csv, prevalidar
+
+    urls = iterar_urls_de_csv(args.csv) if args.csv else args.urls
+    resumen = prevalidar(urls, on_invalido=lambda fila, url, motivo: emitir(
+        "invalid", row=fila, url=url, reason=motivo))
+    emitir("preflight", **resumen)
+    return resumen
+
+
+def reanudar(args):
+    from diario import DiarioTrabajo, ultimo_diario, preparar_reanudacion
+
+    ruta = ultimo_diario() if args.resume == "last" else args.resume
+    if not ruta or not os.path.isfile(ruta):
+        print("No hay ningún trabajo que reanudar", file=sys.stderr)
+        return 2
+    try:
+        trabajo = preparar_reanudacion(ruta)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo leer el diario {ruta}: {e}", file=sys.stderr)
+        return 2
+    # Las opciones del trabajo original, salvo las que se vuelvan a pedir en la línea de órdenes
+    if args.store is None:
+        args.store = trabajo["store"]
+    if args.staging is None:
+        args.staging = trabajo["staging"]
+    args.no_tags = args.no_tags or not trabajo["tags"]
+    args.normalize = args.normalize or trabajo["normalize"]
+    return ejecutar(args, trabajo["urls"], trabajo["total"], trabajo["folder"], trabajo["format"],
+                    trabajo["workers"], trabajo["pipeline"] or args.pipeline, DiarioTrabajo(ruta),
+                    trabajo["terminadas"])
+
+
+def usar_cola(args):
+    """--queue: encola --csv/--urls, muestra el progreso (--status) o trabaja como un nodo (--out)."""
+    import csv
+    import sqlite3
+    from ingesta import iterar_urls_de_csv
+    from cola_trabajos import abrir_cola
+
+    if args.csv and not os.path.isfile(args.csv):
+        print(f"No existe el CSV: {args.csv}", file=sys.stderr)
+        return 2
+    if args.out and not os.path.isdir(args.out):
+        print(f"La carpeta no existe: {args.out}", file=sys.stderr)
+        return 2
+    try:
+        cola = abrir_cola(args.queue)
+    except (ValueError, sqlite3.Error) as e:
+        print(f"No se pudo abrir la cola {args.queue}: {e}", file=sys.stderr)
+        return 2
+    try:
+        if args.csv or args.urls:
+            cola.fijar_parametros(format=args.format.upper())
+            try:
+                resumen = cola.encolar(iterar_urls_de_csv(args.csv) if args.csv else args.urls)
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                print(f"No se pudo leer el CSV: {e}", file=sys.stderr)
+                return 2
+            emitir("enqueued", **resumen)
+        if args.status or not args.out:
+            emitir("queue", **cola.progreso())
+            return 0
+        return trabajar_cola(args, cola)
+    finally:
+        cola.cerrar()
+
+
+def trabajar_cola(args, cola):
+    """Descarga en args.out lo que este proceso reserve de la cola hasta que el lote termine."""
+    from descargas import descargar_lote
+    from cola_trabajos import TrabajadorCola, DURACION_RESERVA
+
+    formato = cola.parametros().get("format") or args.format.upper()
+    cancelado = threading.Event()
+    trabajador = TrabajadorCola(cola, bloque=args.jobs, duracion=args.lease or DURACION_RESERVA,
+                                cancelado=cancelado)
+    emitir("start", queue=args.queue, worker=trabajador.id, format=formato,
+           startup_ms=round((time.perf_counter() - _INICIO) * 1000, 1))
+    opciones = crear_opciones(args)
+    ultimo = {"t": 0.0}
+
+    def progreso(completadas, total):
+        emitir("progress", completed=completadas, total=total)
+        # El progreso del lote entero, como mucho una vez por segundo
+        if time.monotonic() - ultimo["t"] >= 1.0:
+            ultimo["t"] = time.monotonic()
+            emitir("queue", **cola.progreso())
+
+    anterior = signal.signal(signal.SIGINT, lambda *_: cancelado.set())
+    try:
+        resultado = descargar_lote(trabajador.urls(), args.out, formato, args.jobs, opciones,
+                                   on_progreso=progreso, on_terminada=trabajador.terminada,
+                                   cancelado=cancelado)
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+        trabajador.cerrar()
+        cerrar_recursos(opciones)
+    emitir("summary", elapsed_s=round(time.perf_counter() - _INICIO, 3), queue=cola.progreso(), **resultado)
+    if resultado["cancelled"]:
+        return 130
+    return 1 if resultado["error"] else 0
+
+
+def sincronizar(args):
+    """--watch: en cada ciclo descarga (o encola en --queue) solo las filas y vídeos nuevos."""
+    from sincronizacion import Sincronizador, vigilar, ruta_estado, INTERVALO_CSV, INTERVALO_LISTAS
+
+    if args.out and not os.path.isdir(args.out):
+        print(f"La carpeta no existe: {args.out}", file=sys.stderr)
+        return 2
+    destino = args.queue or os.path.abspath(args.out)
+    sincronizador = Sincronizador(ruta_estado(destino), args.csv, args.watch_playlist,
+                                  args.playlist_interval or INTERVALO_LISTAS)
+    detener = threading.Event()
+    cola = None
+    opciones = None
+    if args.queue:
+        from cola_trabajos import abrir_cola
+
+        cola = abrir_cola(args.queue)
+        cola.fijar_parametros(format=args.format.upper())
+
+        def procesar(urls):
+            resumen = cola.encolar(urls)
+            # En la cola ya no se pierden: la sincronización las da por terminadas
+            for url in urls:
+                sincronizador.terminada(url, "ok")
+            return resumen
+    else:
+        from descargas import descargar_lote
+
+        # Las listas vigiladas ya llegan expandidas por el Sincronizador
+        opciones = crear_opciones(args, expandir_listas=False)
+
+        def procesar(urls):
+            return descargar_lote(urls, args.out, args.format.upper(), args.jobs, opciones,
+                                  on_terminada=sincronizador.terminada, cancelado=detener)
+
+    def ciclo(resumen, resultado):
+        if cola is None:
+            resultado = {clave: resultado[clave] for clave in
+                         ("ok", "error", "invalid", "skipped", "duplicates", "cancelled")}
+        emitir("sync", **resumen, **resultado)
+
+    emitir("start", watch=True, csv=args.csv, playlists=args.watch_playlist, queue=args.queue,
+           startup_ms=round((time.perf_counter() - _INICIO) * 1000, 1))
+    # Ctrl+C termina la sincronización (y corta el ciclo en curso, que se retoma al volver)
+    anterior = signal.signal(signal.SIGINT, lambda *_: detener.set())
+    try:
+        vigilar(sincronizador, procesar, detener, args.watch_interval or INTERVALO_CSV, on_ciclo=ciclo,
+                on_error=lambda lista, e: print(f"No se pudo revisar la lista {lista}: {e}", file=sys.stderr))
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+        sincronizador.cerrar()
+        if cola is not None:
+            cola.cerrar()
+        if opciones is not None:
+            cerrar_recursos(opciones)
+    emitir("stopped", elapsed_s=round(time.perf_counter() - _INICIO, 3))
+    return 0
+
+
+def servir(args):
+    """--serve: deja el proceso precalentado aceptando trabajos hasta Ctrl+C."""
+    from servidor_trabajos import ServidorTrabajos, ruta_anuncio
+
+    servidor = ServidorTrabajos(args.port, workers=args.jobs, cookies=args.cookies)
+    detener = threading.Event()
+    anterior = signal.signal(signal.SIGINT, lambda *_: detener.set())
+    try:
+        try:
+            servidor.iniciar()
+        except OSError as e:
+            print(f"No se pudo iniciar el servidor en el puerto {args.port}: {e}", file=sys.stderr)
+            return 2
+        emitir("serving", url=servidor.url_base, announce=ruta_anuncio(), warmup_ms=servidor.precalentado_ms,
+               startup_ms=round((time.perf_counter() - _INICIO) * 1000, 1))
+        # Con espera acotada para que Ctrl+C también llegue en Windows
+        while not detener.wait(1.0):
+            pass
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+        servidor.detener()
+    emitir("stopped", elapsed_s=round(time.perf_counter() - _INICIO, 3))
+    return 0
+
+
+def enviar_a_servidor(args):
+    """--submit: envía el trabajo al servidor de --serve y escribe sus eventos como propios."""
+    from servidor_trabajos import ClienteTrabajos
+
+    if args.csv and not os.path.isfile(args.csv):
+        print(f"No existe el CSV: {args.csv}", file=sys.stderr)
+        return 2
+    cliente = ClienteTrabajos.local()
+    if cliente is None:
+        print("No hay ningún servidor en marcha (python -m dwsongs --serve)", file=sys.stderr)
+        return 2
+    try:
+        id = cliente.enviar(args.out, args.format, urls=args.urls, csv=args.csv, jobs=args.jobs,
+                            pipeline=args.pipeline, segments=args.segments, tags=not args.no_tags,
+                            normalize=args.normalize, archive=not args.no_archive)
+    except ValueError as e:
+        print(f"El servidor rechazó el trabajo: {e}", file=sys.stderr)
+        return 2
+    # Ctrl+C cancela el trabajo en el servidor; se siguen leyendo sus eventos hasta el resumen
+    anterior = signal.signal(signal.SIGINT, lambda *_: threading.Thread(
+        target=cliente.cancelar, args=(id,), daemon=True).start())
+    codigo = 1
+    try:
+        for datos in cliente.eventos(id):
+            evento = datos.pop("event")
+            emitir(evento, **datos)
+            if evento == "summary":
+                codigo = 130 if datos.get("cancelled") else (1 if datos.get("error") else 0)
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+    return codigo
+
+
+def crear_opciones(args, **cambios):
+    """OpcionesLote de los argumentos, con la MetricasLote, el AlmacenContenidos, el
+    EscritorSalidas y el ControlMemoria que piden; cerrar_recursos los cierra al acabar."""
+    from descargas import OpcionesLote
+    from metricas import MetricasLote
+    from almacen import AlmacenContenidos
+    from escritor import EscritorSalidas
+    from memoria import ControlMemoria
+
+    metricas = MetricasLote(args.metrics, args.prometheus)
+    almacen = AlmacenContenidos(args.store or None) if args.store is not None else None
+    escritor = None
+    if args.staging is not None:
+        escritor = EscritorSalidas(args.staging or None,
+                                   args.staging_budget << 20 if args.staging_budget else None)
+    opciones = OpcionesLote(
+        pipeline=args.pipeline, segmentos=args.segments, usar_historial=not args.no_archive,
+        etiquetar=not args.no_tags, normalizar=args.normalize, cookies=args.cookies, silencioso=True,
+        metricas=metricas, almacen=almacen, escritor=escritor,
+        memoria=ControlMemoria(args.recycle_after, args.max_rss << 20 if args.max_rss else None),
+    )
+    return opciones.copiar(**cambios)
+
+
+def cerrar_recursos(opciones):
+    opciones.metricas.cerrar()
+    if opciones.almacen is not None:
+        opciones.almacen.cerrar()
+
+
+def ejecutar(args, urls, total, carpeta, formato, workers, pipeline, diario, terminadas=None):
+    import csv
+    import asyncio
+    from orquestador import Orquestador, crear_ejecutor, EJECUTOR_PROCESOS
+
+    emitir("start", total=total, journal=diario.ruta,
+           startup_ms=round((time.perf_counter() - _INICIO) * 1000, 1))
+    opciones = crear_opciones(args, pipeline=pipeline, diario=diario, terminadas=terminadas)
+    lotes = 1
+    ejecutor = None
+    if args.executor == EJECUTOR_PROCESOS:
+        lotes = max(1, min(workers, args.processes or os.cpu_count() or 1))
+        ejecutor = crear_ejecutor(EJECUTOR_PROCESOS, lotes)
+    orquestador = Orquestador(
+        urls, carpeta, formato, workers=workers, opciones=opciones, ejecutor=ejecutor, lotes=lotes,
+        total=total, on_progreso=lambda completadas, total: emitir("progress", completed=completadas, total=total),
+    )
+    # Ctrl+C cancela: las descargas en curso se cortan y el diario permite reanudar
+    anterior = signal.signal(signal.SIGINT, lambda *_: orquestador.cancelar())
+    try:
+        resultado = asyncio.run(orquestador.ejecutar())
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        print(f"No se pudo leer el CSV: {e}", file=sys.stderr)
+        return 2
+    finally:
+        signal.signal(signal.SIGINT, anterior)
+        if ejecutor is not None:
+            ejecutor.shutdown()
+        diario.cerrar()
+        cerrar_recursos(opciones)
+    emitir("summary", elapsed_s=round(time.perf_counter() - _INICIO, 3), **resultado)
+    if resultado["cancelled"]:
+        return 130
+    return 1 if resultado["error"] else 0
+
+
+if __name__ == "__main__":
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    sys.exit(main())
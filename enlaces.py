@@ -0,0 +1,263 @@
+# Enlaces: validación y forma canónica sin red (extractor, id y tipo de cada URL)
+
+import re
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+
+# Tipo de cada enlace
+UNICO = "single"
+LISTA = "playlist"
+CANAL = "channel"
+INVALIDO = "invalid"
+
+# Motivos por los que un enlace no es válido
+VACIO = "empty"
+MAL_FORMADO = "malformed"
+ESQUEMA = "scheme"
+
+# "Extractor" de los enlaces que solo el genérico de yt-dlp intentaría descargar
+GENERICO = "url"
+
+# Los vídeos sueltos pasan antes que las listas y canales (que además hay que expandir)
+PRIORIDAD_VIDEO = 0
+PRIORIDAD_LISTA = 1
+
+# Hosts cuyos extractores candidatos se recuerdan (se vacía al llenarse)
+MAX_HOSTS = 65536
+
+EnlaceCanonico = namedtuple("EnlaceCanonico", "extractor id tipo motivo")
+
+# Las formas de YouTube (la mayoría de las listas) se resuelven sin recorrer los extractores.
+# Un vídeo con &list= es ese vídeo: las descargas usan noplaylist
+_YOUTUBE = r"(?:https?://)?(?:[\w-]+\.)?youtube(?:-nocookie)?\.com/"
+_YOUTUBE_VIDEO = re.compile(
+    r"(?:" + _YOUTUBE + r"(?:watch\?(?:[^#]*&)?v=|shorts/|embed/(?!live_stream|videoseries)|live/|v/|e/)"
+    r"|(?:https?://)?youtu\.be/)([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])",
+    re.IGNORECASE,
+)
+_YOUTUBE_LISTA = re.compile(_YOUTUBE + r"(?:playlist|watch)\?(?:[^#]*&)?list=([0-9A-Za-z_-]+)", re.IGNORECASE)
+_YOUTUBE_CANAL = re.compile(
+    _YOUTUBE + r"(?:(@[\w.-]+)|channel/(UC[0-9A-Za-z_-]{22})|c/([^/?#]+)|user/([^/?#]+))"
+    r"(?:/(videos|shorts|streams|playlists|releases|podcasts))?/?(?:[?#]|$)",
+    re.IGNORECASE,
+)
+
+_HOST_VALIDO = re.compile(r"[\w-]+(?:\.[\w-]+)*\.?|[0-9a-f:.]+")
+
+# Sufijos de los extractores de yt-dlp que devuelven colecciones de vídeos
+_SUFIJOS_CANAL = ("Tab", "Channel", "User")
+_SUFIJOS_LISTA = ("Playlist", "Album", "Series", "Season", "Show", "Set", "Collection", "List")
+
+# Limpieza de _VALID_URL antes de sacar sus palabras: clases de caracteres, escapes de letra
+# (\d, \w...), nombres de grupo y opciones en línea
+_CLASE_O_ESCAPE = re.compile(r"\\.|\[\^?\]?(?:\\.|[^\]])*\]")
+_SINTAXIS = re.compile(r"\\[A-Za-z]|\(\?P<\w+>|\(\?P=\w+\)|\(\?[aiLmsux-]+\)")
+_COMENTARIO = re.compile(r"(?<!\\)#[^\n]*")
+_PALABRA = re.compile(r"[A-Za-z0-9-]+(\??)")
+
+
+def _tipo(extractor):
+    if extractor.endswith(_SUFIJOS_CANAL):
+        return CANAL
+    if extractor.endswith(_SUFIJOS_LISTA):
+        return LISTA
+    return UNICO
+
+
+def _limpiar(fuente):
+    fuente = fuente.replace("\\/", "/")
+    fuente = _CLASE_O_ESCAPE.sub(lambda m: m.group() if m.group()[0] == "\\" else " ", fuente)
+    if re.match(r"\(\?[aiLmsu]*x", fuente):
+        fuente = _COMENTARIO.sub(" ", fuente)
+    return _SINTAXIS.sub(" ", fuente)
+
+
+def _palabras(fuente):
+    palabras = set()
+    for m in _PALABRA.finditer(_limpiar(fuente)):
+        palabra = m.group().rstrip("?").strip("-").lower()
+        palabras.update(p for p in [palabra, *palabra.split("-")] if p)
+        if m.group(1) and len(palabra) > 1:
+            # "tiktokv?": la última letra es opcional
+            palabras.add(palabra[:-1])
+    return palabras
+
+
+def _host_comodin(fuente):
+    """Indica si el host de la expresión no contiene ningún nombre fijo (p. ej. https?://[^/]+/)."""
+    fuente = _limpiar(fuente)
+    inicio = fuente.find("//")
+    fin = fuente.find("/", inicio + 2)
+    host = fuente[inicio + 2:fin if fin >= 0 else None]
+    return not any(p.lower() != "www" for p in re.findall(r"[A-Za-z0-9-]{2,}", host))
+
+
+class IndiceExtractores:
+    """Los extractores de yt-dlp indexados por las palabras de sus _VALID_URL.
+
+    Recorrer los ~1700 extractores con cada URL cuesta alrededor de un milisegundo. Aquí cada
+    host se cruza una vez con el índice (sus etiquetas, los trozos de 3 o más letras de ellas
+    y sus dos primeras letras) y solo se prueban, en el orden de yt-dlp, los extractores que
+    nombran ese host más los pocos cuyo host es un comodín. Las palabras presentes en muchos
+    extractores ("www", "video", "tv"...) no sirven para filtrar y se ignoran si el host
+    tiene otras.
+    """
+
+    def __init__(self):
+        from yt_dlp.extractor import gen_extractor_classes
+
+        self._extractores = [ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic"]
+        self._por_palabra = {}
+        self._siempre = []
+        self._youtube = []
+        for i, ie in enumerate(self._extractores):
+            if ie.ie_key().startswith("Youtube"):
+                # Algunos escriben el dominio como [yY][oO][uU]...
+                self._youtube.append(i)
+            fuentes = getattr(ie, "_VALID_URL", None)
+            if isinstance(fuentes, str):
+                fuentes = [fuentes]
+            if not isinstance(fuentes, (list, tuple)):
+                if ie.suitable.__func__.__qualname__ != "LazyLoadExtractor.suitable":
+                    self._siempre.append(i)
+                continue
+            # Las seudo-URL ("nrk:123", "ytsearch:...") no son enlaces válidos aquí
+            fuentes = [f for f in fuentes if "//" in f.replace("\\/", "/")]
+            if not fuentes:
+                continue
+            if any(_host_comodin(f) for f in fuentes):
+                self._siempre.append(i)
+                continue
+            for fuente in fuentes:
+                for palabra in _palabras(fuente):
+                    self._por_palabra.setdefault(palabra, []).append(i)
+        limite = len(self._extractores) // 50
+        self._comunes = {p for p, indices in self._por_palabra.items() if len(indices) > limite}
+        self._candidatos = {}
+
+    def candidatos(self, host):
+        candidatos = self._candidatos.get(host)
+        if candidatos is not None:
+            return candidatos
+        etiquetas = host.rstrip(".").split(".")[:-1]
+        etiquetas = [e for e in etiquetas if e not in self._comunes] or etiquetas
+        indices = set(self._siempre)
+        if "youtu" in host:
+            indices.update(self._youtube)
+        for etiqueta in etiquetas:
+            indices.update(self._por_palabra.get(etiqueta, ()))
+            # "wetv", "vkvideo": prefijos de dos letras ("we", "vk") seguidos de otra palabra
+            indices.update(self._por_palabra.get(etiqueta[:2], ()))
+            for a in range(len(etiqueta) - 2):
+                for b in range(a + 3, len(etiqueta) + 1):
+                    if etiqueta[a:b] not in self._comunes:
+                        indices.update(self._por_palabra.get(etiqueta[a:b], ()))
+        candidatos = tuple(self._extractores[i] for i in sorted(indices))
+        if len(self._candidatos) >= MAX_HOSTS:
+            self._candidatos.clear()
+        self._candidatos[host] = candidatos
+        return candidatos
+
+    def identificar(self, url, host):
+        """(extractor, id) del primer extractor que acepta la URL; (None, None) si ninguno."""
+        for ie in self.candidatos(host):
+            if ie.suitable(url):
+                return ie.ie_key(), ie.get_temp_id(url)
+        return None, None
+
+
+_indice = None
+_lock_indice = threading.Lock()
+
+
+def indice_extractores():
+    """El IndiceExtractores del proceso (se construye con la primera URL que lo necesita)."""
+    global _indice
+    if _indice is None:
+        with _lock_indice:
+            if _indice is None:
+                _indice = IndiceExtractores()
+    return _indice
+
+
+def _invalido(motivo):
+    return EnlaceCanonico(None, None, INVALIDO, motivo)
+
+
+def canonizar(url):
+    """Clasifica una URL sin hacer peticiones de red.
+
+    Devuelve un EnlaceCanonico: el extractor de yt-dlp que la descargaría y el ID que saca de
+    ella (None si no sabe sacarlo), su tipo (single, playlist o channel) o, si no es un
+    enlace válido, tipo invalid y el motivo (empty, malformed o scheme). Los enlaces http(s)
+    que ningún extractor propio reconoce quedan con extractor "url" (el genérico de yt-dlp).
+    """
+    url = (url or "").strip()
+    if not url:
+        return _invalido(VACIO)
+    m = _YOUTUBE_VIDEO.match(url)
+    if m:
+        return EnlaceCanonico("Youtube", m.group(1), UNICO, None)
+    m = _YOUTUBE_LISTA.match(url)
+    if m:
+        return EnlaceCanonico("YoutubeTab", m.group(1), LISTA, None)
+    m = _YOUTUBE_CANAL.match(url)
+    if m:
+        nombre = next(g for g in m.groups()[:4] if g)
+        return EnlaceCanonico("YoutubeTab", f"{nombre}/{m.group(5)}" if m.group(5) else nombre, CANAL, None)
+
+    esquema, separador, _ = url.partition("://")
+    if separador and esquema.lower() not in ("http", "https"):
+        return _invalido(ESQUEMA)
+    try:
+        partes = urlsplit(url if separador else "https://" + url)
+        host = partes.hostname
+        partes.port
+    except ValueError:
+        return _invalido(MAL_FORMADO)
+    if not host or not _HOST_VALIDO.fullmatch(host):
+        return _invalido(MAL_FORMADO)
+    extractor, video_id = indice_extractores().identificar(url, host)
+    if extractor is None:
+        # Sin esquema solo valen los enlaces que algún extractor entiende así ("youtube.com/...")
+        if not separador:
+            return _invalido(ESQUEMA)
+        return EnlaceCanonico(GENERICO, None, UNICO, None)
+    return EnlaceCanonico(extractor, video_id, _tipo(extractor), None)
+
+
+def prioridad(enlace):
+    """Prioridad en una cola del EnlaceCanonico de una URL: vídeos antes que listas."""
+    return PRIORIDAD_LISTA if enlace.tipo in (LISTA, CANAL) else PRIORIDAD_VIDEO
+
+
+def clave_de(enlace, url):
+    """Clave (extractor, id) del historial y el almacén; ("url", url) si no hay ID."""
+    if enlace.id is not None:
+        return (enlace.extractor, enlace.id)
+    return (GENERICO, url.strip())
+
+
+def clave_canonica(url, enlace=None):
+    """Forma canónica de una URL para detectar duplicados.
+
+    Todas las variantes de un mismo vídeo (youtu.be, watch?v=, shorts/, m., &list=, &t=...)
+    se reducen a "extractor:id"; si no hay ID, la URL se normaliza quitando el esquema, el
+    "www." y la barra final.
+    """
+    if enlace is None:
+        enlace = canonizar(url)
+    if enlace.id is not None:
+        return f"{enlace.extractor}:{enlace.id}"
+    url = url.strip()
+    try:
+        partes = urlsplit(url if "://" in url else "https://" + url)
+    except ValueError:
+        return url
+    host = partes.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    ruta = partes.path.rstrip("/")
+    return f"{host}{ruta}?{partes.query}" if partes.query else f"{host}{ruta}"
@@ -0,0 +1,231 @@
+# Escritura de las salidas: preparación en un disco local rápido y control del espacio libre
+
+import os
+import errno
+import shutil
+import tempfile
+import threading
+import time
+
+from historial import hash_archivo
+
+
+# Máximo de bytes intermedios (descargas y trabajo de ffmpeg) en vuelo a la vez
+PRESUPUESTO_POR_DEFECTO = 4 << 30
+# Espacio que se deja siempre libre en cada disco
+MARGEN_LIBRE = 512 << 20
+# Tamaño supuesto de un formato que no anuncia el suyo
+TAMANO_DESCONOCIDO = 64 << 20
+BLOQUE_COPIA = 4 << 20
+
+
+class EspacioInsuficiente(OSError):
+    """No cabe el trabajo en disco ni aunque terminen los que están en vuelo."""
+
+    def __init__(self, carpeta, necesarios, libres):
+        super().__init__(errno.ENOSPC, f"espacio insuficiente en {carpeta}: "
+                                       f"hacen falta {necesarios >> 20} MB y quedan {libres >> 20} MB")
+
+
+def carpeta_temporal_por_defecto():
+    return os.path.join(tempfile.gettempdir(), "dwsongs-staging")
+
+
+def estimar_bytes(info):
+    """Bytes que ocuparán los streams elegidos de un info-dict (ya con formatos resueltos)."""
+    total = 0
+    for entrada in info.get("entries") or [info]:
+        if not entrada:
+            continue
+        for fmt in entrada.get("requested_formats") or [entrada]:
+            tamano = fmt.get("filesize") or fmt.get("filesize_approx")
+            if not tamano and fmt.get("tbr") and entrada.get("duration"):
+                tamano = fmt["tbr"] * 1000 / 8 * entrada["duration"]
+            total += int(tamano or TAMANO_DESCONOCIDO)
+    return total
+
+
+def preasignar(archivo, tamano):
+    """Reserva tamano bytes para archivo (abierto en escritura) antes de escribirlo.
+
+    Con posix_fallocate el disco lleno se detecta al empezar y no a mitad de la descarga; donde
+    no existe (Windows, algunos sistemas de archivos) se deja un archivo disperso del tamaño final.
+    Pensado para la carpeta temporal: en discos sin fallocate nativo glibc lo emula escribiendo
+    ceros.
+    """
+    try:
+        os.posix_fallocate(archivo.fileno(), 0, tamano)
+        return
+    except AttributeError:
+        pass
+    except OSError as e:
+        if e.errno == errno.ENOSPC:
+            raise
+    archivo.truncate(tamano)
+
+
+def _mismo_disco(a, b):
+    try:
+        return os.stat(a).st_dev == os.stat(b).st_dev
+    except OSError:
+        return False
+
+
+def _mismo_contenido(a, b):
+    try:
+        return os.path.getsize(a) == os.path.getsize(b) and hash_archivo(a) == hash_archivo(b)
+    except OSError:
+        return False
+
+
+def _renombrar_sin_pisar(origen, destino):
+    """Renombra origen a destino sin sobrescribir nada; devuelve el nombre que ha quedado.
+
+    Si destino ya existe con otro contenido se prueba "nombre (1).ext", "nombre (2).ext"...
+    como hace yt-dlp; si tiene el mismo, se descarta origen. El enlace duro crea el nombre
+    solo si está libre (sin carreras entre hilos ni procesos) y luego se borra origen; donde
+    no hay enlaces duros (FAT32, algunos discos de red) se comprueba y se renombra.
+    """
+    raiz, ext = os.path.splitext(destino)
+    n = 0
+    while True:
+        if n:
+            destino = f"{raiz} ({n}){ext}"
+        n += 1
+        try:
+            os.link(origen, destino)
+        except FileExistsError:
+            pass
+        except OSError:
+            if not os.path.lexists(destino):
+                try:
+                    # En Windows rename ya falla si el nombre se ha ocupado entretanto
+                    os.rename(origen, destino)
+                    return destino
+                except FileExistsError:
+                    pass
+        else:
+            os.remove(origen)
+            return destino
+        if _mismo_contenido(origen, destino):
+            os.remove(origen)
+            return destino
+
+
+class EscritorSalidas:
+    """Prepara los trabajos en carpeta_temporal y solo lleva a su destino los archivos terminados.
+
+    Las descargas y las conversiones de ffmpeg se hacen en una carpeta local (por defecto la
+    temporal del sistema) y cada archivo final se mueve a la carpeta de destino con un
+    renombrado o una sola copia secuencial, de modo que una unidad USB o de red solo recibe
+    escrituras grandes y en orden.
+
+    admitir() deja entrar un trabajo cuando caben sus bytes intermedios en el presupuesto y
+    en el disco temporal (además de su salida en el de destino): si no caben porque hay otros
+    en vuelo, espera a que terminen; si no cabrían nunca, lanza EspacioInsuficiente.
+    """
+
+    def __init__(self, carpeta_temporal=None, presupuesto=None, margen=MARGEN_LIBRE):
+        self.carpeta_temporal = carpeta_temporal or carpeta_temporal_por_defecto()
+        os.makedirs(self.carpeta_temporal, exist_ok=True)
+        self.margen = margen
+        libres = shutil.disk_usage(self.carpeta_temporal).free
+        self.presupuesto = presupuesto or max(TAMANO_DESCONOCIDO, min(PRESUPUESTO_POR_DEFECTO, libres // 2))
+        self._condicion = threading.Condition()
+        self._reservas = {}
+        self._siguiente = 0
+        self._en_vuelo = 0
+        self._estadisticas = {"admitidos": 0, "esperas": 0, "espera_s": 0.0, "pico_en_vuelo": 0,
+                              "movidos": 0, "copiados": 0, "bytes_movidos": 0}
+
+    def _cabe(self, intermedios, final, carpeta):
+        """None si el trabajo cabe ya, False si hay que esperar o la excepción si no cabrá."""
+        temporal = shutil.disk_usage(self.carpeta_temporal).free
+        necesarios = self._en_vuelo + intermedios + self.margen
+        if temporal < necesarios:
+            if not self._en_vuelo:
+                return EspacioInsuficiente(self.carpeta_temporal, necesarios, temporal)
+            return False
+        if carpeta is not None and not _mismo_disco(carpeta, self.carpeta_temporal):
+            destino = shutil.disk_usage(carpeta).free
+            if destino < final + self.margen:
+                return EspacioInsuficiente(carpeta, final + self.margen, destino)
+        if self._en_vuelo and self._en_vuelo + intermedios > self.presupuesto:
+            return False
+        return None
+
+    def admitir(self, intermedios, final=0, carpeta=None):
+        """Reserva intermedios bytes en el disco temporal; devuelve el id de la reserva."""
+        inicio = time.monotonic()
+        esperado = False
+        with self._condicion:
+            while True:
+                resultado = self._cabe(intermedios, final, carpeta)
+                if resultado is None:
+                    break
+                if isinstance(resultado, EspacioInsuficiente):
+                    raise resultado
+                esperado = True
+                # Sin timeout se perdería el espacio liberado por otros programas
+                self._condicion.wait(timeout=1.0)
+            self._siguiente += 1
+            self._reservas[self._siguiente] = intermedios
+            self._en_vuelo += intermedios
+            estadisticas = self._estadisticas
+            estadisticas["admitidos"] += 1
+            estadisticas["pico_en_vuelo"] = max(estadisticas["pico_en_vuelo"], self._en_vuelo)
+            if esperado:
+                estadisticas["esperas"] += 1
+                estadisticas["espera_s"] = round(estadisticas["espera_s"] + time.monotonic() - inicio, 3)
+            return self._siguiente
+
+    def liberar(self, reserva):
+        with self._condicion:
+            self._en_vuelo -= self._reservas.pop(reserva, 0)
+            self._condicion.notify_all()
+
+    def mover(self, ruta, carpeta):
+        """Lleva un archivo terminado a carpeta y devuelve su ruta final.
+
+        En el mismo disco es un renombrado; si no, una copia secuencial a un .part que se
+        renombra al acabar, así en el destino nunca hay archivos a medias. Un archivo distinto
+        con el mismo nombre no se sobrescribe: el nuevo se queda como "nombre (n).ext".
+        """
+        destino = os.path.join(carpeta, os.path.basename(ruta))
+        tamano = os.path.getsize(ruta)
+        if _mismo_disco(ruta, carpeta):
+            destino = _renombrar_sin_pisar(ruta, destino)
+            clave = "movidos"
+        else:
+            parcial = f"{destino}.{os.getpid()}-{threading.get_ident()}.part"
+            try:
+                with open(ruta, "rb") as origen, open(parcial, "wb") as salida:
+                    shutil.copyfileobj(origen, salida, BLOQUE_COPIA)
+                shutil.copystat(ruta, parcial)
+                destino = _renombrar_sin_pisar(parcial, destino)
+            except BaseException:
+                try:
+                    os.remove(parcial)
+                except OSError:
+                    pass
+                raise
+            os.remove(ruta)
+            clave = "copiados"
+        self.limpiar(ruta)
+        with self._condicion:
+            self._estadisticas[clave] += 1
+            self._estadisticas["bytes_movidos"] += tamano
+        return destino
+
+    def limpiar(self, ruta):
+        """Borra la subcarpeta de trabajo de ruta si ha quedado vacía."""
+        carpeta = os.path.dirname(os.path.abspath(ruta))
+        if carpeta != os.path.abspath(self.carpeta_temporal):
+            try:
+                os.rmdir(carpeta)
+            except OSError:
+                pass
+
+    def estadisticas(self):
+        with self._condicion:
+            return {**self._estadisticas, "presupuesto": self.presupuesto, "en_vuelo": self._en_vuelo}
@@ -0,0 +1,84 @@
+# Expansión de listas de reproducción y canales en vídeos individuales
+
+import json
+import time
+import sqlite3
+import threading
+
+from rutas import ruta_datos
+from enlaces import canonizar, LISTA, CANAL
+
+
+# Tiempo que se reutiliza la expansión de una lista antes de volver a pedirla
+TTL_EXPANSION = 6 * 3600
+# Profundidad máxima al expandir listas que contienen otras listas (pestañas de un canal)
+MAX_PROFUNDIDAD = 2
+
+
+def es_lista(url: str) -> bool:
+    """Indica (sin red) si la URL es una lista de reproducción o un canal."""
+    return canonizar(url).tipo in (LISTA, CANAL)
+
+
+def url_de_entrada(entrada):
+    return entrada.get("webpage_url") or entrada.get("url")
+
+
+def expandir_lista(ydl, url, profundidad=0):
+    """Devuelve las URLs de los vídeos de una lista usando extracción plana.
+
+    ydl debe haberse creado con extract_flat="in_playlist" para que no se extraiga cada vídeo.
+    """
+    info = ydl.extract_info(url, download=False, process=False)
+    if info.get("_type") not in ("playlist", "multi_video"):
+        return [url]
+    urls = []
+    for entrada in info.get("entries") or []:
+        if not entrada:
+            continue
+        url_entrada = url_de_entrada(entrada)
+        if not url_entrada:
+            continue
+        # Pasada MAX_PROFUNDIDAD una lista se queda como URL (también si se contiene a sí misma)
+        if profundidad < MAX_PROFUNDIDAD and (
+            entrada.get("_type") == "playlist" or (entrada.get("_type") == "url" and es_lista(url_entrada))
+        ):
+            urls.extend(expandir_lista(ydl, url_entrada, profundidad + 1))
+        else:
+            urls.append(url_entrada)
+    return urls
+
+
+class CacheExpansiones:
+    """Caché en disco (SQLite) de las URLs de vídeo de cada lista, con caducidad."""
+
+    def __init__(self, ruta=None, ttl=TTL_EXPANSION):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta or ruta_datos("expansiones.sqlite3"), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS expansiones ("
+            " url TEXT PRIMARY KEY, creada REAL NOT NULL, entradas TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def obtener(self, url):
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT creada, entradas FROM expansiones WHERE url = ?", (url,)
+            ).fetchone()
+        if fila is None or time.time() - fila[0] > self.ttl:
+            return None
+        return json.loads(fila[1])
+
+    def guardar(self, url, entradas):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO expansiones VALUES (?, ?, ?)",
+                (url, time.time(), json.dumps(entradas)),
+            )
+            self._conn.commit()
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,96 @@
+# Historial persistente de descargas por carpeta y formato
+
+import os
+import sqlite3
+import hashlib
+import threading
+
+from enlaces import canonizar, clave_de
+
+
+NOMBRE_HISTORIAL = ".dwsongs-historial.sqlite3"
+
+
+def identificar_url(url: str):
+    """Devuelve la clave (extractor, id) de una URL sin hacer peticiones de red.
+
+    Si ningún extractor sabe sacar el ID de la URL se usa ("url", url) como clave.
+    """
+    return clave_de(canonizar(url), url)
+
+
+def hash_archivo(ruta, bloque=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, "rb") as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            h.update(datos)
+    return h.hexdigest()
+
+
+class HistorialDescargas:
+    """Registro en disco de lo ya descargado en una carpeta, indexado por formato y (extractor, id).
+
+    Las entradas se cargan en memoria al abrir, así que comprobar una URL es una búsqueda en un
+    dict más un os.stat; si el archivo ya no existe o cambió de tamaño la entrada se descarta.
+    """
+
+    def __init__(self, carpeta):
+        self.ruta = os.path.join(carpeta, NOMBRE_HISTORIAL)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.ruta, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS descargas ("
+            " formato TEXT NOT NULL, extractor TEXT NOT NULL, video_id TEXT NOT NULL,"
+            " ruta TEXT NOT NULL, tamano INTEGER NOT NULL, hash TEXT NOT NULL,"
+            " PRIMARY KEY (formato, extractor, video_id))"
+        )
+        self._conn.commit()
+        self._entradas = {
+            (formato, extractor, video_id): (ruta, tamano)
+            for formato, extractor, video_id, ruta, tamano in self._conn.execute(
+                "SELECT formato, extractor, video_id, ruta, tamano FROM descargas"
+            )
+        }
+
+    def contiene(self, formato, clave) -> bool:
+        """Indica si la clave ya está descargada en este formato y su archivo sigue intacto."""
+        entrada = self._entradas.get((formato, *clave))
+        if entrada is None:
+            return False
+        ruta, tamano = entrada
+        try:
+            if os.stat(ruta).st_size == tamano:
+                return True
+        except OSError:
+            pass
+        self.olvidar(formato, clave)
+        return False
+
+    def registrar(self, formato, clave, ruta, digest=None):
+        """Apunta el archivo de la clave; digest evita recalcular el hash si ya se conoce."""
+        ruta = os.path.abspath(ruta)
+        tamano = os.path.getsize(ruta)
+        digest = digest or hash_archivo(ruta)
+        with self._lock:
+            self._entradas[(formato, *clave)] = (ruta, tamano)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descargas VALUES (?, ?, ?, ?, ?, ?)",
+                (formato, clave[0], clave[1], ruta, tamano, digest),
+            )
+            self._conn.commit()
+
+    def olvidar(self, formato, clave):
+        with self._lock:
+            self._entradas.pop((formato, *clave), None)
+            self._conn.execute(
+                "DELETE FROM descargas WHERE formato = ? AND extractor = ? AND video_id = ?",
+                (formato, clave[0], clave[1]),
+            )
+            self._conn.commit()
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
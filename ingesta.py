@@ -0,0 +1,142 @@
+# Lectura incremental de enlaces (CSV o texto pegado) con deduplicación al vuelo
+
+import csv
+import time
+import hashlib
+from array import array
+
+from enlaces import canonizar, clave_canonica, UNICO, LISTA, CANAL, INVALIDO, GENERICO
+
+
+def iterar_urls_de_csv(ruta_csv):
+    """Genera la primera columna de cada fila no vacía del CSV sin cargar el archivo entero."""
+    with open(ruta_csv, "r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if row:
+                yield row[0]
+
+
+def iterar_urls_de_texto(texto):
+    for linea in texto.splitlines():
+        if linea.strip():
+            yield linea
+
+
+def contar_filas_csv(ruta_csv, bloque=1 << 20):
+    """Cuenta rápidamente las líneas no vacías del CSV (para mostrar el porcentaje)."""
+    filas = 0
+    resto = b""
+    with open(ruta_csv, "rb") as f:
+        while True:
+            datos = f.read(bloque)
+            if not datos:
+                break
+            lineas = (resto + datos).split(b"\n")
+            resto = lineas.pop()
+            filas += sum(1 for linea in lineas if linea.strip())
+    if resto.strip():
+        filas += 1
+    return filas
+
+
+class ConjuntoHashes:
+    """Conjunto de huellas de 64 bits en una tabla de direccionamiento abierto sobre array("Q").
+
+    Ocupa ~16 bytes por elemento, frente a los cientos de un set de cadenas, a cambio de una
+    probabilidad despreciable de falsos positivos (colisiones de 64 bits).
+    """
+
+    def __init__(self, capacidad=1024):
+        tamano = 1
+        while tamano < capacidad * 2:
+            tamano <<= 1
+        self._tabla = array("Q", bytes(8 * tamano))
+        self._mascara = tamano - 1
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, clave: str) -> bool:
+        h = self._huella(clave)
+        tabla, mascara = self._tabla, self._mascara
+        i = h & mascara
+        while tabla[i]:
+            if tabla[i] == h:
+                return True
+            i = (i + 1) & mascara
+        return False
+
+    @staticmethod
+    def _huella(clave: str) -> int:
+        h = int.from_bytes(hashlib.blake2b(clave.encode("utf-8"), digest_size=8).digest(), "little")
+        return h or 1  # 0 marca las casillas libres
+
+    def agregar(self, clave: str) -> bool:
+        """Añade la clave; devuelve False si ya estaba."""
+        h = self._huella(clave)
+        tabla, mascara = self._tabla, self._mascara
+        i = h & mascara
+        while tabla[i]:
+            if tabla[i] == h:
+                return False
+            i = (i + 1) & mascara
+        tabla[i] = h
+        self._n += 1
+        if self._n * 2 > len(tabla):
+            self._ampliar()
+        return True
+
+    def _ampliar(self):
+        anterior = self._tabla
+        self._tabla = array("Q", bytes(16 * len(anterior)))
+        self._mascara = len(self._tabla) - 1
+        for h in anterior:
+            if h:
+                i = h & self._mascara
+                while self._tabla[i]:
+                    i = (i + 1) & self._mascara
+                self._tabla[i] = h
+
+
+def sin_duplicados(urls, on_duplicado=None, vistas=None):
+    """Filtra al vuelo las URLs repetidas (según clave_canonica) de un iterable.
+
+    vistas permite compartir el ConjuntoHashes con otras fuentes de URLs.
+    """
+    if vistas is None:
+        vistas = ConjuntoHashes()
+    for url in urls:
+        if not url or not url.strip() or vistas.agregar(clave_canonica(url)):
+            yield url
+        elif on_duplicado:
+            on_duplicado(url)
+
+
+def prevalidar(urls, on_invalido=None):
+    """Pasada previa, sin red, sobre todos los enlaces antes de descargar nada.
+
+    Canoniza cada URL (enlaces.canonizar) y cuenta cuántas son vídeos, listas, canales,
+    inválidas o repetidas; on_invalido(fila, url, motivo) recibe cada inválida con su posición
+    (desde 1). Devuelve el resumen con el tiempo empleado y las URLs por segundo.
+    """
+    inicio = time.perf_counter()
+    resumen = {"rows": 0, UNICO: 0, LISTA: 0, CANAL: 0, INVALIDO: 0, "duplicates": 0, "generic": 0}
+    vistas = ConjuntoHashes()
+    for fila, url in enumerate(urls, 1):
+        resumen["rows"] = fila
+        enlace = canonizar(url)
+        if enlace.tipo == INVALIDO:
+            resumen[INVALIDO] += 1
+            if on_invalido:
+                on_invalido(fila, url, enlace.motivo)
+        elif not vistas.agregar(clave_canonica(url, enlace)):
+            resumen["duplicates"] += 1
+        else:
+            resumen[enlace.tipo] += 1
+            if enlace.extractor == GENERICO:
+                resumen["generic"] += 1
+    transcurrido = time.perf_counter() - inicio
+    resumen["elapsed_s"] = round(transcurrido, 3)
+    resumen["urls_s"] = round(resumen["rows"] / transcurrido) if transcurrido > 0 else 0
+    return resumen
@@ -1,20 +1,27 @@
+import time
+
+_INICIO = time.perf_counter()
+
 import os
-import csv
+import json
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from yt_dlp import YoutubeDL
 import sys
 import subprocess
 import webbrowser
 import threading
-import customtkinter as ctk
+import multiprocessing
 
 from translations import set_language, t, get_language_choices, code_from_choice, get_current_choice
-
-
-# Rutas base (compatibles con PyInstaller)
-BASE_PATH = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
-FFMPEG_PATH = os.path.join(BASE_PATH, 'ffmpeg', 'bin')
+from descargas import DESCARGAS_PARALELAS_POR_DEFECTO, MAX_DESCARGAS_PARALELAS, OpcionesLote, precalentar
+from orquestador import Orquestador
+from ingesta import iterar_urls_de_csv, iterar_urls_de_texto, contar_filas_csv
+from diario import DiarioTrabajo, ultimo_diario, preparar_reanudacion
+from progreso import EstadoProgreso, FPS_PROGRESO, formatear_bytes, formatear_eta
+from metricas import MetricasLote
+from almacen import AlmacenContenidos
+from escritor import EscritorSalidas
+from rutas import ruta_datos
 
 
 def seleccionar_csv():
@@ -28,13 +35,6 @@ def seleccionar_carpeta_descarga():
     return filedialog.askdirectory(title=t("select_folder"))
 
 
-def es_url_valida(url: str) -> bool:
-    if not url:
-        return False
-    url = url.strip()
-    return url.startswith(("http://", "https://", "youtube.com", "youtu.be"))
-
-
 def abrir_carpeta(path: str):
     if not path or not os.path.isdir(path):
         return
@@ -49,45 +49,40 @@ def abrir_carpeta(path: str):
         pass
 
 
-def construir_opciones_ydl(formato: str, carpeta_salida: str):
-    outtmpl = os.path.join(carpeta_salida, "%(title)s")
-    if formato == "MP3":
-        return {
-            "format": "bestaudio/best",
-            "ffmpeg_location": FFMPEG_PATH,
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
-            "outtmpl": outtmpl,
-            "windowsfilenames": True,
-            "restrictfilenames": True,
-        }
-    else:  # MP4
-        return {
-            "format": "bestvideo*+bestaudio/best",
-            "ffmpeg_location": FFMPEG_PATH,
-            "merge_output_format": "mp4",
-            "outtmpl": outtmpl,
-            "windowsfilenames": True,
-            "restrictfilenames": True,
-        }
-
-
-def leer_urls_de_csv(ruta_csv):
-    urls = []
+def registrar_arranque(root):
+    """Anota lo que ha tardado la ventana en estar lista (desde el inicio del proceso).
+
+    Cada arranque añade una línea a arranque.jsonl de la carpeta de datos. Con
+    --medir-arranque además se escribe en stdout y se cierra la aplicación (benchmark.py).
+    """
+    datos = {
+        "t": round(time.time(), 3),
+        "startup_ms": round((time.perf_counter() - _INICIO) * 1000, 1),
+        "frozen": getattr(sys, "frozen", False),
+    }
     try:
-        with open(ruta_csv, "r", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if row:
-                    urls.append(row[0])
-    except Exception as e:
-        messagebox.showerror("Error", t("csv_read_error").format(error=str(e)))
-    return urls
+        with open(ruta_datos("arranque.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(datos) + "\n")
+    except OSError:
+        pass
+    if "--medir-arranque" in sys.argv:
+        print(json.dumps(datos), flush=True)
+        root.destroy()
+
+
+def precalentar_en_segundo_plano():
+    """Con la ventana ya lista, carga yt-dlp en un hilo: la primera descarga empieza al momento."""
+    if "--medir-arranque" in sys.argv:
+        return
+
+    def cargar():
+        try:
+            precalentar()
+        except Exception:
+            # Sin precalentar, la primera descarga carga lo mismo al empezar
+            pass
+
+    threading.Thread(target=cargar, name="dwsongs-precalentar", daemon=True).start()
 
 
 def main():
@@ -99,30 +94,18 @@ def main():
         if getattr(sys, 'frozen', False):
             return os.path.join(sys._MEIPASS, relative_path)
         return os.path.join(os.path.abspath("."), relative_path)
-    # Intentar cargar icono desde la carpeta assets (prevenir estiramiento si no es cuadrado)
+    # Icono: PNG ya cuadrado por preparar_build.py (así no se estira ni hace falta Pillow)
     try:
+        png_path = resource_path("assets/dwSongs.png")
         icon_path = resource_path("assets/dwSongs.ico")
-        if os.path.exists(icon_path):
-            try:
-                # Preferible: usar Pillow para crear una imagen cuadrada y aplicar con iconphoto
-                from PIL import Image, ImageTk
-                img = Image.open(icon_path)
-                img = img.convert("RGBA")
-                w, h = img.size
-                size = max(w, h)
-                # Crear fondo transparente cuadrado y centrar la imagen original
-                new = Image.new("RGBA", (size, size), (0, 0, 0, 0))
-                new.paste(img, ((size - w) // 2, (size - h) // 2), img)
-                tk_img = ImageTk.PhotoImage(new)
-                root.iconphoto(False, tk_img)
-                # Mantener referencia para que no lo recoja el GC
-                root._icon_img = tk_img
-            except Exception:
-                # Fallback sencillo: usar .ico nativo en Windows
-                try:
-                    root.iconbitmap(icon_path)
-                except Exception:
-                    pass
+        if os.path.exists(png_path):
+            tk_img = tk.PhotoImage(file=png_path)
+            root.iconphoto(False, tk_img)
+            # Mantener referencia para que no lo recoja el GC
+            root._icon_img = tk_img
+        elif os.path.exists(icon_path):
+            # Fallback sencillo: usar .ico nativo en Windows
+            root.iconbitmap(icon_path)
     except Exception:
         pass
     root.minsize(520, 560)
@@ -252,6 +235,29 @@ def main():
     rb_mp4 = tk.Radiobutton(frame_formato, text=t("mp4"), variable=formato_var, value="MP4")
     rb_mp4.pack(side="left", padx=8, pady=5)
 
+    # Descargas en paralelo
+    paralelas_var = tk.IntVar(value=DESCARGAS_PARALELAS_POR_DEFECTO)
+    spin_paralelas = tk.Spinbox(frame_formato, from_=1, to=MAX_DESCARGAS_PARALELAS, width=3,
+                                textvariable=paralelas_var, state="readonly")
+    spin_paralelas.pack(side="right", padx=8, pady=5)
+    label_paralelas = tk.Label(frame_formato, text=t("parallel_downloads"))
+    label_paralelas.pack(side="right", pady=5)
+
+    # Modo pipeline: descarga y ffmpeg en etapas separadas
+    pipeline_var = tk.BooleanVar(value=False)
+    chk_pipeline = tk.Checkbutton(root, text=t("pipeline_mode"), variable=pipeline_var)
+    chk_pipeline.pack(anchor="w", padx=12)
+
+    # Biblioteca compartida: cada canción se guarda una vez y se enlaza en cada carpeta
+    biblioteca_var = tk.BooleanVar(value=False)
+    chk_biblioteca = tk.Checkbutton(root, text=t("shared_store"), variable=biblioteca_var)
+    chk_biblioteca.pack(anchor="w", padx=12)
+
+    # Preparar en disco local: útil si la carpeta de destino es una unidad USB o de red
+    preparar_var = tk.BooleanVar(value=False)
+    chk_preparar = tk.Checkbutton(root, text=t("local_staging"), variable=preparar_var)
+    chk_preparar.pack(anchor="w", padx=12)
+
     # Barra de progreso (inicia vacía en modo determinado)
     progress_var = tk.IntVar(value=0)
     progress_bar = ttk.Progressbar(root, orient="horizontal", length=400, mode="determinate", 
@@ -262,6 +268,10 @@ def main():
     progress_label = tk.Label(root, text="", font=("Arial", 10), fg="#555555")
     progress_label.pack(pady=2)
 
+    # Estado de cada descarga en paralelo
+    workers_label = tk.Label(root, text="", font=("Arial", 9), fg="#777777", justify="left")
+    workers_label.pack(pady=2)
+
     # Enlace autor
     link1 = tk.Label(root, text=t("author_link"), fg="blue", cursor="hand2")
     link1.pack(pady=6)
@@ -274,49 +284,151 @@ def main():
 
     link1.bind("<Button-1>", _abrir_github)
 
+    # Orquestador del trabajo en curso, para los botones de pausa y cancelación
+    trabajo_actual = {"orquestador": None}
+
     # Funciones de descarga
-    def realizar_descarga(urls, carpeta, formato):
-        ok_count = 0
-        error_count = 0
-        invalid_count = 0
-
-        ydl_opts = construir_opciones_ydl(formato, carpeta)
-        
-        total_urls = len(urls)
+    def iniciar_descarga(urls, total_urls, carpeta, formato, workers, pipeline, diario, terminadas=None,
+                         store=None, staging=None, etiquetar=True, normalizar=False):
         # Mostrar progreso inicial 0/total - 0%
         progress_label.config(text=f"0 procesados de {total_urls} - 0%")
-        # Cambiar a modo indeterminado y comenzar animación
-        progress_bar["mode"] = "indeterminate"
-        progress_bar.start(10)
-
-        with YoutubeDL(ydl_opts) as ydl:
-            for i, raw in enumerate(urls, start=1):
-                url = (raw or "").strip()
-                if not es_url_valida(url):
-                    invalid_count += 1
-                else:
-                    try:
-                        ydl.download([url])
-                        ok_count += 1
-                    except Exception as e:
-                        print(f"Error al descargar {url}: {e}")
-                        error_count += 1
-                
-                # Actualizar label de progreso
-                completed = ok_count + error_count + invalid_count
-                percentage = int((completed / total_urls) * 100)
-                progress_label.config(text=f"{completed} procesados de {total_urls} - {percentage}%")
-                root.update_idletasks()
-
-        root.after(0, lambda: mostrar_resultado(ok_count, error_count, invalid_count, carpeta))
-
-    def mostrar_resultado(ok_count, error_count, invalid_count, carpeta):
+        progress_bar["mode"] = "determinate"
+        progress_var.set(0)
+
+        # La versión con ventana no tiene consola: las métricas y errores de cada elemento
+        # quedan en la carpeta de datos
+        metricas = MetricasLote.nueva(prometheus=True)
+        almacen = None
+        # store y staging como en la cabecera del diario: "" la carpeta por defecto, None sin ella
+        try:
+            almacen = AlmacenContenidos(store or None) if store is not None else None
+            escritor = EscritorSalidas(staging or None) if staging is not None else None
+        except OSError as e:
+            diario.cerrar()
+            metricas.cerrar()
+            if almacen is not None:
+                almacen.cerrar()
+            mostrar_error_lectura(str(e), "storage_error")
+            return
+
+        # Los hilos de descarga solo escriben en progreso; Tk se actualiza desde pintar_progreso
+        progreso = EstadoProgreso(total_urls)
+        opciones = OpcionesLote(pipeline=pipeline, etiquetar=etiquetar, normalizar=normalizar, diario=diario,
+                                terminadas=terminadas, progreso=progreso, metricas=metricas, almacen=almacen, escritor=escritor)
+        orquestador = Orquestador(urls, carpeta, formato, workers=workers, opciones=opciones,
+                                  total=total_urls, on_progreso=progreso.actualizar)
+
+        def al_terminar(orquestador):
+            diario.cerrar()
+            metricas.cerrar()
+            if almacen is not None:
+                almacen.cerrar()
+            if orquestador.error is not None:
+                # Error leyendo el CSV a mitad de la descarga
+                progreso.terminar(error=str(orquestador.error))
+            else:
+                progreso.terminar(orquestador.resultado)
+
+        trabajo_actual["orquestador"] = orquestador
+        orquestador.iniciar(al_terminar)
+        activar_controles_trabajo(True)
+        root.after(1000 // FPS_PROGRESO, lambda: pintar_progreso(progreso, carpeta))
+
+    def on_pausar():
+        orquestador = trabajo_actual["orquestador"]
+        if orquestador is None:
+            return
+        if orquestador.pausado:
+            orquestador.reanudar()
+        else:
+            orquestador.pausar()
+        btn_pausar.config(text=t("continue") if orquestador.pausado else t("pause"))
+
+    def on_cancelar():
+        orquestador = trabajo_actual["orquestador"]
+        if orquestador is not None:
+            orquestador.cancelar()
+            btn_cancelar.config(state="disabled")
+            btn_pausar.config(state="disabled")
+
+    def activar_controles_trabajo(activos):
+        if not activos:
+            trabajo_actual["orquestador"] = None
+        estado = "normal" if activos else "disabled"
+        btn_pausar.config(state=estado, text=t("pause"))
+        btn_cancelar.config(state=estado)
+
+    def pintar_progreso(progreso, carpeta):
+        estado = progreso.instantanea()
+        if estado["error"] is not None:
+            mostrar_error_lectura(estado["error"])
+            return
+        if estado["resultado"] is not None:
+            mostrar_resultado(estado["resultado"], carpeta)
+            return
+
+        completed, total = estado["completadas"], estado["total"]
+        if total:
+            percentage = min(100, int((completed / total) * 100))
+            progress_var.set(percentage)
+            texto = f"{completed} procesados de {total} - {percentage}%"
+        else:
+            texto = f"{completed} procesados"
+        orquestador = trabajo_actual["orquestador"]
+        if orquestador is not None and orquestador.pausado:
+            texto += "  ·  " + t("paused")
+        texto += "  ·  " + t("progress_speed").format(
+            speed=formatear_bytes(estado["bytes_s"]), eta=formatear_eta(estado["eta"]))
+        progress_label.config(text=texto)
+
+        lineas = []
+        for i, (nombre, worker) in enumerate(sorted(estado["workers"].items()), start=1):
+            if worker["estado"] == "downloading":
+                detalle = worker["titulo"][:40]
+                if worker["total"]:
+                    detalle += f" {int(worker['bytes'] * 100 / worker['total'])}%"
+            elif worker["estado"] == "converting":
+                detalle = t("worker_converting")
+            else:
+                detalle = t("worker_idle")
+            lineas.append(f"{i}. {detalle}")
+        if estado["codificando"]:
+            lineas.append(t("encodes_running").format(n=estado["codificando"]))
+        workers_label.config(text="\n".join(lineas))
+
+        root.after(1000 // FPS_PROGRESO, lambda: pintar_progreso(progreso, carpeta))
+
+    def mostrar_error_lectura(error, clave="csv_read_error"):
+        desbloquear_widgets()
+        activar_controles_trabajo(False)
+        progress_bar.stop()
+        progress_bar["mode"] = "determinate"
+        progress_var.set(0)
+        progress_label.config(text="")
+        workers_label.config(text="")
+        messagebox.showerror("Error", t(clave).format(error=error))
+
+    def mostrar_resultado(resultado, carpeta):
         desbloquear_widgets()
+        activar_controles_trabajo(False)
         # Detener animación, volver a modo determinado vacío y limpiar label
         progress_bar.stop()
         progress_bar["mode"] = "determinate"
         progress_var.set(0)
-        stats = t("download_stats").format(ok=ok_count, err=error_count, inv=invalid_count)
+        workers_label.config(text="")
+        stats = t("download_stats").format(ok=resultado["ok"], err=resultado["error"], inv=resultado["invalid"])
+        if resultado["skipped"]:
+            stats += "\n" + t("download_skipped").format(n=resultado["skipped"])
+        if resultado["duplicates"]:
+            stats += "\n" + t("download_duplicates").format(n=resultado["duplicates"])
+        if resultado["cancelled"]:
+            stats += "\n" + t("download_cancelled").format(n=resultado["cancelled"])
+        if resultado["almacen"] and resultado["almacen"]["enlazados"]:
+            stats += "\n" + t("store_stats").format(
+                n=resultado["almacen"]["enlazados"], saved=formatear_bytes(resultado["almacen"]["bytes_ahorrados"]))
+        if resultado["codificaciones_s"] is not None:
+            stats += "\n" + t("pipeline_stats").format(
+                dl=resultado["descargas_s"], enc=resultado["codificaciones_s"])
         msg = f"{t('download_finished')}\n\n{stats}\n\n{t('download_open_folder_question')}"
         abrir = messagebox.askyesno(t("download_finished"), msg)
         if abrir:
@@ -337,18 +449,57 @@ def main():
                 messagebox.showerror("Error", t("error_select_csv"))
                 desbloquear_widgets()
                 return
-            urls = leer_urls_de_csv(ruta_csv)
+            # Recuento rápido para el porcentaje; las filas se leen a medida que se descargan
+            try:
+                total_urls = contar_filas_csv(ruta_csv)
+            except Exception as e:
+                messagebox.showerror("Error", t("csv_read_error").format(error=str(e)))
+                desbloquear_widgets()
+                return
+            urls = iterar_urls_de_csv(ruta_csv)
         else:
             contenido = texto_urls.get("1.0", "end").strip()
-            urls = [line for line in contenido.splitlines() if line.strip()]
+            total_urls = sum(1 for line in contenido.splitlines() if line.strip())
+            urls = iterar_urls_de_texto(contenido)
 
-        if not urls:
+        if not total_urls:
             messagebox.showerror("Error", t("error_no_urls"))
             desbloquear_widgets()
             return
 
-        thread = threading.Thread(target=realizar_descarga, args=(urls, carpeta, formato_var.get()), daemon=True)
-        thread.start()
+        # Diario del trabajo para poder reanudarlo si la aplicación se cierra a medias
+        store = "" if biblioteca_var.get() else None
+        staging = "" if preparar_var.get() else None
+        diario = DiarioTrabajo.nuevo(
+            carpeta, formato_var.get(), paralelas_var.get(), pipeline_var.get(),
+            csv=ruta_csv if fuente_var.get() == "CSV" else None,
+            urls=None if fuente_var.get() == "CSV" else contenido.splitlines(),
+            store=store, staging=staging,
+        )
+        iniciar_descarga(urls, total_urls, carpeta, formato_var.get(), paralelas_var.get(),
+                         pipeline_var.get(), diario, store=store, staging=staging)
+
+    def on_reanudar():
+        ruta = ultimo_diario()
+        if not ruta:
+            messagebox.showinfo(t("resume"), t("no_job_to_resume"))
+            return
+        try:
+            trabajo = preparar_reanudacion(ruta)
+        except Exception as e:
+            messagebox.showerror("Error", t("resume_error").format(error=str(e)))
+            return
+        if not os.path.isdir(trabajo["folder"]):
+            messagebox.showerror("Error", t("error_select_folder"))
+            return
+        bloquear_widgets()
+        carpeta_var.set(trabajo["folder"])
+        formato_var.set(trabajo["format"])
+        biblioteca_var.set(trabajo["store"] is not None)
+        preparar_var.set(trabajo["staging"] is not None)
+        iniciar_descarga(trabajo["urls"], trabajo["total"], trabajo["folder"], trabajo["format"],
+                         trabajo["workers"], trabajo["pipeline"], DiarioTrabajo(ruta), trabajo["terminadas"],
+                         trabajo["store"], trabajo["staging"], trabajo["tags"], trabajo["normalize"])
 
     def reset_values():
         carpeta_var.set(t("no_folder"))
@@ -359,8 +510,13 @@ def main():
         progress_bar["mode"] = "determinate"
         progress_var.set(0)
         progress_label.config(text="")
+        workers_label.config(text="")
         fuente_var.set("CSV")
         formato_var.set("MP3")
+        paralelas_var.set(DESCARGAS_PARALELAS_POR_DEFECTO)
+        pipeline_var.set(False)
+        biblioteca_var.set(False)
+        preparar_var.set(False)
         progress_label.config(text="")
 
         actualizar_visibilidad_fuente()
@@ -375,7 +531,20 @@ def main():
     btn_reset = tk.Button(frame_botones, text=t("reset"), command=reset_values, width=15, bg="orange", fg="white")
     btn_reset.pack(side="left", padx=6)
 
-    widgets_a_bloquear = [btn_carpeta, btn_csv, rb_csv, rb_texto, rb_mp3, rb_mp4, texto_urls, btn_descargar, btn_reset]
+    btn_reanudar = tk.Button(frame_botones, text=t("resume"), command=on_reanudar, width=15)
+    btn_reanudar.pack(side="left", padx=6)
+
+    # Controles del trabajo en curso
+    frame_trabajo = tk.Frame(root)
+    frame_trabajo.pack(pady=2)
+
+    btn_pausar = tk.Button(frame_trabajo, text=t("pause"), command=on_pausar, width=15, state="disabled")
+    btn_pausar.pack(side="left", padx=6)
+
+    btn_cancelar = tk.Button(frame_trabajo, text=t("cancel"), command=on_cancelar, width=15, state="disabled")
+    btn_cancelar.pack(side="left", padx=6)
+
+    widgets_a_bloquear = [btn_carpeta, btn_csv, rb_csv, rb_texto, rb_mp3, rb_mp4, spin_paralelas, chk_pipeline, chk_biblioteca, chk_preparar, texto_urls, btn_descargar, btn_reset, btn_reanudar]
 
     notice_label = tk.Label(root, text=t("uses_notice"), fg="gray")
     notice_label.pack(pady=6)
@@ -408,8 +577,16 @@ def main():
         frame_formato.config(text=t("format_frame"))
         rb_mp3.config(text=t("mp3"))
         rb_mp4.config(text=t("mp4"))
+        label_paralelas.config(text=t("parallel_downloads"))
+        chk_pipeline.config(text=t("pipeline_mode"))
+        chk_biblioteca.config(text=t("shared_store"))
+        chk_preparar.config(text=t("local_staging"))
         btn_descargar.config(text=t("download"))
         btn_reset.config(text=t("reset"))
+        btn_reanudar.config(text=t("resume"))
+        orquestador = trabajo_actual["orquestador"]
+        btn_pausar.config(text=t("continue") if orquestador is not None and orquestador.pausado else t("pause"))
+        btn_cancelar.config(text=t("cancel"))
         link1.config(text=t("author_link"))
         notice_label.config(text=t("uses_notice"))
 
@@ -422,8 +599,12 @@ def main():
 
     lang_var.trace_add("write", on_lang_change)
 
+    root.after_idle(registrar_arranque, root)
+    root.after_idle(precalentar_en_segundo_plano)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    # Necesario para el pool de procesos de ffmpeg en el ejecutable de PyInstaller
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,152 @@
+# Memoria de los trabajos largos: medida de la memoria residente y reciclaje de los YoutubeDL
+
+import os
+import sys
+import time
+import threading
+import statistics
+from array import array
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Como mucho una generación de reciclaje por memoria cada tantos segundos: si la memoria no
+# baja al reciclar, no se recicla en cada elemento
+INTERVALO_GENERACION = 30.0
+# Muestras de memoria que se guardan; al llenarse se queda una de cada dos
+MAX_MUESTRAS = 4096
+
+
+def _memoria_windows():
+    import ctypes
+    from ctypes import wintypes
+
+    class Contadores(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    contadores = Contadores()
+    contadores.cb = ctypes.sizeof(contadores)
+    proceso = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(proceso, ctypes.byref(contadores), contadores.cb):
+        return None
+    return contadores
+
+
+def rss_actual():
+    """Memoria residente del proceso en bytes; None si el sistema no permite medirla."""
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+    if sys.platform == "win32":
+        try:
+            contadores = _memoria_windows()
+        except (OSError, AttributeError):
+            return None
+        return contadores.WorkingSetSize if contadores else None
+    return None
+
+
+def rss_pico():
+    """Pico de memoria residente del proceso en bytes; None si no se puede medir."""
+    if sys.platform == "win32":
+        try:
+            contadores = _memoria_windows()
+        except (OSError, AttributeError):
+            return None
+        return contadores.PeakWorkingSetSize if contadores else None
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def _mb(n):
+    return round(n / (1 << 20), 1) if n is not None else None
+
+
+class ControlMemoria:
+    """Decide cuándo recicla cada hilo su YoutubeDL y sigue la memoria residente del lote.
+
+    Un YoutubeDL acumula estado mientras vive (instancias de extractores, código del
+    reproductor, mensajes ya mostrados...), así que en trabajos de miles de elementos la
+    memoria no deja de crecer. Con reciclar_cada cada hilo cierra el suyo y crea otro tras
+    ese número de elementos; con max_rss (bytes), si la memoria residente lo supera se abre
+    una nueva generación y cada hilo recicla una vez al terminar su elemento actual.
+
+    terminado() lo llama cada hilo al acabar un elemento: muestrea la memoria y devuelve si
+    le toca reciclar. estadisticas() da la memoria inicial, el pico, la estable (mediana de
+    la última mitad de las muestras) y la final, en MB, y los reciclajes hechos.
+    """
+
+    def __init__(self, reciclar_cada=None, max_rss=None):
+        self.reciclar_cada = reciclar_cada or None
+        self.max_rss = max_rss or None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generacion = 0
+        self._ultima_generacion = time.monotonic()
+        self._reciclados = 0
+        self._elementos = 0
+        self._inicial = rss_actual()
+        self._pico = self._inicial
+        self._muestras = array("d")
+        self._paso = 1
+
+    def terminado(self):
+        """Cuenta un elemento del hilo actual; True si el hilo debe reciclar su YoutubeDL."""
+        rss = rss_actual()
+        with self._lock:
+            self._elementos += 1
+            if rss is not None:
+                self._pico = max(self._pico or 0, rss)
+                if self._elementos % self._paso == 0:
+                    self._muestras.append(rss)
+                    if len(self._muestras) >= MAX_MUESTRAS:
+                        self._muestras = self._muestras[::2]
+                        self._paso *= 2
+                if (self.max_rss and rss > self.max_rss
+                        and time.monotonic() - self._ultima_generacion >= INTERVALO_GENERACION):
+                    self._generacion += 1
+                    self._ultima_generacion = time.monotonic()
+            generacion = self._generacion
+        local = self._local
+        local.usados = getattr(local, "usados", 0) + 1
+        if getattr(local, "generacion", None) is None:
+            local.generacion = generacion
+        if (self.reciclar_cada and local.usados >= self.reciclar_cada) or local.generacion != generacion:
+            local.usados = 0
+            local.generacion = generacion
+            with self._lock:
+                self._reciclados += 1
+            return True
+        return False
+
+    def serie(self):
+        """Las muestras de memoria residente (bytes), en orden."""
+        with self._lock:
+            return list(self._muestras)
+
+    def estadisticas(self):
+        with self._lock:
+            muestras = list(self._muestras)
+            datos = {"elementos": self._elementos, "reciclados": self._reciclados,
+                     "reciclar_cada": self.reciclar_cada, "max_rss_mb": _mb(self.max_rss)}
+        pico = max(filter(None, (self._pico, rss_pico())), default=None)
+        datos.update({
+            "rss_inicial_mb": _mb(self._inicial),
+            "rss_pico_mb": _mb(pico),
+            "rss_estable_mb": _mb(statistics.median(muestras[len(muestras) // 2:])) if muestras else None,
+            "rss_final_mb": _mb(rss_actual()),
+        })
+        return datos
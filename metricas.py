@@ -0,0 +1,235 @@
+# Métricas por elemento: tiempo en cada etapa, bytes, reintentos y estado final
+
+import os
+import json
+import time
+import random
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+
+from rutas import DIR_DATOS
+
+
+# Etapas medidas de cada elemento
+EXTRACCION = "extract"
+DESCARGA = "download"
+COLA_FFMPEG = "queue"
+POSTPROCESO = "postprocess"
+ESCRITURA = "write"
+ETAPAS = (EXTRACCION, DESCARGA, COLA_FFMPEG, POSTPROCESO, ESCRITURA)
+
+# Muestras que se guardan por etapa para los percentiles; a partir de ahí se sustituyen al
+# azar (muestreo de reservorio) y la memoria no crece con la longitud del trabajo
+MAX_MUESTRAS = 65536
+
+
+def carpeta_metricas():
+    ruta = os.path.join(DIR_DATOS, "metricas")
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def percentil(valores, p):
+    """Percentil p (0-100) por rango más cercano de una secuencia ya ordenada."""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, -(-len(valores) * p // 100) - 1))
+    return valores[int(indice)]
+
+
+class MetricasLote:
+    """Instrumentación de un lote de descargas, segura entre hilos.
+
+    Cada elemento acumula segundos por etapa (extract, download, queue, postprocess, write),
+    bytes, reintentos y errores hasta que terminar() lo cierra con su estado: entonces se
+    escribe como una línea JSON en ruta_jsonl (si se indica), se descarta y entra en las
+    muestras con las que resumen() calcula p50/p95 por etapa (como mucho MAX_MUESTRAS por
+    etapa; el número, la suma y el máximo son siempre exactos). cerrar() escribe además, si
+    se pidió, el mismo resumen en el formato de texto de Prometheus en ruta_prometheus.
+
+    hook_descarga y hook_postproceso van en los hooks de YoutubeDL: atribuyen bytes y tiempo
+    de postproceso al elemento que empezar() asoció al hilo actual.
+    """
+
+    def __init__(self, ruta_jsonl=None, ruta_prometheus=None):
+        self.ruta_jsonl = ruta_jsonl
+        self.ruta_prometheus = ruta_prometheus
+        self._archivo = open(ruta_jsonl, "a", encoding="utf-8") if ruta_jsonl else None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._elementos = {}
+        self._muestras = {etapa: array("d") for etapa in ETAPAS + ("total",)}
+        self._conteos = Counter()
+        self._sumas = Counter()
+        self._maximos = {}
+        self._azar = random.Random(0)
+        self._estados = Counter()
+        self._bytes = 0
+        self._reintentos = 0
+
+    @classmethod
+    def nueva(cls, prometheus=False):
+        """Métricas en un archivo nuevo de carpeta_metricas() (para la interfaz gráfica)."""
+        base = os.path.join(carpeta_metricas(), time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}")
+        return cls(base + ".jsonl", base + ".prom" if prometheus else None)
+
+    def _elemento(self, url):
+        elemento = self._elementos.get(url)
+        if elemento is None:
+            elemento = self._elementos[url] = {"inicio": time.monotonic(), "etapas": {},
+                                               "bytes": 0, "reintentos": 0, "errores": []}
+        return elemento
+
+    def empezar(self, url):
+        """Asocia el hilo actual a url (los hooks de yt-dlp le atribuyen lo que midan)."""
+        self._local.url = url
+        self._local.inicio_pp = None
+        with self._lock:
+            self._elemento(url)
+
+    def sumar(self, url, etapa, segundos):
+        with self._lock:
+            etapas = self._elemento(url)["etapas"]
+            etapas[etapa] = etapas.get(etapa, 0.0) + segundos
+
+    def segundos(self, url, etapa):
+        with self._lock:
+            elemento = self._elementos.get(url)
+            return elemento["etapas"].get(etapa, 0.0) if elemento else 0.0
+
+    @contextmanager
+    def medir(self, url, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(url, etapa, time.perf_counter() - inicio)
+
+    def sumar_bytes(self, url, n):
+        with self._lock:
+            self._elemento(url)["bytes"] += n
+            self._bytes += n
+
+    def reintento(self, url, motivo, error):
+        with self._lock:
+            elemento = self._elemento(url)
+            elemento["reintentos"] += 1
+            elemento["errores"].append(f"{motivo}: {error}")
+            self._reintentos += 1
+
+    def hook_descarga(self, d):
+        """Para "progress_hooks": suma los bytes de cada archivo terminado."""
+        url = getattr(self._local, "url", None)
+        if url is not None and d.get("status") == "finished":
+            self.sumar_bytes(url, d.get("total_bytes") or d.get("downloaded_bytes") or 0)
+
+    def hook_postproceso(self, d):
+        """Para "postprocessor_hooks": mide lo que tardan los postprocesadores de yt-dlp."""
+        url = getattr(self._local, "url", None)
+        if url is None:
+            return
+        if d.get("status") == "started":
+            self._local.inicio_pp = time.perf_counter()
+        elif d.get("status") == "finished" and getattr(self._local, "inicio_pp", None) is not None:
+            self.sumar(url, POSTPROCESO, time.perf_counter() - self._local.inicio_pp)
+            self._local.inicio_pp = None
+
+    def terminar(self, url, estado, error=None):
+        """Cierra el elemento con su estado final y lo escribe."""
+        with self._lock:
+            elemento = self._elementos.pop(url, None)
+            if elemento is None:
+                return
+            total = time.monotonic() - elemento["inicio"]
+            self._estados[estado] += 1
+            for etapa, segundos in elemento["etapas"].items():
+                self._muestrear(etapa, segundos)
+            self._muestrear("total", total)
+            if self._archivo is None:
+                return
+            registro = {
+                "url": url, "status": estado, "t": round(time.time(), 3), "total_s": round(total, 4),
+                "stages": {etapa: round(s, 4) for etapa, s in elemento["etapas"].items()},
+                "bytes": elemento["bytes"], "retries": elemento["reintentos"],
+            }
+            if error is not None or elemento["errores"]:
+                registro["errors"] = elemento["errores"] + ([str(error)] if error is not None else [])
+            self._archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            self._archivo.flush()
+
+    def abiertos(self):
+        """Elementos empezados que aún no se han cerrado con terminar()."""
+        with self._lock:
+            return len(self._elementos)
+
+    def _muestrear(self, etapa, segundos):
+        self._conteos[etapa] += 1
+        self._sumas[etapa] += segundos
+        self._maximos[etapa] = max(self._maximos.get(etapa, 0.0), segundos)
+        muestras = self._muestras[etapa]
+        if len(muestras) < MAX_MUESTRAS:
+            muestras.append(segundos)
+        else:
+            i = self._azar.randrange(self._conteos[etapa])
+            if i < MAX_MUESTRAS:
+                muestras[i] = segundos
+
+    def resumen(self):
+        """p50/p95/máximo y total (segundos) de cada etapa, más estados, bytes y reintentos."""
+        with self._lock:
+            muestras = {etapa: sorted(valores) for etapa, valores in self._muestras.items() if valores}
+            conteos = dict(self._conteos)
+            sumas = dict(self._sumas)
+            maximos = dict(self._maximos)
+            resumen = {
+                "status": dict(self._estados),
+                "bytes": self._bytes,
+                "retries": self._reintentos,
+                "stages": {},
+            }
+        for etapa, valores in muestras.items():
+            resumen["stages"][etapa] = {
+                "n": conteos[etapa],
+                "p50": round(percentil(valores, 50), 4),
+                "p95": round(percentil(valores, 95), 4),
+                "max": round(maximos[etapa], 4),
+                "sum": round(sumas[etapa], 3),
+            }
+        return resumen
+
+    def prometheus(self):
+        """El resumen en el formato de texto de Prometheus (p. ej. para el textfile collector)."""
+        resumen = self.resumen()
+        lineas = [
+            "# HELP dwsongs_stage_seconds Seconds spent per item in each stage.",
+            "# TYPE dwsongs_stage_seconds summary",
+        ]
+        for etapa, datos in resumen["stages"].items():
+            for q, clave in (("0.5", "p50"), ("0.95", "p95")):
+                lineas.append(f'dwsongs_stage_seconds{{stage="{etapa}",quantile="{q}"}} {datos[clave]}')
+            lineas.append(f'dwsongs_stage_seconds_sum{{stage="{etapa}"}} {datos["sum"]}')
+            lineas.append(f'dwsongs_stage_seconds_count{{stage="{etapa}"}} {datos["n"]}')
+        lineas += ["# HELP dwsongs_items_total Items finished by status.", "# TYPE dwsongs_items_total counter"]
+        for estado, n in resumen["status"].items():
+            lineas.append(f'dwsongs_items_total{{status="{estado}"}} {n}')
+        lineas += [
+            "# HELP dwsongs_downloaded_bytes_total Bytes downloaded.",
+            "# TYPE dwsongs_downloaded_bytes_total counter",
+            f"dwsongs_downloaded_bytes_total {resumen['bytes']}",
+            "# HELP dwsongs_retries_total Retries scheduled.", "# TYPE dwsongs_retries_total counter",
+            f"dwsongs_retries_total {resumen['retries']}",
+        ]
+        return "\n".join(lineas) + "\n"
+
+    def cerrar(self):
+        if self.ruta_prometheus:
+            temporal = self.ruta_prometheus + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                f.write(self.prometheus())
+            os.replace(temporal, self.ruta_prometheus)
+        if self._archivo is not None:
+            with self._lock:
+                self._archivo.close()
+                self._archivo = None
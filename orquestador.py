@@ -0,0 +1,385 @@
+# Orquestador asyncio de un trabajo: cola con prioridad, pausa, cancelación y ejecutor intercambiable
+
+import queue
+import signal
+import importlib
+import asyncio
+import threading
+import multiprocessing
+from functools import partial
+from multiprocessing.managers import SyncManager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from descargas import descargar_lote, OpcionesLote
+from enlaces import canonizar, clave_canonica, prioridad, PRIORIDAD_VIDEO
+from ingesta import ConjuntoHashes
+
+
+# Detrás de cualquier prioridad de enlaces.prioridad: marca el final de la fuente
+_PRIORIDAD_FIN = 99
+
+# URLs leídas por adelantado de la fuente: la prioridad ordena dentro de esta ventana
+MAX_LEIDAS = 10000
+BLOQUE_LECTURA = 256
+
+EJECUTOR_HILOS = "threads"
+EJECUTOR_PROCESOS = "processes"
+
+# Contadores que se suman entre los lotes de varios procesos
+CONTADORES = ("ok", "error", "invalid", "skipped", "duplicates", "cancelled", "retries",
+              "cache_hits", "cache_misses")
+
+
+def _ignorar_interrupcion():
+    # Ctrl+C llega a todo el grupo de procesos: solo el principal lo atiende (cancelando)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def crear_ejecutor(tipo=EJECUTOR_HILOS, lotes=1):
+    """Ejecutor para Orquestador: un hilo o un proceso por lote."""
+    if tipo == EJECUTOR_PROCESOS:
+        return ProcessPoolExecutor(max_workers=lotes, initializer=_ignorar_interrupcion)
+    return ThreadPoolExecutor(max_workers=lotes, thread_name_prefix="dwsongs-lote")
+
+
+def _leer_bloque(fuente, vistas, n):
+    """Lee hasta n URLs de la fuente (en un hilo: puede ser un CSV) con su prioridad.
+
+    Devuelve (pares (prioridad, url), duplicados, agotada).
+    """
+    leidas = []
+    duplicados = 0
+    for url in fuente:
+        if url and url.strip():
+            enlace = canonizar(url)
+            if not vistas.agregar(clave_canonica(url, enlace)):
+                duplicados += 1
+                continue
+            leidas.append((prioridad(enlace), url))
+        else:
+            # Filas vacías: el lote las cuenta como inválidas
+            leidas.append((PRIORIDAD_VIDEO, url))
+        if len(leidas) >= n:
+            return leidas, duplicados, False
+    return leidas, duplicados, True
+
+
+def _lote_en_proceso(indice, puente, eventos, cancelado, activo, carpeta, formato, workers, total, opciones):
+    """Un descargar_lote en un proceso del pool, con los recursos recreados a partir de sus rutas."""
+    from diario import DiarioTrabajo
+    from metricas import MetricasLote
+    from almacen import AlmacenContenidos
+    from escritor import EscritorSalidas
+    from memoria import ControlMemoria
+
+    recursos = {}
+    if opciones.diario:
+        recursos["diario"] = DiarioTrabajo(opciones.diario, reanudado=False)
+    if opciones.metricas:
+        recursos["metricas"] = MetricasLote(opciones.metricas)
+    if opciones.almacen:
+        recursos["almacen"] = AlmacenContenidos(opciones.almacen)
+    cerrar = list(recursos.values())
+    if opciones.escritor:
+        recursos["escritor"] = EscritorSalidas(*opciones.escritor)
+    if opciones.memoria:
+        recursos["memoria"] = ControlMemoria(*opciones.memoria)
+    try:
+        return descargar_lote(iter(puente.get, None), carpeta, formato, workers, opciones.copiar(**recursos),
+                              total=total, cancelado=cancelado, activo=activo,
+                              on_progreso=lambda completadas, total: eventos.put((indice, completadas, total)))
+    finally:
+        for recurso in cerrar:
+            recurso.cerrar()
+
+
+class Orquestador:
+    """Dueño de la cola de URLs de un trabajo; reparte el trabajo entre uno o varios lotes.
+
+    Un lector va sacando URLs de urls (en un hilo, porque puede ser un CSV), quita las
+    repetidas y las ordena por prioridad (vídeos antes que listas) dentro de una ventana de
+    MAX_LEIDAS. Un despachador las pasa a los lotes (descargar_lote con workers hilos entre
+    todos) por un canal acotado, de modo que el trabajo en vuelo está limitado.
+
+    El ejecutor decide dónde corren los lotes: en un ThreadPoolExecutor (por defecto, un lote
+    en este proceso que comparte cachés, progreso y diario) o en un ProcessPoolExecutor, con
+    lotes procesos que reciben las URLs por colas de multiprocessing. En ese caso diario,
+    metricas, almacen, escritor y memoria se recrean en cada proceso a partir de sus rutas (progreso y
+    limitador no se pasan) y los resúmenes por etapa y de conexiones no se combinan.
+
+    pausar(), reanudar() y cancelar() se pueden llamar desde cualquier hilo (también antes de
+    empezar). En pausa no empieza ninguna URL nueva (ni en el canal ni dentro de los lotes) y
+    lo que está en curso termina; cancelar descarta la cola y corta las descargas en curso (ver descargar_lote).
+
+    ejecutar() es la corrutina que hace el trabajo y devuelve el resultado de descargar_lote
+    (combinado si hay varios lotes); iniciar() la ejecuta en un hilo propio.
+    """
+
+    def __init__(self, urls, carpeta, formato, workers=1, opciones=None, ejecutor=None, lotes=1,
+                 total=None, on_progreso=None):
+        self.urls = urls
+        self.carpeta = carpeta
+        self.formato = formato
+        self.lotes = max(1, lotes)
+        self.workers = max(self.lotes, workers)
+        self.ejecutor = ejecutor
+        self.total = total
+        self.on_progreso = on_progreso
+        self.opciones = opciones or OpcionesLote()
+        self.resultado = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._activo = None
+        self._pausado = False
+        self._cancelado = threading.Event()
+        self._evento_cancelado = None
+        self._evento_activo = None
+        self._hilo = None
+        self._progreso_lotes = {}
+        self._duplicados = 0
+
+    @property
+    def en_procesos(self):
+        return isinstance(self.ejecutor, ProcessPoolExecutor)
+
+    @property
+    def pausado(self):
+        return self._pausado
+
+    @property
+    def cancelado(self):
+        return self._cancelado.is_set()
+
+    def pausar(self):
+        self._pausado = True
+        self._avisar()
+
+    def reanudar(self):
+        self._pausado = False
+        self._avisar()
+
+    def cancelar(self):
+        self._cancelado.set()
+        self._avisar()
+
+    def _avisar(self):
+        with self._lock:
+            loop = self._loop
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(self._aplicar_estado)
+            except RuntimeError:  # el bucle ya terminó
+                pass
+
+    def _aplicar_estado(self):
+        if self._cancelado.is_set():
+            if self._evento_cancelado is not None:
+                self._evento_cancelado.set()
+            # Despierta al despachador y a los lotes para que vean la cancelación
+            self._activo.set()
+            self._evento_activo.set()
+        elif self._pausado:
+            self._activo.clear()
+            self._evento_activo.clear()
+        else:
+            self._activo.set()
+            self._evento_activo.set()
+
+    def _progreso(self, indice, completadas, total):
+        """on_progreso de cada lote: suma lo de todos y avisa con el total del trabajo."""
+        with self._lock:
+            # Los avisos de distintos hilos de un lote pueden llegar desordenados
+            anterior = self._progreso_lotes.get(indice)
+            if anterior is not None:
+                completadas = max(completadas, anterior[0])
+                total = None if total is None else max(total, anterior[1] or 0)
+            self._progreso_lotes[indice] = (completadas, total)
+        self._notificar()
+
+    def _notificar(self):
+        with self._lock:
+            completadas = self._duplicados + sum(c for c, _ in self._progreso_lotes.values())
+            total = self._total_actual()
+        if self.on_progreso:
+            self.on_progreso(completadas, total)
+
+    def _total_actual(self):
+        # Los lotes empiezan en 0 y suman lo que añaden al expandir listas
+        if self.total is None:
+            return None
+        return self.total + sum(t or 0 for _, t in self._progreso_lotes.values())
+
+    async def _leer(self, pendientes):
+        fuente = iter(self.urls)
+        vistas = ConjuntoHashes()
+        secuencia = 0
+        try:
+            agotada = False
+            while not agotada and not self._cancelado.is_set():
+                leidas, duplicados, agotada = await asyncio.to_thread(
+                    _leer_bloque, fuente, vistas, BLOQUE_LECTURA)
+                if duplicados:
+                    with self._lock:
+                        self._duplicados += duplicados
+                    self._notificar()
+                for prioridad_url, url in leidas:
+                    secuencia += 1
+                    await pendientes.put((prioridad_url, secuencia, url))
+        except Exception as e:
+            # Error leyendo la fuente: se termina lo que haya en curso y ejecutar() lo relanza
+            self.error = e
+        finally:
+            await pendientes.put((_PRIORIDAD_FIN, secuencia + 1, None))
+
+    async def _despachar(self, pendientes, puente):
+        while True:
+            await self._activo.wait()
+            if self._cancelado.is_set():
+                break
+            _, _, url = await pendientes.get()
+            if url is None:
+                break
+            # Se pudo pausar mientras se esperaba una URL
+            await self._activo.wait()
+            if not await self._poner(puente, url):
+                break
+        if self._cancelado.is_set():
+            # Las URLs que ya estaban en el canal no se procesan: así caben las marcas de fin
+            while True:
+                try:
+                    puente.get_nowait()
+                except queue.Empty:
+                    break
+        for _ in range(self.lotes):
+            await self._poner(puente, None)
+
+    async def _poner(self, puente, url):
+        """Espera hueco en el canal hacia los lotes; False si se cancela mientras tanto.
+
+        La espera es por intervalos: un lote cancelado deja de leer y un put sin límite
+        dejaría colgado el hilo.
+        """
+        while True:
+            try:
+                await asyncio.to_thread(puente.put, url, True, 0.2)
+                return True
+            except queue.Full:
+                if self._cancelado.is_set() and url is not None:
+                    return False
+
+    def _bombear(self, eventos):
+        """Lleva el progreso de los lotes en otros procesos a _progreso (en un hilo)."""
+        for evento in iter(eventos.get, None):
+            self._progreso(*evento)
+
+    async def ejecutar(self):
+        loop = asyncio.get_running_loop()
+        self._activo = asyncio.Event()
+        pendientes = asyncio.PriorityQueue(MAX_LEIDAS)
+        ejecutor = self.ejecutor or crear_ejecutor(EJECUTOR_HILOS, self.lotes)
+        gestor = None
+        hilos_por_lote = -(-self.workers // self.lotes)
+        total_lote = None if self.total is None else 0
+        # El lector (canonizar) y los lotes importan partes de yt_dlp: importarlo a la vez desde
+        # dos hilos falla por sus importaciones circulares
+        await asyncio.to_thread(importlib.import_module, "yt_dlp")
+        if self.en_procesos:
+            gestor = SyncManager(ctx=multiprocessing.get_context())
+            gestor.start(_ignorar_interrupcion)
+            puente = gestor.Queue(self.workers)
+            eventos = gestor.Queue()
+            self._evento_cancelado = gestor.Event()
+            self._evento_activo = gestor.Event()
+            opciones = self._opciones_para_procesos()
+            trabajos = [loop.run_in_executor(ejecutor, _lote_en_proceso, i, puente, eventos,
+                                             self._evento_cancelado, self._evento_activo, self.carpeta,
+                                             self.formato, hilos_por_lote, total_lote, opciones)
+                        for i in range(self.lotes)]
+            bomba = loop.run_in_executor(None, self._bombear, eventos)
+        else:
+            puente = queue.Queue(self.workers)
+            eventos = None
+            self._evento_cancelado = self._cancelado
+            self._evento_activo = threading.Event()
+            trabajos = [loop.run_in_executor(ejecutor, partial(
+                descargar_lote, iter(puente.get, None), self.carpeta, self.formato, hilos_por_lote,
+                self.opciones, total=total_lote, on_progreso=partial(self._progreso, i),
+                cancelado=self._cancelado, activo=self._evento_activo))
+                for i in range(self.lotes)]
+        with self._lock:
+            self._loop = loop
+        self._aplicar_estado()
+
+        lector = asyncio.create_task(self._leer(pendientes))
+        despachador = asyncio.create_task(self._despachar(pendientes, puente))
+        try:
+            resultados = await asyncio.gather(*trabajos)
+        finally:
+            with self._lock:
+                self._loop = None
+            lector.cancel()
+            despachador.cancel()
+            await asyncio.gather(lector, despachador, return_exceptions=True)
+            if eventos is not None:
+                eventos.put(None)
+                await bomba
+            if self.ejecutor is None:
+                ejecutor.shutdown(wait=False)
+            if gestor is not None:
+                gestor.shutdown()
+        if self.error is not None:
+            raise self.error
+        self.resultado = self._combinar(resultados)
+        return self.resultado
+
+    def _opciones_para_procesos(self):
+        """Sustituye los objetos que no pueden pasar a otro proceso por lo necesario para recrearlos."""
+        opciones = self.opciones
+        cambios = {"progreso": None, "limitador": None}
+        if opciones.diario is not None:
+            cambios["diario"] = opciones.diario.ruta
+        if opciones.metricas is not None:
+            cambios["metricas"] = opciones.metricas.ruta_jsonl
+        if opciones.almacen is not None:
+            cambios["almacen"] = opciones.almacen.carpeta
+        if opciones.escritor is not None:
+            escritor = opciones.escritor
+            cambios["escritor"] = (escritor.carpeta_temporal, escritor.presupuesto // self.lotes, escritor.margen)
+        if opciones.memoria is not None:
+            # Cada proceso mide su propia memoria y recicla sus propios YoutubeDL
+            cambios["memoria"] = (opciones.memoria.reciclar_cada, opciones.memoria.max_rss)
+        return opciones.copiar(**cambios)
+
+    def _combinar(self, resultados):
+        if len(resultados) == 1:
+            resultado = dict(resultados[0])
+        else:
+            resultado = {clave: sum(r.get(clave) or 0 for r in resultados) for clave in CONTADORES}
+            # Los lotes corren a la vez: su rendimiento se suma
+            resultado["descargas_s"] = sum(r["descargas_s"] for r in resultados)
+            codificaciones = [r["codificaciones_s"] for r in resultados if r["codificaciones_s"] is not None]
+            resultado["codificaciones_s"] = sum(codificaciones) if codificaciones else None
+            for clave in ("conversiones", "latencias", "conexiones", "almacen", "staging", "memoria"):
+                resultado[clave] = None
+            resultado["lotes"] = resultados
+        resultado["duplicates"] += self._duplicados
+        return resultado
+
+    def iniciar(self, al_terminar=None):
+        """Ejecuta el trabajo en un hilo propio; al_terminar(orquestador) se llama al acabar."""
+        def correr():
+            try:
+                asyncio.run(self.ejecutar())
+            except Exception as e:
+                self.error = e
+            if al_terminar:
+                al_terminar(self)
+
+        self._hilo = threading.Thread(target=correr, name="dwsongs-orquestador", daemon=True)
+        self._hilo.start()
+
+    def esperar(self, timeout=None):
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+        return self.resultado
@@ -0,0 +1,204 @@
+# Ritmo de peticiones por host y reintentos con espera exponencial
+
+import re
+import time
+import heapq
+import random
+import socket
+import threading
+from urllib.parse import urlsplit
+
+
+# Peticiones por segundo iniciales y máximas por host, y ráfaga permitida
+RITMO_INICIAL = 4.0
+RITMO_MAXIMO = 16.0
+RITMO_MINIMO = 0.2
+RAFAGA = 4
+# Tras un 429 el ritmo del host se multiplica por este factor; cada éxito le suma INCREMENTO_RITMO
+FACTOR_FRENADO = 0.5
+INCREMENTO_RITMO = 0.1
+
+MAX_REINTENTOS = 4
+ESPERA_BASE = 2.0
+ESPERA_MAXIMA = 120.0
+
+# Clases de error
+LIMITADO = "throttle"
+RED = "network"
+NO_DISPONIBLE = "unavailable"
+OTRO = "other"
+
+REINTENTABLES = {LIMITADO, RED}
+
+_PATRON_HTTP = re.compile(r"HTTP Error (\d{3})")
+_TEXTOS_NO_DISPONIBLE = (
+    "private video", "video unavailable", "is not available", "has been removed",
+    "members-only", "sign in to confirm your age", "unsupported url", "copyright",
+)
+_TEXTOS_RED = (
+    "timed out", "connection reset", "connection refused", "connection aborted",
+    "temporary failure in name resolution", "remote end closed", "incomplete read",
+)
+
+
+def host_de(url):
+    host = urlsplit(url if "://" in url else "https://" + url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _cadena_errores(error):
+    """Recorre el error y sus causas (yt-dlp envuelve el original en exc_info o cause)."""
+    vistos = set()
+    while error is not None and id(error) not in vistos:
+        vistos.add(id(error))
+        yield error
+        exc_info = getattr(error, "exc_info", None)
+        siguiente = exc_info[1] if isinstance(exc_info, tuple) and len(exc_info) > 1 else None
+        error = (siguiente or getattr(error, "cause", None) or error.__cause__
+                 or error.__context__)
+        if not isinstance(error, BaseException):
+            error = None
+
+
+def clasificar_error(error):
+    """Devuelve (clase, retry_after) de un error de descarga.
+
+    clase es LIMITADO (429), RED (5xx, cortes, timeouts), NO_DISPONIBLE (privado, borrado,
+    4xx...) u OTRO; retry_after son los segundos de la cabecera Retry-After si la había.
+    """
+    estado = None
+    retry_after = None
+    hubo_red = False
+    for e in _cadena_errores(error):
+        codigo = getattr(e, "status", None) or getattr(e, "code", None)
+        if isinstance(codigo, int) and 100 <= codigo < 600 and estado is None:
+            estado = codigo
+            respuesta = getattr(e, "response", None) or e
+            cabeceras = getattr(respuesta, "headers", None)
+            try:
+                retry_after = float(cabeceras.get("Retry-After")) if cabeceras else None
+            except (TypeError, ValueError):
+                retry_after = None
+        if isinstance(e, (socket.timeout, ConnectionError, TimeoutError)):
+            hubo_red = True
+        elif type(e).__name__ in ("TransportError", "IncompleteRead", "SSLError", "ProxyError"):
+            hubo_red = True
+    texto = str(error).lower()
+    if estado is None:
+        m = _PATRON_HTTP.search(str(error))
+        estado = int(m.group(1)) if m else None
+    if estado == 429:
+        return LIMITADO, retry_after
+    if estado is not None and (estado >= 500 or estado == 408):
+        return RED, retry_after
+    if estado is not None and estado >= 400:
+        return NO_DISPONIBLE, None
+    if any(t in texto for t in _TEXTOS_NO_DISPONIBLE):
+        return NO_DISPONIBLE, None
+    if hubo_red or any(t in texto for t in _TEXTOS_RED):
+        return RED, None
+    return OTRO, None
+
+
+def calcular_espera(intento, base=ESPERA_BASE, maximo=ESPERA_MAXIMA, retry_after=None):
+    """Espera exponencial con jitter completo para el reintento número intento (desde 1)."""
+    espera = random.uniform(0, min(maximo, base * 2 ** intento))
+    if retry_after is not None:
+        espera = max(espera, min(retry_after, maximo))
+    return espera
+
+
+class LimitadorHosts:
+    """Cubo de fichas por host con ritmo adaptativo.
+
+    Cada host empieza a RITMO_INICIAL peticiones/s; un 429 reduce su ritmo a la mitad (y lo
+    pausa el tiempo de Retry-After si lo hay) y cada éxito lo sube poco a poco hasta
+    ritmo_maximo, de modo que el ritmo se queda justo por debajo del límite del servidor.
+    """
+
+    def __init__(self, ritmo_inicial=RITMO_INICIAL, ritmo_maximo=RITMO_MAXIMO, rafaga=RAFAGA):
+        self._ritmo_inicial = ritmo_inicial
+        self._ritmo_maximo = ritmo_maximo
+        self._rafaga = rafaga
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host, ahora):
+        estado = self._hosts.get(host)
+        if estado is None:
+            estado = self._hosts[host] = {"ritmo": self._ritmo_inicial, "fichas": float(self._rafaga),
+                                          "t": ahora, "pausa": 0.0}
+        return estado
+
+    def esperar(self, host):
+        """Bloquea hasta que haya una ficha para el host y la consume."""
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                estado = self._host(host, ahora)
+                estado["fichas"] = min(self._rafaga,
+                                       estado["fichas"] + (ahora - estado["t"]) * estado["ritmo"])
+                estado["t"] = ahora
+                if ahora >= estado["pausa"] and estado["fichas"] >= 1:
+                    estado["fichas"] -= 1
+                    return
+                espera = max(estado["pausa"] - ahora, (1 - estado["fichas"]) / estado["ritmo"])
+            time.sleep(espera)
+
+    def exito(self, host):
+        with self._lock:
+            estado = self._host(host, time.monotonic())
+            estado["ritmo"] = min(self._ritmo_maximo, estado["ritmo"] + INCREMENTO_RITMO)
+
+    def frenar(self, host, retry_after=None):
+        """El host ha respondido 429: baja su ritmo y lo pausa si pidió esperar."""
+        with self._lock:
+            ahora = time.monotonic()
+            estado = self._host(host, ahora)
+            estado["ritmo"] = max(RITMO_MINIMO, estado["ritmo"] * FACTOR_FRENADO)
+            estado["fichas"] = 0.0
+            if retry_after:
+                estado["pausa"] = max(estado["pausa"], ahora + retry_after)
+
+    def ritmos(self):
+        with self._lock:
+            return {host: round(e["ritmo"], 2) for host, e in self._hosts.items()}
+
+
+class ColaReintentos:
+    """Montículo de URLs a reintentar ordenadas por el momento en que vuelven a estar listas."""
+
+    def __init__(self):
+        self._monticulo = []
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def programar(self, url, espera):
+        with self._lock:
+            self._n += 1
+            heapq.heappush(self._monticulo, (time.monotonic() + espera, self._n, url))
+
+    def siguiente(self):
+        """Saca la primera URL ya lista, o None si ninguna lo está."""
+        with self._lock:
+            if self._monticulo and self._monticulo[0][0] <= time.monotonic():
+                return heapq.heappop(self._monticulo)[2]
+            return None
+
+    def vaciar(self):
+        """Saca todas las URLs, estén listas o no, por orden."""
+        with self._lock:
+            urls = [url for _, _, url in sorted(self._monticulo)]
+            self._monticulo.clear()
+        return urls
+
+    def espera(self):
+        """Segundos hasta que la próxima URL esté lista (None si la cola está vacía)."""
+        with self._lock:
+            if not self._monticulo:
+                return None
+            return max(0.0, self._monticulo[0][0] - time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._monticulo)
@@ -0,0 +1,84 @@
+# Pasos previos al empaquetado con PyInstaller
+#
+#   python preparar_build.py
+#
+# Genera assets/dwSongs.png: el icono de assets/dwSongs.ico centrado en un lienzo cuadrado
+# transparente, para que la aplicación lo cargue con tk.PhotoImage al arrancar sin necesitar
+# Pillow ni redimensionar nada en cada ejecución.
+
+import os
+import sys
+import zlib
+import struct
+
+ICONO_ICO = os.path.join("assets", "dwSongs.ico")
+ICONO_PNG = os.path.join("assets", "dwSongs.png")
+
+
+def leer_ico(ruta):
+    """Devuelve (ancho, alto, filas RGBA de arriba abajo) de la imagen más grande del .ico.
+
+    Solo entiende entradas BMP de 32 bits, que es lo que contiene el icono de la aplicación.
+    """
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    _, tipo, n = struct.unpack_from("<HHH", datos, 0)
+    if tipo != 1 or n == 0:
+        raise ValueError(f"{ruta} no es un .ico")
+    entradas = [struct.unpack_from("<BBBBHHII", datos, 6 + 16 * i) for i in range(n)]
+    entrada = max(entradas, key=lambda e: (e[0] or 256) * (e[1] or 256))
+    desplazamiento = entrada[7]
+    if datos[desplazamiento:desplazamiento + 8] == b"\x89PNG\r\n\x1a\n":
+        raise ValueError("el icono es PNG: conviértelo con Pillow")
+    cabecera, ancho, alto_doble, _, bits = struct.unpack_from("<IiiHH", datos, desplazamiento)
+    if bits != 32:
+        raise ValueError(f"profundidad de color no soportada: {bits} bits")
+    alto = abs(alto_doble) // 2
+    inicio = desplazamiento + cabecera
+    filas = []
+    for y in range(alto):
+        fila = datos[inicio + y * ancho * 4:inicio + (y + 1) * ancho * 4]
+        # BGRA -> RGBA
+        rgba = bytearray(len(fila))
+        rgba[0::4], rgba[1::4], rgba[2::4], rgba[3::4] = fila[2::4], fila[1::4], fila[0::4], fila[3::4]
+        filas.append(bytes(rgba))
+    if alto_doble > 0:  # DIB de abajo arriba
+        filas.reverse()
+    return ancho, alto, filas
+
+
+def cuadrar(ancho, alto, filas):
+    """Centra la imagen en un lienzo cuadrado transparente."""
+    lado = max(ancho, alto)
+    izquierda = bytes(4 * ((lado - ancho) // 2))
+    derecha = bytes(4 * (lado - ancho - (lado - ancho) // 2))
+    vacia = bytes(4 * lado)
+    arriba = (lado - alto) // 2
+    cuadradas = [vacia] * arriba + [izquierda + f + derecha for f in filas]
+    cuadradas += [vacia] * (lado - len(cuadradas))
+    return lado, cuadradas
+
+
+def escribir_png(ruta, lado, filas):
+    def bloque(tipo, contenido):
+        return (struct.pack(">I", len(contenido)) + tipo + contenido
+                + struct.pack(">I", zlib.crc32(tipo + contenido) & 0xFFFFFFFF))
+
+    crudo = b"".join(b"\x00" + fila for fila in filas)
+    with open(ruta, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(bloque(b"IHDR", struct.pack(">IIBBBBB", lado, lado, 8, 6, 0, 0, 0)))
+        f.write(bloque(b"IDAT", zlib.compress(crudo, 9)))
+        f.write(bloque(b"IEND", b""))
+
+
+def main():
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    lado, filas = cuadrar(*leer_ico(ICONO_ICO))
+    escribir_png(ICONO_PNG, lado, filas)
+    print(f"{ICONO_PNG}: {lado}x{lado}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
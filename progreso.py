@@ -0,0 +1,124 @@
+# Estado de progreso compartido entre los hilos de descarga y la interfaz
+
+import time
+import threading
+
+
+# Refrescos por segundo de la interfaz, independientemente de cuántos eventos lleguen
+FPS_PROGRESO = 10
+# Ventana (segundos) para calcular la velocidad agregada
+VENTANA_VELOCIDAD = 3.0
+
+
+class EstadoProgreso:
+    """Progreso agregado de un lote, alimentado por los hooks de yt-dlp desde varios hilos.
+
+    Los hooks solo sobrescriben el estado de su hilo bajo un lock (coste constante por evento),
+    y quien pinta llama a instantanea() a un ritmo fijo, de modo que los eventos se agrupan
+    solos y el coste de la interfaz no depende de cuántos lleguen.
+    """
+
+    def __init__(self, total=None):
+        self._lock = threading.Lock()
+        self._inicio = time.monotonic()
+        self.total = total
+        self.completadas = 0
+        self.codificando = 0
+        self.resultado = None
+        self.error = None
+        self._bytes = 0
+        self._muestras = []
+        self._workers = {}
+
+    def _worker(self):
+        nombre = threading.current_thread().name
+        estado = self._workers.get(nombre)
+        if estado is None:
+            estado = self._workers[nombre] = {"estado": "", "titulo": "", "archivo": None,
+                                              "bytes": 0, "total": None}
+        return estado
+
+    def hook_descarga(self, d):
+        """Para "progress_hooks" de YoutubeDL."""
+        with self._lock:
+            estado = self._worker()
+            if d.get("filename") != estado["archivo"]:
+                estado["archivo"] = d.get("filename")
+                estado["bytes"] = 0
+            descargados = d.get("downloaded_bytes") or 0
+            if descargados > estado["bytes"]:
+                self._bytes += descargados - estado["bytes"]
+                estado["bytes"] = descargados
+            estado["total"] = d.get("total_bytes") or d.get("total_bytes_estimate")
+            estado["titulo"] = (d.get("info_dict") or {}).get("title") or ""
+            estado["estado"] = "downloading" if d.get("status") == "downloading" else d.get("status")
+
+    def hook_postproceso(self, d):
+        """Para "postprocessor_hooks" de YoutubeDL."""
+        with self._lock:
+            estado = self._worker()
+            estado["estado"] = "converting" if d.get("status") == "started" else "idle"
+
+    def codificacion(self, delta):
+        with self._lock:
+            self.codificando += delta
+
+    def libre(self):
+        """El hilo actual ha terminado su URL."""
+        with self._lock:
+            estado = self._worker()
+            estado.update(estado="idle", titulo="", archivo=None, bytes=0, total=None)
+
+    def actualizar(self, completadas, total):
+        """Para on_progreso de descargar_lote."""
+        with self._lock:
+            self.completadas = completadas
+            self.total = total
+
+    def terminar(self, resultado=None, error=None):
+        """Marca el lote como acabado, con su resultado o con el error que lo detuvo."""
+        with self._lock:
+            self.resultado = resultado
+            self.error = error
+
+    def instantanea(self):
+        """Copia coherente del progreso: contadores, bytes/s, ETA y estado de cada hilo."""
+        ahora = time.monotonic()
+        with self._lock:
+            self._muestras.append((ahora, self._bytes))
+            while self._muestras and ahora - self._muestras[0][0] > VENTANA_VELOCIDAD:
+                self._muestras.pop(0)
+            t0, b0 = self._muestras[0]
+            velocidad = (self._bytes - b0) / (ahora - t0) if ahora > t0 else 0.0
+            transcurrido = ahora - self._inicio
+            eta = None
+            if self.total and self.completadas:
+                eta = (self.total - self.completadas) * transcurrido / self.completadas
+            return {
+                "completadas": self.completadas,
+                "total": self.total,
+                "bytes": self._bytes,
+                "bytes_s": velocidad,
+                "eta": eta,
+                "codificando": self.codificando,
+                "workers": {nombre: dict(e) for nombre, e in self._workers.items()},
+                "resultado": self.resultado,
+                "error": self.error,
+            }
+
+
+def formatear_bytes(n):
+    for unidad in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unidad}" if unidad != "B" else f"{n:.0f} B"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+def formatear_eta(segundos):
+    if segundos is None:
+        return "--:--"
+    segundos = int(segundos)
+    h, resto = divmod(segundos, 3600)
+    m, s = divmod(resto, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
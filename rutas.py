@@ -0,0 +1,25 @@
+# Rutas de la aplicación
+
+import os
+import sys
+
+
+# Rutas base (compatibles con PyInstaller)
+BASE_PATH = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+# Carpeta ffmpeg/bin junto al ejecutable: así un build --onefile no tiene que llevar ffmpeg
+# dentro y descomprimirlo en cada arranque
+_FFMPEG_JUNTO = os.path.join(os.path.dirname(sys.executable), 'ffmpeg', 'bin')
+# DWSONGS_FFMPEG permite usar otra carpeta de ffmpeg (p. ej. al ejecutar desde el código fuente)
+FFMPEG_PATH = os.environ.get("DWSONGS_FFMPEG") or (
+    _FFMPEG_JUNTO if getattr(sys, 'frozen', False) and os.path.isdir(_FFMPEG_JUNTO)
+    else os.path.join(BASE_PATH, 'ffmpeg', 'bin'))
+
+# Datos persistentes de la aplicación (cachés, diarios de trabajos...)
+DIR_DATOS = os.environ.get("DWSONGS_DATOS") or os.path.join(os.path.expanduser("~"), ".dwsongs")
+
+
+def ruta_datos(*partes):
+    """Ruta dentro de DIR_DATOS, creando las carpetas intermedias si hace falta."""
+    ruta = os.path.join(DIR_DATOS, *partes)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    return ruta
@@ -0,0 +1,196 @@
+# Descarga HTTP por segmentos: varias peticiones Range en paralelo sobre un archivo preasignado
+
+import os
+import re
+import json
+import time
+import threading
+from http.client import HTTPException
+
+from conexiones import PoolConexiones
+from escritor import preasignar
+
+
+# Por debajo de este tamaño no compensa abrir varias conexiones
+TAMANO_MINIMO = 1 << 20
+TAMANO_SEGMENTO_MINIMO = 256 * 1024
+BLOQUE = 256 * 1024
+REINTENTOS_SEGMENTO = 5
+# Cada cuántos segundos se guarda el estado de los segmentos para poder reanudar
+INTERVALO_ESTADO = 1.0
+
+_PATRON_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+def _rango(cabeceras, inicio, fin):
+    cabeceras = dict(cabeceras or {})
+    cabeceras["Range"] = f"bytes={inicio}-{fin}"
+    return cabeceras
+
+
+class DescargaSegmentada:
+    """Descarga una URL en varios segmentos a la vez sobre ruta + ".part".
+
+    preparar() comprueba que el servidor acepta Range y conoce el tamaño; si no, devuelve
+    False y hay que descargar de la forma normal. Cada segmento se reintenta por su cuenta
+    desde el último byte escrito, y el estado se guarda en ruta + ".part.segs" para que una
+    descarga interrumpida continúe donde se quedó. Las peticiones salen de pool (un
+    PoolConexiones compartido con otras descargas), así que los segmentos y los reintentos
+    reutilizan conexiones abiertas.
+
+        descarga = DescargaSegmentada(url, ruta, segmentos=4)
+        if descarga.preparar():
+            descarga.iniciar()
+            descarga.esperar()
+    """
+
+    def __init__(self, url, ruta, segmentos=4, cabeceras=None, pool=None):
+        self.url = url
+        self.pool = pool or PoolConexiones()
+        self.ruta = ruta
+        self.segmentos = segmentos
+        self.cabeceras = cabeceras
+        self.tamano = None
+        self._parcial = ruta + ".part"
+        self._ruta_estado = ruta + ".part.segs"
+        self._partes = []
+        self._hilos = []
+        self._error = None
+        self._lock = threading.Lock()
+        self._estado_guardado = 0.0
+
+    def preparar(self):
+        """Averigua el tamaño con una petición de un byte; False si no se puede segmentar."""
+        if self.segmentos < 2:
+            return False
+        try:
+            with self.pool.abrir(self.url, _rango(self.cabeceras, 0, 0)) as respuesta:
+                m = _PATRON_CONTENT_RANGE.match(respuesta.headers.get("Content-Range", ""))
+                if respuesta.status != 206 or not m:
+                    return False
+                respuesta.read()
+                self.tamano = int(m.group(3))
+                # Los segmentos van directamente al destino de las redirecciones, con las
+                # cabeceras que el pool dejó para ese origen
+                self.url = respuesta.url
+                self.cabeceras = {k: v for k, v in respuesta.cabeceras.items() if k != "Range"}
+        except (HTTPException, OSError):
+            return False
+        if self.tamano < TAMANO_MINIMO:
+            return False
+        if not self._cargar_estado():
+            n = max(1, min(self.segmentos, self.tamano // TAMANO_SEGMENTO_MINIMO))
+            paso = -(-self.tamano // n)
+            self._partes = [[i, min(i + paso, self.tamano) - 1, 0] for i in range(0, self.tamano, paso)]
+            with open(self._parcial, "wb") as f:
+                preasignar(f, self.tamano)
+        return True
+
+    def _cargar_estado(self):
+        try:
+            with open(self._ruta_estado, "r", encoding="utf-8") as f:
+                estado = json.load(f)
+            if estado["tamano"] != self.tamano or os.path.getsize(self._parcial) != self.tamano:
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        self._partes = estado["partes"]
+        return True
+
+    def _guardar_estado(self):
+        with self._lock:
+            estado = {"url": self.url, "tamano": self.tamano, "partes": [list(p) for p in self._partes]}
+        temporal = self._ruta_estado + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(estado, f)
+        os.replace(temporal, self._ruta_estado)
+        self._estado_guardado = time.monotonic()
+
+    @property
+    def descargados(self):
+        with self._lock:
+            return sum(p[2] for p in self._partes)
+
+    def iniciar(self):
+        for parte in self._partes:
+            if parte[0] + parte[2] > parte[1]:
+                continue
+            hilo = threading.Thread(target=self._descargar_parte, args=(parte,),
+                                    name="dwsongs-segmento", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def _descargar_parte(self, parte):
+        fallos = 0
+        with open(self._parcial, "r+b") as f:
+            while parte[0] + parte[2] <= parte[1] and self._error is None:
+                inicio = parte[0] + parte[2]
+                try:
+                    with self.pool.abrir(self.url, _rango(self.cabeceras, inicio, parte[1])) as respuesta:
+                        m = _PATRON_CONTENT_RANGE.match(respuesta.headers.get("Content-Range", ""))
+                        if respuesta.status != 206 or not m or int(m.group(1)) != inicio:
+                            raise ValueError(f"el servidor no respetó el rango {inicio}-{parte[1]}")
+                        f.seek(inicio)
+                        while True:
+                            datos = respuesta.read1(min(BLOQUE, parte[1] - parte[0] - parte[2] + 1))
+                            if not datos or self._error is not None:
+                                break
+                            f.write(datos)
+                            with self._lock:
+                                parte[2] += len(datos)
+                            fallos = 0
+                except (HTTPException, OSError) as e:
+                    fallos += 1
+                    estado = getattr(e, "status", None)
+                    permanente = estado is not None and estado < 500 and estado not in (408, 429)
+                    if permanente or fallos > REINTENTOS_SEGMENTO:
+                        self._error = e
+                        return
+                    time.sleep(0.5 * 2 ** (fallos - 1))
+                except Exception as e:
+                    self._error = e
+                    return
+
+    def cancelar(self):
+        """Detiene los segmentos y guarda el estado para reanudar más tarde."""
+        if self._error is None:
+            self._error = RuntimeError("cancelada")
+        for hilo in self._hilos:
+            hilo.join()
+        self._guardar_estado()
+
+    def terminada(self):
+        return not any(h.is_alive() for h in self._hilos)
+
+    def esperar(self, timeout=None):
+        """Espera a que acaben los segmentos; con timeout devuelve False si aún no han acabado.
+
+        Al terminar mueve el .part a su ruta final, o lanza el error del segmento que falló
+        (dejando el estado guardado para reanudar).
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        for hilo in self._hilos:
+            hilo.join(None if limite is None else max(0.0, limite - time.monotonic()))
+            if hilo.is_alive():
+                if time.monotonic() - self._estado_guardado >= INTERVALO_ESTADO:
+                    self._guardar_estado()
+                return False
+        if self._error is not None or self.descargados != self.tamano:
+            self._guardar_estado()
+            raise RuntimeError(f"descarga por segmentos incompleta: {self.ruta}: {self._error}")
+        os.replace(self._parcial, self.ruta)
+        try:
+            os.remove(self._ruta_estado)
+        except OSError:
+            pass
+        return True
+
+
+def descargar_segmentado(url, ruta, segmentos=4, cabeceras=None, pool=None):
+    """Descarga url en ruta por segmentos; devuelve False si el servidor no lo permite."""
+    descarga = DescargaSegmentada(url, ruta, segmentos, cabeceras, pool)
+    if not descarga.preparar():
+        return False
+    descarga.iniciar()
+    descarga.esperar()
+    return True
@@ -0,0 +1,191 @@
+# Servidor HTTP local de archivos multimedia para pruebas de rendimiento
+
+import os
+import re
+import time
+import random
+import shutil
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+TIPOS = {
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".webm": "video/webm",
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+}
+
+_PATRON_RANGO = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _archivo(self):
+        # /m/<prefijo>-<archivo>: el prefijo solo sirve para que cada elemento de un lote tenga
+        # su propia URL (y su propio título en yt-dlp) aunque apunte al mismo archivo
+        ruta = self.path.split("?", 1)[0]
+        nombre = os.path.basename(ruta)
+        if ruta.startswith("/m/") and "-" in nombre:
+            nombre = nombre.split("-", 1)[1]
+        ruta = os.path.join(self.server.directorio, nombre)
+        return ruta if os.path.isfile(ruta) else None
+
+    def do_HEAD(self):
+        self._responder(cuerpo=False)
+
+    def do_GET(self):
+        self._responder(cuerpo=True)
+
+    def _responder(self, cuerpo):
+        ruta = self._archivo()
+        if ruta is None:
+            self.send_error(404)
+            return
+        codigo = self.server.fallo_inyectado()
+        if codigo is not None:
+            self.send_response(codigo)
+            if codigo == 429:
+                self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        tamano = os.path.getsize(ruta)
+        inicio, fin = 0, tamano - 1
+        m = _PATRON_RANGO.match(self.headers.get("Range", ""))
+        if m and (m.group(1) or m.group(2)):
+            if m.group(1):
+                inicio = int(m.group(1))
+                fin = min(int(m.group(2)), tamano - 1) if m.group(2) else tamano - 1
+            else:
+                inicio = max(0, tamano - int(m.group(2)))
+            if inicio >= tamano or inicio > fin:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{tamano}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {inicio}-{fin}/{tamano}")
+        else:
+            self.send_response(200)
+        longitud = fin - inicio + 1
+        self.send_header("Content-Type", TIPOS.get(os.path.splitext(ruta)[1], "application/octet-stream"))
+        self.send_header("Content-Length", str(longitud))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        if not cuerpo:
+            return
+        with open(ruta, "rb") as f:
+            f.seek(inicio)
+            try:
+                shutil.copyfileobj(_Limitado(f, longitud, self.server.kbps_conexion), self.wfile,
+                                   16 * 1024 if self.server.kbps_conexion else 64 * 1024)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+
+class _Limitado:
+    """Lector que no pasa de n bytes (para servir rangos con copyfileobj) y, si se indica,
+    tampoco de kbps kilobytes por segundo."""
+
+    def __init__(self, f, n, kbps=None):
+        self._f = f
+        self._n = n
+        self._kbps = kbps
+        self._leidos = 0
+        self._inicio = time.monotonic()
+
+    def read(self, tamano=-1):
+        if self._n <= 0:
+            return b""
+        datos = self._f.read(self._n if tamano < 0 else min(tamano, self._n))
+        self._n -= len(datos)
+        if self._kbps:
+            self._leidos += len(datos)
+            adelanto = self._leidos / (self._kbps * 1024) - (time.monotonic() - self._inicio)
+            if adelanto > 0:
+                time.sleep(adelanto)
+        return datos
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, directorio, tasa_fallos, max_rps, kbps_conexion):
+        super().__init__(direccion, _Manejador)
+        self.directorio = directorio
+        self.kbps_conexion = kbps_conexion
+        self.tasa_fallos = tasa_fallos
+        self.max_rps = max_rps
+        self.inyectados = {429: 0, 503: 0}
+        self._fichas = float(max_rps or 0)
+        self._t = time.monotonic()
+        self._lock = threading.Lock()
+
+    def fallo_inyectado(self):
+        """429 si se supera max_rps, 503 con probabilidad tasa_fallos, o None."""
+        with self._lock:
+            codigo = None
+            if self.max_rps:
+                ahora = time.monotonic()
+                self._fichas = min(self.max_rps, self._fichas + (ahora - self._t) * self.max_rps)
+                self._t = ahora
+                if self._fichas < 1:
+                    codigo = 429
+                else:
+                    self._fichas -= 1
+            if codigo is None and random.random() < self.tasa_fallos:
+                codigo = 503
+            if codigo is not None:
+                self.inyectados[codigo] += 1
+            return codigo
+
+
+class ServidorMedios:
+    """Sirve los archivos de un directorio en 127.0.0.1 (con soporte de Range) en un hilo aparte.
+
+        with ServidorMedios(carpeta) as servidor:
+            servidor.url("pista.m4a", 3)  # http://127.0.0.1:PUERTO/m/3-pista.m4a
+
+    Para probar los reintentos puede responder 503 a una fracción tasa_fallos de las peticiones
+    y 429 (con Retry-After) a las que superen max_rps por segundo; los fallos servidos se
+    cuentan en inyectados. Con kbps_conexion cada respuesta va como mucho a esa velocidad,
+    como un enlace que limita cada conexión por separado.
+    """
+
+    def __init__(self, directorio, puerto=0, tasa_fallos=0.0, max_rps=None, kbps_conexion=None):
+        self._httpd = _Servidor(("127.0.0.1", puerto), directorio, tasa_fallos, max_rps, kbps_conexion)
+        self._hilo = None
+
+    @property
+    def inyectados(self):
+        return dict(self._httpd.inyectados)
+
+    @property
+    def url_base(self):
+        host, puerto = self._httpd.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def url(self, nombre, n=None):
+        return f"{self.url_base}/m/{n}-{nombre}" if n is not None else f"{self.url_base}/{nombre}"
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._httpd.serve_forever, name="dwsongs-servidor", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
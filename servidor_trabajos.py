@@ -0,0 +1,607 @@
+# Servidor local de trabajos: procesos ya calientes que descargan los lotes que le envían
+#
+#   python -m dwsongs --serve                                      (lo deja escuchando)
+#   python -m dwsongs --submit --urls URL --out CARPETA            (envía un trabajo y sigue su progreso)
+#
+# API HTTP en 127.0.0.1 (JSON; todas las peticiones llevan la cabecera X-Dwsongs-Token):
+#   POST   /jobs                {"urls": [...]} o {"csv": RUTA}, "out", "format", "jobs"... -> {"id", ...}
+#   GET    /jobs                estado de los trabajos
+#   GET    /jobs/<id>           estado de un trabajo (y su resumen al terminar)
+#   GET    /jobs/<id>/events    sus eventos como líneas JSON, en vivo hasta que termina (?from=N,
+#                               contando los eventos salvo "progress", del que solo va el último)
+#   DELETE /jobs/<id>           lo cancela
+
+import os
+import sys
+import json
+import time
+import hmac
+import queue
+import signal
+import secrets
+import threading
+import http.client
+import multiprocessing
+from itertools import islice
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit, parse_qs
+from multiprocessing.managers import SyncManager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from rutas import ruta_datos
+
+
+CABECERA_TOKEN = "X-Dwsongs-Token"
+# Trabajos que descargan a la vez; los demás esperan su turno en orden de llegada
+MAX_TRABAJOS_SIMULTANEOS = 2
+# Trabajos terminados que se recuerdan (con sus eventos) para consultarlos después
+MAX_TERMINADOS = 100
+# Eventos que guarda cada trabajo; de los anteriores solo queda la cuenta, y del progreso solo
+# el último valor, así que la memoria de un trabajo no crece con su número de elementos
+MAX_EVENTOS = 1000
+MAX_CUERPO = 64 << 20
+# Cada cuánto mira el hilo de un trabajo si lo han cancelado mientras espera eventos de su proceso
+INTERVALO_EVENTOS = 0.2
+
+EN_COLA = "queued"
+EN_CURSO = "running"
+TERMINADO = "done"
+CANCELADO = "cancelled"
+FALLIDO = "failed"
+FINALES = (TERMINADO, CANCELADO, FALLIDO)
+
+
+def ruta_anuncio():
+    """Archivo donde el servidor en marcha deja su dirección y su token para los clientes."""
+    return ruta_datos("servidor.json")
+
+
+def _crear_limitador():
+    from planificador import LimitadorHosts
+
+    return LimitadorHosts()
+
+
+class _Gestor(SyncManager):
+    """Proceso gestor: las colas de eventos, las cancelaciones y el limitador compartido."""
+
+
+_Gestor.register("limitador", _crear_limitador)
+
+
+def _ignorar_interrupcion():
+    # Ctrl+C llega a todo el grupo de procesos: solo el principal lo atiende (deteniendo)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+_precalentado_ms = None
+
+
+def _iniciar_proceso():
+    """Inicializador de cada proceso del pool: se precalienta antes de su primer trabajo."""
+    global _precalentado_ms
+    from descargas import precalentar
+
+    _ignorar_interrupcion()
+    _precalentado_ms = precalentar()
+
+
+def _precalentado(_):
+    return _precalentado_ms
+
+
+def _trabajo_en_proceso(fuente, carpeta, formato, workers, total, opciones, eventos, cancelado):
+    """Un trabajo en un proceso del pool; sus eventos vuelven al servidor por la cola eventos."""
+    from ingesta import iterar_urls_de_csv
+    from descargas import descargar_lote, OpcionesLote
+
+    if not isinstance(fuente, list):
+        fuente = iterar_urls_de_csv(fuente)
+    return descargar_lote(
+        fuente, carpeta, formato, workers, OpcionesLote(silencioso=True, **opciones), total=total,
+        on_progreso=lambda completadas, total: eventos.put(("progress", completadas, total)),
+        cancelado=cancelado, on_terminada=lambda url, estado: eventos.put(("item", url, estado)),
+    )
+
+
+class Trabajo:
+    """Un lote enviado al servidor y sus eventos (líneas JSON ya serializadas).
+
+    Se guardan los MAX_EVENTOS últimos, numerados desde el primero que se emitió, y aparte el
+    último "progress". La fuente (la lista de URLs) se suelta al terminar.
+    """
+
+    def __init__(self, id, fuente, carpeta, formato, workers, opciones):
+        self.id = id
+        self.fuente = fuente
+        self.carpeta = carpeta
+        self.formato = formato
+        self.workers = workers
+        self.opciones = opciones
+        self.estado = EN_COLA
+        self.enviado = time.perf_counter()
+        self.completadas = 0
+        self.total = len(fuente) if isinstance(fuente, list) else None
+        self.resultado = None
+        self.cancelado = threading.Event()
+        self._eventos = deque(maxlen=MAX_EVENTOS)
+        self._emitidos = 0
+        self._progreso = None
+        self._version_progreso = 0
+        self._cambio = threading.Condition()
+
+    def emitir(self, evento, **datos):
+        linea = json.dumps({"event": evento, "job": self.id, **datos}, ensure_ascii=False)
+        with self._cambio:
+            self._eventos.append(linea)
+            self._emitidos += 1
+            self._cambio.notify_all()
+
+    def fijar_progreso(self, completadas, total):
+        linea = json.dumps({"event": "progress", "job": self.id, "completed": completadas, "total": total})
+        with self._cambio:
+            self.completadas = completadas
+            self._progreso = linea
+            self._version_progreso += 1
+            self._cambio.notify_all()
+
+    def fijar_estado(self, estado):
+        with self._cambio:
+            self.estado = estado
+            if estado in FINALES:
+                self.fuente = None
+            self._cambio.notify_all()
+
+    def eventos(self, desde=0, parar=None):
+        """Genera los eventos a partir del índice desde, esperando los nuevos hasta que el
+        trabajo termina (o hasta que se active parar).
+
+        Si los primeros ya se descartaron se empieza por el más antiguo que se guarda. El
+        progreso va antes de los eventos nuevos y solo su último valor: un cliente lento no
+        recibe los que se perdió.
+        """
+        i = desde
+        version = 0
+        while True:
+            with self._cambio:
+                while (i >= self._emitidos and version == self._version_progreso
+                       and self.estado not in FINALES):
+                    if parar is not None and parar.is_set():
+                        return
+                    self._cambio.wait(1.0)
+                primero = self._emitidos - len(self._eventos)
+                i = max(i, primero)
+                nuevos = list(islice(self._eventos, i - primero, None))
+                progreso = self._progreso if version != self._version_progreso else None
+                version = self._version_progreso
+                final = self.estado in FINALES
+            if progreso is not None:
+                yield progreso
+            yield from nuevos
+            i += len(nuevos)
+            if final and not nuevos:
+                return
+
+    def descripcion(self):
+        datos = {"id": self.id, "status": self.estado, "format": self.formato, "out": self.carpeta,
+                 "completed": self.completadas, "total": self.total}
+        if self.resultado is not None:
+            datos["result"] = self.resultado
+        return datos
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _autorizado(self):
+        token = self.headers.get(CABECERA_TOKEN, "")
+        if hmac.compare_digest(token.encode("utf-8"), self.server.servidor.token.encode("utf-8")):
+            return True
+        self._responder(403, {"error": "token"})
+        return False
+
+    def _responder(self, codigo, datos, cerrar=False):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        if cerrar:
+            # El cliente sabe así que no puede reutilizar la conexión
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _ruta(self):
+        partes = urlsplit(self.path)
+        return [p for p in partes.path.split("/") if p], parse_qs(partes.query)
+
+    def _trabajo(self, id):
+        trabajo = self.server.servidor.trabajo(id)
+        if trabajo is None:
+            self._responder(404, {"error": "job"})
+        return trabajo
+
+    def do_POST(self):
+        if not self._autorizado():
+            return
+        ruta, _ = self._ruta()
+        if ruta != ["jobs"]:
+            self._responder(404, {"error": "path"})
+            return
+        try:
+            longitud = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            longitud = -1
+        if longitud < 0:
+            # Sin una longitud válida no se sabe dónde acaba el cuerpo: la conexión no se reutiliza
+            self._responder(400, {"error": "Content-Length"}, cerrar=True)
+            return
+        if longitud > MAX_CUERPO:
+            self._responder(413, {"error": "body"}, cerrar=True)
+            return
+        try:
+            peticion = json.loads(self.rfile.read(longitud) or b"{}")
+            trabajo = self.server.servidor.enviar_peticion(peticion)
+        except (ValueError, TypeError) as e:
+            self._responder(400, {"error": str(e)})
+            return
+        self._responder(202, trabajo.descripcion())
+
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        ruta, consulta = self._ruta()
+        if ruta == ["jobs"]:
+            self._responder(200, {"jobs": [t.descripcion() for t in self.server.servidor.trabajos()]})
+        elif len(ruta) == 2 and ruta[0] == "jobs":
+            trabajo = self._trabajo(ruta[1])
+            if trabajo is not None:
+                self._responder(200, trabajo.descripcion())
+        elif len(ruta) == 3 and ruta[0] == "jobs" and ruta[2] == "events":
+            try:
+                desde = int((consulta.get("from") or ["0"])[0])
+            except ValueError:
+                desde = -1
+            if desde < 0:
+                self._responder(400, {"error": "from"})
+                return
+            trabajo = self._trabajo(ruta[1])
+            if trabajo is not None:
+                self._seguir(trabajo, desde)
+        else:
+            self._responder(404, {"error": "path"})
+
+    def _seguir(self, trabajo, desde):
+        # Sin Content-Length: los eventos van según llegan y el fin de la conexión marca el final
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for linea in trabajo.eventos(desde, self.server.servidor.detenido):
+                self.wfile.write(linea.encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_DELETE(self):
+        if not self._autorizado():
+            return
+        ruta, _ = self._ruta()
+        if len(ruta) != 2 or ruta[0] != "jobs":
+            self._responder(404, {"error": "path"})
+            return
+        trabajo = self._trabajo(ruta[1])
+        if trabajo is not None:
+            self.server.servidor.cancelar(trabajo.id)
+            self._responder(200, trabajo.descripcion())
+
+
+class _Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, direccion, servidor):
+        super().__init__(direccion, _Manejador)
+        self.servidor = servidor
+
+
+class ServidorTrabajos:
+    """Servidor de descargas que se queda en marcha y acepta trabajos por HTTP en 127.0.0.1.
+
+    Lanzar dwsongs para cada lote paga cada vez el arranque de Python, importar yt-dlp,
+    crear el primer YoutubeDL y compilar las expresiones de los extractores, casi un segundo
+    antes de la primera petición. iniciar() arranca un pool de max_trabajos procesos que hacen
+    todo eso una vez al empezar (descargas.precalentar en su inicializador) y después cada
+    trabajo es un descargar_lote en uno de ellos: un trabajo de un elemento empieza a
+    descargar en milisegundos, y un trabajo que se atasca o revienta no se lleva por delante
+    al servidor ni a los demás. Un hilo por trabajo pasa sus eventos al Trabajo y la
+    cancelación al proceso. Los trabajos comparten el limitador por host (vive en el proceso
+    del gestor), así que dos clientes no duplican el ritmo de peticiones a un mismo sitio.
+
+    Como mucho max_trabajos descargan a la vez y el resto espera en orden de llegada. Cada
+    trabajo guarda sus eventos ("queued", "start", "item", "progress", "summary"), que
+    eventos() o GET /jobs/<id>/events dan en vivo a cualquier número de clientes. Se
+    recuerdan los MAX_TERMINADOS últimos trabajos terminados.
+
+    Solo escucha en 127.0.0.1 y exige en cada petición el token que iniciar() escribe, junto
+    con la dirección, en ruta_anuncio() (legible solo por el usuario): así una página web
+    abierta en el navegador no puede enviar trabajos. ClienteTrabajos.local() lo lee.
+    """
+
+    def __init__(self, puerto=0, max_trabajos=MAX_TRABAJOS_SIMULTANEOS, workers=None, cookies=None,
+                 anunciar=True):
+        # Las descargas se importan aquí y no al cargar el módulo: ClienteTrabajos (--submit)
+        # solo necesita http.client
+        from descargas import DESCARGAS_PARALELAS_POR_DEFECTO
+
+        self.puerto = puerto
+        self.max_trabajos = max(1, max_trabajos)
+        self.workers = workers or DESCARGAS_PARALELAS_POR_DEFECTO
+        self.cookies = cookies
+        self.anunciar = anunciar
+        self.token = secrets.token_urlsafe(24)
+        self.limitador = None
+        self.detenido = threading.Event()
+        self.precalentado_ms = None
+        self._lock = threading.Lock()
+        self._trabajos = OrderedDict()
+        self._siguiente = 1
+        self._pool = ThreadPoolExecutor(max_workers=self.max_trabajos, thread_name_prefix="dwsongs-trabajo")
+        self._gestor = None
+        self._procesos = None
+        self._httpd = None
+        self._hilo = None
+
+    @property
+    def url_base(self):
+        host, puerto = self._httpd.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def _crear_procesos(self):
+        """Pool de procesos ya calientes: un trabajo vacío por proceso los arranca a todos ya."""
+        procesos = ProcessPoolExecutor(max_workers=self.max_trabajos, initializer=_iniciar_proceso)
+        list(procesos.map(_precalentado, range(self.max_trabajos)))
+        return procesos
+
+    def iniciar(self):
+        self._httpd = _Servidor(("127.0.0.1", self.puerto), self)
+        inicio = time.perf_counter()
+        self._gestor = _Gestor(ctx=multiprocessing.get_context())
+        self._gestor.start(_ignorar_interrupcion)
+        self.limitador = self._gestor.limitador()
+        self._procesos = self._crear_procesos()
+        self.precalentado_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        self._hilo = threading.Thread(target=self._httpd.serve_forever, name="dwsongs-api", daemon=True)
+        self._hilo.start()
+        if self.anunciar:
+            ruta = ruta_anuncio()
+            temporal = ruta + ".tmp"
+            fd = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"url": self.url_base, "token": self.token, "pid": os.getpid()}, f)
+            os.replace(temporal, ruta)
+        return self
+
+    def detener(self):
+        self.detenido.set()
+        with self._lock:
+            trabajos = list(self._trabajos.values())
+        for trabajo in trabajos:
+            trabajo.cancelado.set()
+        if self.anunciar:
+            try:
+                with open(ruta_anuncio(), "r", encoding="utf-8") as f:
+                    propio = json.load(f).get("token") == self.token
+                if propio:
+                    os.remove(ruta_anuncio())
+            except (OSError, ValueError):
+                pass
+        if self._httpd is not None:
+            if self._hilo is not None:
+                self._httpd.shutdown()
+            self._httpd.server_close()
+        self._pool.shutdown(wait=True)
+        if self._procesos is not None:
+            self._procesos.shutdown(wait=True)
+        if self._gestor is not None:
+            self._gestor.shutdown()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    def trabajo(self, id):
+        with self._lock:
+            return self._trabajos.get(id)
+
+    def trabajos(self):
+        with self._lock:
+            return list(self._trabajos.values())
+
+    def enviar_peticion(self, peticion):
+        """Valida el cuerpo de POST /jobs y envía el trabajo; ValueError si no es válido."""
+        if not isinstance(peticion, dict):
+            raise ValueError("el cuerpo debe ser un objeto JSON")
+        urls, csv = peticion.get("urls"), peticion.get("csv")
+        if csv:
+            if not os.path.isfile(csv):
+                raise ValueError(f"no existe el CSV: {csv}")
+        elif not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            raise ValueError("hace falta una lista de URLs (urls) o un CSV (csv)")
+        carpeta = peticion.get("out")
+        if not carpeta or not os.path.isdir(carpeta):
+            raise ValueError(f"la carpeta no existe: {carpeta}")
+        formato = str(peticion.get("format") or "mp3").upper()
+        if formato not in ("MP3", "MP4"):
+            raise ValueError(f"formato no admitido: {formato}")
+        segmentos = int(peticion.get("segments") or 0)
+        return self.enviar(csv or urls, carpeta, formato, workers=int(peticion.get("jobs") or self.workers),
+                           pipeline=bool(peticion.get("pipeline")) or segmentos > 1, segmentos=segmentos,
+                           etiquetar=bool(peticion.get("tags", True)),
+                           normalizar=bool(peticion.get("normalize")),
+                           usar_historial=bool(peticion.get("archive", True)))
+
+    def enviar(self, fuente, carpeta, formato, workers=None, **opciones):
+        """Encola un trabajo: fuente es una lista de URLs o la ruta de un CSV y opciones las de
+        descargas.OpcionesLote que elige el cliente. Devuelve su Trabajo."""
+        if self.detenido.is_set():
+            raise ValueError("el servidor se está deteniendo")
+        with self._lock:
+            id = str(self._siguiente)
+            self._siguiente += 1
+            trabajo = self._trabajos[id] = Trabajo(id, fuente, os.path.abspath(carpeta), formato,
+                                                     workers or self.workers, opciones)
+            terminados = [t for t in self._trabajos.values() if t.estado in FINALES]
+            for viejo in terminados[:max(0, len(terminados) - MAX_TERMINADOS)]:
+                del self._trabajos[viejo.id]
+        trabajo.emitir("queued", total=trabajo.total)
+        self._pool.submit(self._ejecutar, trabajo)
+        return trabajo
+
+    def cancelar(self, id):
+        trabajo = self.trabajo(id)
+        if trabajo is None:
+            return False
+        trabajo.cancelado.set()
+        return True
+
+    def _ejecutar(self, trabajo):
+        if trabajo.cancelado.is_set():
+            trabajo.emitir("summary", cancelled=True)
+            trabajo.fijar_estado(CANCELADO)
+            return
+        trabajo.fijar_estado(EN_CURSO)
+        trabajo.emitir("start", total=trabajo.total,
+                       wait_ms=round((time.perf_counter() - trabajo.enviado) * 1000, 1))
+
+        procesos = self._procesos
+        try:
+            eventos = self._gestor.Queue()
+            cancelado = self._gestor.Event()
+            opciones = dict(trabajo.opciones, cookies=self.cookies, limitador=self.limitador)
+            futuro = procesos.submit(_trabajo_en_proceso, trabajo.fuente, trabajo.carpeta, trabajo.formato,
+                                     trabajo.workers, trabajo.total, opciones, eventos, cancelado)
+            self._bombear(trabajo, futuro, eventos, cancelado)
+            resultado = futuro.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool) and not self.detenido.is_set():
+                # Un proceso murió (p. ej. sin memoria): los trabajos siguientes van a un pool nuevo
+                with self._lock:
+                    if self._procesos is procesos:
+                        self._procesos = self._crear_procesos()
+            print(f"Error en el trabajo {trabajo.id}: {e}", file=sys.stderr)
+            trabajo.emitir("error", message=str(e))
+            trabajo.fijar_estado(FALLIDO)
+            return
+        trabajo.resultado = resultado
+        trabajo.emitir("summary", elapsed_s=round(time.perf_counter() - trabajo.enviado, 3), **resultado)
+        trabajo.fijar_estado(CANCELADO if resultado["cancelled"] else TERMINADO)
+
+    def _bombear(self, trabajo, futuro, eventos, cancelado):
+        """Pasa al Trabajo los eventos de su proceso, y al proceso la cancelación, hasta que acaba."""
+        avisado = False
+
+        def aplicar(evento):
+            if evento[0] == "progress":
+                trabajo.fijar_progreso(*evento[1:])
+            else:
+                trabajo.emitir("item", url=evento[1], status=evento[2])
+
+        while not futuro.done():
+            if not avisado and trabajo.cancelado.is_set():
+                cancelado.set()
+                avisado = True
+            try:
+                aplicar(eventos.get(timeout=INTERVALO_EVENTOS))
+            except queue.Empty:
+                pass
+        # Lo que el proceso emitió justo antes de terminar
+        while True:
+            try:
+                aplicar(eventos.get_nowait())
+            except queue.Empty:
+                return
+
+
+class ClienteTrabajos:
+    """Cliente de la API de ServidorTrabajos (solo usa http.client: arranca al instante)."""
+
+    def __init__(self, url, token, timeout=10):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.puerto = partes.port
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def local(cls):
+        """El cliente del servidor anunciado en ruta_anuncio(); None si no hay ninguno en marcha."""
+        try:
+            with open(ruta_anuncio(), "r", encoding="utf-8") as f:
+                anuncio = json.load(f)
+        except (OSError, ValueError):
+            return None
+        cliente = cls(anuncio["url"], anuncio["token"])
+        try:
+            cliente.trabajos()
+        except (OSError, http.client.HTTPException, ValueError):
+            return None
+        return cliente
+
+    def _peticion(self, metodo, ruta, datos=None, timeout=-1):
+        conexion = http.client.HTTPConnection(self.host, self.puerto,
+                                              timeout=self.timeout if timeout == -1 else timeout)
+        cuerpo = json.dumps(datos).encode("utf-8") if datos is not None else None
+        cabeceras = {CABECERA_TOKEN: self.token}
+        if cuerpo is not None:
+            cabeceras["Content-Type"] = "application/json"
+        conexion.request(metodo, ruta, cuerpo, cabeceras)
+        return conexion, conexion.getresponse()
+
+    def _json(self, metodo, ruta, datos=None):
+        conexion, respuesta = self._peticion(metodo, ruta, datos)
+        try:
+            contenido = json.loads(respuesta.read() or b"{}")
+        finally:
+            conexion.close()
+        if respuesta.status >= 400:
+            raise ValueError(contenido.get("error") or f"HTTP {respuesta.status}")
+        return contenido
+
+    def enviar(self, carpeta, formato="mp3", urls=None, csv=None, **opciones):
+        """Envía un trabajo (urls o la ruta de un csv) y devuelve su id."""
+        peticion = {"out": os.path.abspath(carpeta), "format": formato, **opciones}
+        if csv:
+            peticion["csv"] = os.path.abspath(csv)
+        else:
+            peticion["urls"] = list(urls)
+        return self._json("POST", "/jobs", peticion)["id"]
+
+    def estado(self, id):
+        return self._json("GET", f"/jobs/{id}")
+
+    def trabajos(self):
+        return self._json("GET", "/jobs")["jobs"]
+
+    def cancelar(self, id):
+        return self._json("DELETE", f"/jobs/{id}")
+
+    def eventos(self, id, desde=0):
+        """Genera los eventos (dicts) del trabajo según llegan, hasta que termina."""
+        conexion, respuesta = self._peticion("GET", f"/jobs/{id}/events?from={desde}", timeout=None)
+        try:
+            if respuesta.status >= 400:
+                raise ValueError(json.loads(respuesta.read() or b"{}").get("error") or f"HTTP {respuesta.status}")
+            for linea in respuesta:
+                if linea.strip():
+                    yield json.loads(linea)
+        finally:
+            conexion.close()
@@ -0,0 +1,252 @@
+# Sincronización continua: filas nuevas de un CSV que crece y vídeos nuevos de listas vigiladas
+
+import io
+import os
+import csv
+import time
+import hashlib
+import sqlite3
+import threading
+
+from rutas import ruta_datos
+from enlaces import canonizar, clave_canonica, LISTA, CANAL
+from expansion import url_de_entrada, es_lista, MAX_PROFUNDIDAD
+
+
+# Segundos entre dos comprobaciones del CSV (un os.stat) y entre dos revisiones de cada lista
+INTERVALO_CSV = 5.0
+INTERVALO_LISTAS = 900.0
+# En un canal (lo más nuevo primero) se deja de leer tras tantas entradas ya vistas seguidas
+MAX_VISTAS_SEGUIDAS = 30
+# Una URL fallida se reintenta en ciclos posteriores, con espera doble cada vez, hasta
+# MAX_INTENTOS veces
+ESPERA_REINTENTO = 60.0
+MAX_INTENTOS = 5
+# Bytes del CSV que se leen como mucho por ciclo (la primera vez el archivo puede ser enorme)
+MAX_LECTURA = 8 << 20
+
+
+def ruta_estado(destino):
+    """Archivo de estado de la sincronización hacia destino (una carpeta o una cola)."""
+    nombre = hashlib.blake2b(destino.encode("utf-8"), digest_size=8).hexdigest()
+    return ruta_datos("sincronizacion", nombre + ".sqlite3")
+
+
+class Sincronizador:
+    """Calcula en cada ciclo solo lo nuevo de un CSV de solo añadido y de unas listas.
+
+    Del CSV se recuerda el desplazamiento en bytes tras la última línea completa leída (y el
+    dispositivo e inodo del archivo): cada ciclo hace un os.stat y, si ha crecido, lee desde
+    ahí. Si el archivo se sustituye o encoge se vuelve a leer desde el principio (el historial
+    de la carpeta evita repetir descargas). Las filas que son listas o canales pasan a
+    vigilarse como las de listas.
+
+    Cada lista se revisa como mucho cada intervalo_listas segundos con extracción plana y se
+    recuerdan las claves de sus vídeos, así solo salen los que no se habían visto. En los
+    canales, que yt-dlp pagina de lo más nuevo a lo más antiguo, la lectura se corta tras
+    MAX_VISTAS_SEGUIDAS entradas ya vistas y no se piden el resto de páginas.
+
+    novedades() devuelve las URLs nuevas más las fallidas a las que les toca reintento, y en
+    una sola transacción avanza los desplazamientos y las apunta como pendientes; terminada()
+    (para on_terminada de descargar_lote) quita las que acaban bien y aplaza las fallidas. Así,
+    si el proceso se corta a mitad de un ciclo, el siguiente retoma las que quedaron sin hacer.
+    Las listas se extraen sin el lock ni una transacción abierta, así que terminada() no espera
+    a la red.
+    """
+
+    def __init__(self, ruta, csv=None, listas=(), intervalo_listas=INTERVALO_LISTAS):
+        self.csv = os.path.abspath(csv) if csv else None
+        self.intervalo_listas = intervalo_listas
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS archivos ("
+            " ruta TEXT PRIMARY KEY, dispositivo INTEGER, inodo INTEGER, desplazamiento INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS listas (url TEXT PRIMARY KEY, revisada REAL NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS entradas ("
+            " lista TEXT NOT NULL, clave TEXT NOT NULL, PRIMARY KEY (lista, clave)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS pendientes ("
+            " url TEXT PRIMARY KEY, intentos INTEGER NOT NULL DEFAULT 0, siguiente REAL NOT NULL DEFAULT 0);"
+        )
+        self._conn.executemany("INSERT OR IGNORE INTO listas (url) VALUES (?)", [(url,) for url in listas])
+        self._conn.commit()
+        self._ydl = None
+        # Un ciclo de novedades() a la vez; _lock solo protege cada acceso a la base de datos
+        self._ciclo = threading.Lock()
+
+    def _filas_nuevas(self):
+        """(URLs de las líneas completas añadidas al CSV, nuevo estado del archivo, bytes por leer)."""
+        try:
+            estado = os.stat(self.csv)
+        except FileNotFoundError:
+            return [], None, 0
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT dispositivo, inodo, desplazamiento FROM archivos WHERE ruta = ?", (self.csv,)).fetchone()
+        desplazamiento = 0
+        if fila and fila[:2] == (estado.st_dev, estado.st_ino) and fila[2] <= estado.st_size:
+            desplazamiento = fila[2]
+        if desplazamiento == estado.st_size:
+            return [], None, 0
+        with open(self.csv, "rb") as f:
+            f.seek(desplazamiento)
+            datos = f.read(MAX_LECTURA)
+        # La última línea puede estar a medio escribir: se deja para el siguiente ciclo
+        fin = datos.rfind(b"\n") + 1
+        if not fin:
+            return [], None, 0
+        texto = datos[:fin].decode("utf-8", errors="replace")
+        # Con csv.reader, como ingesta.iterar_urls_de_csv: un campo entre comillas puede llevar saltos
+        urls = [fila[0] for fila in csv.reader(io.StringIO(texto, newline="")) if fila and fila[0].strip()]
+        desplazamiento += fin
+        por_leer = estado.st_size - desplazamiento if len(datos) == MAX_LECTURA else 0
+        return urls, (self.csv, estado.st_dev, estado.st_ino, desplazamiento), por_leer
+
+    def _ydl_listas(self):
+        if self._ydl is None:
+            from yt_dlp import YoutubeDL
+
+            self._ydl = YoutubeDL({"extract_flat": "in_playlist", "quiet": True, "noprogress": True})
+        return self._ydl
+
+    def _entradas_nuevas(self, lista, url, vistas, nuevas, profundidad=0):
+        info = self._ydl_listas().extract_info(url, download=False, process=False)
+        if info.get("_type") not in ("playlist", "multi_video"):
+            return
+        recientes_primero = canonizar(url).tipo == CANAL
+        seguidas = 0
+        # process=False deja las entradas como generador: las páginas se piden al recorrerlo
+        for entrada in info.get("entries") or []:
+            url_entrada = url_de_entrada(entrada) if entrada else None
+            if not url_entrada:
+                continue
+            if profundidad < MAX_PROFUNDIDAD and (
+                    entrada.get("_type") == "playlist" or (entrada.get("_type") == "url" and es_lista(url_entrada))):
+                self._entradas_nuevas(lista, url_entrada, vistas, nuevas, profundidad + 1)
+                continue
+            clave = clave_canonica(url_entrada)
+            if clave in vistas or self._vista(lista, clave):
+                seguidas += 1
+                if recientes_primero and seguidas >= MAX_VISTAS_SEGUIDAS:
+                    return
+                continue
+            seguidas = 0
+            vistas.add(clave)
+            nuevas.append(url_entrada)
+
+    def _vista(self, lista, clave):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM entradas WHERE lista = ? AND clave = ?", (lista, clave)).fetchone() is not None
+
+    def _listas_por_revisar(self, nuevas):
+        """Listas a las que les toca revisión más las de nuevas (del CSV) que aún no se vigilaban."""
+        with self._lock:
+            vencidas = [url for url, in self._conn.execute(
+                "SELECT url FROM listas WHERE revisada <= ?", (time.time() - self.intervalo_listas,))]
+            conocidas = {url for url, in self._conn.execute("SELECT url FROM listas")} if nuevas else set()
+        return vencidas + [url for url in dict.fromkeys(nuevas) if url not in conocidas]
+
+    def _revisar_listas(self, listas, on_error=None):
+        """Vídeos nuevos de listas (con red, sin el lock).
+
+        Devuelve (URLs, [(lista, claves vistas)]); las claves son None si la lista falló.
+        """
+        urls = []
+        revisadas = []
+        for lista in listas:
+            vistas = set()
+            nuevas = []
+            try:
+                self._entradas_nuevas(lista, lista, vistas, nuevas)
+            except Exception as e:
+                if on_error:
+                    on_error(lista, e)
+                revisadas.append((lista, None))
+                continue
+            urls.extend(nuevas)
+            revisadas.append((lista, vistas))
+        return urls, revisadas
+
+    def novedades(self, on_error=None):
+        """URLs a procesar en este ciclo; devuelve (urls, resumen por origen).
+
+        on_error(lista, excepción) se llama con las listas que no se han podido revisar (se
+        reintentan pasados ESPERA_REINTENTO segundos).
+        """
+        with self._ciclo:
+            return self._novedades(on_error)
+
+    def _novedades(self, on_error):
+        filas, archivo, por_leer = self._filas_nuevas() if self.csv else ([], None, 0)
+        videos = []
+        listas = []
+        for url in filas:
+            url = url.strip()
+            enlace = canonizar(url)
+            if enlace.tipo in (LISTA, CANAL):
+                listas.append(url)
+            else:
+                videos.append(url)
+        # Las listas recién llegadas del CSV se revisan ya
+        de_listas, revisadas = self._revisar_listas(self._listas_por_revisar(listas), on_error)
+        # Lo extraído se anota en una transacción corta
+        with self._lock:
+            ahora = time.time()
+            self._conn.executemany("INSERT OR IGNORE INTO listas (url) VALUES (?)", [(url,) for url in listas])
+            reintentos = [url for url, in self._conn.execute(
+                "SELECT url FROM pendientes WHERE siguiente <= ?", (ahora,))]
+            if archivo is not None:
+                self._conn.execute("INSERT OR REPLACE INTO archivos VALUES (?, ?, ?, ?)", archivo)
+            for lista, vistas in revisadas:
+                if vistas is None:
+                    # Una lista que falla se vuelve a probar en ESPERA_REINTENTO segundos
+                    revisada = ahora - self.intervalo_listas + ESPERA_REINTENTO
+                    self._conn.execute("UPDATE listas SET revisada = ? WHERE url = ?", (revisada, lista))
+                    continue
+                self._conn.execute("UPDATE listas SET revisada = ? WHERE url = ?", (ahora, lista))
+                self._conn.executemany("INSERT OR IGNORE INTO entradas VALUES (?, ?)",
+                                       [(lista, clave) for clave in vistas])
+            nuevas = videos + de_listas
+            self._conn.executemany("INSERT OR IGNORE INTO pendientes (url) VALUES (?)", [(url,) for url in nuevas])
+            self._conn.commit()
+        pendientes = set(reintentos)
+        urls = reintentos + [url for url in nuevas if url not in pendientes]
+        return urls, {"csv_rows": len(filas), "playlists": len(listas), "playlist_entries": len(de_listas),
+                      "retries": len(reintentos), "csv_bytes_left": por_leer}
+
+    def terminada(self, url, resultado):
+        with self._lock:
+            if resultado == "error":
+                self._conn.execute(
+                    "UPDATE pendientes SET intentos = intentos + 1,"
+                    " siguiente = ? * (1 << intentos) + ? WHERE url = ?", (ESPERA_REINTENTO, time.time(), url))
+                self._conn.execute("DELETE FROM pendientes WHERE url = ? AND intentos >= ?", (url, MAX_INTENTOS))
+            elif resultado != "cancelled":
+                self._conn.execute("DELETE FROM pendientes WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+        if self._ydl is not None:
+            self._ydl.close()
+
+
+def vigilar(sincronizador, procesar, detener, intervalo=INTERVALO_CSV, on_ciclo=None, on_error=None):
+    """Bucle de sincronización hasta que se active detener (un threading.Event).
+
+    Cada intervalo segundos pide las novedades y, si hay, llama a procesar(urls) (que debe
+    avisar a sincronizador.terminada de cada una) y a on_ciclo(resumen, resultado). Si al CSV
+    le quedan bytes por leer el siguiente ciclo empieza sin esperar.
+    """
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        urls, resumen = sincronizador.novedades(on_error)
+        resumen["sync_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        if urls:
+            resultado = procesar(urls)
+            if on_ciclo:
+                on_ciclo(resumen, resultado)
+        if not resumen["csv_bytes_left"]:
+            detener.wait(intervalo)
@@ -0,0 +1,46 @@
+# Entorno común de las pruebas: el código del repositorio importable y los datos en una
+# carpeta temporal (historial, cachés y métricas no van a la carpeta del usuario)
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import threading
+import subprocess
+from http.server import ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+DATOS = tempfile.mkdtemp(prefix="dwsongs-pruebas-")
+os.environ["DWSONGS_DATOS"] = DATOS
+atexit.register(shutil.rmtree, DATOS, ignore_errors=True)
+
+from descargas import ruta_ffmpeg  # noqa: E402
+
+HAY_FFMPEG = shutil.which(ruta_ffmpeg()) is not None
+
+
+def describir_medio(ruta):
+    """(etiquetas, streams) de un archivo según ffmpeg: las etiquetas globales como dict y una
+    línea "Stream #0:N..." por stream (no hace falta ffprobe)."""
+    proceso = subprocess.run([ruta_ffmpeg(), "-hide_banner", "-i", ruta, "-f", "ffmetadata", "-"],
+                             capture_output=True, text=True, check=True)
+    etiquetas = {}
+    for linea in proceso.stdout.splitlines():
+        if "=" in linea and not linea.startswith(";"):
+            clave, valor = linea.split("=", 1)
+            etiquetas[clave.lower()] = valor
+    streams = [linea.strip() for linea in proceso.stderr.splitlines() if linea.strip().startswith("Stream #0:")]
+    return etiquetas, streams
+
+
+def servidor_local(manejador):
+    """ThreadingHTTPServer de manejador en 127.0.0.1 (puerto libre) atendiendo en un hilo aparte;
+    se para con shutdown() y server_close()."""
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="pruebas-http", daemon=True).start()
+    return servidor
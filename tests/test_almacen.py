@@ -0,0 +1,130 @@
+# Almacén por contenido: enlaces reflink → hardlink → copia y claves por formato y variante
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from comun import DATOS
+
+import almacen
+from almacen import AlmacenContenidos, clave_objeto, enlazar, REFLINK, HARDLINK, COPIA
+from descargas import OpcionesLote
+
+CLAVE = ("youtube", "aaaaaaaaaaa")
+
+
+class PruebaEnlazar(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+        self.origen = os.path.join(carpeta.name, "origen.mp3")
+        with open(self.origen, "wb") as f:
+            f.write(os.urandom(4096))
+        self.destino = os.path.join(carpeta.name, "destino.mp3")
+
+    def comprobar(self, metodo, esperado):
+        self.assertEqual(metodo, esperado)
+        with open(self.origen, "rb") as fo, open(self.destino, "rb") as fd:
+            self.assertEqual(fo.read(), fd.read())
+        self.assertEqual(os.path.samefile(self.origen, self.destino), esperado == HARDLINK)
+        # Sin temporales a medio hacer
+        self.assertEqual(sorted(os.listdir(self.carpeta)), ["destino.mp3", "origen.mp3"])
+
+    def test_prefiere_reflink(self):
+        # Sin un sistema de archivos que clone, el reflink se simula con una copia
+        with mock.patch("almacen._reflink", side_effect=lambda o, d: bool(shutil.copy(o, d))) as reflink:
+            self.comprobar(enlazar(self.origen, self.destino), REFLINK)
+        temporal = reflink.call_args[0][1]
+        self.assertTrue(temporal.startswith(self.destino) and temporal.endswith(".tmp"))
+
+    def test_sin_reflink_enlace_duro(self):
+        dispositivo = os.stat(self.origen).st_dev
+        self.addCleanup(almacen._sin_reflink.discard, dispositivo)
+        almacen._sin_reflink.discard(dispositivo)
+        with mock.patch("fcntl.ioctl", side_effect=OSError(95, "Operation not supported")) as ioctl:
+            self.comprobar(enlazar(self.origen, self.destino), HARDLINK)
+            # El dispositivo que no sabe clonar no se vuelve a probar
+            os.remove(self.destino)
+            self.comprobar(enlazar(self.origen, self.destino), HARDLINK)
+        self.assertEqual(ioctl.call_count, 1 if almacen.sys.platform.startswith("linux") else 0)
+
+    def test_sin_enlace_duro_copia(self):
+        with mock.patch("almacen._reflink", return_value=False), \
+                mock.patch("os.link", side_effect=OSError(18, "Invalid cross-device link")):
+            self.comprobar(enlazar(self.origen, self.destino), COPIA)
+
+    def test_sustituye_el_destino(self):
+        with open(self.destino, "wb") as f:
+            f.write(b"antes")
+        with mock.patch("almacen._reflink", return_value=False):
+            self.comprobar(enlazar(self.origen, self.destino), HARDLINK)
+
+
+class PruebaAlmacen(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.almacen = AlmacenContenidos(os.path.join(carpeta.name, "almacen"))
+        self.addCleanup(self.almacen.cerrar)
+        self.salida = os.path.join(carpeta.name, "salida")
+        os.makedirs(self.salida)
+
+    def guardar(self, contenido, formato="MP3", variante="", nombre="Canción.mp3"):
+        subcarpeta = tempfile.mkdtemp(dir=self.almacen.carpeta_entrada)
+        ruta = os.path.join(subcarpeta, nombre)
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        return self.almacen.guardar(CLAVE, formato, ruta, self.salida, variante)
+
+    def test_variantes_de_las_opciones(self):
+        self.assertEqual(OpcionesLote().variante, "")
+        self.assertEqual(OpcionesLote(normalizar=True).variante, "loudnorm")
+        self.assertEqual(OpcionesLote(etiquetar=True).variante, "tags+cover")
+        self.assertEqual(OpcionesLote(etiquetar=True, normalizar=True).variante, "tags+cover+loudnorm")
+        claves = {clave_objeto(CLAVE, formato, OpcionesLote(etiquetar=e, normalizar=n).variante)
+                  for formato in ("MP3", "MP4") for e in (False, True) for n in (False, True)}
+        self.assertEqual(len(claves), 8)
+
+    def test_cada_variante_tiene_su_objeto(self):
+        etiquetada = OpcionesLote(etiquetar=True).variante
+        _, sin_etiquetas = self.guardar(b"sin etiquetas")
+        # La misma canción con etiquetas no pisa a la de sin etiquetas, ni en el almacén ni en la carpeta
+        ruta, con_etiquetas = self.guardar(b"con etiquetas", variante=etiquetada)
+        self.assertNotEqual(sin_etiquetas, con_etiquetas)
+        self.assertEqual(os.path.basename(ruta), "Canción [aaaaaaaaaaa].mp3")
+        self.assertEqual(self.almacen.buscar(CLAVE, "MP3")[1][0], sin_etiquetas)
+        self.assertEqual(self.almacen.buscar(CLAVE, "MP3", etiquetada)[1][0], con_etiquetas)
+        self.assertIsNone(self.almacen.buscar(CLAVE, "MP3", "loudnorm"))
+        self.assertIsNone(self.almacen.buscar(CLAVE, "MP4"))
+        # Y otra carpeta recibe la variante que pide
+        otra = os.path.join(self.salida, "otra")
+        os.makedirs(otra)
+        ruta, digest = self.almacen.materializar(CLAVE, "MP3", otra, etiquetada)
+        self.assertEqual(digest, con_etiquetas)
+        with open(ruta, "rb") as f:
+            self.assertEqual(f.read(), b"con etiquetas")
+
+    def test_el_indice_sobrevive_al_reabrir(self):
+        _, digest = self.guardar(b"contenido", variante="loudnorm")
+        self.almacen.cerrar()
+        self.almacen = AlmacenContenidos(self.almacen.carpeta)
+        self.addCleanup(self.almacen.cerrar)
+        self.assertEqual(self.almacen.buscar(CLAVE, "MP3", "loudnorm")[1][0], digest)
+        self.assertIsNone(self.almacen.buscar(CLAVE, "MP3"))
+
+    def test_contenido_repetido_se_guarda_una_vez(self):
+        self.guardar(b"igual")
+        self.guardar(b"igual", formato="MP4", nombre="Canción.mp4")
+        estadisticas = self.almacen.estadisticas()
+        self.assertEqual((estadisticas["guardados"], estadisticas["deduplicados"]), (2, 0))
+        self.guardar(b"igual", variante="loudnorm")
+        self.assertEqual(self.almacen.estadisticas()["deduplicados"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
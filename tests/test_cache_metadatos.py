@@ -0,0 +1,108 @@
+# Caché de info-dicts: caducidad según el expire= de las URLs firmadas, LRU y persistencia
+
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+from comun import DATOS
+
+from cache_metadatos import CacheMetadatos, caducidad_info, TTL_SIN_FIRMA, MARGEN_CADUCIDAD
+
+CLAVE = ("Youtube", "dQw4w9WgXcQ")
+AHORA = 1_700_000_000
+
+
+def formato(expira=None, forma="?expire={}&sig=x"):
+    url = "https://rr1.googlevideo.com/videoplayback"
+    return {"url": url + forma.format(expira) if expira else url}
+
+
+class PruebaCaducidad(unittest.TestCase):
+
+    def test_la_primera_url_que_caduca(self):
+        info = {"formats": [formato(AHORA + 7200), formato(AHORA + 3600), formato()]}
+        self.assertEqual(caducidad_info(info, AHORA), AHORA + 3600 - MARGEN_CADUCIDAD)
+
+    def test_expire_en_la_ruta(self):
+        info = {"formats": [formato(AHORA + 3600, "/expire/{}/ip/1.2.3.4")]}
+        self.assertEqual(caducidad_info(info, AHORA), AHORA + 3600 - MARGEN_CADUCIDAD)
+
+    def test_url_directa_sin_formatos(self):
+        self.assertEqual(caducidad_info(formato(AHORA + 600), AHORA), AHORA + 600 - MARGEN_CADUCIDAD)
+
+    def test_sin_firma(self):
+        self.assertEqual(caducidad_info({"formats": [formato()]}, AHORA), AHORA + TTL_SIN_FIRMA)
+        self.assertEqual(caducidad_info({"formats": []}, AHORA), AHORA + TTL_SIN_FIRMA)
+        # "expires=" u otros parámetros parecidos no cuentan
+        self.assertEqual(caducidad_info({"url": "https://x.example/a?noexpire=1"}, AHORA), AHORA + TTL_SIN_FIRMA)
+
+
+class PruebaCache(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.ruta = os.path.join(carpeta.name, "metadatos.sqlite3")
+        self.cache = self.abrir()
+
+    def abrir(self, **parametros):
+        cache = CacheMetadatos(self.ruta, **parametros)
+        self.addCleanup(cache.cerrar)
+        return cache
+
+    def info(self, expira):
+        return {"id": CLAVE[1], "title": "Canción", "formats": [formato(expira)]}
+
+    def test_caduca_con_la_url_firmada(self):
+        ahora = time.time()
+        self.cache.guardar(CLAVE, self.info(int(ahora) + 1000))
+        self.assertEqual(self.cache.obtener(CLAVE)["title"], "Canción")
+        with mock.patch("cache_metadatos.time.time", return_value=ahora + 1000 - MARGEN_CADUCIDAD + 1):
+            self.assertIsNone(self.cache.obtener(CLAVE))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_sin_firma_dura_el_ttl(self):
+        ahora = time.time()
+        self.cache.guardar(CLAVE, {"id": CLAVE[1], "url": "https://x.example/a.mp3"})
+        with mock.patch("cache_metadatos.time.time", return_value=ahora + TTL_SIN_FIRMA - 10):
+            self.assertIsNotNone(self.cache.obtener(CLAVE))
+        with mock.patch("cache_metadatos.time.time", return_value=ahora + TTL_SIN_FIRMA + 10):
+            self.assertIsNone(self.cache.obtener(CLAVE))
+
+    def test_ya_caducada_no_se_devuelve(self):
+        self.cache.guardar(CLAVE, self.info(int(time.time()) + MARGEN_CADUCIDAD - 1))
+        self.assertIsNone(self.cache.obtener(CLAVE))
+
+    def test_persiste_y_se_purga_al_abrir(self):
+        ahora = time.time()
+        otra = ("Youtube", "aaaaaaaaaaa")
+        self.cache.guardar(CLAVE, self.info(int(ahora) + 7200))
+        self.cache.guardar(otra, self.info(int(ahora) + MARGEN_CADUCIDAD + 60))
+        self.cache.cerrar()
+        with mock.patch("cache_metadatos.time.time", return_value=ahora + 120):
+            cache = self.abrir()
+        self.assertEqual(cache.obtener(CLAVE)["id"], CLAVE[1])
+        filas = cache._conn.execute("SELECT clave FROM metadatos").fetchall()
+        self.assertEqual(filas, [("Youtube:dQw4w9WgXcQ",)])
+
+    def test_devuelve_copias(self):
+        self.cache.guardar(CLAVE, self.info(int(time.time()) + 7200))
+        self.cache.obtener(CLAVE)["title"] = "cambiado"
+        self.assertEqual(self.cache.obtener(CLAVE)["title"], "Canción")
+
+    def test_lru_en_memoria_y_resto_en_disco(self):
+        cache = self.abrir(max_en_memoria=2)
+        expira = int(time.time()) + 7200
+        claves = [("Youtube", f"{i:011d}") for i in range(4)]
+        for clave in claves:
+            cache.guardar(clave, self.info(expira))
+        self.assertEqual(len(cache._memoria), 2)
+        # Las que salieron de memoria siguen en SQLite
+        self.assertTrue(all(cache.obtener(clave) is not None for clave in claves))
+        self.assertEqual(cache.hits, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
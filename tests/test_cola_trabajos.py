@@ -0,0 +1,132 @@
+# Cola de trabajos SQLite repartida entre varios procesos: reservas, caducidad y reclamación
+
+import os
+import time
+import sqlite3
+import tempfile
+import unittest
+import multiprocessing
+
+from comun import DATOS
+
+from cola_trabajos import ColaSQLite, PENDIENTE, RESERVADO, EXPANDIDO, MAX_INTENTOS
+
+# Reserva corta para que las caducadas se recuperen enseguida
+DURACION = 0.5
+
+
+def _nodo(ruta, identificador, empezar, bloque, completar, pausa=0.0):
+    """Un nodo en otro proceso: reserva de bloque en bloque y completa lo reservado como "ok".
+
+    Con completar=False reserva un solo bloque y sale sin completarlo ni liberarlo, como un nodo
+    que muere a mitad de trabajo.
+    """
+    empezar.wait(30)
+    cola = ColaSQLite(ruta)
+    try:
+        while True:
+            filas = cola.reclamar(identificador, bloque, DURACION)
+            if not filas or not completar:
+                return
+            for clave, _ in filas:
+                time.sleep(pausa)
+                cola.completar(identificador, clave, "ok")
+    finally:
+        cola.cerrar()
+
+
+class PruebaColaVariosProcesos(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.ruta = os.path.join(carpeta.name, "cola.sqlite")
+        self.cola = ColaSQLite(self.ruta)
+        self.addCleanup(self.cola.cerrar)
+        self.contexto = multiprocessing.get_context("spawn")
+
+    def encolar(self, n):
+        urls = [f"https://medios.example/v/{i}.mp3" for i in range(n)]
+        self.assertEqual(self.cola.encolar(urls)["added"], n)
+        return urls
+
+    def lanzar(self, *nodos):
+        """Arranca un proceso por nodo (identificador, bloque, completar[, pausa]) a la vez."""
+        empezar = self.contexto.Event()
+        procesos = [self.contexto.Process(target=_nodo, args=(self.ruta, nodo[0], empezar) + nodo[1:])
+                    for nodo in nodos]
+        for proceso in procesos:
+            proceso.start()
+        empezar.set()
+        for proceso in procesos:
+            proceso.join(60)
+            self.assertEqual(proceso.exitcode, 0)
+
+    def filas(self):
+        with sqlite3.connect(self.ruta) as conn:
+            return conn.execute("SELECT clave, estado, trabajador, intentos, caducadas FROM trabajos").fetchall()
+
+    def test_dos_procesos_se_reparten_la_cola(self):
+        self.encolar(40)
+        self.lanzar(("a", 2, True, 0.01), ("b", 2, True, 0.01))
+        filas = self.filas()
+        self.assertEqual({estado for _, estado, _, _, _ in filas}, {"ok"})
+        # Ningún elemento se reservó dos veces y los dos nodos trabajaron
+        self.assertEqual({intentos for _, _, _, intentos, _ in filas}, {1})
+        self.assertEqual({trabajador for _, _, trabajador, _, _ in filas}, {"a", "b"})
+        progreso = self.cola.progreso()
+        self.assertEqual((progreso["done"], progreso["total"], progreso["requeued"]), (40, 40, 0))
+        self.assertTrue(self.cola.terminada())
+
+    def test_reserva_caducada_la_reclama_otro_proceso(self):
+        self.encolar(6)
+        self.lanzar(("muerto", 3, False))
+        self.assertEqual(self.cola.progreso()[RESERVADO], 3)
+        abandonadas = {clave for clave, estado, _, _, _ in self.filas() if estado == RESERVADO}
+        # Mientras la reserva no caduca, nadie más recibe esos elementos
+        self.assertTrue(abandonadas.isdisjoint(clave for clave, _ in self.cola.reclamar("otro", 10, 60)))
+        self.cola.liberar("otro", [clave for clave, _, _, _, _ in self.filas()])
+        time.sleep(DURACION + 0.1)
+
+        self.lanzar(("vivo", 2, True))
+        for clave, estado, trabajador, intentos, caducadas in self.filas():
+            self.assertEqual((estado, trabajador), ("ok", "vivo"))
+            self.assertEqual((intentos, caducadas), (2, 1) if clave in abandonadas else (1, 0))
+        progreso = self.cola.progreso()
+        self.assertEqual((progreso["done"], progreso["requeued"]), (6, 3))
+        # El nodo muerto ya no puede completar ni renovar lo que fue suyo
+        clave = next(iter(abandonadas))
+        self.assertFalse(self.cola.completar("muerto", clave, "error"))
+        self.assertEqual(self.cola.latido("muerto", abandonadas, DURACION), abandonadas)
+
+    def test_demasiadas_caducidades_es_error(self):
+        self.encolar(1)
+        for _ in range(MAX_INTENTOS):
+            self.assertEqual(len(self.cola.reclamar("a", 1, 0.01)), 1)
+            time.sleep(0.02)
+        self.assertEqual(self.cola.reclamar("b", 1, DURACION), [])
+        self.assertEqual(self.cola.progreso()["error"], 1)
+
+
+class PruebaProgreso(unittest.TestCase):
+
+    def test_todos_los_estados_finales_cuentan(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        cola = ColaSQLite(os.path.join(carpeta.name, "cola.sqlite"))
+        self.addCleanup(cola.cerrar)
+        resumen = cola.encolar([f"https://medios.example/v/{i}.mp3" for i in range(6)]
+                               + ["https://medios.example/v/0.mp3", "no es un enlace"])
+        self.assertEqual(resumen, {"added": 6, "duplicates": 1, "invalid": 1})
+        filas = cola.reclamar("a", 6)
+        for (clave, _), estado in zip(filas, ("ok", "error", "skipped", "duplicates", "cancelled",
+                                              EXPANDIDO)):
+            self.assertTrue(cola.completar("a", clave, estado))
+        progreso = cola.progreso()
+        # La lista expandida no cuenta: la sustituyen sus vídeos
+        self.assertEqual((progreso["done"], progreso["total"], progreso[PENDIENTE]), (6, 6, 0))
+        self.assertTrue(cola.terminada())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# PoolConexiones: redirecciones (credenciales solo en su origen), errores HTTP y keep-alive
+
+import json
+import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler
+
+from comun import servidor_local
+
+from conexiones import PoolConexiones, ErrorHTTP, ErrorRedireccion, MAX_REDIRECCIONES
+
+CREDENCIALES = {"Cookie": "sesion=secreta", "Authorization": "Bearer secreto"}
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    """/a/<url> redirige a url; /eco devuelve las cabeceras recibidas (en minúsculas); /estado/<n>
+    responde n."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/a/"):
+            self.responder(302, b"", {"Location": self.path[3:]})
+        elif self.path == "/eco":
+            self.responder(200, json.dumps({k.lower(): v for k, v in self.headers.items()}).encode())
+        elif self.path.startswith("/estado/"):
+            self.responder(int(self.path[8:]), b"error")
+        else:
+            self.responder(404, b"")
+
+    def responder(self, codigo, cuerpo, cabeceras=None):
+        self.send_response(codigo)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+class PruebaPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Mismo host y otro puerto: otro origen
+        cls.servidores = [servidor_local(_Manejador), servidor_local(_Manejador)]
+        cls.origen, cls.otro = (f"http://127.0.0.1:{s.server_address[1]}" for s in cls.servidores)
+
+    @classmethod
+    def tearDownClass(cls):
+        for servidor in cls.servidores:
+            servidor.shutdown()
+            servidor.server_close()
+
+    def setUp(self):
+        self.pool = PoolConexiones()
+        self.addCleanup(self.pool.cerrar)
+
+    def eco(self, url, cabeceras=None):
+        with self.pool.abrir(url, cabeceras) as respuesta:
+            return respuesta.url, json.loads(respuesta.read())
+
+    def test_sin_redireccion_envia_las_credenciales(self):
+        _, recibidas = self.eco(f"{self.origen}/eco", CREDENCIALES)
+        self.assertEqual((recibidas.get("cookie"), recibidas.get("authorization")),
+                         tuple(CREDENCIALES.values()))
+
+    def test_redireccion_en_el_mismo_origen_las_conserva(self):
+        url, recibidas = self.eco(f"{self.origen}/a//eco", {**CREDENCIALES, "Range": "bytes=0-"})
+        self.assertEqual(url, f"{self.origen}/eco")
+        self.assertEqual((recibidas.get("cookie"), recibidas.get("authorization")),
+                         tuple(CREDENCIALES.values()))
+
+    def test_redireccion_a_otro_origen_las_quita(self):
+        url, recibidas = self.eco(f"{self.origen}/a/{self.otro}/eco",
+                                  {"cookie": "sesion=secreta", "AUTHORIZATION": "Bearer secreto",
+                                   "Range": "bytes=0-"})
+        self.assertEqual(url, f"{self.otro}/eco")
+        self.assertNotIn("cookie", recibidas)
+        self.assertNotIn("authorization", recibidas)
+        # Las demás cabeceras sí siguen
+        self.assertEqual(recibidas.get("range"), "bytes=0-")
+
+    def test_no_vuelven_al_regresar_al_origen(self):
+        # origen → otro → origen: una vez quitadas no se recuperan
+        url, recibidas = self.eco(f"{self.origen}/a/{self.otro}/a/{self.origen}/eco", CREDENCIALES)
+        self.assertEqual(url, f"{self.origen}/eco")
+        self.assertNotIn("cookie", recibidas)
+        self.assertNotIn("authorization", recibidas)
+
+    def test_demasiadas_redirecciones(self):
+        url = f"{self.origen}/eco"
+        for _ in range(MAX_REDIRECCIONES + 1):
+            url = f"{self.origen}/a/{url}"
+        with self.assertRaises(ErrorRedireccion):
+            self.pool.abrir(url)
+
+    def test_de_https_a_http_se_rechaza(self):
+        respuesta = mock.Mock(status=302, headers={"Location": f"{self.origen}/eco"})
+        with mock.patch.object(self.pool, "_enviar", return_value=respuesta):
+            with self.assertRaisesRegex(ErrorRedireccion, "https a http"):
+                self.pool.abrir("https://x.example/a", CREDENCIALES)
+
+    def test_errores_http(self):
+        with self.assertRaises(ErrorHTTP) as contexto:
+            self.pool.abrir(f"{self.origen}/estado/503")
+        self.assertEqual(contexto.exception.status, 503)
+        # 416 (rango fuera del archivo) se devuelve para que quien pidió el rango lo trate
+        with self.pool.abrir(f"{self.origen}/estado/416") as respuesta:
+            self.assertEqual(respuesta.status, 416)
+            respuesta.read()
+
+    def test_reutiliza_las_conexiones(self):
+        for _ in range(3):
+            self.eco(f"{self.origen}/eco")
+        self.eco(f"{self.origen}/a/{self.otro}/eco")
+        estadisticas = self.pool.estadisticas()
+        # Una por origen; la redirección también reutiliza la del primero
+        self.assertEqual((estadisticas["conexiones_nuevas"], estadisticas["conexiones_reutilizadas"]), (2, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
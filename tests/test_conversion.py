@@ -0,0 +1,224 @@
+# Plan de conversión (mover, copiar streams o recodificar) con etiquetas, portada y normalización
+
+import os
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from comun import HAY_FFMPEG, describir_medio
+
+import benchmark
+from conversion import (
+    planificar, etiquetas_de, MOVER, REMUX, RECODIFICAR_AUDIO, RECODIFICAR_VIDEO, BITRATE_MP3,
+)
+from descargas import descargar_lote, transcodificar, ruta_ffmpeg, OpcionesLote
+from servidor_medios import ServidorMedios
+
+AUDIO_M4A = {"ext": "m4a", "vcodec": "none", "acodec": "mp4a.40.2"}
+AUDIO_MP3 = {"ext": "mp3", "vcodec": "none", "acodec": "mp3"}
+VIDEO_MP4 = {"ext": "mp4", "vcodec": "avc1.64001f", "acodec": "mp4a.40.2"}
+PORTADA_MP3 = ["-c:v:0", "mjpeg", "-filter:v:0",
+               "scale=w='min(iw,600)':h='min(ih,600)':force_original_aspect_ratio=decrease",
+               "-disposition:v:0", "attached_pic"]
+
+
+def trabajo(formato, *streams, **extra):
+    entradas = [f"entrada{i}.{s['ext']}" for i, s in enumerate(streams)]
+    return {"entradas": entradas, "streams": list(streams), "formato": formato, **extra}
+
+
+class PruebaPlanMP3(unittest.TestCase):
+
+    def test_mp3_se_mueve(self):
+        plan = planificar(trabajo("MP3", AUDIO_MP3))
+        self.assertEqual((plan["accion"], plan["argumentos"]), (MOVER, []))
+
+    def test_mp3_con_etiquetas_copia_el_audio(self):
+        plan = planificar(trabajo("MP3", AUDIO_MP3, etiquetas={"title": "Canción", "artist": "Grupo"}))
+        self.assertEqual(plan["accion"], REMUX)
+        self.assertEqual(plan["argumentos"], ["-vn", "-c:a", "copy", "-metadata", "title=Canción",
+                                              "-metadata", "artist=Grupo", "-id3v2_version", "3"])
+
+    def test_aac_se_recodifica(self):
+        plan = planificar(trabajo("MP3", AUDIO_M4A))
+        self.assertEqual(plan["accion"], RECODIFICAR_AUDIO)
+        self.assertEqual(plan["argumentos"], ["-vn", "-c:a", "libmp3lame", "-b:a", BITRATE_MP3, "-threads", "1"])
+
+    def test_mp3_normalizado_se_recodifica(self):
+        plan = planificar(trabajo("MP3", AUDIO_MP3, normalizar=True))
+        self.assertEqual(plan["accion"], RECODIFICAR_AUDIO)
+        self.assertEqual(plan["argumentos"][:3], ["-vn", "-af", "loudnorm=I=-14:TP=-1.5:LRA=11,aresample=44100"])
+
+    def test_portada(self):
+        plan = planificar(trabajo("MP3", AUDIO_M4A, portada="portada.jpg"))
+        self.assertEqual(plan["argumentos"],
+                         ["-map", "0:a:0", "-map", "1:v:0", "-c:a", "libmp3lame", "-b:a", BITRATE_MP3,
+                          "-threads", "1"] + PORTADA_MP3
+                         + ["-id3v2_version", "3", "-metadata:s:v", "title=Album cover",
+                            "-metadata:s:v", "comment=Cover (front)"])
+
+
+class PruebaPlanMP4(unittest.TestCase):
+
+    def test_mp4_compatible_se_mueve(self):
+        plan = planificar(trabajo("MP4", VIDEO_MP4))
+        self.assertEqual((plan["accion"], plan["argumentos"]), (MOVER, []))
+
+    def test_etiquetas_en_mp4_compatible(self):
+        plan = planificar(trabajo("MP4", VIDEO_MP4, etiquetas={"title": "Vídeo"}))
+        self.assertEqual(plan["accion"], REMUX)
+        self.assertEqual(plan["argumentos"], ["-c:v", "copy", "-c:a", "copy", "-metadata", "title=Vídeo",
+                                              "-movflags", "+faststart"])
+
+    def test_union_de_video_y_audio(self):
+        plan = planificar(trabajo("MP4", {"ext": "webm", "vcodec": "vp9", "acodec": "none"},
+                                  {"ext": "webm", "vcodec": "none", "acodec": "opus"}))
+        self.assertEqual(plan["accion"], REMUX)
+        self.assertEqual(plan["argumentos"], ["-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy",
+                                              "-c:a", "copy", "-movflags", "+faststart"])
+
+    def test_video_incompatible_se_recodifica_con_hilos(self):
+        plan = planificar(trabajo("MP4", {"ext": "webm", "vcodec": "vp8", "acodec": "none"}, AUDIO_M4A), 4)
+        self.assertEqual(plan["accion"], RECODIFICAR_VIDEO)
+        self.assertEqual(plan["argumentos"], ["-map", "0:v:0", "-map", "1:a:0", "-c:v", "libx264",
+                                              "-preset", "veryfast", "-crf", "20", "-threads", "4",
+                                              "-c:a", "copy", "-movflags", "+faststart"])
+
+    def test_portada_va_detras_del_video(self):
+        plan = planificar(trabajo("MP4", VIDEO_MP4, portada="portada.jpg"))
+        self.assertEqual(plan["argumentos"][:6], ["-map", "0:v:0", "-map", "0:a:0?", "-map", "1:v:0"])
+        self.assertIn("-disposition:v:1", plan["argumentos"])
+
+    def test_portada_sin_video_no_pide_el_video(self):
+        # Un enlace directo a un .m4a no trae códecs: la extensión dice que no hay vídeo
+        plan = planificar(trabajo("MP4", {"ext": "m4a", "vcodec": None, "acodec": None},
+                                  portada="portada.jpg"))
+        self.assertEqual(plan["accion"], REMUX)
+        self.assertEqual(plan["argumentos"], ["-map", "0:a:0", "-map", "1:v:0", "-c:a", "copy"]
+                         + PORTADA_MP3 + ["-movflags", "+faststart"])
+
+    def test_audio_solo_normalizado(self):
+        plan = planificar(trabajo("MP4", AUDIO_M4A, normalizar=True))
+        self.assertEqual(plan["accion"], RECODIFICAR_AUDIO)
+        self.assertNotIn("-c:v", plan["argumentos"])
+
+
+class PruebaEtiquetas(unittest.TestCase):
+
+    def test_campos_por_preferencia(self):
+        info = {"title": "Título del vídeo", "track": "Canción", "uploader": "Canal",
+                "artists": ["A", "B"], "upload_date": "20240131", "webpage_url": "https://x/y",
+                "description": "no se usa"}
+        self.assertEqual(etiquetas_de(info), {"title": "Canción", "artist": "Canal", "date": "2024",
+                                              "comment": "https://x/y"})
+
+    def test_varios_artistas(self):
+        self.assertEqual(etiquetas_de({"artists": ["A", "B"]}), {"artist": "A, B"})
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg")
+class PruebaConversionReal(unittest.TestCase):
+    """Los planes anteriores ejecutados de verdad con ffmpeg."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._medios = tempfile.TemporaryDirectory()
+        benchmark.generar_medios(cls._medios.name, 1)
+        cls.portada = os.path.join(cls._medios.name, "portada.jpg")
+        subprocess.run([ruta_ffmpeg(), "-y", "-loglevel", "error", "-f", "lavfi", "-i", "color=c=red:s=64x64",
+                        "-frames:v", "1", cls.portada], check=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._medios.cleanup()
+
+    def convertir(self, archivo, formato, streams, **extra):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        entrada = os.path.join(carpeta.name, archivo)
+        shutil.copy(os.path.join(self._medios.name, archivo), entrada)
+        if extra.get("portada"):
+            extra["portada"] = shutil.copy(self.portada, carpeta.name)
+        salida = os.path.join(carpeta.name, f"salida.{formato.lower()}")
+        plan = transcodificar({"entradas": [entrada], "streams": [streams], "salida": salida,
+                               "formato": formato, **extra})
+        self.assertFalse(os.path.exists(entrada))
+        if extra.get("portada"):
+            self.assertFalse(os.path.exists(extra["portada"]))
+        return plan, describir_medio(salida)
+
+    def test_mp3_con_portada(self):
+        plan, (etiquetas, streams) = self.convertir("pista.m4a", "MP3", AUDIO_M4A, portada=True,
+                                                    etiquetas={"title": "Canción", "artist": "Grupo"})
+        self.assertEqual(plan["accion"], RECODIFICAR_AUDIO)
+        self.assertEqual((etiquetas["title"], etiquetas["artist"]), ("Canción", "Grupo"))
+        self.assertEqual(len(streams), 2)
+        self.assertIn("mp3", streams[0])
+        self.assertIn("(attached pic)", streams[1])
+
+    def test_mp4_solo_audio_con_portada(self):
+        plan, (etiquetas, streams) = self.convertir("pista.m4a", "MP4", {"ext": "m4a"}, portada=True,
+                                                    etiquetas={"title": "Canción"})
+        self.assertEqual(plan["accion"], REMUX)
+        self.assertEqual(etiquetas["title"], "Canción")
+        self.assertEqual(len(streams), 2)
+        self.assertIn("aac", streams[0])
+        self.assertIn("(attached pic)", streams[1])
+
+    def test_mp4_con_video_y_portada(self):
+        plan, (etiquetas, streams) = self.convertir("video.mp4", "MP4", VIDEO_MP4, portada=True,
+                                                    etiquetas={"title": "Vídeo"})
+        self.assertEqual(plan["accion"], REMUX)
+        self.assertEqual(etiquetas["title"], "Vídeo")
+        self.assertEqual(len(streams), 3)
+        self.assertIn("h264", streams[0])
+        self.assertIn("(attached pic)", streams[2])
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg")
+class PruebaLoteEtiquetado(unittest.TestCase):
+    """etiquetar=True de punta a punta: descarga del servidor local y una sola pasada de ffmpeg."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._medios = tempfile.TemporaryDirectory()
+        benchmark.generar_medios(cls._medios.name, 1)
+        cls.servidor = ServidorMedios(cls._medios.name).iniciar()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.detener()
+        cls._medios.cleanup()
+
+    def descargar(self, formato, **opciones):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        url = self.servidor.url(benchmark.ARCHIVOS[formato], 7)
+        opciones = OpcionesLote(usar_historial=False, usar_cache=False, silencioso=True, etiquetar=True,
+                                **opciones)
+        resultado = descargar_lote([url], carpeta.name, formato, 1, opciones)
+        self.assertEqual(resultado["ok"], 1)
+        archivos = os.listdir(carpeta.name)
+        self.assertEqual(len(archivos), 1)
+        return url, archivos[0], describir_medio(os.path.join(carpeta.name, archivos[0]))
+
+    def test_mp3(self):
+        url, archivo, (etiquetas, streams) = self.descargar("MP3")
+        self.assertEqual(archivo, "7-pista.mp3")
+        self.assertEqual((etiquetas["title"], etiquetas["comment"]), ("7-pista", url))
+        self.assertIn("mp3", streams[0])
+
+    def test_mp4(self):
+        url, archivo, (etiquetas, streams) = self.descargar("MP4")
+        self.assertEqual(archivo, "7-video.mp4")
+        self.assertEqual((etiquetas["title"], etiquetas["comment"]), ("7-video", url))
+        self.assertEqual(len(streams), 2)
+
+    def test_mp3_pipeline(self):
+        url, archivo, (etiquetas, _) = self.descargar("MP3", pipeline=True)
+        self.assertEqual(etiquetas["title"], "7-pista")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# Descarga por el extractor genérico de yt-dlp desde un servidor local, con varios hilos
+
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from comun import HAY_FFMPEG
+
+import benchmark
+from descargas import descargar_lote, OpcionesLote, Lote
+from servidor_medios import ServidorMedios
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg para generar y convertir los medios")
+class PruebaDescargaLocal(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._medios = tempfile.TemporaryDirectory()
+        benchmark.generar_medios(cls._medios.name, 1)
+        cls.servidor = ServidorMedios(cls._medios.name).iniciar()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.detener()
+        cls._medios.cleanup()
+
+    def descargar(self, urls, formato="MP3", **opciones):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        terminadas = []
+        opciones = OpcionesLote(usar_historial=False, usar_cache=False, silencioso=True, **opciones)
+        resultado = descargar_lote(urls, carpeta.name, formato, 3, opciones,
+                                   on_terminada=lambda url, estado: terminadas.append((url, estado)))
+        return resultado, sorted(os.listdir(carpeta.name)), terminadas
+
+    def test_lote_mp3(self):
+        urls = [self.servidor.url(benchmark.ARCHIVOS["MP3"], i) for i in range(5)]
+        resultado, archivos, terminadas = self.descargar(urls + ["no es un enlace"])
+        self.assertEqual(resultado["ok"], 5)
+        self.assertEqual(resultado["invalid"], 1)
+        self.assertEqual(resultado["error"], 0)
+        self.assertEqual(archivos, [f"{i}-pista.mp3" for i in range(5)])
+        self.assertEqual(sorted(url for url, estado in terminadas if estado == "ok"), sorted(urls))
+        self.assertEqual(resultado["memoria"]["elementos_abiertos"], 0)
+
+    def test_repetidas(self):
+        url = self.servidor.url(benchmark.ARCHIVOS["MP3"], 0)
+        resultado, archivos, terminadas = self.descargar([url, url])
+        self.assertEqual((resultado["ok"], resultado["duplicates"]), (1, 1))
+        self.assertEqual(sorted(estado for _, estado in terminadas), ["duplicates", "ok"])
+
+    def test_mp4_pipeline(self):
+        urls = [self.servidor.url(benchmark.ARCHIVOS["MP4"], i) for i in range(2)]
+        resultado, archivos, _ = self.descargar(urls, "MP4", pipeline=True)
+        self.assertEqual(resultado["ok"], 2)
+        self.assertEqual(archivos, ["0-video.mp4", "1-video.mp4"])
+
+    def test_pipeline_con_fallos_de_conversion(self):
+        urls = [self.servidor.url(benchmark.ARCHIVOS["MP3"], i) for i in range(4)]
+        finalizar, encolar = Lote.finalizar_salida, Lote.encolar_codificacion
+
+        def finalizar_salida(lote, clave, ruta):
+            if os.path.basename(ruta).startswith("1-"):
+                raise sqlite3.OperationalError("database is locked")
+            return finalizar(lote, clave, ruta)
+
+        def encolar_codificacion(lote, url, trabajos):
+            # ffmpeg falla de verdad en el pool: la entrada no existe
+            if url == urls[2]:
+                for trabajo in trabajos:
+                    trabajo["entradas"] = [ruta + ".borrada" for ruta in trabajo["entradas"]]
+            return encolar(lote, url, trabajos)
+
+        # Un fallo al convertir o al guardar cierra la URL como error y el lote llega al total
+        with mock.patch.object(Lote, "finalizar_salida", finalizar_salida), \
+                mock.patch.object(Lote, "encolar_codificacion", encolar_codificacion):
+            resultado, archivos, terminadas = self.descargar(urls, pipeline=True)
+        self.assertEqual((resultado["ok"], resultado["error"]), (2, 2))
+        self.assertEqual(sorted(url for url, estado in terminadas if estado == "error"), urls[1:3])
+        self.assertEqual(resultado["memoria"]["elementos_abiertos"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# Diario de trabajos: la cabecera guarda las opciones del lote y --resume las vuelve a aplicar
+# después de matar el proceso a medias
+
+import os
+import sys
+import json
+import time
+import tempfile
+import unittest
+import subprocess
+
+from comun import HAY_FFMPEG, DATOS, RAIZ
+
+import benchmark
+from almacen import AlmacenContenidos
+from diario import DiarioTrabajo, preparar_reanudacion
+from historial import identificar_url
+from servidor_medios import ServidorMedios
+
+
+class PruebaCabecera(unittest.TestCase):
+
+    def reanudacion(self, **parametros):
+        diario = DiarioTrabajo.nuevo(DATOS, "MP3", 2, urls=["https://x.example/a.mp3"], **parametros)
+        diario.cerrar()
+        self.addCleanup(os.remove, diario.ruta)
+        return preparar_reanudacion(diario.ruta)
+
+    def test_opciones_del_lote(self):
+        trabajo = self.reanudacion(store="almacen", staging="", tags=False, normalize=True)
+        self.assertEqual((trabajo["store"], trabajo["staging"], trabajo["tags"], trabajo["normalize"]),
+                         (os.path.abspath("almacen"), "", False, True))
+        self.assertEqual(list(trabajo["urls"]), ["https://x.example/a.mp3"])
+
+    def test_valores_por_defecto(self):
+        trabajo = self.reanudacion()
+        self.assertEqual((trabajo["store"], trabajo["staging"], trabajo["tags"], trabajo["normalize"]),
+                         (None, None, True, False))
+
+    def test_diario_sin_opciones_en_la_cabecera(self):
+        # Diarios escritos antes de guardar las opciones
+        ruta = os.path.join(DATOS, "antiguo.jsonl")
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"event": "job", "folder": DATOS, "format": "MP3", "workers": 1,
+                                "pipeline": False, "urls": []}) + "\n")
+        self.addCleanup(os.remove, ruta)
+        trabajo = preparar_reanudacion(ruta)
+        self.assertEqual((trabajo["store"], trabajo["staging"], trabajo["tags"], trabajo["normalize"]),
+                         (None, None, True, False))
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg para generar y convertir los medios")
+class PruebaReanudar(unittest.TestCase):
+    """dwsongs.py de verdad contra el servidor de medios local: se mata y se reanuda con --resume."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._medios = tempfile.TemporaryDirectory()
+        benchmark.generar_medios(cls._medios.name, 1)
+        # Lento para que el proceso siga a medias cuando se mata
+        cls.servidor = ServidorMedios(cls._medios.name, kbps_conexion=32).iniciar()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.detener()
+        cls._medios.cleanup()
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.salida = os.path.join(carpeta.name, "salida")
+        self.almacen = os.path.join(carpeta.name, "almacen")
+        self.staging = os.path.join(carpeta.name, "staging")
+        os.makedirs(self.salida)
+
+    def dwsongs(self, *argumentos):
+        return subprocess.Popen([sys.executable, os.path.join(RAIZ, "dwsongs.py"), *argumentos],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                env=dict(os.environ, DWSONGS_DATOS=DATOS))
+
+    def esperar_terminada(self, ruta, limite=60):
+        """Espera a que el diario tenga al menos una URL terminada en disco."""
+        fin = time.monotonic() + limite
+        while time.monotonic() < fin:
+            with open(ruta, encoding="utf-8") as f:
+                if any(json.loads(linea)["event"] == "done" for linea in f if linea.endswith("\n")):
+                    return
+            time.sleep(0.1)
+        self.fail("ninguna URL terminada en el diario")
+
+    def test_matar_y_reanudar(self):
+        urls = [self.servidor.url(benchmark.ARCHIVOS["MP3"], i) for i in range(4)]
+        proceso = self.dwsongs("--urls", *urls, "--out", self.salida, "--jobs", "1", "--no-preflight",
+                               "--no-archive", "--store", self.almacen, "--staging", self.staging,
+                               "--no-tags", "--normalize")
+        try:
+            inicio = json.loads(proceso.stdout.readline())
+            self.assertEqual(inicio["event"], "start")
+            self.esperar_terminada(inicio["journal"])
+        finally:
+            proceso.kill()
+            proceso.communicate()
+        terminadas = len(os.listdir(self.salida))
+        self.assertLess(terminadas, len(urls))
+
+        # Se reanuda sin repetir ninguna opción: salen de la cabecera del diario
+        proceso = self.dwsongs("--resume", inicio["journal"], "--no-archive")
+        salida, _ = proceso.communicate(timeout=300)
+        self.assertEqual(proceso.returncode, 0, salida)
+        resumen = [json.loads(linea) for linea in salida.splitlines()][-1]
+        self.assertEqual(resumen["event"], "summary")
+        self.assertEqual(resumen["ok"], len(urls) - terminadas)
+        self.assertIsNotNone(resumen["almacen"])
+        self.assertEqual(resumen["staging"]["admitidos"], len(urls) - terminadas)
+        self.assertEqual(sorted(os.listdir(self.salida)), [f"{i}-pista.mp3" for i in range(len(urls))])
+        # Cada canción está en el mismo almacén y con la variante del trabajo original
+        almacen = AlmacenContenidos(self.almacen)
+        self.addCleanup(almacen.cerrar)
+        for url in urls:
+            self.assertIsNotNone(almacen.buscar(identificar_url(url), "MP3", "loudnorm"), url)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# Forma canónica de los enlaces sin red: extractor, id, tipo, motivos de invalidez, claves y
+# la pasada previa sobre un CSV
+
+import os
+import tempfile
+import unittest
+
+from comun import DATOS
+
+from ingesta import iterar_urls_de_csv, prevalidar
+from enlaces import (
+    canonizar, clave_canonica, clave_de, prioridad, indice_extractores,
+    UNICO, LISTA, CANAL, INVALIDO, VACIO, MAL_FORMADO, ESQUEMA, GENERICO, PRIORIDAD_VIDEO, PRIORIDAD_LISTA,
+)
+
+
+class PruebaYouTube(unittest.TestCase):
+
+    def test_variantes_de_un_video(self):
+        for url in ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", "youtube.com/watch?v=dQw4w9WgXcQ",
+                    "https://youtu.be/dQw4w9WgXcQ?t=42", "https://m.youtube.com/watch?feature=x&v=dQw4w9WgXcQ",
+                    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123",
+                    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+                    "https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ",
+                    "  https://www.youtube.com/live/dQw4w9WgXcQ  "):
+            with self.subTest(url):
+                self.assertEqual(canonizar(url), ("Youtube", "dQw4w9WgXcQ", UNICO, None))
+                self.assertEqual(clave_canonica(url), "Youtube:dQw4w9WgXcQ")
+
+    def test_listas_y_canales(self):
+        self.assertEqual(canonizar("https://www.youtube.com/playlist?list=PL123"),
+                         ("YoutubeTab", "PL123", LISTA, None))
+        self.assertEqual(canonizar("https://www.youtube.com/@canal/videos"),
+                         ("YoutubeTab", "@canal/videos", CANAL, None))
+        canal = "UC" + "a" * 22
+        self.assertEqual(canonizar(f"https://www.youtube.com/channel/{canal}/"),
+                         ("YoutubeTab", canal, CANAL, None))
+        self.assertEqual(canonizar("https://www.youtube.com/c/Nombre"), ("YoutubeTab", "Nombre", CANAL, None))
+
+    def test_id_incompleto_no_es_un_video(self):
+        self.assertNotEqual(canonizar("https://youtu.be/dQw4w9WgXc").id, "dQw4w9WgXc")
+
+
+class PruebaOtrosSitios(unittest.TestCase):
+
+    def test_extractores_de_yt_dlp(self):
+        self.assertEqual(canonizar("https://vimeo.com/76979871"), ("Vimeo", "76979871", UNICO, None))
+        self.assertEqual(canonizar("https://www.dailymotion.com/video/x7tgad0"),
+                         ("Dailymotion", "x7tgad0", UNICO, None))
+        self.assertEqual(canonizar("https://soundcloud.com/artista/sets/lista").tipo, LISTA)
+
+    def test_el_indice_coincide_con_recorrer_todos_los_extractores(self):
+        from yt_dlp.extractor import gen_extractor_classes
+
+        extractores = [ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic"]
+        for url in ("https://vimeo.com/76979871", "https://www.dailymotion.com/video/x7tgad0",
+                    "https://soundcloud.com/artista/cancion", "https://www.twitch.tv/videos/123456789",
+                    "https://www.tiktok.com/@usuario/video/7000000000000000000",
+                    "https://x.com/usuario/status/1234567890", "https://archive.org/details/algo",
+                    "https://www.bilibili.com/video/BV1xx411c7mD", "https://x.example/a.mp3"):
+            with self.subTest(url):
+                esperado = next((ie.ie_key() for ie in extractores if ie.suitable(url)), GENERICO)
+                self.assertEqual(canonizar(url).extractor, esperado)
+
+    def test_genericos(self):
+        enlace = canonizar("https://x.example/a.mp3")
+        self.assertEqual(enlace, (GENERICO, None, UNICO, None))
+        self.assertEqual(clave_de(enlace, " https://x.example/a.mp3 "), (GENERICO, "https://x.example/a.mp3"))
+
+    def test_candidatos_en_cache_por_host(self):
+        indice = indice_extractores()
+        self.assertIs(indice.candidatos("vimeo.com"), indice.candidatos("vimeo.com"))
+
+
+class PruebaInvalidos(unittest.TestCase):
+
+    def test_motivos(self):
+        for url, motivo in (("", VACIO), ("   ", VACIO), (None, VACIO), ("ftp://x.example/a", ESQUEMA),
+                            ("javascript:alert(1)", MAL_FORMADO), ("no es un enlace", MAL_FORMADO),
+                            ("x.example/a.mp3", ESQUEMA), ("vimeo.com/76979871", ESQUEMA),
+                            ("https://exa mple.com/", MAL_FORMADO),
+                            ("https://x.example:99999/", MAL_FORMADO), ("https:///ruta", MAL_FORMADO)):
+            with self.subTest(url):
+                self.assertEqual(canonizar(url), (None, None, INVALIDO, motivo))
+
+
+class PruebaClaves(unittest.TestCase):
+
+    def test_sin_id_se_normaliza_la_url(self):
+        self.assertEqual(clave_canonica("http://www.X.example/a/"), "x.example/a")
+        self.assertEqual(clave_canonica("https://x.example/a"), "x.example/a")
+        self.assertEqual(clave_canonica("https://x.example/a?b=1"), "x.example/a?b=1")
+        self.assertNotEqual(clave_canonica("https://x.example/a?b=1"), clave_canonica("https://x.example/a?b=2"))
+
+    def test_prioridad(self):
+        self.assertEqual(prioridad(canonizar("https://youtu.be/dQw4w9WgXcQ")), PRIORIDAD_VIDEO)
+        self.assertEqual(prioridad(canonizar("https://www.youtube.com/playlist?list=PL1")), PRIORIDAD_LISTA)
+        self.assertEqual(prioridad(canonizar("https://www.youtube.com/@canal")), PRIORIDAD_LISTA)
+        self.assertEqual(prioridad(canonizar("no es un enlace")), PRIORIDAD_VIDEO)
+
+
+class PruebaPasadaPrevia(unittest.TestCase):
+
+    def test_csv(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        ruta = os.path.join(carpeta.name, "enlaces.csv")
+        with open(ruta, "w", encoding="utf-8", newline="") as f:
+            f.write("https://youtu.be/dQw4w9WgXcQ,Uno\n\nftp://x.example/a\n"
+                    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=1\n"
+                    "https://www.youtube.com/playlist?list=PL1\nhttps://www.youtube.com/@canal\n"
+                    "https://x.example/a.mp3\nhttps://vimeo.com/76979871\n")
+        invalidas = []
+        resumen = prevalidar(iterar_urls_de_csv(ruta),
+                             on_invalido=lambda fila, url, motivo: invalidas.append((fila, url, motivo)))
+        # Las filas cuentan los enlaces leídos, no las líneas del archivo
+        self.assertEqual(invalidas, [(2, "ftp://x.example/a", ESQUEMA)])
+        claves = ("rows", UNICO, LISTA, CANAL, INVALIDO, "duplicates", "generic")
+        self.assertEqual({k: resumen[k] for k in claves},
+                         {"rows": 7, UNICO: 3, LISTA: 1, CANAL: 1, INVALIDO: 1, "duplicates": 1, "generic": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# EscritorSalidas: admisión por presupuesto y espacio libre, y salidas que no pisan otras
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from comun import DATOS
+
+from escritor import EscritorSalidas, EspacioInsuficiente
+
+
+def _disco(libres):
+    return mock.Mock(free=libres)
+
+
+class PruebaAdmision(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+        self.escritor = EscritorSalidas(os.path.join(carpeta.name, "staging"), presupuesto=1000, margen=0)
+
+    def test_espera_a_que_quepa_en_el_presupuesto(self):
+        primera = self.escritor.admitir(600)
+        admitida = threading.Event()
+        hilo = threading.Thread(target=lambda: (self.escritor.admitir(600), admitida.set()))
+        hilo.start()
+        self.assertFalse(admitida.wait(0.3))
+        self.assertEqual(self.escritor.estadisticas()["en_vuelo"], 600)
+        self.escritor.liberar(primera)
+        self.assertTrue(admitida.wait(5))
+        hilo.join()
+        estadisticas = self.escritor.estadisticas()
+        self.assertEqual((estadisticas["admitidos"], estadisticas["esperas"]), (2, 1))
+        self.assertEqual((estadisticas["en_vuelo"], estadisticas["pico_en_vuelo"]), (600, 600))
+
+    def test_un_trabajo_mayor_que_el_presupuesto_entra_solo(self):
+        # Sin nada en vuelo entra aunque pase del presupuesto, si no no entraría nunca
+        reserva = self.escritor.admitir(5000)
+        self.escritor.liberar(reserva)
+        self.assertEqual(self.escritor.estadisticas()["en_vuelo"], 0)
+
+    def test_sin_espacio_temporal(self):
+        with mock.patch("escritor.shutil.disk_usage", return_value=_disco(500)):
+            with self.assertRaises(EspacioInsuficiente) as contexto:
+                self.escritor.admitir(600)
+        self.assertIn(self.escritor.carpeta_temporal, str(contexto.exception))
+
+    def test_sin_espacio_temporal_con_otros_en_vuelo_espera(self):
+        libres = [1000]
+        with mock.patch("escritor.shutil.disk_usage", side_effect=lambda _: _disco(libres[0])):
+            primera = self.escritor.admitir(400)
+            # Otro programa llena el disco: la segunda no cabe junto a la primera, pero espera
+            # en vez de fallar porque cabrá cuando esta termine
+            libres[0] = 700
+            admitida = threading.Event()
+            hilo = threading.Thread(target=lambda: (self.escritor.admitir(400), admitida.set()))
+            hilo.start()
+            self.assertFalse(admitida.wait(0.3))
+            self.escritor.liberar(primera)
+            self.assertTrue(admitida.wait(5))
+            hilo.join()
+
+    def test_sin_espacio_en_el_destino(self):
+        destino = os.path.join(self.carpeta, "usb")
+        os.makedirs(destino)
+        discos = {self.escritor.carpeta_temporal: _disco(1 << 40), destino: _disco(100)}
+        with mock.patch("escritor.shutil.disk_usage", side_effect=discos.__getitem__), \
+                mock.patch("escritor._mismo_disco", return_value=False):
+            with self.assertRaises(EspacioInsuficiente) as contexto:
+                self.escritor.admitir(10, 200, destino)
+            self.assertIn(destino, str(contexto.exception))
+            self.escritor.admitir(10, 50, destino)
+
+
+class PruebaMover(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.escritor = EscritorSalidas(os.path.join(carpeta.name, "staging"))
+        self.destino = os.path.join(carpeta.name, "destino")
+        os.makedirs(self.destino)
+
+    def preparado(self, contenido, nombre="Canción.mp3"):
+        """Un archivo terminado en su subcarpeta de trabajo, como lo deja descargar_lote."""
+        ruta = os.path.join(tempfile.mkdtemp(dir=self.escritor.carpeta_temporal), nombre)
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        return ruta
+
+    def leer(self, nombre):
+        with open(os.path.join(self.destino, nombre), "rb") as f:
+            return f.read()
+
+    def comprobar_colisiones(self):
+        ruta = self.escritor.mover(self.preparado(b"uno"), self.destino)
+        self.assertEqual(os.path.basename(ruta), "Canción.mp3")
+        ruta = self.escritor.mover(self.preparado(b"dos"), self.destino)
+        self.assertEqual(os.path.basename(ruta), "Canción (1).mp3")
+        ruta = self.escritor.mover(self.preparado(b"tres"), self.destino)
+        self.assertEqual(os.path.basename(ruta), "Canción (2).mp3")
+        # El mismo contenido otra vez no crea otra copia
+        ruta = self.escritor.mover(self.preparado(b"dos"), self.destino)
+        self.assertEqual(os.path.basename(ruta), "Canción (1).mp3")
+        self.assertEqual([self.leer(n) for n in ("Canción.mp3", "Canción (1).mp3", "Canción (2).mp3")],
+                         [b"uno", b"dos", b"tres"])
+        self.assertEqual(len(os.listdir(self.destino)), 3)
+        # Ni temporales en el destino ni subcarpetas de trabajo vacías
+        self.assertEqual(os.listdir(self.escritor.carpeta_temporal), [])
+
+    def test_mismo_disco(self):
+        self.comprobar_colisiones()
+        self.assertEqual(self.escritor.estadisticas()["movidos"], 4)
+
+    def test_sin_enlaces_duros(self):
+        with mock.patch("escritor.os.link", side_effect=OSError(1, "Operation not permitted")):
+            self.comprobar_colisiones()
+
+    def test_otro_disco(self):
+        with mock.patch("escritor._mismo_disco", return_value=False):
+            self.comprobar_colisiones()
+        self.assertEqual(self.escritor.estadisticas()["copiados"], 4)
+
+    def test_hilos_a_la_vez(self):
+        rutas = [self.preparado(f"versión {i}".encode()) for i in range(8)]
+        barrera = threading.Barrier(len(rutas))
+        finales = []
+
+        def mover(ruta):
+            barrera.wait()
+            finales.append(self.escritor.mover(ruta, self.destino))
+
+        hilos = [threading.Thread(target=mover, args=(ruta,)) for ruta in rutas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(set(finales)), len(rutas))
+        self.assertEqual(sorted(self.leer(os.path.basename(r)) for r in finales),
+                         sorted(f"versión {i}".encode() for i in range(8)))
+
+
+if __name__ == "__main__":
+    unittest.main()
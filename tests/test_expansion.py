@@ -0,0 +1,95 @@
+# Expansión de listas con extracción plana: listas anidadas, profundidad máxima y caché
+
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+
+from comun import DATOS
+
+from expansion import expandir_lista, CacheExpansiones, MAX_PROFUNDIDAD
+
+VIDEO = "https://www.youtube.com/watch?v={:011d}"
+LISTA = "https://www.youtube.com/playlist?list=PL{}"
+
+
+class _YDLFalso:
+    """extract_info sin red: cada URL de listas devuelve su info-dict plano."""
+
+    def __init__(self, listas):
+        self.listas = listas
+        self.pedidas = []
+
+    def extract_info(self, url, download=False, process=False):
+        self.pedidas.append(url)
+        if url not in self.listas:
+            return {"_type": "video", "id": url, "webpage_url": url}
+        return {"_type": "playlist", "entries": iter(self.listas[url])}
+
+
+def video(n):
+    return {"_type": "url", "url": VIDEO.format(n)}
+
+
+def lista_plana(nombre):
+    return {"_type": "url", "url": LISTA.format(nombre)}
+
+
+def lista_anidada(nombre):
+    # Las pestañas de un canal llegan como listas con sus propias entradas
+    return {"_type": "playlist", "webpage_url": LISTA.format(nombre)}
+
+
+class PruebaExpandir(unittest.TestCase):
+
+    def test_lista_de_videos(self):
+        ydl = _YDLFalso({LISTA.format(0): [video(1), None, {"_type": "url"}, video(2)]})
+        self.assertEqual(expandir_lista(ydl, LISTA.format(0)), [VIDEO.format(1), VIDEO.format(2)])
+
+    def test_un_video_no_es_una_lista(self):
+        self.assertEqual(expandir_lista(_YDLFalso({}), VIDEO.format(1)), [VIDEO.format(1)])
+
+    def test_listas_anidadas_hasta_la_profundidad_maxima(self):
+        for entrada in (lista_plana, lista_anidada):
+            with self.subTest(entrada.__name__):
+                # Una cadena de listas más larga que MAX_PROFUNDIDAD, cada una con un vídeo
+                cadena = {LISTA.format(i): [video(i), entrada(i + 1)] for i in range(MAX_PROFUNDIDAD + 3)}
+                ydl = _YDLFalso(cadena)
+                urls = expandir_lista(ydl, LISTA.format(0))
+                self.assertEqual(ydl.pedidas, [LISTA.format(i) for i in range(MAX_PROFUNDIDAD + 1)])
+                self.assertEqual(urls, [VIDEO.format(i) for i in range(MAX_PROFUNDIDAD + 1)]
+                                 + [LISTA.format(MAX_PROFUNDIDAD + 1)])
+
+    def test_lista_que_se_contiene_a_si_misma(self):
+        for entrada in (lista_plana, lista_anidada):
+            with self.subTest(entrada.__name__):
+                ydl = _YDLFalso({LISTA.format(0): [video(1), entrada(0)]})
+                urls = expandir_lista(ydl, LISTA.format(0))
+                self.assertEqual(len(ydl.pedidas), MAX_PROFUNDIDAD + 1)
+                self.assertEqual(urls, [VIDEO.format(1)] * (MAX_PROFUNDIDAD + 1) + [LISTA.format(0)])
+
+
+class PruebaCache(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.ruta = os.path.join(carpeta.name, "expansiones.sqlite3")
+
+    def test_guardar_obtener_y_caducar(self):
+        cache = CacheExpansiones(self.ruta, ttl=60)
+        self.addCleanup(cache.cerrar)
+        self.assertIsNone(cache.obtener(LISTA.format(0)))
+        cache.guardar(LISTA.format(0), [VIDEO.format(1), VIDEO.format(2)])
+        self.assertEqual(cache.obtener(LISTA.format(0)), [VIDEO.format(1), VIDEO.format(2)])
+        with mock.patch("expansion.time.time", return_value=time.time() + 61):
+            self.assertIsNone(cache.obtener(LISTA.format(0)))
+        # Persiste entre aperturas
+        otra = CacheExpansiones(self.ruta, ttl=60)
+        self.addCleanup(otra.cerrar)
+        self.assertEqual(otra.obtener(LISTA.format(0)), [VIDEO.format(1), VIDEO.format(2)])
+
+
+if __name__ == "__main__":
+    unittest.main()
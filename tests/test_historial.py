@@ -0,0 +1,91 @@
+# Historial de descargas por carpeta: claves sin red, archivos intactos y persistencia
+
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from comun import DATOS
+
+from historial import HistorialDescargas, identificar_url, hash_archivo, NOMBRE_HISTORIAL
+
+CLAVE = ("Youtube", "dQw4w9WgXcQ")
+
+
+class PruebaIdentificar(unittest.TestCase):
+
+    def test_variantes_de_un_video_dan_la_misma_clave(self):
+        for url in ("https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+                    "https://youtu.be/dQw4w9WgXcQ?t=42",
+                    "https://m.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123&index=2",
+                    "https://www.youtube.com/shorts/dQw4w9WgXcQ"):
+            with self.subTest(url):
+                self.assertEqual(identificar_url(url), CLAVE)
+
+    def test_sin_extractor_la_clave_es_la_url(self):
+        url = "https://x.example/canción.mp3"
+        self.assertEqual(identificar_url(url)[0], "url")
+
+
+class PruebaHistorial(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+        self.historial = self.abrir()
+
+    def abrir(self):
+        historial = HistorialDescargas(self.carpeta)
+        self.addCleanup(historial.cerrar)
+        return historial
+
+    def archivo(self, nombre, contenido=b"audio"):
+        ruta = os.path.join(self.carpeta, nombre)
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        return ruta
+
+    def test_registrar_y_contiene(self):
+        self.assertFalse(self.historial.contiene("MP3", CLAVE))
+        self.historial.registrar("MP3", CLAVE, self.archivo("Canción.mp3"))
+        self.assertTrue(self.historial.contiene("MP3", CLAVE))
+        # Cada formato va aparte
+        self.assertFalse(self.historial.contiene("MP4", CLAVE))
+        self.assertTrue(os.path.isfile(os.path.join(self.carpeta, NOMBRE_HISTORIAL)))
+
+    def test_persiste_entre_aperturas(self):
+        ruta = self.archivo("Canción.mp3")
+        self.historial.registrar("MP3", CLAVE, ruta)
+        self.historial.cerrar()
+        self.assertTrue(self.abrir().contiene("MP3", CLAVE))
+
+    def test_hash_del_archivo(self):
+        ruta = self.archivo("Canción.mp3", b"contenido")
+        self.historial.registrar("MP3", CLAVE, ruta)
+        self.historial.registrar("MP4", CLAVE, ruta, digest="ya calculado")
+        self.historial.cerrar()
+        with sqlite3.connect(os.path.join(self.carpeta, NOMBRE_HISTORIAL)) as conn:
+            hashes = dict(conn.execute("SELECT formato, hash FROM descargas"))
+        conn.close()
+        self.assertEqual(hashes, {"MP3": hash_archivo(ruta), "MP4": "ya calculado"})
+
+    def test_archivo_borrado_o_cambiado_se_olvida(self):
+        borrado = self.archivo("Borrado.mp3")
+        cambiado = self.archivo("Cambiado.mp3")
+        otra = ("Youtube", "aaaaaaaaaaa")
+        self.historial.registrar("MP3", CLAVE, borrado)
+        self.historial.registrar("MP3", otra, cambiado)
+        os.remove(borrado)
+        self.archivo("Cambiado.mp3", b"otro audio distinto")
+        self.assertFalse(self.historial.contiene("MP3", CLAVE))
+        self.assertFalse(self.historial.contiene("MP3", otra))
+        # La entrada descartada tampoco vuelve al reabrir
+        self.historial.cerrar()
+        historial = self.abrir()
+        self.archivo("Borrado.mp3")
+        self.assertFalse(historial.contiene("MP3", CLAVE))
+
+
+if __name__ == "__main__":
+    unittest.main()
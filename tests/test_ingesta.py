@@ -0,0 +1,107 @@
+# Lectura de enlaces de CSV y texto, conjunto de huellas y deduplicación al vuelo
+
+import os
+import tempfile
+import unittest
+
+from comun import DATOS
+
+from ingesta import (
+    iterar_urls_de_csv, iterar_urls_de_texto, contar_filas_csv, ConjuntoHashes, sin_duplicados, prevalidar,
+)
+
+
+class PruebaLectura(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.csv = os.path.join(carpeta.name, "enlaces.csv")
+
+    def escribir(self, texto):
+        with open(self.csv, "w", encoding="utf-8", newline="") as f:
+            f.write(texto)
+
+    def test_primera_columna_de_cada_fila(self):
+        self.escribir('https://x.example/1.mp3,Uno\n\n"https://x.example/2?a=1,2","Dos"\r\n'
+                      'https://x.example/3.mp3,"título en\ndos líneas"\nhttps://x.example/4.mp3')
+        self.assertEqual(list(iterar_urls_de_csv(self.csv)), [
+            "https://x.example/1.mp3", "https://x.example/2?a=1,2", "https://x.example/3.mp3",
+            "https://x.example/4.mp3"])
+
+    def test_contar_filas(self):
+        self.escribir("a\n\n  \nb\r\nc")
+        self.assertEqual(contar_filas_csv(self.csv), 3)
+        # Filas partidas entre bloques de lectura
+        self.escribir("".join(f"https://x.example/{i}.mp3\n" for i in range(100)))
+        self.assertEqual(contar_filas_csv(self.csv, bloque=7), 100)
+
+    def test_texto_pegado(self):
+        self.assertEqual(list(iterar_urls_de_texto("uno\n\n   \ndos\r\n")), ["uno", "dos"])
+
+
+class PruebaConjuntoHashes(unittest.TestCase):
+
+    def test_agregar_y_contiene(self):
+        conjunto = ConjuntoHashes()
+        self.assertTrue(conjunto.agregar("a"))
+        self.assertFalse(conjunto.agregar("a"))
+        self.assertIn("a", conjunto)
+        self.assertNotIn("b", conjunto)
+        self.assertEqual(len(conjunto), 1)
+
+    def test_crece_sin_perder_claves(self):
+        conjunto = ConjuntoHashes(capacidad=4)
+        claves = [f"youtube:{i:011d}" for i in range(5000)]
+        self.assertTrue(all(conjunto.agregar(clave) for clave in claves))
+        self.assertEqual(len(conjunto), len(claves))
+        self.assertTrue(all(clave in conjunto for clave in claves))
+        self.assertFalse(any(conjunto.agregar(clave) for clave in claves))
+        self.assertNotIn("youtube:99999999999", conjunto)
+
+
+class PruebaSinDuplicados(unittest.TestCase):
+
+    def test_variantes_de_la_misma_url(self):
+        repetidas = []
+        urls = ["https://www.youtube.com/watch?v=dQw4w9WgXcQ", "", "https://youtu.be/dQw4w9WgXcQ",
+                "https://x.example/a.mp3", "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=3", "   ",
+                "https://x.example/a.mp3"]
+        self.assertEqual(list(sin_duplicados(urls, on_duplicado=repetidas.append)), [
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ", "", "https://x.example/a.mp3", "   "])
+        self.assertEqual(repetidas, ["https://youtu.be/dQw4w9WgXcQ",
+                                     "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=3", "https://x.example/a.mp3"])
+
+    def test_es_perezoso_y_comparte_las_vistas(self):
+        vistas = ConjuntoHashes()
+        leidas = []
+
+        def fuente():
+            for i in range(3):
+                leidas.append(i)
+                yield f"https://x.example/{i}.mp3"
+
+        filtradas = sin_duplicados(fuente(), vistas=vistas)
+        self.assertEqual(next(filtradas), "https://x.example/0.mp3")
+        self.assertEqual(leidas, [0])
+        list(filtradas)
+        # Otra fuente con las mismas vistas ya no deja pasar las anteriores
+        self.assertEqual(list(sin_duplicados(["https://x.example/1.mp3", "https://x.example/9.mp3"],
+                                             vistas=vistas)), ["https://x.example/9.mp3"])
+
+
+class PruebaPrevalidar(unittest.TestCase):
+
+    def test_resumen(self):
+        invalidas = []
+        resumen = prevalidar(["https://www.youtube.com/watch?v=dQw4w9WgXcQ", "no es un enlace",
+                              "https://youtu.be/dQw4w9WgXcQ", "https://www.youtube.com/playlist?list=PL123",
+                              "https://x.example/a.mp3"],
+                             on_invalido=lambda fila, url, motivo: invalidas.append((fila, url)))
+        self.assertEqual(invalidas, [(2, "no es un enlace")])
+        self.assertEqual((resumen["rows"], resumen["invalid"], resumen["duplicates"], resumen["generic"]),
+                         (5, 1, 1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+# Métricas por elemento: percentiles, líneas JSON por elemento, reservorio y formato Prometheus
+
+import os
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from comun import DATOS
+
+import metricas
+from metricas import MetricasLote, percentil, DESCARGA, EXTRACCION, POSTPROCESO
+
+
+class PruebaPercentil(unittest.TestCase):
+
+    def test_rango_mas_cercano(self):
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50)
+        self.assertEqual(percentil(valores, 95), 95)
+        self.assertEqual(percentil(valores, 100), 100)
+        self.assertEqual(percentil(valores, 0), 1)
+        self.assertEqual(percentil([7], 95), 7)
+        self.assertIsNone(percentil([], 50))
+
+
+class PruebaMetricas(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.jsonl = os.path.join(carpeta.name, "lote.jsonl")
+        self.prom = os.path.join(carpeta.name, "lote.prom")
+
+    def nuevas(self, **parametros):
+        m = MetricasLote(**parametros)
+        self.addCleanup(m.cerrar)
+        return m
+
+    def leer(self):
+        with open(self.jsonl, encoding="utf-8") as f:
+            return [json.loads(linea) for linea in f]
+
+    def test_una_linea_por_elemento(self):
+        m = self.nuevas(ruta_jsonl=self.jsonl)
+        m.empezar("u1")
+        m.sumar("u1", EXTRACCION, 0.5)
+        m.sumar("u1", DESCARGA, 1.0)
+        m.sumar("u1", DESCARGA, 0.25)
+        m.sumar_bytes("u1", 1000)
+        m.reintento("u1", "429", "Too Many Requests")
+        m.terminar("u1", "ok")
+        m.empezar("u2")
+        m.terminar("u2", "error", error=ValueError("roto"))
+        # Cerrar dos veces o un elemento desconocido no escribe nada
+        m.terminar("u2", "error")
+        m.terminar("nunca", "ok")
+        uno, dos = self.leer()
+        self.assertEqual((uno["url"], uno["status"], uno["bytes"], uno["retries"]), ("u1", "ok", 1000, 1))
+        self.assertEqual(uno["stages"], {EXTRACCION: 0.5, DESCARGA: 1.25})
+        self.assertEqual(uno["errors"], ["429: Too Many Requests"])
+        self.assertEqual((dos["status"], dos["errors"], dos["stages"]), ("error", ["roto"], {}))
+        self.assertEqual(m.abiertos(), 0)
+
+    def test_resumen(self):
+        m = self.nuevas()
+        for i in range(1, 101):
+            url = f"u{i}"
+            m.empezar(url)
+            m.sumar(url, DESCARGA, float(i))
+            m.sumar_bytes(url, 10)
+            m.terminar(url, "ok" if i % 10 else "error")
+        resumen = m.resumen()
+        self.assertEqual(resumen["status"], {"ok": 90, "error": 10})
+        self.assertEqual((resumen["bytes"], resumen["retries"]), (1000, 0))
+        descarga = resumen["stages"][DESCARGA]
+        self.assertEqual(descarga, {"n": 100, "p50": 50.0, "p95": 95.0, "max": 100.0, "sum": 5050.0})
+        self.assertEqual(resumen["stages"]["total"]["n"], 100)
+        # Las etapas sin muestras no aparecen
+        self.assertNotIn(EXTRACCION, resumen["stages"])
+
+    def test_reservorio_acotado(self):
+        m = self.nuevas()
+        with mock.patch("metricas.MAX_MUESTRAS", 50):
+            for i in range(1000):
+                m.empezar(i)
+                m.sumar(i, DESCARGA, float(i))
+                m.terminar(i, "ok")
+        self.assertEqual(len(m._muestras[DESCARGA]), 50)
+        descarga = m.resumen()["stages"][DESCARGA]
+        # Número, suma y máximo siguen siendo exactos
+        self.assertEqual((descarga["n"], descarga["sum"], descarga["max"]), (1000, 499500.0, 999.0))
+        # La muestra sustituye al azar: la mediana no se queda en los 50 primeros
+        self.assertGreater(descarga["p50"], 200)
+
+    def test_hooks_por_hilo(self):
+        m = self.nuevas(ruta_jsonl=self.jsonl)
+
+        def trabajo(url, n):
+            m.empezar(url)
+            m.hook_postproceso({"status": "started"})
+            m.hook_descarga({"status": "downloading", "downloaded_bytes": 5})
+            m.hook_descarga({"status": "finished", "total_bytes": n})
+            m.hook_postproceso({"status": "finished"})
+            m.terminar(url, "ok")
+
+        hilos = [threading.Thread(target=trabajo, args=(f"u{i}", 100 * (i + 1))) for i in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        registros = {r["url"]: r for r in self.leer()}
+        self.assertEqual({url: r["bytes"] for url, r in registros.items()},
+                         {"u0": 100, "u1": 200, "u2": 300, "u3": 400})
+        self.assertTrue(all(POSTPROCESO in r["stages"] for r in registros.values()))
+        # Un hilo sin elemento asociado no atribuye nada
+        m.hook_descarga({"status": "finished", "total_bytes": 99})
+        self.assertEqual(m.resumen()["bytes"], 1000)
+
+    def test_prometheus_al_cerrar(self):
+        m = MetricasLote(ruta_prometheus=self.prom)
+        m.empezar("u1")
+        m.sumar("u1", DESCARGA, 2.0)
+        m.sumar_bytes("u1", 42)
+        m.terminar("u1", "ok")
+        m.cerrar()
+        with open(self.prom, encoding="utf-8") as f:
+            texto = f.read()
+        self.assertIn('dwsongs_stage_seconds{stage="download",quantile="0.95"} 2.0\n', texto)
+        self.assertIn('dwsongs_stage_seconds_count{stage="download"} 1\n', texto)
+        self.assertIn('dwsongs_items_total{status="ok"} 1\n', texto)
+        self.assertIn("dwsongs_downloaded_bytes_total 42\n", texto)
+        self.assertFalse(os.path.exists(self.prom + ".tmp"))
+
+    def test_nueva_en_la_carpeta_de_metricas(self):
+        with mock.patch("metricas.DIR_DATOS", os.path.dirname(self.jsonl)):
+            m = MetricasLote.nueva(prometheus=True)
+            self.addCleanup(m.cerrar)
+            carpeta = metricas.carpeta_metricas()
+        self.assertEqual(os.path.dirname(m.ruta_jsonl), carpeta)
+        self.assertTrue(m.ruta_prometheus.endswith(".prom"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+# Orquestador: prioridad, duplicados, pausa, cancelación y errores de la fuente, con un lote
+# falso en lugar de descargar_lote (sin red)
+
+import time
+import threading
+import unittest
+from unittest import mock
+
+from comun import DATOS
+
+from orquestador import Orquestador
+
+VIDEO = "https://www.youtube.com/watch?v={:011d}"
+LISTA = "https://www.youtube.com/playlist?list=PL{}"
+
+
+class _LoteFalso:
+    """Sustituye a descargar_lote: "descarga" cada URL del canal en orden y las apunta.
+
+    al_empezar(n, url) se llama antes de cada URL, desde el hilo del lote.
+    """
+
+    def __init__(self, al_empezar=None):
+        self.al_empezar = al_empezar
+        self.urls = []
+        self.cancelado = None
+
+    def __call__(self, urls, carpeta, formato, workers, opciones, total=None, on_progreso=None,
+                 cancelado=None, activo=None):
+        self.cancelado = cancelado
+        for url in urls:
+            if self.al_empezar:
+                self.al_empezar(len(self.urls), url)
+            self.urls.append(url)
+            if on_progreso:
+                on_progreso(len(self.urls), total)
+        return {"ok": len(self.urls), "duplicates": 0, "cancelled": 0}
+
+
+class PruebaOrquestador(unittest.TestCase):
+
+    def ejecutar(self, orquestador, limite=30):
+        orquestador.iniciar()
+        self.addCleanup(orquestador.cancelar)
+        orquestador.esperar(limite)
+        self.assertFalse(orquestador._hilo.is_alive(), "el orquestador no terminó")
+        return orquestador.resultado
+
+    def orquestador(self, lote, urls, **parametros):
+        parche = mock.patch("orquestador.descargar_lote", lote)
+        parche.start()
+        self.addCleanup(parche.stop)
+        return Orquestador(urls, DATOS, "MP3", **parametros)
+
+    def test_prioridad_y_duplicados(self):
+        lote = _LoteFalso()
+        progreso = []
+        urls = [LISTA.format(1), VIDEO.format(1), VIDEO.format(1), LISTA.format(2), VIDEO.format(2)]
+        resultado = self.ejecutar(self.orquestador(lote, urls, total=len(urls),
+                                                   on_progreso=lambda c, t: progreso.append((c, t))))
+        # Dentro de la ventana leída los vídeos pasan antes que las listas
+        self.assertEqual(lote.urls, [VIDEO.format(1), VIDEO.format(2), LISTA.format(1), LISTA.format(2)])
+        self.assertEqual((resultado["ok"], resultado["duplicates"]), (4, 1))
+        self.assertEqual(progreso[-1], (len(urls), len(urls)))
+
+    def test_pausa_antes_de_empezar(self):
+        lote = _LoteFalso()
+        orquestador = self.orquestador(lote, [VIDEO.format(i) for i in range(5)])
+        orquestador.pausar()
+        orquestador.iniciar()
+        self.addCleanup(orquestador.cancelar)
+        time.sleep(0.5)
+        self.assertEqual(lote.urls, [])
+        self.assertTrue(orquestador.pausado)
+        orquestador.reanudar()
+        orquestador.esperar(30)
+        self.assertEqual(orquestador.resultado["ok"], 5)
+
+    def test_pausa_a_medias(self):
+        urls = [VIDEO.format(i) for i in range(50)]
+        pausado = threading.Event()
+
+        def al_empezar(n, url):
+            if n == 3:
+                orquestador.pausar()
+                pausado.set()
+
+        lote = _LoteFalso(al_empezar)
+        orquestador = self.orquestador(lote, urls, workers=1)
+        orquestador.iniciar()
+        self.addCleanup(orquestador.cancelar)
+        self.assertTrue(pausado.wait(10))
+        time.sleep(0.5)
+        # Termina la que estaba en curso y, como mucho, la que ya esperaba en el canal (de 1 hueco)
+        en_pausa = len(lote.urls)
+        self.assertLessEqual(en_pausa, 5)
+        time.sleep(0.3)
+        self.assertEqual(len(lote.urls), en_pausa)
+        orquestador.reanudar()
+        orquestador.esperar(30)
+        self.assertEqual(lote.urls, urls)
+
+    def test_cancelar_a_medias(self):
+        leidas = []
+
+        def fuente():
+            for i in range(100000):
+                leidas.append(i)
+                yield VIDEO.format(i)
+
+        def al_empezar(n, url):
+            if n == 3:
+                orquestador.cancelar()
+
+        lote = _LoteFalso(al_empezar)
+        orquestador = self.orquestador(lote, fuente(), workers=1)
+        self.ejecutar(orquestador)
+        self.assertTrue(orquestador.cancelado)
+        # El lote ve la cancelación y las URLs del canal se descartan
+        self.assertTrue(lote.cancelado.is_set())
+        self.assertLessEqual(len(lote.urls), 5)
+        # La fuente deja de leerse
+        self.assertLess(len(leidas), 100000)
+
+    def test_cancelar_antes_de_empezar(self):
+        lote = _LoteFalso()
+        orquestador = self.orquestador(lote, [VIDEO.format(i) for i in range(5)])
+        orquestador.cancelar()
+        self.ejecutar(orquestador)
+        self.assertEqual(lote.urls, [])
+
+    def test_cancelar_en_pausa(self):
+        lote = _LoteFalso()
+        orquestador = self.orquestador(lote, [VIDEO.format(i) for i in range(5)])
+        orquestador.pausar()
+        orquestador.iniciar()
+        time.sleep(0.3)
+        orquestador.cancelar()
+        orquestador.esperar(10)
+        self.assertFalse(orquestador._hilo.is_alive())
+        self.assertEqual(lote.urls, [])
+
+    def test_error_de_la_fuente(self):
+        def fuente():
+            yield VIDEO.format(1)
+            raise OSError("CSV ilegible")
+
+        lote = _LoteFalso()
+        orquestador = self.orquestador(lote, fuente())
+        # Bloques de una URL: la primera ya está en la cola cuando falla la lectura
+        with mock.patch("orquestador.BLOQUE_LECTURA", 1):
+            self.ejecutar(orquestador)
+        self.assertIsInstance(orquestador.error, OSError)
+        self.assertIsNone(orquestador.resultado)
+        # Lo que ya estaba en la cola se procesa igualmente
+        self.assertEqual(lote.urls, [VIDEO.format(1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
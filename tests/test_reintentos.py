@@ -0,0 +1,209 @@
+# Reintentos con espera exponencial y Retry-After contra un servidor que responde 429 y 503, y
+# ritmo adaptativo por host (LimitadorHosts)
+
+import os
+import json
+import random
+import tempfile
+import threading
+import unittest
+from functools import partial
+from collections import deque
+from unittest import mock
+
+from comun import HAY_FFMPEG
+
+import benchmark
+from conexiones import ErrorHTTP
+from descargas import descargar_lote, OpcionesLote
+from diario import DiarioTrabajo
+from planificador import (
+    LIMITADO, RED, NO_DISPONIBLE, LimitadorHosts, clasificar_error, calcular_espera,
+    RITMO_INICIAL, RITMO_MAXIMO, RITMO_MINIMO, RAFAGA, INCREMENTO_RITMO,
+)
+from servidor_medios import ServidorMedios
+
+
+class PruebaClasificacion(unittest.TestCase):
+
+    def test_429_con_retry_after(self):
+        self.assertEqual(clasificar_error(ErrorHTTP(429, "Too Many Requests", {"Retry-After": "3"})),
+                         (LIMITADO, 3.0))
+
+    def test_5xx_y_4xx(self):
+        self.assertEqual(clasificar_error(ErrorHTTP(503, "Service Unavailable", {}))[0], RED)
+        self.assertEqual(clasificar_error(ErrorHTTP(404, "Not Found", {}))[0], NO_DISPONIBLE)
+        self.assertEqual(clasificar_error(Exception("ERROR: HTTP Error 502: Bad Gateway"))[0], RED)
+
+    def test_espera_respeta_retry_after(self):
+        for intento in range(1, 5):
+            self.assertGreaterEqual(calcular_espera(intento, retry_after=5), 5)
+            self.assertLessEqual(calcular_espera(intento, base=1.0), 2 ** intento)
+        self.assertEqual(calcular_espera(10, maximo=30, retry_after=300), 30)
+
+
+class _Reloj:
+    """Sustituye a time en planificador: sleep() adelanta el reloj en vez de esperar."""
+
+    def __init__(self):
+        self.ahora = 0.0
+        self.esperas = []
+
+    def monotonic(self):
+        return self.ahora
+
+    def sleep(self, segundos):
+        self.esperas.append(segundos)
+        # Como el reloj de verdad, siempre avanza algo
+        self.ahora += max(segundos, 1e-6)
+
+
+class PruebaLimitador(unittest.TestCase):
+
+    def setUp(self):
+        self.reloj = _Reloj()
+        parche = mock.patch("planificador.time", self.reloj)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.limitador = LimitadorHosts()
+
+    def test_rafaga_y_ritmo(self):
+        for _ in range(RAFAGA):
+            self.limitador.esperar("a.example")
+        self.assertEqual(self.reloj.esperas, [])
+        self.limitador.esperar("a.example")
+        self.assertAlmostEqual(sum(self.reloj.esperas), 1 / RITMO_INICIAL)
+        # Cada host tiene su cubo
+        self.limitador.esperar("b.example")
+        self.assertAlmostEqual(sum(self.reloj.esperas), 1 / RITMO_INICIAL)
+
+    def test_subida_aditiva_hasta_el_maximo(self):
+        self.limitador.exito("a.example")
+        self.assertAlmostEqual(self.limitador.ritmos()["a.example"], RITMO_INICIAL + INCREMENTO_RITMO)
+        for _ in range(1000):
+            self.limitador.exito("a.example")
+        self.assertEqual(self.limitador.ritmos()["a.example"], RITMO_MAXIMO)
+
+    def test_bajada_multiplicativa_hasta_el_minimo(self):
+        self.limitador.frenar("a.example")
+        self.assertEqual(self.limitador.ritmos()["a.example"], RITMO_INICIAL / 2)
+        # Sin fichas: la siguiente petición espera un periodo del nuevo ritmo
+        self.limitador.esperar("a.example")
+        self.assertAlmostEqual(sum(self.reloj.esperas), 2 / RITMO_INICIAL)
+        for _ in range(50):
+            self.limitador.frenar("a.example")
+        self.assertEqual(self.limitador.ritmos()["a.example"], RITMO_MINIMO)
+
+    def test_retry_after_pausa_el_host(self):
+        self.limitador.frenar("a.example", retry_after=30)
+        self.limitador.esperar("b.example")
+        self.assertEqual(self.reloj.ahora, 0)
+        self.limitador.esperar("a.example")
+        self.assertGreaterEqual(self.reloj.ahora, 30)
+        # Un Retry-After más corto no acorta una pausa más larga ya en marcha
+        self.limitador.frenar("b.example", retry_after=20)
+        self.limitador.frenar("b.example", retry_after=5)
+        inicio = self.reloj.ahora
+        self.limitador.esperar("b.example")
+        self.assertGreaterEqual(self.reloj.ahora - inicio, 20)
+
+    def test_se_queda_por_debajo_del_limite_del_servidor(self):
+        for limite in (2, 6, 12):
+            with self.subTest(limite=limite):
+                limitador = LimitadorHosts()
+                # Servidor que responde 429 a partir de limite peticiones en el último segundo
+                aceptadas = deque()
+                rechazos = 0
+                for i in range(3000):
+                    limitador.esperar("a.example")
+                    while aceptadas and aceptadas[0] <= self.reloj.ahora - 1:
+                        aceptadas.popleft()
+                    if len(aceptadas) >= limite:
+                        limitador.frenar("a.example")
+                        rechazos += i >= 1500
+                    else:
+                        aceptadas.append(self.reloj.ahora)
+                        limitador.exito("a.example")
+                    if i == 1500:
+                        inicio = self.reloj.ahora
+                # Ya estable: cerca del límite y con pocos 429
+                ritmo = 1500 / (self.reloj.ahora - inicio)
+                self.assertGreater(ritmo, limite / 2)
+                self.assertLessEqual(ritmo, limite * 1.05)
+                self.assertLess(rechazos, 1500 * 0.1)
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg para generar y convertir los medios")
+class PruebaServidorConFallos(unittest.TestCase):
+
+    def setUp(self):
+        medios = tempfile.TemporaryDirectory()
+        self.addCleanup(medios.cleanup)
+        benchmark.generar_medios(medios.name, 1)
+        random.seed(11)
+        self.servidor = ServidorMedios(medios.name, tasa_fallos=0.25, max_rps=3).iniciar()
+        self.addCleanup(self.servidor.detener)
+
+    def test_lote_con_429_y_503(self):
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        ruta_diario = os.path.join(carpeta.name, "diario.jsonl")
+        diario = DiarioTrabajo(ruta_diario, cabecera={"folder": carpeta.name})
+        urls = [self.servidor.url(benchmark.ARCHIVOS["MP3"], i) for i in range(6)]
+        # Esperas cortas para que la prueba vaya rápida; Retry-After se sigue respetando
+        with mock.patch("descargas.calcular_espera", partial(calcular_espera, base=0.05)):
+            opciones = OpcionesLote(usar_historial=False, usar_cache=False, silencioso=True, diario=diario,
+                                    max_reintentos=8, limitador=LimitadorHosts(ritmo_inicial=16.0, rafaga=8))
+            resultado = descargar_lote(urls, os.path.join(carpeta.name, "salida"), "MP3", 3, opciones)
+        diario.cerrar()
+        with open(ruta_diario, encoding="utf-8") as f:
+            reintentos = [e for e in map(json.loads, f) if e["event"] == "retry"]
+
+        self.assertEqual(resultado["ok"], len(urls))
+        self.assertGreater(self.servidor.inyectados[429], 0)
+        self.assertGreater(self.servidor.inyectados[503], 0)
+        self.assertEqual(resultado["retries"], len(reintentos))
+        limitados = [e for e in reintentos if e["reason"] == LIMITADO]
+        self.assertTrue(limitados)
+        self.assertTrue(any(e["reason"] == RED for e in reintentos))
+        for evento in limitados:
+            self.assertGreaterEqual(evento["wait"], 1.0)
+
+
+class PruebaCancelarConReintentos(unittest.TestCase):
+    """Al cancelar con URLs esperando su reintento, esas URLs también terminan como "cancelled"."""
+
+    def test_cancelar_con_reintento_pendiente(self):
+        medios = tempfile.TemporaryDirectory()
+        self.addCleanup(medios.cleanup)
+        with open(os.path.join(medios.name, "pista.mp3"), "wb") as f:
+            f.write(os.urandom(4096))
+        servidor = ServidorMedios(medios.name, tasa_fallos=1.0).iniciar()
+        self.addCleanup(servidor.detener)
+        carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(carpeta.cleanup)
+        urls = [servidor.url("pista.mp3", i) for i in range(3)]
+        cancelado, programados = threading.Event(), []
+        terminadas = []
+
+        def espera_larga(intento, **_):
+            # El lote sólo se cancela cuando todas las URLs esperan su reintento
+            programados.append(intento)
+            if len(programados) == len(urls):
+                cancelado.set()
+            return 60.0
+
+        with mock.patch("descargas.calcular_espera", espera_larga):
+            opciones = OpcionesLote(usar_historial=False, usar_cache=False, silencioso=True)
+            resultado = descargar_lote(urls, carpeta.name, "MP3", 3, opciones, cancelado=cancelado,
+                                       on_terminada=lambda url, estado: terminadas.append((url, estado)))
+
+        self.assertEqual(resultado["cancelled"], len(urls))
+        self.assertEqual(sum(resultado[c] for c in ("ok", "error", "invalid", "skipped", "duplicates",
+                                                    "cancelled")), len(urls))
+        self.assertEqual(sorted(terminadas), sorted((url, "cancelled") for url in urls))
+        self.assertEqual(resultado["memoria"]["elementos_abiertos"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
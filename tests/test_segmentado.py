@@ -0,0 +1,78 @@
+# Descarga por segmentos contra un servidor local con Range: completa, cancelada y reanudada
+
+import os
+import time
+import tempfile
+import unittest
+
+from comun import DATOS
+
+from segmentado import DescargaSegmentada, TAMANO_MINIMO
+from servidor_medios import ServidorMedios
+
+
+class PruebaSegmentado(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._medios = tempfile.TemporaryDirectory()
+        cls.contenido = os.urandom(3 * 1024 * 1024 + 12345)
+        with open(os.path.join(cls._medios.name, "grande.mp4"), "wb") as f:
+            f.write(cls.contenido)
+        with open(os.path.join(cls._medios.name, "corto.mp4"), "wb") as f:
+            f.write(os.urandom(TAMANO_MINIMO // 2))
+        cls.servidor = ServidorMedios(cls._medios.name).iniciar()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.detener()
+        cls._medios.cleanup()
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.ruta = os.path.join(carpeta.name, "grande.mp4")
+
+    def leer(self):
+        with open(self.ruta, "rb") as f:
+            return f.read()
+
+    def test_completa(self):
+        descarga = DescargaSegmentada(self.servidor.url("grande.mp4"), self.ruta, segmentos=4)
+        self.assertTrue(descarga.preparar())
+        self.assertEqual(descarga.tamano, len(self.contenido))
+        descarga.iniciar()
+        self.assertTrue(descarga.esperar())
+        self.assertEqual(self.leer(), self.contenido)
+        self.assertFalse(os.path.exists(self.ruta + ".part"))
+        self.assertFalse(os.path.exists(self.ruta + ".part.segs"))
+
+    def test_corto_no_se_segmenta(self):
+        descarga = DescargaSegmentada(self.servidor.url("corto.mp4"), self.ruta, segmentos=4)
+        self.assertFalse(descarga.preparar())
+
+    def test_cancelar_y_reanudar(self):
+        with ServidorMedios(self._medios.name, kbps_conexion=200) as lento:
+            descarga = DescargaSegmentada(lento.url("grande.mp4"), self.ruta, segmentos=4)
+            self.assertTrue(descarga.preparar())
+            descarga.iniciar()
+            time.sleep(0.5)
+            descarga.cancelar()
+            self.assertTrue(descarga.terminada())
+            descargados = descarga.descargados
+            self.assertGreater(descargados, 0)
+            self.assertLess(descargados, len(self.contenido))
+            self.assertTrue(os.path.exists(self.ruta + ".part.segs"))
+            self.assertFalse(os.path.exists(self.ruta))
+
+        reanudada = DescargaSegmentada(self.servidor.url("grande.mp4"), self.ruta, segmentos=4)
+        self.assertTrue(reanudada.preparar())
+        self.assertEqual(reanudada.descargados, descargados)
+        reanudada.iniciar()
+        self.assertTrue(reanudada.esperar())
+        self.assertEqual(self.leer(), self.contenido)
+        self.assertFalse(os.path.exists(self.ruta + ".part.segs"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+# API HTTP del servidor de trabajos: token, envío, estado, eventos, cancelación y peticiones mal formadas
+
+import os
+import json
+import time
+import tempfile
+import unittest
+import http.client
+
+from comun import HAY_FFMPEG, DATOS
+
+import benchmark
+from servidor_medios import ServidorMedios
+from servidor_trabajos import ServidorTrabajos, ClienteTrabajos, CABECERA_TOKEN, MAX_CUERPO
+
+
+class PruebaAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.servidor = ServidorTrabajos(max_trabajos=1, workers=2, anunciar=False).iniciar()
+        cls.cliente = ClienteTrabajos(cls.servidor.url_base, cls.servidor.token)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.detener()
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+
+    def peticion(self, metodo, ruta, cuerpo=None, cabeceras=None):
+        """(código, JSON de la respuesta, si el servidor cierra la conexión)."""
+        conexion = http.client.HTTPConnection(self.cliente.host, self.cliente.puerto, timeout=10)
+        self.addCleanup(conexion.close)
+        conexion.putrequest(metodo, ruta)
+        for nombre, valor in ({CABECERA_TOKEN: self.servidor.token, **(cabeceras or {})}).items():
+            conexion.putheader(nombre, valor)
+        conexion.endheaders(cuerpo)
+        respuesta = conexion.getresponse()
+        return respuesta.status, json.loads(respuesta.read()), respuesta.will_close
+
+    def test_token(self):
+        with self.assertRaisesRegex(ValueError, "token"):
+            ClienteTrabajos(self.servidor.url_base, "otro").trabajos()
+        for metodo in ("GET", "POST", "DELETE"):
+            codigo, datos, _ = self.peticion(metodo, "/jobs/1", cabeceras={CABECERA_TOKEN: ""})
+            self.assertEqual((codigo, datos), (403, {"error": "token"}))
+
+    def test_content_length(self):
+        codigo, datos, cierra = self.peticion("POST", "/jobs", cabeceras={"Content-Length": "mucho"})
+        self.assertEqual((codigo, datos, cierra), (400, {"error": "Content-Length"}, True))
+        codigo, _, cierra = self.peticion("POST", "/jobs", cabeceras={"Content-Length": "-5"})
+        self.assertEqual((codigo, cierra), (400, True))
+        # Demasiado grande: se rechaza sin leer el cuerpo
+        codigo, datos, cierra = self.peticion("POST", "/jobs", cabeceras={"Content-Length": str(MAX_CUERPO + 1)})
+        self.assertEqual((codigo, datos, cierra), (413, {"error": "body"}, True))
+
+    def test_cuerpos_no_validos(self):
+        for cuerpo in (b"[]", b"{no es json", json.dumps({"urls": [], "out": self.carpeta}).encode(),
+                       json.dumps({"urls": ["https://x.example/a.mp3"], "out": "/no/existe"}).encode(),
+                       json.dumps({"urls": ["https://x.example/a.mp3"], "out": self.carpeta,
+                                   "format": "wav"}).encode()):
+            codigo, datos, _ = self.peticion("POST", "/jobs", cuerpo,
+                                             {"Content-Length": str(len(cuerpo))})
+            self.assertEqual(codigo, 400, cuerpo)
+            self.assertIn("error", datos)
+
+    def test_from_y_rutas(self):
+        for desde in ("-1", "uno"):
+            codigo, datos, _ = self.peticion("GET", f"/jobs/1/events?from={desde}")
+            self.assertEqual((codigo, datos), (400, {"error": "from"}))
+        self.assertEqual(self.peticion("GET", "/jobs/9999")[:2], (404, {"error": "job"}))
+        self.assertEqual(self.peticion("DELETE", "/jobs/9999")[:2], (404, {"error": "job"}))
+        self.assertEqual(self.peticion("GET", "/otra")[:2], (404, {"error": "path"}))
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg para generar y convertir los medios")
+class PruebaTrabajos(unittest.TestCase):
+    """Trabajos de verdad en los procesos del pool contra el servidor de medios local."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._medios = tempfile.TemporaryDirectory()
+        benchmark.generar_medios(cls._medios.name, 1)
+        cls.medios = ServidorMedios(cls._medios.name).iniciar()
+        cls.lento = ServidorMedios(cls._medios.name, kbps_conexion=16).iniciar()
+        cls.servidor = ServidorTrabajos(max_trabajos=2, workers=2, anunciar=False).iniciar()
+        cls.cliente = ClienteTrabajos(cls.servidor.url_base, cls.servidor.token)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.detener()
+        cls.lento.detener()
+        cls.medios.detener()
+        cls._medios.cleanup()
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+
+    def test_enviar_y_seguir(self):
+        urls = [self.medios.url(benchmark.ARCHIVOS["MP3"], i) for i in range(3)]
+        id = self.cliente.enviar(self.carpeta, "mp3", urls=urls + [urls[0]], archive=False)
+        eventos = list(self.cliente.eventos(id))
+        tipos = [e["event"] for e in eventos if e["event"] != "progress"]
+        self.assertEqual(tipos[:2], ["queued", "start"])
+        self.assertEqual(tipos[-1], "summary")
+        items = {(e["url"], e["status"]) for e in eventos if e["event"] == "item"}
+        self.assertEqual(items, {(url, "ok") for url in urls} | {(urls[0], "duplicates")})
+        estado = self.cliente.estado(id)
+        self.assertEqual((estado["status"], estado["completed"], estado["total"]), ("done", 4, 4))
+        self.assertEqual((estado["result"]["ok"], estado["result"]["duplicates"]), (3, 1))
+        self.assertEqual(sorted(os.listdir(self.carpeta)), [f"{i}-pista.mp3" for i in range(3)])
+        # Los eventos se pueden volver a pedir desde cualquier punto
+        repetidos = list(self.cliente.eventos(id, desde=len(tipos) - 1))
+        self.assertEqual(repetidos[-1]["event"], "summary")
+        self.assertIn(id, [t["id"] for t in self.cliente.trabajos()])
+
+    def test_cancelar_en_otro_proceso(self):
+        urls = [self.lento.url(benchmark.ARCHIVOS["MP4"], i) for i in range(2)]
+        id = self.cliente.enviar(self.carpeta, "mp4", urls=urls, archive=False, tags=False)
+        eventos = self.cliente.eventos(id)
+        self.assertEqual(next(eventos)["event"], "queued")
+        self.assertEqual(next(eventos)["event"], "start")
+        # Con las dos descargas ya en curso (a 16 kB/s tardarían varios segundos)
+        time.sleep(1.0)
+        self.cliente.cancelar(id)
+        resumen = [e for e in eventos if e["event"] == "summary"][0]
+        self.assertEqual(resumen["cancelled"], len(urls))
+        self.assertEqual(self.cliente.estado(id)["status"], "cancelled")
+
+
+if __name__ == "__main__":
+    unittest.main()
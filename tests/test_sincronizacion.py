@@ -0,0 +1,122 @@
+# Sincronización de un CSV que crece (desplazamiento, inodo y truncado) y de listas vigiladas
+
+import os
+import tempfile
+import threading
+import unittest
+
+from comun import DATOS
+
+from sincronizacion import Sincronizador
+
+LISTA = "https://www.youtube.com/playlist?list=PLpruebas"
+
+
+class _YDLBloqueado:
+    """Extractor falso: devuelve una lista de dos vídeos cuando se le deja continuar."""
+
+    def __init__(self):
+        self.extrayendo = threading.Event()
+        self.continuar = threading.Event()
+
+    def extract_info(self, url, download=False, process=False):
+        self.extrayendo.set()
+        self.continuar.wait(10)
+        return {"_type": "playlist", "entries": iter([
+            {"_type": "url", "url": "https://www.youtube.com/watch?v=aaaaaaaaaaa"},
+            {"_type": "url", "url": "https://www.youtube.com/watch?v=bbbbbbbbbbb"},
+        ])}
+
+    def close(self):
+        pass
+
+
+class PruebaCSV(unittest.TestCase):
+
+    def setUp(self):
+        carpeta = tempfile.TemporaryDirectory(dir=DATOS)
+        self.addCleanup(carpeta.cleanup)
+        self.carpeta = carpeta.name
+        self.csv = os.path.join(carpeta.name, "enlaces.csv")
+        self.estado = os.path.join(carpeta.name, "estado.sqlite3")
+        self.sincronizador = self.abrir()
+
+    def abrir(self):
+        sincronizador = Sincronizador(self.estado, self.csv)
+        self.addCleanup(sincronizador.cerrar)
+        return sincronizador
+
+    def escribir(self, texto, modo="a"):
+        with open(self.csv, modo, encoding="utf-8", newline="") as f:
+            f.write(texto)
+
+    def novedades(self, sincronizador=None):
+        """URLs nuevas del ciclo, dándolas por descargadas para que no vuelvan como reintento."""
+        sincronizador = sincronizador or self.sincronizador
+        urls, resumen = sincronizador.novedades()
+        for url in urls:
+            sincronizador.terminada(url, "ok")
+        return urls
+
+    def test_solo_lineas_nuevas_y_completas(self):
+        self.assertEqual(self.novedades(), [])
+        self.escribir("https://x.example/1.mp3\nhttps://x.example/2.mp3\n")
+        self.assertEqual(self.novedades(), ["https://x.example/1.mp3", "https://x.example/2.mp3"])
+        self.assertEqual(self.novedades(), [])
+        # La línea a medio escribir espera al siguiente ciclo
+        self.escribir("https://x.example/3.m")
+        self.assertEqual(self.novedades(), [])
+        self.escribir("p3\nhttps://x.example/4.mp3\n")
+        # Otro proceso con el mismo estado sigue desde el desplazamiento guardado
+        self.assertEqual(self.novedades(self.abrir()), ["https://x.example/3.mp3", "https://x.example/4.mp3"])
+
+    def test_campos_entre_comillas(self):
+        # splitlines() también partiría el título con U+2028 (habitual al copiar de una web)
+        self.escribir('url,titulo\n"https://x.example/a?b=1,2","Uno"\n'
+                      'https://x.example/c.mp3,"título en\ndos líneas"\n'
+                      'https://x.example/d.mp3,párrafo\u2028siguiente\n')
+        self.assertEqual(self.novedades(), ["url", "https://x.example/a?b=1,2", "https://x.example/c.mp3",
+                                            "https://x.example/d.mp3"])
+
+    def test_truncado_y_sustitucion_releen_desde_el_principio(self):
+        self.escribir("https://x.example/1.mp3\nhttps://x.example/2.mp3\n")
+        self.novedades()
+        # Mismo inodo pero más corto: se ha truncado y reescrito
+        self.escribir("https://x.example/9.mp3\n", modo="w")
+        self.assertEqual(self.novedades(), ["https://x.example/9.mp3"])
+        # Otro archivo (otro inodo) más largo que lo ya leído: también desde el principio
+        nuevo = os.path.join(self.carpeta, "nuevo.csv")
+        with open(nuevo, "w", encoding="utf-8") as f:
+            f.write("https://x.example/9.mp3\nhttps://x.example/10.mp3\n")
+        os.replace(nuevo, self.csv)
+        self.assertEqual(self.novedades(), ["https://x.example/9.mp3", "https://x.example/10.mp3"])
+
+    def test_la_extraccion_de_listas_no_bloquea(self):
+        self.escribir("https://x.example/1.mp3\n")
+        self.novedades()
+        self.escribir(LISTA + "\n")
+        ydl = _YDLBloqueado()
+        self.sincronizador._ydl = ydl
+        resultado = []
+        ciclo = threading.Thread(target=lambda: resultado.append(self.sincronizador.novedades()))
+        ciclo.start()
+        self.assertTrue(ydl.extrayendo.wait(10))
+        # Con la lista a medio extraer, terminada() (desde los hilos del lote) no espera
+        hecho = threading.Thread(target=self.sincronizador.terminada, args=("https://x.example/1.mp3", "ok"))
+        hecho.start()
+        hecho.join(5)
+        self.assertFalse(hecho.is_alive())
+        ydl.continuar.set()
+        ciclo.join(10)
+        urls, resumen = resultado[0]
+        self.assertEqual(urls, ["https://www.youtube.com/watch?v=aaaaaaaaaaa",
+                                "https://www.youtube.com/watch?v=bbbbbbbbbbb"])
+        self.assertEqual((resumen["playlists"], resumen["playlist_entries"]), (1, 2))
+        for url in urls:
+            self.sincronizador.terminada(url, "ok")
+        # La lista ya revisada no vuelve a extraerse hasta su intervalo
+        self.assertEqual(self.novedades(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
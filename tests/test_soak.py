@@ -0,0 +1,116 @@
+# Soak contra el servidor local: la memoria y el estado por elemento no crecen con el lote
+#
+# El soak corto corre siempre; el de 10000 elementos solo con DWSONGS_SOAK_LARGO=1:
+#   DWSONGS_SOAK_LARGO=1 python -m pytest tests/test_soak.py
+
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from comun import HAY_FFMPEG
+
+import benchmark
+from memoria import ControlMemoria
+from servidor_medios import ServidorMedios
+
+MB = 1 << 20
+ELEMENTOS = 400
+ELEMENTOS_LARGO = 10000
+WORKERS = 2
+
+
+class PruebaMuestras(unittest.TestCase):
+    """Las muestras de rss_actual que guarda ControlMemoria y lo que el soak deduce de ellas."""
+
+    def control(self, valores, **parametros):
+        with mock.patch("memoria.rss_actual", side_effect=valores):
+            control = ControlMemoria(**parametros)
+        return control
+
+    def test_guarda_una_muestra_por_elemento(self):
+        valores = [100 * MB + i * MB for i in range(50)]
+        control = self.control(iter([90 * MB]), reciclar_cada=None)
+        with mock.patch("memoria.rss_actual", side_effect=valores):
+            for _ in valores:
+                control.terminado()
+        self.assertEqual(control.serie(), valores)
+        estadisticas = control.estadisticas()
+        self.assertEqual((estadisticas["elementos"], estadisticas["rss_inicial_mb"]), (50, 90.0))
+        self.assertGreaterEqual(estadisticas["rss_pico_mb"], 149.0)
+
+    def test_aclara_las_muestras_al_llenarse(self):
+        control = self.control(iter([0]))
+        with mock.patch("memoria.rss_actual", return_value=MB), mock.patch("memoria.MAX_MUESTRAS", 64):
+            for _ in range(1000):
+                control.terminado()
+        self.assertLess(len(control.serie()), 64)
+        self.assertGreater(len(control.serie()), 16)
+
+    def test_max_rss_recicla_cada_hilo_una_vez(self):
+        control = self.control(iter([MB]), max_rss=100 * MB)
+        with mock.patch("memoria.rss_actual", return_value=200 * MB), \
+                mock.patch("memoria.INTERVALO_GENERACION", 0):
+            # Un hilo que ya había empezado antes de pasar del límite
+            self.assertFalse(control.terminado())
+            reciclan = []
+            hilo = threading.Thread(target=lambda: reciclan.extend(control.terminado() for _ in range(3)))
+            hilo.start()
+            hilo.join()
+        self.assertTrue(any(reciclan))
+        self.assertGreater(control.estadisticas()["reciclados"], 0)
+
+    def crecimiento(self, serie, items=1000, workers=2, reciclar_cada=50):
+        referencia, final = benchmark.memoria_referencia_y_final(serie, items, workers, reciclar_cada)
+        return (final - referencia) / MB
+
+    def test_memoria_plana_tras_el_calentamiento(self):
+        # Sube durante el calentamiento (primeros reciclajes) y luego oscila sin crecer
+        serie = [50 * MB + min(i, 100) * MB // 4 + (i % 7) * MB // 2 for i in range(1000)]
+        self.assertLess(self.crecimiento(serie), 4)
+
+    def test_una_fuga_se_detecta(self):
+        # 64 kB por elemento: 64 MB en el lote
+        serie = [50 * MB + i * (64 << 10) for i in range(1000)]
+        self.assertGreater(self.crecimiento(serie), 32)
+
+    def test_sin_muestras_no_se_puede_medir(self):
+        with self.assertRaises(RuntimeError):
+            self.crecimiento([MB] * 5)
+
+
+@unittest.skipUnless(HAY_FFMPEG, "hace falta ffmpeg para generar los medios")
+class PruebaSoak(unittest.TestCase):
+
+    def soak(self, elementos, workers, reciclar_cada, tolerancia_mb):
+        with tempfile.TemporaryDirectory() as medios:
+            benchmark.generar_medios(medios, 1)
+            with ServidorMedios(medios) as servidor:
+                # Proceso aparte, como en benchmark.py: la memoria medida es solo la del lote
+                soak = benchmark.lanzar_escenario({
+                    "soak": True, "items": elementos, "workers": workers, "reciclar_cada": reciclar_cada,
+                    "max_rss_mb": None, "tolerancia_mb": tolerancia_mb, "url_base": servidor.url_base,
+                })
+        self.assertEqual(benchmark.fallos_soak(soak), [])
+        self.assertTrue(soak["correcto"])
+        self.assertEqual(soak["memoria"]["elementos_abiertos"], 0)
+        self.assertGreater(soak["memoria"]["reciclados"], 0)
+        # La comparación de memoria sale de muestras de verdad a lo largo de todo el lote
+        self.assertGreaterEqual(soak["muestras"], min(elementos, 2048))
+        self.assertGreater(soak["rss_referencia_mb"], 0)
+        self.assertLessEqual(soak["rss_final_mb"] - soak["rss_referencia_mb"], tolerancia_mb)
+        self.assertLessEqual(soak["rss_referencia_mb"], soak["memoria"]["rss_pico_mb"])
+        return soak
+
+    def test_memoria_y_estado_acotados(self):
+        self.soak(ELEMENTOS, WORKERS, reciclar_cada=50, tolerancia_mb=32.0)
+
+    @unittest.skipUnless(os.environ.get("DWSONGS_SOAK_LARGO"), "soak de 10000 elementos: DWSONGS_SOAK_LARGO=1")
+    def test_soak_largo(self):
+        # Lo mismo que python benchmark.py --soak 10000 --workers 4
+        self.soak(ELEMENTOS_LARGO, 4, reciclar_cada=200, tolerancia_mb=32.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,6 +26,27 @@ LANGS = {
         "download_finished": "Descarga finalizada.",
         "download_stats": "Correctas: {ok}\nCon error: {err}\nInválidas: {inv}",
         "download_open_folder_question": "¿Quieres abrir la carpeta de descarga?",
+        "parallel_downloads": "Descargas en paralelo:",
+        "pipeline_mode": "Modo pipeline (descarga y conversión en paralelo)",
+        "pipeline_stats": "Descargas/s: {dl:.2f}\nConversiones/s: {enc:.2f}",
+        "download_skipped": "Ya descargadas: {n}",
+        "download_duplicates": "Duplicadas: {n}",
+        "resume": "Reanudar",
+        "no_job_to_resume": "No hay ningún trabajo anterior que reanudar.",
+        "progress_speed": "{speed}/s · quedan {eta}",
+        "worker_converting": "convirtiendo…",
+        "worker_idle": "en espera",
+        "encodes_running": "Conversiones en curso: {n}",
+        "shared_store": "Biblioteca compartida (cada canción se guarda una sola vez entre carpetas)",
+        "store_stats": "Enlazadas desde la biblioteca: {n} ({saved} ahorrados)",
+        "local_staging": "Preparar en disco local (para carpetas en USB o en red)",
+        "pause": "Pausar",
+        "continue": "Continuar",
+        "cancel": "Cancelar",
+        "paused": "en pausa",
+        "download_cancelled": "Canceladas: {n}",
+        "storage_error": "No se pudo preparar la biblioteca o la carpeta temporal: {error}",
+        "resume_error": "No se pudo leer el trabajo a reanudar: {error}",
     },
     "en": {
         "app_title": "dwSongs: YouTube Downloader",
@@ -52,6 +73,27 @@ LANGS = {
         "download_finished": "Download finished.",
         "download_stats": "Successful: {ok}\nErrors: {err}\nInvalid: {inv}",
         "download_open_folder_question": "Open download folder?",
+        "parallel_downloads": "Parallel downloads:",
+        "pipeline_mode": "Pipeline mode (download and convert in parallel)",
+        "pipeline_stats": "Downloads/s: {dl:.2f}\nEncodes/s: {enc:.2f}",
+        "download_skipped": "Already downloaded: {n}",
+        "download_duplicates": "Duplicates: {n}",
+        "resume": "Resume",
+        "no_job_to_resume": "There is no previous job to resume.",
+        "progress_speed": "{speed}/s · {eta} left",
+        "worker_converting": "converting…",
+        "worker_idle": "idle",
+        "encodes_running": "Encodes running: {n}",
+        "shared_store": "Shared library (store each song once across folders)",
+        "store_stats": "Linked from the library: {n} ({saved} saved)",
+        "local_staging": "Stage on local disk (for USB or network folders)",
+        "pause": "Pause",
+        "continue": "Continue",
+        "cancel": "Cancel",
+        "paused": "paused",
+        "download_cancelled": "Cancelled: {n}",
+        "storage_error": "Could not prepare the shared store or the staging folder: {error}",
+        "resume_error": "Could not read the job to resume: {error}",
     },
     "fr": {
         "app_title": "dwSongs: Téléchargeur YouTube",
@@ -78,6 +120,27 @@ LANGS = {
         "download_finished": "Téléchargement terminé.",
         "download_stats": "Succès : {ok}\nErreurs : {err}\nInvalides : {inv}",
         "download_open_folder_question": "Ouvrir le dossier de téléchargement ?",
+        "parallel_downloads": "Téléchargements en parallèle :",
+        "pipeline_mode": "Mode pipeline (téléchargement et conversion en parallèle)",
+        "pipeline_stats": "Téléchargements/s : {dl:.2f}\nConversions/s : {enc:.2f}",
+        "download_skipped": "Déjà téléchargés : {n}",
+        "download_duplicates": "Doublons : {n}",
+        "resume": "Reprendre",
+        "no_job_to_resume": "Aucun travail précédent à reprendre.",
+        "progress_speed": "{speed}/s · reste {eta}",
+        "worker_converting": "conversion…",
+        "worker_idle": "en attente",
+        "encodes_running": "Conversions en cours : {n}",
+        "shared_store": "Bibliothèque partagée (chaque chanson stockée une seule fois entre dossiers)",
+        "store_stats": "Liées depuis la bibliothèque : {n} ({saved} économisés)",
+        "local_staging": "Préparer sur le disque local (pour dossiers USB ou réseau)",
+        "pause": "Pause",
+        "continue": "Continuer",
+        "cancel": "Annuler",
+        "paused": "en pause",
+        "download_cancelled": "Annulés : {n}",
+        "storage_error": "Impossible de préparer la bibliothèque ou le dossier temporaire : {error}",
+        "resume_error": "Impossible de lire la tâche à reprendre : {error}",
     },
     "ro": {
         "app_title": "dwSongs: Downloader YouTube",
@@ -104,6 +167,27 @@ LANGS = {
         "download_finished": "Descărcare finalizată.",
         "download_stats": "Reușite: {ok}\nErori: {err}\nInvalide: {inv}",
         "download_open_folder_question": "Deschide folderul de descărcare?",
+        "parallel_downloads": "Descărcări în paralel:",
+        "pipeline_mode": "Mod pipeline (descărcare și conversie în paralel)",
+        "pipeline_stats": "Descărcări/s: {dl:.2f}\nConversii/s: {enc:.2f}",
+        "download_skipped": "Deja descărcate: {n}",
+        "download_duplicates": "Duplicate: {n}",
+        "resume": "Reia",
+        "no_job_to_resume": "Nu există nicio lucrare anterioară de reluat.",
+        "progress_speed": "{speed}/s · rămas {eta}",
+        "worker_converting": "se convertește…",
+        "worker_idle": "în așteptare",
+        "encodes_running": "Conversii în curs: {n}",
+        "shared_store": "Bibliotecă partajată (fiecare melodie stocată o singură dată între foldere)",
+        "store_stats": "Legate din bibliotecă: {n} ({saved} economisiți)",
+        "local_staging": "Pregătire pe discul local (pentru foldere USB sau de rețea)",
+        "pause": "Pauză",
+        "continue": "Continuă",
+        "cancel": "Anulează",
+        "paused": "în pauză",
+        "download_cancelled": "Anulate: {n}",
+        "storage_error": "Nu s-a putut pregăti biblioteca sau folderul temporar: {error}",
+        "resume_error": "Nu s-a putut citi sarcina de reluat: {error}",
     },
     "it": {
         "app_title": "dwSongs: Downloader per YouTube",
@@ -130,6 +214,27 @@ LANGS = {
         "download_finished": "Download completato.",
         "download_stats": "Riuscite: {ok}\nErrori: {err}\nInvalidi: {inv}",
         "download_open_folder_question": "Vuoi aprire la cartella di download?",
+        "parallel_downloads": "Download in parallelo:",
+        "pipeline_mode": "Modalità pipeline (download e conversione in parallelo)",
+        "pipeline_stats": "Download/s: {dl:.2f}\nConversioni/s: {enc:.2f}",
+        "download_skipped": "Già scaricati: {n}",
+        "download_duplicates": "Duplicati: {n}",
+        "resume": "Riprendi",
+        "no_job_to_resume": "Nessun lavoro precedente da riprendere.",
+        "progress_speed": "{speed}/s · restano {eta}",
+        "worker_converting": "conversione…",
+        "worker_idle": "in attesa",
+        "encodes_running": "Conversioni in corso: {n}",
+        "shared_store": "Libreria condivisa (ogni brano salvato una sola volta tra le cartelle)",
+        "store_stats": "Collegati dalla libreria: {n} ({saved} risparmiati)",
+        "local_staging": "Prepara sul disco locale (per cartelle USB o di rete)",
+        "pause": "Pausa",
+        "continue": "Continua",
+        "cancel": "Annulla",
+        "paused": "in pausa",
+        "download_cancelled": "Annullati: {n}",
+        "storage_error": "Impossibile preparare la libreria o la cartella temporanea: {error}",
+        "resume_error": "Impossibile leggere il lavoro da riprendere: {error}",
     },
     "de": {
         "app_title": "dwSongs: YouTube Downloader",
@@ -156,6 +261,27 @@ LANGS = {
         "download_finished": "Download abgeschlossen.",
         "download_stats": "Erfolgreich: {ok}\nFehler: {err}\nUngültig: {inv}",
         "download_open_folder_question": "Download-Ordner öffnen?",
+        "parallel_downloads": "Parallele Downloads:",
+        "pipeline_mode": "Pipeline-Modus (Download und Konvertierung parallel)",
+        "pipeline_stats": "Downloads/s: {dl:.2f}\nKonvertierungen/s: {enc:.2f}",
+        "download_skipped": "Bereits heruntergeladen: {n}",
+        "download_duplicates": "Duplikate: {n}",
+        "resume": "Fortsetzen",
+        "no_job_to_resume": "Es gibt keinen früheren Auftrag zum Fortsetzen.",
+        "progress_speed": "{speed}/s · noch {eta}",
+        "worker_converting": "wird konvertiert…",
+        "worker_idle": "wartet",
+        "encodes_running": "Laufende Konvertierungen: {n}",
+        "shared_store": "Gemeinsame Bibliothek (jedes Lied nur einmal über alle Ordner speichern)",
+        "store_stats": "Aus der Bibliothek verknüpft: {n} ({saved} gespart)",
+        "local_staging": "Auf lokaler Festplatte vorbereiten (für USB- oder Netzwerkordner)",
+        "pause": "Pausieren",
+        "continue": "Fortsetzen",
+        "cancel": "Abbrechen",
+        "paused": "pausiert",
+        "download_cancelled": "Abgebrochen: {n}",
+        "storage_error": "Bibliothek oder temporärer Ordner konnte nicht vorbereitet werden: {error}",
+        "resume_error": "Der fortzusetzende Auftrag konnte nicht gelesen werden: {error}",
     },
     "zh": {
         "app_title": "dwSongs：YouTube 下载器",
@@ -182,6 +308,27 @@ LANGS = {
         "download_finished": "下载完成。",
         "download_stats": "成功：{ok}\n错误：{err}\n无效：{inv}",
         "download_open_folder_question": "要打开下载文件夹吗？",
+        "parallel_downloads": "并行下载数：",
+        "pipeline_mode": "流水线模式（下载与转换并行）",
+        "pipeline_stats": "下载/秒：{dl:.2f}\n转换/秒：{enc:.2f}",
+        "download_skipped": "已下载：{n}",
+        "download_duplicates": "重复：{n}",
+        "resume": "继续",
+        "no_job_to_resume": "没有可继续的上一个任务。",
+        "progress_speed": "{speed}/秒 · 剩余 {eta}",
+        "worker_converting": "正在转换…",
+        "worker_idle": "空闲",
+        "encodes_running": "正在进行的转换：{n}",
+        "shared_store": "共享曲库（每首歌在各文件夹间只保存一次）",
+        "store_stats": "从曲库链接：{n}（节省 {saved}）",
+        "local_staging": "在本地磁盘暂存（适用于 U 盘或网络文件夹）",
+        "pause": "暂停",
+        "continue": "继续",
+        "cancel": "取消",
+        "paused": "已暂停",
+        "download_cancelled": "已取消：{n}",
+        "storage_error": "无法准备共享库或临时文件夹：{error}",
+        "resume_error": "无法读取要恢复的任务：{error}",
     },
     "pt": {
         "app_title": "dwSongs: Downloader do YouTube",
@@ -208,6 +355,27 @@ LANGS = {
         "download_finished": "Download concluído.",
         "download_stats": "Bem-sucedidos: {ok}\nErros: {err}\nInválidos: {inv}",
         "download_open_folder_question": "Abrir pasta de download?",
+        "parallel_downloads": "Downloads em paralelo:",
+        "pipeline_mode": "Modo pipeline (download e conversão em paralelo)",
+        "pipeline_stats": "Downloads/s: {dl:.2f}\nConversões/s: {enc:.2f}",
+        "download_skipped": "Já baixados: {n}",
+        "download_duplicates": "Duplicados: {n}",
+        "resume": "Retomar",
+        "no_job_to_resume": "Não há nenhum trabalho anterior para retomar.",
+        "progress_speed": "{speed}/s · faltam {eta}",
+        "worker_converting": "convertendo…",
+        "worker_idle": "aguardando",
+        "encodes_running": "Conversões em andamento: {n}",
+        "shared_store": "Biblioteca partilhada (cada música guardada uma só vez entre pastas)",
+        "store_stats": "Ligadas a partir da biblioteca: {n} ({saved} poupados)",
+        "local_staging": "Preparar no disco local (para pastas USB ou de rede)",
+        "pause": "Pausar",
+        "continue": "Continuar",
+        "cancel": "Cancelar",
+        "paused": "em pausa",
+        "download_cancelled": "Canceladas: {n}",
+        "storage_error": "Não foi possível preparar a biblioteca ou a pasta temporária: {error}",
+        "resume_error": "Não foi possível ler o trabalho a retomar: {error}",
     },
     "ar_MA": {
         "app_title": "dwSongs: محمل يوتيوب",
@@ -234,6 +402,27 @@ LANGS = {
         "download_finished": "اكتمل التنزيل.",
         "download_stats": "ناجحة: {ok}\nأخطاء: {err}\nغير صالحة: {inv}",
         "download_open_folder_question": "هل تريد فتح مجلد التنزيل؟",
+        "parallel_downloads": "التنزيلات المتوازية:",
+        "pipeline_mode": "وضع خط المعالجة (التنزيل والتحويل بالتوازي)",
+        "pipeline_stats": "التنزيلات/ث: {dl:.2f}\nالتحويلات/ث: {enc:.2f}",
+        "download_skipped": "تم تنزيلها مسبقًا: {n}",
+        "download_duplicates": "مكررة: {n}",
+        "resume": "استئناف",
+        "no_job_to_resume": "لا توجد مهمة سابقة لاستئنافها.",
+        "progress_speed": "{speed}/ث · المتبقي {eta}",
+        "worker_converting": "جارٍ التحويل…",
+        "worker_idle": "في الانتظار",
+        "encodes_running": "التحويلات الجارية: {n}",
+        "shared_store": "مكتبة مشتركة (حفظ كل أغنية مرة واحدة عبر المجلدات)",
+        "store_stats": "مرتبطة من المكتبة: {n} (تم توفير {saved})",
+        "local_staging": "التحضير على القرص المحلي (لمجلدات USB أو الشبكة)",
+        "pause": "إيقاف مؤقت",
+        "continue": "متابعة",
+        "cancel": "إلغاء",
+        "paused": "متوقف مؤقتاً",
+        "download_cancelled": "ملغاة: {n}",
+        "storage_error": "تعذر تجهيز المكتبة أو المجلد المؤقت: {error}",
+        "resume_error": "تعذرت قراءة المهمة المراد استئنافها: {error}",
     },
 }
 